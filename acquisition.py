@@ -0,0 +1,273 @@
+# acquisition.py
+"""Bit-for-bit acquisition of a block device or an existing disk image.
+
+One reader thread fills a small ring of aligned buffers with large
+sequential reads. Every filled block is handed to a set of consumer
+threads: one per whole-image digest, one for the per-segment digests and
+one writing the image file. Each buffer goes back to the reader when the
+last consumer is done with it. hashlib and file writes release the GIL,
+so hashing overlaps reading and the digests run on separate cores.
+"""
+
+import errno
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+
+from config import (
+    HASH_ALGORITHMS, ACQUIRE_BLOCK_SIZE, ACQUIRE_SEGMENT_SIZE, ACQUIRE_BUFFERS,
+    ACQUIRE_SEGMENT_ALGORITHMS
+)
+from hash_utils import MultiHasher, ScanProgress, ScanCancelled
+
+ALIGNMENT = 4096  # block and segment sizes are rounded to whole 4 KiB sectors
+
+
+class AcquisitionResult:
+    """Hashes and read errors from one acquisition."""
+
+    def __init__(self, source, image_path):
+        self.source = source
+        self.image_path = image_path
+        self.size = 0
+        self.hashes = {}
+        self.segments = []     # (index, offset, length, {algorithm: hexdigest})
+        self.bad_ranges = []   # (offset, length) that could not be read and were zero-filled
+        self.started = None
+        self.elapsed = 0.0
+
+    def mb_per_sec(self):
+        return self.size / 1e6 / self.elapsed if self.elapsed else 0.0
+
+    def to_dict(self):
+        return {
+            "source": self.source,
+            "image_path": self.image_path,
+            "size": self.size,
+            "hashes": self.hashes,
+            "segments": [{"index": index, "offset": offset, "length": length, "hashes": hashes}
+                         for index, offset, length, hashes in self.segments],
+            "bad_ranges": [{"offset": offset, "length": length}
+                           for offset, length in self.bad_ranges],
+            "started": self.started,
+            "elapsed": self.elapsed,
+        }
+
+    def save_sidecar(self, path=None):
+        """Write the result as JSON next to the image (image.dd.json)."""
+        path = path or self.image_path + ".json"
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+        return path
+
+
+class _Block:
+    __slots__ = ("buffer", "offset", "length", "remaining")
+
+    def __init__(self, buffer, offset, length, consumers):
+        self.buffer = buffer
+        self.offset = offset
+        self.length = length
+        self.remaining = consumers
+
+
+def _round_up(value, multiple):
+    return max(multiple, (value + multiple - 1) // multiple * multiple)
+
+
+def source_size(f):
+    """Size in bytes of an open regular file or block device, or None if unknown."""
+    size = os.fstat(f.fileno()).st_size
+    if size:
+        return size
+    try:
+        size = f.seek(0, os.SEEK_END)  # block devices report st_size 0
+        f.seek(0)
+        return size or None
+    except OSError:
+        return None
+
+
+def _read_block(f, view, offset, size, result):
+    """Fill view from offset; unreadable sectors are zero-filled and recorded."""
+    filled = 0
+    while filled < len(view):
+        try:
+            n = f.readinto(view[filled:])
+        except OSError:
+            if size is None:
+                raise  # without a known end, a read error cannot be told from EOF
+            bad = min(len(view) - filled, ALIGNMENT, size - offset - filled)
+            if bad <= 0:
+                break
+            view[filled:filled + bad] = bytes(bad)
+            result.bad_ranges.append((offset + filled, bad))
+            filled += bad
+            f.seek(offset + filled)
+            continue
+        if not n:
+            break
+        filled += n
+    return filled
+
+
+def _write_block(out, data, offset):
+    """Write all of data to the unbuffered image file, retrying short writes."""
+    written = 0
+    while written < len(data):
+        n = out.write(data[written:])
+        if not n:
+            raise OSError(errno.EIO, f"image write stalled at byte {offset + written}")
+        written += n
+
+
+def acquire_image(source, image_path=None, algorithms=HASH_ALGORITHMS,
+                  segment_size=ACQUIRE_SEGMENT_SIZE, block_size=ACQUIRE_BLOCK_SIZE,
+                  buffers=ACQUIRE_BUFFERS, segment_algorithms=ACQUIRE_SEGMENT_ALGORITHMS,
+                  progress=None):
+    """Read source end to end, writing image_path (if given) and hashing in the same pass.
+
+    Returns an AcquisitionResult with whole-image hashes and one set of
+    segment_algorithms digests per segment_size bytes. Without image_path
+    the source is only hashed (verification of an existing image).
+    progress.advance() receives one record per finished segment.
+    """
+    progress = progress or ScanProgress()
+    block_size = _round_up(block_size, ALIGNMENT)
+    segment_size = _round_up(segment_size, block_size)
+    result = AcquisitionResult(source, image_path)
+    result.started = time.strftime("%Y-%m-%d %H:%M:%S")
+    start = time.perf_counter()
+
+    failure = []
+    free = queue.Queue()
+    for _ in range(max(2, buffers)):
+        free.put(bytearray(block_size))
+    lock = threading.Lock()
+
+    def release(block):
+        with lock:
+            block.remaining -= 1
+            last = block.remaining == 0
+        if last:
+            free.put(block.buffer)
+
+    def consume(inbox, handle, finish=None):
+        try:
+            while True:
+                block = inbox.get()
+                if block is None:
+                    break
+                try:
+                    if not failure:
+                        handle(block, memoryview(block.buffer)[:block.length])
+                finally:
+                    release(block)
+            if finish is not None and not failure:
+                finish()
+        except Exception as e:
+            failure.append(e)
+            # Keep draining so the reader never waits on this consumer's buffers
+            while True:
+                block = inbox.get()
+                if block is None:
+                    break
+                release(block)
+
+    segment = {"index": 0, "offset": 0, "length": 0,
+               "hasher": MultiHasher(segment_algorithms)}
+
+    def finish_segment():
+        if not segment["length"]:
+            return
+        hashes = segment["hasher"].hexdigests()
+        result.segments.append((segment["index"], segment["offset"], segment["length"], hashes))
+        progress.advance({"path": f"{source} [segment {segment['index']}]",
+                          "size": segment["length"], "hashes": hashes,
+                          "offset": segment["offset"]})
+
+    def hash_segment(block, data):
+        index = block.offset // segment_size
+        if index != segment["index"]:
+            finish_segment()
+            segment.update(index=index, offset=block.offset, length=0,
+                           hasher=MultiHasher(segment_algorithms))
+        segment["hasher"].update(data)
+        segment["length"] += block.length
+
+    hashers = {name: hashlib.new(name) for name in algorithms}
+    consumers = [(lambda block, data, h=h: h.update(data), None) for h in hashers.values()]
+    consumers.append((hash_segment, finish_segment))
+
+    out = None
+    if image_path:
+        out = open(image_path, "wb", buffering=0)
+        consumers.append((lambda block, data: _write_block(out, data, block.offset), None))
+
+    inboxes = [queue.Queue() for _ in consumers]
+    threads = [threading.Thread(target=consume, args=(inbox, handle, finish), daemon=True,
+                                name=f"acquire-{i}")
+               for i, (inbox, (handle, finish)) in enumerate(zip(inboxes, consumers))]
+    for thread in threads:
+        thread.start()
+
+    cancelled = False
+    try:
+        with open(source, "rb", buffering=0) as f:
+            size = source_size(f)
+            progress.plan(1, size or 0)
+            offset = 0
+            while not failure:
+                if progress.cancelled():
+                    cancelled = True
+                    break
+                buffer = free.get()
+                n = _read_block(f, memoryview(buffer), offset, size, result)
+                if not n:
+                    free.put(buffer)
+                    break
+                block = _Block(buffer, offset, n, len(inboxes))
+                for inbox in inboxes:
+                    inbox.put(block)
+                offset += n
+                if n < block_size and size is not None and offset >= size:
+                    break
+    finally:
+        for inbox in inboxes:
+            inbox.put(None)
+        for thread in threads:
+            thread.join()
+        if out is not None:
+            if not failure and not cancelled:
+                os.fsync(out.fileno())
+            out.close()
+
+    if failure:
+        raise failure[0]
+    if cancelled:
+        raise ScanCancelled(f"acquisition of {source} cancelled at byte {offset}")
+    result.size = offset
+    result.hashes = {name: h.hexdigest() for name, h in hashers.items()}
+    result.elapsed = time.perf_counter() - start
+    if image_path:
+        result.save_sidecar()
+    return result
+
+
+def record_acquisition(db, result, serial_number, device_name=None):
+    """Store the image hashes and capacity in the device's usb_history row."""
+    return db.insert_usb_history({
+        "device_name": device_name,
+        "serial_number": serial_number,
+        "manufacturer": None,
+        "hash_md5": result.hashes.get("md5"),
+        "hash_sha256": result.hashes.get("sha256"),
+        "storage_capacity": str(result.size),
+        "first_connected": None,
+        "last_connected": None,
+        "vendor_id": None,
+        "product_id": None,
+    })
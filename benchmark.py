@@ -0,0 +1,1502 @@
+# benchmark.py
+"""Performance benchmarks for the tool's hot paths.
+
+Usage: python benchmark.py <name> [options]   (python benchmark.py -h for the list)
+"""
+
+import argparse
+import os
+import random
+import shutil
+import struct
+import sys
+import tempfile
+import time
+
+
+def make_synthetic_tree(root, files=1000, sizes=(4 * 1024, 256 * 1024, 4 * 1024 * 1024),
+                        dirs=20, seed=0, pick_size=None):
+    """Create files spread over dirs subdirectories.
+
+    Sizes are picked at random from sizes, or by pick_size(rng) if given.
+    """
+    rng = random.Random(seed)
+    block = os.urandom(1024 * 1024)
+    total = 0
+    for i in range(files):
+        folder = os.path.join(root, f"dir{i % dirs:03d}")
+        os.makedirs(folder, exist_ok=True)
+        size = pick_size(rng) if pick_size else rng.choice(sizes)
+        with open(os.path.join(folder, f"file{i:07d}.bin"), "wb") as f:
+            remaining = size
+            while remaining > 0:
+                n = min(remaining, len(block))
+                f.write(block[:n])
+                remaining -= n
+        total += size
+    return total
+
+
+def bench_hash_workers(args):
+    from hash_utils import hash_directory
+
+    root = tempfile.mkdtemp(prefix="usbbench_")
+    try:
+        total = make_synthetic_tree(root, files=args.files)
+        print(f"{args.files} files, {total / 1024 ** 2:.1f} MiB")
+        baseline = None
+        for workers in range(1, args.max_workers + 1):
+            start = time.perf_counter()
+            hash_directory(root, workers=workers, use_processes=args.processes)
+            elapsed = time.perf_counter() - start
+            baseline = baseline or elapsed
+            print(f"workers={workers:<3} {total / 1024 ** 2 / elapsed:8.1f} MiB/s "
+                  f"{args.files / elapsed:8.0f} files/s  speedup x{baseline / elapsed:.2f}")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def bench_db_writes(args):
+    import sqlite3
+    from database import DatabaseManager
+
+    root = tempfile.mkdtemp(prefix="usbbench_")
+    try:
+        events = [("Created", f"E:\\dir\\file{i}.bin", "SERIAL1", "2025-05-06 10:10:00",
+                   "", "", "1024", 0) for i in range(args.events)]
+
+        # Before: one commit (and fsync) per row, as the original insert methods did
+        conn = sqlite3.connect(os.path.join(root, "before.db"))
+        conn.execute('''CREATE TABLE file_transfer_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, event_type TEXT, file_path TEXT,
+            usb_serial TEXT, timestamp TEXT, file_hash_md5 TEXT, file_hash_sha256 TEXT,
+            file_size TEXT, is_suspicious INTEGER DEFAULT 0)''')
+        start = time.perf_counter()
+        for row in events:
+            conn.execute('''INSERT INTO file_transfer_events (event_type, file_path, usb_serial,
+                timestamp, file_hash_md5, file_hash_sha256, file_size, is_suspicious)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)''', row)
+            conn.commit()
+        before = time.perf_counter() - start
+        conn.close()
+
+        # After: write-behind queue, batched transactions, WAL
+        db = DatabaseManager(os.path.join(root, "after.db"))
+        keys = ("event_type", "file_path", "usb_serial", "timestamp",
+                "file_hash_md5", "file_hash_sha256", "file_size", "is_suspicious")
+        start = time.perf_counter()
+        for row in events:
+            db.insert_file_transfer_event(dict(zip(keys, row)))
+        db.flush()
+        after = time.perf_counter() - start
+        db.close()
+
+        print(f"{args.events} file transfer events")
+        print(f"commit per row : {args.events / before:10.0f} events/s")
+        print(f"batched writer : {args.events / after:10.0f} events/s  x{before / after:.1f}")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def _hive_value(name, data):
+    if isinstance(data, int):
+        return name, 4, struct.pack("<I", data)
+    if isinstance(data, bytes):
+        return name, 3, data
+    return name, 1, (data + "\x00").encode("utf-16-le")
+
+
+def write_sample_hive(path, keys):
+    """Write a minimal REGF hive.
+
+    keys is a nested tuple (name, {value name: str|int|bytes}, [child keys],
+    last-written FILETIME); only the fields registry_hive reads are filled in.
+    """
+    cells = bytearray(b"\x00" * 0x20)  # hbin header, patched below
+
+    def alloc(data):
+        size = (len(data) + 4 + 7) & ~7
+        offset = len(cells)
+        cells.extend(struct.pack("<i", -size) + data + b"\x00" * (size - 4 - len(data)))
+        return offset
+
+    def write_key(key, root=False):
+        name, values, children, filetime = key
+        encoded = name.encode("latin-1")
+        # Reserve the key's own cell first so parents precede children, as in real hives
+        nk_offset = alloc(bytes(76 + len(encoded)))
+        children = sorted(children, key=lambda k: k[0].upper())
+        child_offsets = [write_key(child) for child in children]
+        subkey_list = 0xFFFFFFFF
+        lists = []
+        for i in range(0, len(children), 1024):  # large lists split into lf cells under an ri
+            entries = b"".join(struct.pack("<I4s", off, child[0][:4].encode("latin-1").ljust(4, b"\x00"))
+                               for off, child in zip(child_offsets[i:i + 1024], children[i:i + 1024]))
+            lists.append(alloc(b"lf" + struct.pack("<H", len(entries) // 8) + entries))
+        if len(lists) == 1:
+            subkey_list = lists[0]
+        elif lists:
+            subkey_list = alloc(b"ri" + struct.pack("<H", len(lists)) +
+                                b"".join(struct.pack("<I", o) for o in lists))
+        value_offsets = []
+        for value_name, value_type, raw in (_hive_value(n, d) for n, d in values.items()):
+            encoded_name = value_name.encode("latin-1")
+            if len(raw) <= 4:
+                size, data_offset = len(raw) | 0x80000000, struct.unpack("<I", raw.ljust(4, b"\x00"))[0]
+            else:
+                size, data_offset = len(raw), alloc(raw)
+            value_offsets.append(alloc(b"vk" + struct.pack("<HIIIHH", len(encoded_name), size,
+                                                           data_offset, value_type, 1, 0)
+                                       + encoded_name))
+        value_list = alloc(b"".join(struct.pack("<I", o) for o in value_offsets)) \
+            if value_offsets else 0xFFFFFFFF
+        nk = b"nk" + struct.pack("<HQIIIIIIIIIIIIIIIHH", 0x2C if root else 0x20, filetime, 0, 0,
+                                 len(child_offsets), 0, subkey_list, 0xFFFFFFFF,
+                                 len(value_offsets), value_list, 0xFFFFFFFF, 0xFFFFFFFF,
+                                 0, 0, 0, 0, 0, len(encoded), 0) + encoded
+        cells[nk_offset + 4:nk_offset + 4 + len(nk)] = nk
+        return nk_offset
+
+    root_offset = write_key(keys, root=True)
+    cells.extend(b"\x00" * (-len(cells) % 4096))
+    cells[:12] = b"hbin" + struct.pack("<II", 0, len(cells))
+
+    base = bytearray(4096)
+    struct.pack_into("<4sIIQIIIII", base, 0, b"regf", 1, 1, 0, 1, 5, 0, 1, root_offset)
+    struct.pack_into("<II", base, 0x28, len(cells), 1)
+    checksum = 0
+    for (dword,) in struct.iter_unpack("<I", bytes(base[:508])):
+        checksum ^= dword
+    struct.pack_into("<I", base, 0x1FC, checksum)
+    with open(path, "wb") as f:
+        f.write(base)
+        f.write(cells)
+
+
+def make_sample_system_hive(path, devices=1000, filler_keys=0, seed=0):
+    """Write a SYSTEM hive with USBSTOR, USB and MountedDevices entries for devices sticks."""
+    rng = random.Random(seed)
+    filetime = 133000000000000000
+    usbstor, usb, mounted = {}, [], {}
+    for i in range(devices):
+        vendor = rng.choice(["SanDisk", "Kingston", "Generic", "Verbatim"])
+        device_class = f"Disk&Ven_{vendor}&Prod_Model{i % 50}&Rev_1.00"
+        serial = f"{rng.getrandbits(64):016X}"
+        usbstor.setdefault(device_class, []).append(
+            (serial + "&0", {"FriendlyName": f"{vendor} Model{i % 50} USB Device",
+                             "Mfg": "@disk.inf,%genmanufacturer%;(Standard disk drives)"},
+             [], filetime + i * 10000000))
+        usb.append((f"VID_{rng.getrandbits(16):04X}&PID_{rng.getrandbits(16):04X}", {},
+                    [(serial, {}, [], filetime)], filetime))
+        if i < 23:
+            mounted[f"\\DosDevices\\{chr(ord('D') + i)}:"] = \
+                f"_??_USBSTOR#{device_class}#{serial}&0#{{53f56307-b6bf-11d0-94f2-00a0c91efb8b}}".encode("utf-16-le")
+    enum = ("Enum", {}, [
+        ("USBSTOR", {}, [(name, {}, instances, filetime) for name, instances in usbstor.items()], filetime),
+        ("USB", {}, usb, filetime),
+    ], filetime)
+    filler = ("Services", {}, [(f"Service{i:07d}", {"Start": 3, "ImagePath": f"system32\\drv{i}.sys"},
+                                [], filetime) for i in range(filler_keys)], filetime)
+    root = ("ROOT", {}, [
+        ("ControlSet001", {}, [enum, filler], filetime),
+        ("Select", {"Current": 1}, [], filetime),
+        ("MountedDevices", mounted, [], filetime),
+    ], filetime)
+    write_sample_hive(path, root)
+
+
+# Packed FAT date << 16 | time for 2025-05-06 10:00:00
+_FAT_TIMESTAMP = ((2025 - 1980) << 9 | 5 << 5 | 6) << 16 | 10 << 11
+SAMPLE_FILE_KINDS = ("jpeg", "png", "pdf", "zip", "exe", "bin")
+_SAMPLE_EXTENSIONS = {"jpeg": "jpg", "png": "png", "pdf": "pdf", "zip": "zip", "exe": "exe",
+                      "bin": "bin"}
+
+
+def _png_chunk(kind, data):
+    import zlib
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+
+def make_sample_file(rng, kind, size):
+    """Bytes of a file of one of SAMPLE_FILE_KINDS with about size bytes of random content."""
+    body = rng.randbytes(size)
+    if kind == "jpeg":
+        # An EXIF thumbnail with its own end marker, then the scan (no FF bytes in it)
+        thumbnail = b"Exif\x00\x00\xff\xd8\xff\xdb\x00\x04\x00\x00\xff\xd9"
+        return (b"\xff\xd8\xff\xe0\x00\x10JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00"
+                + b"\xff\xe1" + struct.pack(">H", len(thumbnail) + 2) + thumbnail
+                + b"\xff\xda\x00\x08\x01\x01\x00\x00\x3f\x00" + body.replace(b"\xff", b"\x00")
+                + b"\xff\xd9")
+    if kind == "png":
+        return (b"\x89PNG\r\n\x1a\n" + _png_chunk(b"IHDR", struct.pack(">IIBBBBB", 64, 64, 8, 2, 0, 0, 0))
+                + _png_chunk(b"IDAT", body) + _png_chunk(b"IEND", b""))
+    if kind == "pdf":
+        return b"%PDF-1.4\n" + body.hex().encode()[:size] + b"\ntrailer\n<<>>\n%%EOF"
+    if kind == "zip":
+        import io
+        import zipfile
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_STORED) as archive:
+            archive.writestr("data.bin", body)
+        return buffer.getvalue()
+    if kind == "exe":
+        raw = body + bytes(-len(body) % 512)
+        coff = struct.pack("<HHIIIHH", 0x14C, 1, 0, 0, 0, 0xE0, 0x0102)
+        optional = struct.pack("<H", 0x10B) + bytes(0xE0 - 2)
+        section = struct.pack("<8sIIIIIIHHI", b".text", len(raw), 0x1000, len(raw), 0x200,
+                              0, 0, 0, 0, 0x60000020)
+        headers = b"MZ" + bytes(0x3A) + struct.pack("<I", 0x40) + b"PE\x00\x00" + coff \
+            + optional + section
+        return headers + bytes(0x200 - len(headers)) + raw
+    return body
+
+
+def _fat32_entry_set(name, short_index, attributes, first, size, deleted):
+    """LFN entries and the short entry for name, as FAT32 writes them."""
+    stem, extension = os.path.splitext(name)
+    short = f"F{short_index:07X}".encode() + extension[1:4].upper().encode().ljust(3)
+    checksum = 0
+    for byte in short:
+        checksum = (((checksum & 1) << 7) + (checksum >> 1) + byte) & 0xFF
+    parts = [name[i:i + 13] for i in range(0, len(name), 13)]
+    entries = []
+    for seq in range(len(parts), 0, -1):
+        chars = parts[seq - 1].encode("utf-16-le")
+        if len(chars) < 26:
+            chars = (chars + b"\x00\x00").ljust(26, b"\xff")
+        entry = bytearray(32)
+        entry[0] = seq | (0x40 if seq == len(parts) else 0)
+        entry[1:11], entry[11], entry[13] = chars[:10], 0x0F, checksum
+        entry[14:26], entry[28:32] = chars[10:22], chars[22:26]
+        entries.append(entry)
+    entry = bytearray(32)
+    entry[:11], entry[11] = short, attributes
+    struct.pack_into("<HHHHHI", entry, 18, _FAT_TIMESTAMP >> 16, first >> 16,
+                     _FAT_TIMESTAMP & 0xFFFF, _FAT_TIMESTAMP >> 16, first & 0xFFFF, size)
+    entries.append(entry)
+    if deleted:
+        for entry in entries:
+            entry[0] = 0xE5
+    return b"".join(entries)
+
+
+def _exfat_entry_set(name, attributes, first, size, deleted, contiguous):
+    """File, stream extension and file name entries for name, as exFAT writes them."""
+    chars = name.encode("utf-16-le")
+    count = -(-len(name) // 15)
+    primary = bytearray(32)
+    primary[0], primary[1] = 0x85, 1 + count
+    struct.pack_into("<HHIII", primary, 4, attributes, 0, _FAT_TIMESTAMP, _FAT_TIMESTAMP,
+                     _FAT_TIMESTAMP)
+    name_hash = 0
+    for byte in name.upper().encode("utf-16-le"):
+        name_hash = (((name_hash & 1) << 15) | (name_hash >> 1)) + byte & 0xFFFF
+    stream = bytearray(32)
+    stream[0], stream[1], stream[3] = 0xC0, 0x01 | (0x02 if contiguous else 0), len(name)
+    struct.pack_into("<HHQ", stream, 4, name_hash, 0, size)
+    struct.pack_into("<IQ", stream, 20, first, size)
+    entries = primary + stream
+    for i in range(count):
+        entries += b"\xc1\x00" + chars[30 * i:30 * i + 30].ljust(30, b"\x00")
+    checksum = 0
+    for i, byte in enumerate(entries):
+        if i != 2 and i != 3:
+            checksum = (((checksum & 1) << 15) | (checksum >> 1)) + byte & 0xFFFF
+    struct.pack_into("<H", entries, 2, checksum)
+    if deleted:
+        for i in range(0, len(entries), 32):
+            entries[i] &= 0x7F
+    return bytes(entries)
+
+
+def write_sample_fat_image(path, files, size, fs="fat32", cluster_size=4096, orphans=(),
+                           deleted_dirs=(), noise=True, seed=0):
+    """Write a FAT32 or exFAT image for the carver.
+
+    files are (path in the volume, data, deleted) with "/" separators. A
+    deleted file keeps its data but its entries are marked deleted and its
+    clusters freed, as the OS leaves them: FAT32 zeroes the FAT chain, exFAT
+    clears the bitmap (files are contiguous; every third keeps a FAT
+    chain). Directories in deleted_dirs are deleted with everything in
+    them. orphans are blobs in free clusters with no entry, as left by a
+    quick format; with noise, clusters never used hold random bytes. The
+    images hold what fat_carving reads, not everything an OS needs to mount
+    them. Returns {file path or orphan index: image offset of its data}.
+    """
+    from array import array
+    sector = 512
+    per_cluster = cluster_size // sector
+    total_sectors = size // sector
+    if fs == "fat32":
+        reserved = 32
+        estimate = (total_sectors - reserved) // per_cluster
+        fat_sectors = -(-(estimate + 2) * 4 // sector)
+        clusters = (total_sectors - reserved - 2 * fat_sectors) // per_cluster
+        fat_start, data_start = reserved * sector, (reserved + 2 * fat_sectors) * sector
+    else:
+        fat_offset = 24
+        estimate = (total_sectors - fat_offset) // per_cluster
+        fat_sectors = -(-(estimate + 2) * 4 // sector)
+        heap = -(-(fat_offset + fat_sectors) // per_cluster) * per_cluster
+        clusters = (total_sectors - heap) // per_cluster
+        fat_start, data_start = fat_offset * sector, heap * sector
+    fat = array("I", bytes(4 * (clusters + 2)))
+    used = bytearray(clusters + 2)   # 1: allocated in the final image
+    written = bytearray(clusters + 2)
+    writes = []
+    state = {"next": 2}
+
+    def allocate(length, chained=True):
+        count = max(1, -(-length // cluster_size))
+        first = state["next"]
+        if first + count > clusters + 2:
+            raise ValueError(f"{len(files)} files do not fit in a {size} byte image")
+        state["next"] += count
+        used[first:first + count] = b"\x01" * count
+        written[first:first + count] = b"\x01" * count
+        if chained:
+            for cluster in range(first, first + count - 1):
+                fat[cluster] = cluster + 1
+            fat[first + count - 1] = 0x0FFFFFFF if fs == "fat32" else 0xFFFFFFFF
+        return first, count
+
+    def free(first, count, keep_chain=False):
+        used[first:first + count] = bytes(count)
+        if not keep_chain:
+            for cluster in range(first, first + count):
+                fat[cluster] = 0
+
+    def cluster_offset(cluster):
+        return data_start + (cluster - 2) * cluster_size
+
+    bitmap_first = bitmap_count = None
+    if fs == "exfat":
+        bitmap_first, bitmap_count = allocate(-(-clusters // 8))
+    tree = {"": []}
+    for file_path, data, deleted in files:
+        parts = file_path.strip("/").split("/")
+        for depth in range(1, len(parts)):
+            folder = "/".join(parts[:depth])
+            if folder not in tree:
+                tree[folder] = []
+                tree["/".join(parts[:depth - 1])].append((parts[depth - 1], None, folder))
+        tree["/".join(parts[:-1])].append((parts[-1], data, deleted))
+
+    def gone(folder):
+        return any(folder == d.strip("/") or folder.startswith(d.strip("/") + "/")
+                   for d in deleted_dirs)
+
+    # Directories first, sized for their entries, then the files
+    folders = {}
+    for folder, children in tree.items():
+        length = 96 + sum(32 * (2 + -(-len(name) // 13)) for name, _, _ in children)
+        folders[folder] = allocate(length)
+    offsets, placed = {}, {}
+    for folder, children in tree.items():
+        for name, data, deleted in children:
+            if data is None:
+                continue
+            chained = fs == "fat32" or len(placed) % 3 == 0
+            first, count = allocate(len(data), chained) if data else (0, 0)
+            if data:
+                writes.append((first, data))
+                offsets["/" + "/".join(filter(None, (folder, name)))] = cluster_offset(first)
+            placed[(folder, name)] = (first, count, chained)
+    for i, data in enumerate(orphans):
+        first, count = allocate(len(data))
+        writes.append((first, data))
+        offsets[i] = cluster_offset(first)
+        free(first, count)
+
+    for index, (folder, children) in enumerate(tree.items()):
+        entries = bytearray()
+        dir_first, dir_count = folders[folder]
+        if fs == "fat32" and folder:
+            parent = folders["/".join(folder.split("/")[:-1])][0]
+            for dots, cluster in ((b".", dir_first), (b"..", 0 if parent == 2 else parent)):
+                entry = bytearray(32)
+                entry[:11], entry[11] = dots.ljust(11), 0x10
+                struct.pack_into("<HHHHHI", entry, 18, 0, cluster >> 16, 0, 0, cluster & 0xFFFF, 0)
+                entries += entry
+        if fs == "exfat" and not folder:
+            entry = bytearray(32)
+            entry[0] = 0x81
+            struct.pack_into("<IQ", entry, 20, bitmap_first, -(-clusters // 8))
+            entries += entry
+        for short_index, (name, data, deleted) in enumerate(children):
+            if data is None:
+                first, count = folders[deleted]
+                deleted, attributes, length, chained = gone(deleted), 0x10, count * cluster_size, True
+            else:
+                first, count, chained = placed[(folder, name)]
+                deleted, attributes, length = deleted or gone(folder), 0x20, len(data)
+            if fs == "fat32":
+                entries += _fat32_entry_set(name, index * 4096 + short_index, attributes, first,
+                                            0 if attributes == 0x10 else length, deleted)
+            else:
+                entries += _exfat_entry_set(name, attributes, first, length, deleted,
+                                            contiguous=not chained)
+            if deleted and count:
+                free(first, count, keep_chain=fs == "exfat")
+        writes.append((dir_first, bytes(entries)))
+    for folder in tree:
+        if folder and gone(folder):
+            free(*folders[folder])
+
+    with open(path, "wb") as f:
+        f.truncate(size)
+        boot = bytearray(sector)
+        boot[:3] = b"\xeb\x58\x90" if fs == "fat32" else b"\xeb\x76\x90"
+        if fs == "fat32":
+            boot[3:11] = b"MSWIN4.1"
+            struct.pack_into("<HBHBHHBHHHII", boot, 11, sector, per_cluster, reserved, 2, 0, 0,
+                             0xF8, 0, 63, 255, 0, total_sectors)
+            struct.pack_into("<IHHIHH", boot, 36, fat_sectors, 0, 0, 2, 1, 6)
+            struct.pack_into("<BBBI11s8s", boot, 64, 0x80, 0, 0x29, seed & 0xFFFFFFFF,
+                             b"NO NAME    ", b"FAT32   ")
+            fat[0], fat[1] = 0x0FFFFFF8, 0x0FFFFFFF
+        else:
+            boot[3:11] = b"EXFAT   "
+            struct.pack_into("<QQIIIIIIHHBBBBB", boot, 64, 0, total_sectors, fat_offset,
+                             fat_sectors, heap, clusters, folders[""][0], seed & 0xFFFFFFFF,
+                             0x0100, 0, 9, per_cluster.bit_length() - 1, 1, 0x80, 0)
+            fat[0], fat[1] = 0xFFFFFFF8, 0xFFFFFFFF
+        boot[510:512] = b"\x55\xaa"
+        f.write(boot)
+        if fs == "fat32":
+            f.seek(6 * sector)
+            f.write(boot)
+        if sys.byteorder != "little":
+            fat.byteswap()
+        for copy in range(2 if fs == "fat32" else 1):
+            f.seek(fat_start + copy * fat_sectors * sector)
+            f.write(fat.tobytes())
+        if fs == "exfat":
+            bitmap = bytearray(-(-clusters // 8))
+            for cluster in range(2, clusters + 2):
+                if used[cluster]:
+                    bitmap[(cluster - 2) >> 3] |= 1 << ((cluster - 2) & 7)
+            writes.append((bitmap_first, bytes(bitmap)))
+        for first, data in writes:
+            f.seek(cluster_offset(first))
+            f.write(data)
+        if noise:
+            rng = random.Random(seed)
+            block = rng.randbytes(1024 * 1024)
+            cluster = 2
+            while cluster < clusters + 2:
+                if written[cluster]:
+                    cluster += 1
+                    continue
+                end = written.find(1, cluster)
+                end = clusters + 2 if end < 0 else end
+                f.seek(cluster_offset(cluster))
+                remaining = (end - cluster) * cluster_size
+                while remaining > 0:
+                    n = min(remaining, len(block))
+                    f.write(block[:n])
+                    remaining -= n
+                cluster = end
+    return offsets
+
+
+def bench_hive(args):
+    import tracemalloc
+    from usb_registry import HiveFileBackend
+
+    root = tempfile.mkdtemp(prefix="usbbench_")
+    try:
+        path = args.hive
+        if not path:
+            path = os.path.join(root, "SYSTEM")
+            make_sample_system_hive(path, args.devices, args.filler_keys)
+        size = os.path.getsize(path)
+        tracemalloc.start()
+        start = time.perf_counter()
+        with HiveFileBackend(path) as backend:
+            devices = backend.devices()
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"hive {size / 1024 ** 2:.1f} MiB: {len(devices)} devices in {elapsed * 1000:.1f} ms, "
+              f"peak Python heap {peak / 1024 ** 2:.2f} MiB")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def bench_report(args):
+    import hashlib
+    import tracemalloc
+    from database import DatabaseManager
+    from report_generator import iter_hash_records, write_hash_report
+
+    root = tempfile.mkdtemp(prefix="usbbench_")
+    try:
+        db = DatabaseManager(os.path.join(root, "report.db"))
+        serial = "BENCH0001"
+        for start in range(0, args.rows, 10000):
+            entries = []
+            for i in range(start, min(start + 10000, args.rows)):
+                seed = str(i).encode()
+                hashes = {"md5": hashlib.md5(seed).hexdigest(),
+                          "sha1": hashlib.sha1(seed).hexdigest(),
+                          "sha256": hashlib.sha256(seed).hexdigest()}
+                path = f"E:\\evidence\\dir{i % 500:03d}\\document_{i:07d}.docx"
+                entries.append((path, 4096 + i, 0, i, hashes))
+            db.store_cached_hashes(serial, entries, max_entries=args.rows)
+
+        peaks = []
+        for rows in (args.rows // 10, args.rows):
+            _, _, records = iter_hash_records(db, serial)
+            records = (record for _, record in zip(range(rows), records))
+            paths = [os.path.join(root, f"report{rows}.{ext}") for ext in ("pdf", "csv", "jsonl")]
+            tracemalloc.start()
+            start = time.perf_counter()
+            written = write_hash_report(records, *paths)
+            elapsed = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            peaks.append(peak)
+            print(f"{written:>8} rows: {elapsed:6.1f} s ({written / elapsed:8.0f} rows/s), "
+                  f"PDF {os.path.getsize(paths[0]) / 1024 ** 2:.1f} MiB, "
+                  f"peak Python heap {peak / 1024 ** 2:.2f} MiB")
+        db.close()
+        ok = peaks[-1] <= args.max_mib * 1024 ** 2
+        print(f"memory ceiling {args.max_mib} MiB: {'PASS' if ok else 'FAIL'}")
+        if not ok:
+            raise SystemExit(1)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def make_wide_tree(root, entries=1000000, per_dir=1000, depth=2):
+    """Create empty files, per_dir to a directory, nested depth levels deep."""
+    dirs = max(1, entries // per_dir)
+    for d in range(dirs):
+        parts = [f"d{(d // per_dir ** level) % per_dir:03d}" for level in range(depth)]
+        folder = os.path.join(root, *parts)
+        os.makedirs(folder, exist_ok=True)
+        for i in range(min(per_dir, entries - d * per_dir)):
+            open(os.path.join(folder, f"f{i:04d}.dat"), "wb").close()
+
+
+def bench_walk(args):
+    from volume_walker import VolumeWalker
+
+    root = args.root or tempfile.mkdtemp(prefix="usbbench_")
+    try:
+        if not args.root:
+            start = time.perf_counter()
+            make_wide_tree(root, args.entries)
+            print(f"created {args.entries} files in {time.perf_counter() - start:.1f} s")
+
+        def os_walk_stat():
+            # Before: os.walk, then a separate stat per file
+            found = 0
+            for folder, _, names in os.walk(root):
+                for name in names:
+                    try:
+                        os.stat(os.path.join(folder, name))
+                        found += 1
+                    except OSError:
+                        continue
+            return found
+
+        def volume_walker():
+            return sum(1 for _ in VolumeWalker().walk(root))
+
+        for name, fn in (("os.walk + stat", os_walk_stat), ("VolumeWalker", volume_walker)):
+            best = None
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                found = fn()
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            print(f"{name:<16} {found} files in {best:6.2f} s ({found / best:9.0f} entries/s)")
+    finally:
+        if not args.root:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+def bench_acquire(args):
+    import hashlib
+    import subprocess
+    from acquisition import acquire_image
+
+    root = tempfile.mkdtemp(prefix="usbbench_")
+    try:
+        source = args.source
+        if not source:
+            source = os.path.join(root, "source.img")
+            block = os.urandom(1024 * 1024)
+            with open(source, "wb") as f:
+                for _ in range(args.mib):
+                    f.write(block)
+        size = os.path.getsize(source)
+        dest = os.path.join(root, "copy.dd")
+
+        if shutil.which("dd"):
+            start = time.perf_counter()
+            subprocess.run(["dd", f"if={source}", f"of={dest}", "bs=4M", "conv=fsync"],
+                           check=True, stderr=subprocess.DEVNULL)
+            elapsed = time.perf_counter() - start
+            print(f"dd bs=4M (copy only)        {size / 1e6 / elapsed:8.1f} MB/s")
+            os.remove(dest)
+        else:
+            print("dd not found; skipping the baseline")
+
+        # Reference: the same digests over data already in memory, one after another
+        from config import HASH_ALGORITHMS, ACQUIRE_SEGMENT_ALGORITHMS
+        sample = os.urandom(64 * 1024 * 1024)
+        start = time.perf_counter()
+        for name in HASH_ALGORITHMS + ACQUIRE_SEGMENT_ALGORITHMS:
+            hashlib.new(name, sample).digest()
+        elapsed = time.perf_counter() - start
+        print(f"in-memory digests, 1 core   {len(sample) / 1e6 / elapsed:8.1f} MB/s "
+              f"({os.cpu_count()} CPUs available)")
+
+        result = acquire_image(source, dest)
+        print(f"acquire_image (copy+hashes) {result.mb_per_sec():8.1f} MB/s  "
+              f"{len(result.segments)} segments, {', '.join(result.hashes)}")
+        result = acquire_image(source)
+        print(f"acquire_image (verify only) {result.mb_per_sec():8.1f} MB/s")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def bench_hash_sets(args):
+    import tracemalloc
+    from hash_sets import HashSetIndex, KnownHashSets, KNOWN_BAD
+
+    root = tempfile.mkdtemp(prefix="usbbench_")
+    try:
+        rng = random.Random(0)
+        path = os.path.join(root, "hashes.txt")
+        start = time.perf_counter()
+        with open(path, "w") as f:
+            for _ in range(args.hashes):
+                f.write("%032x\n" % rng.getrandbits(128))
+        print(f"wrote {args.hashes} MD5 lines in {time.perf_counter() - start:.1f} s")
+
+        start = time.perf_counter()
+        known = KnownHashSets()
+        known.add(path, KNOWN_BAD)
+        print(f"compile (parse + sort + write)  {time.perf_counter() - start:8.2f} s")
+
+        start = time.perf_counter()
+        index = HashSetIndex.open(path + ".md5.hidx")
+        print(f"load compiled index (mmap)      {(time.perf_counter() - start) * 1000:8.2f} ms")
+        per_million = os.path.getsize(index.path) / len(index) * 1e6 / 2 ** 20
+        print(f"index size                      {per_million:8.1f} MiB per million hashes")
+
+        rng = random.Random(0)
+        hits = ["%032x" % rng.getrandbits(128) for _ in range(args.lookups)]
+        other = random.Random(1)
+        misses = ["%032x" % other.getrandbits(128) for _ in range(args.lookups)]
+        for name, probes in (("hits", hits), ("misses", misses)):
+            start = time.perf_counter()
+            found = sum(1 for digest in probes if digest in index)
+            elapsed = time.perf_counter() - start
+            print(f"lookups ({name:<6})                {len(probes) / elapsed:8.0f} /s "
+                  f"({found} found)")
+
+        # Reference: the same digests as a Python set of bytes objects
+        tracemalloc.start()
+        with open(path) as f:
+            as_set = {bytes.fromhex(line.strip()) for line in f}
+        heap = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        print(f"python set of bytes             {heap / len(as_set) * 1e6 / 2 ** 20:8.1f} "
+              f"MiB per million hashes")
+        index.close()
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def bench_fuzzy(args):
+    import hashlib
+    from database import DatabaseManager
+    from fuzzy_hash import CTPHHasher, B64, SIGNATURE_LENGTH
+
+    rng = random.Random(0)
+    words = ["".join(rng.choice("etaoinshrdlucmfwyp") for _ in range(rng.randint(2, 9)))
+             for _ in range(5000)]
+    samples = (("random", os.urandom(args.mib * 2 ** 20)),
+               ("text", " ".join(rng.choice(words) for _ in range(args.mib * 2 ** 20 // 6))
+                .encode()[:args.mib * 2 ** 20]))
+    for name, data in samples:
+        start = time.perf_counter()
+        hashlib.sha256(data).digest()
+        sha = len(data) / 1e6 / (time.perf_counter() - start)
+        start = time.perf_counter()
+        hasher = CTPHHasher(len(data))
+        for i in range(0, len(data), 2 ** 20):
+            hasher.update(data[i:i + 2 ** 20])
+        hasher.hexdigest()
+        ctph = len(data) / 1e6 / (time.perf_counter() - start)
+        print(f"{name:<6} sha256 {sha:8.1f} MB/s   ctph {ctph:8.1f} MB/s")
+
+    def signature(length):
+        return "".join(rng.choice(B64) for _ in range(length))
+
+    root = tempfile.mkdtemp(prefix="usbbench_")
+    try:
+        db = DatabaseManager(os.path.join(root, "bench.db"))
+        digests = []
+        elapsed = 0.0
+        for batch in range(0, args.files, 10000):
+            entries = []
+            for i in range(batch, min(batch + 10000, args.files)):
+                digest = "%d:%s:%s" % (1 << rng.randint(10, 20), signature(SIGNATURE_LENGTH),
+                                       signature(SIGNATURE_LENGTH // 2))
+                entries.append((f"DEV{i % 50:03d}", f"/files/{i:07d}.doc", 100000, digest))
+                if i % max(1, args.files // args.queries) == 0:
+                    digests.append(digest)
+            start = time.perf_counter()
+            db.index_fuzzy_hashes(entries, "scan")
+            elapsed += time.perf_counter() - start
+        db_bytes = sum(os.path.getsize(os.path.join(root, name)) for name in os.listdir(root))
+        print(f"indexed {args.files} digests in {elapsed:.1f} s "
+              f"({args.files / elapsed:.0f}/s, {db_bytes / 2 ** 20:.0f} MiB on disk)")
+
+        def edited(digest):
+            # A few changed pieces, as after editing a document
+            block_size, sig1, sig2 = digest.split(":")
+            sig1, sig2 = list(sig1), list(sig2)
+            for sig in (sig1, sig1, sig1, sig2):
+                sig[rng.randrange(len(sig))] = rng.choice(B64)
+            return "%s:%s:%s" % (block_size, "".join(sig1), "".join(sig2))
+
+        timings = []
+        found = 0
+        for digest in digests:
+            start = time.perf_counter()
+            matches = db.find_similar(edited(digest))
+            timings.append(time.perf_counter() - start)
+            found += any(match[4] == digest for match in matches)
+        timings.sort()
+        print(f"similarity queries: {len(timings)}, original found for {found}, "
+              f"p50 {timings[len(timings) // 2] * 1000:.1f} ms, "
+              f"p95 {timings[int(len(timings) * 0.95)] * 1000:.1f} ms, "
+              f"max {timings[-1] * 1000:.1f} ms")
+        db.close()
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def bench_transfer_log(args):
+    from transfer_log import TransferLogWriter, TransferLogReader, format_transfer_line
+
+    root = tempfile.mkdtemp(prefix="usbbench_")
+    events = [{"event_type": "Created", "file_path": f"E:\\dir{i % 100:02d}\\file{i:08d}.bin",
+               "file_size": 4096, "hashes": {"md5": "%032x" % i, "sha256": "%064x" % i},
+               "timestamp": "2025-05-06 10:00:00"} for i in range(args.events)]
+    try:
+        path = os.path.join(root, "old.log")
+        start = time.perf_counter()
+        for event in events:
+            with open(path, "a") as log:  # the old log_transfer: open, append, close
+                log.write(format_transfer_line(event) + "\n")
+        old_write = time.perf_counter() - start
+        start = time.perf_counter()
+        with open(path) as f:
+            lines = f.readlines()  # the old get_file_transfers, on every refresh
+        old_read = time.perf_counter() - start
+        del lines
+
+        path = os.path.join(root, "new.jsonl")
+        writer = TransferLogWriter(path, max_bytes=args.segment_mib * 2 ** 20)
+        start = time.perf_counter()
+        for event in events:
+            writer.write(event)
+        writer.close()
+        new_write = time.perf_counter() - start
+        reader = TransferLogReader(path)
+        start = time.perf_counter()
+        records, seq = reader.tail(args.events - 100)  # a refresh that finds 100 new entries
+        new_tail = time.perf_counter() - start
+        start = time.perf_counter()
+        next(reader.records(args.events // 2))  # an entry from the middle of the history
+        new_seek = time.perf_counter() - start
+        segments = len(reader.segments())
+        size = sum(os.path.getsize(os.path.join(root, name)) for name in os.listdir(root)
+                   if name.startswith("new."))
+        print(f"{args.events} events")
+        print(f"old text log:   {args.events / old_write:9.0f} events/s, refresh reads whole file "
+              f"{old_read * 1000:8.1f} ms, {os.path.getsize(os.path.join(root, 'old.log')) / 2 ** 20:.0f} MiB")
+        print(f"jsonl log:      {args.events / new_write:9.0f} events/s, refresh (100 new) "
+              f"{new_tail * 1000:8.2f} ms, seek to middle {new_seek * 1000:.2f} ms, "
+              f"{segments} segments, {size / 2 ** 20:.0f} MiB on disk")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def bench_content(args):
+    from config import HASH_ALGORITHMS, FILE_HASH_ALGORITHMS, CONTENT_ANALYSERS
+    from content_analysis import np
+    from hash_utils import collect_files, hash_files
+
+    pairs = (("digests", HASH_ALGORITHMS), ("default", FILE_HASH_ALGORITHMS))
+    print(f"entropy histogram: {'numpy' if np is not None else 'Counter, first block only'}")
+    worst = 0.0
+    for distribution in args.distributions.split(","):
+        pick_size, scale = SIZE_DISTRIBUTIONS[distribution]
+        root = tempfile.mkdtemp(prefix="usbbench_")
+        try:
+            total = make_synthetic_tree(root, max(1, int(args.files * scale)), seed=1,
+                                        pick_size=pick_size)
+            files = collect_files(root)
+            best = {}
+            # Alternate the passes so drift in machine load hits both sides alike
+            for _ in range(args.repeat):
+                for label, algorithms in pairs:
+                    for with_content in (False, True):
+                        analysers = CONTENT_ANALYSERS if with_content else ()
+                        start = time.perf_counter()
+                        hash_files(files, algorithms, workers=args.workers, analysers=analysers)
+                        elapsed = time.perf_counter() - start
+                        key = (label, with_content)
+                        best[key] = min(best.get(key, elapsed), elapsed)
+            print(f"{distribution}: {len(files)} files, {total / 2 ** 20:.0f} MiB")
+            for label, algorithms in pairs:
+                before, after = best[(label, False)], best[(label, True)]
+                overhead = (after / before - 1) * 100
+                if label == "default":
+                    worst = max(worst, overhead)
+                print(f"  {'+'.join(algorithms):<24} {total / 2 ** 20 / before:8.1f} MiB/s   "
+                      f"+ filetype, entropy {total / 2 ** 20 / after:8.1f} MiB/s   "
+                      f"overhead {overhead:+5.1f}%")
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+    # The ceiling applies to the default pass, which is what USB scans run;
+    # against bare digests small files pay a fixed per-file cost that shows more
+    ok = worst <= args.max_overhead
+    print(f"default pass overhead {worst:+.1f}%, ceiling {args.max_overhead}%: "
+          f"{'PASS' if ok else 'FAIL'}")
+    if not ok:
+        raise SystemExit(1)
+
+
+# Regression suite ------------------------------------------------------------
+#
+# Each case runs in its own interpreter so its peak RSS is its own. Metric
+# names say which way is better: *_per_s higher, *_ms and *_mib lower; the
+# rest (counts, sizes) are recorded but never compared.
+
+SUITE_SCALES = {
+    "small": {"files": 400, "rows": 10000, "events": 5000, "transfers": 50,
+              "report_rows": 10000, "devices": 500, "image_mib": 64},
+    "medium": {"files": 4000, "rows": 1000000, "events": 50000, "transfers": 200,
+               "report_rows": 200000, "devices": 5000, "image_mib": 1024},
+    "large": {"files": 20000, "rows": 10000000, "events": 200000, "transfers": 1000,
+              "report_rows": 1000000, "devices": 20000, "image_mib": 8192},
+}
+
+
+def _small_file_size(rng):
+    return rng.randint(0, 16 * 1024)
+
+
+def _mixed_file_size(rng):
+    # Log-normal: mostly small documents with a long tail of large media files
+    return min(int(rng.lognormvariate(9, 2.5)), 64 * 1024 * 1024)
+
+
+def _large_file_size(rng):
+    return rng.randint(16, 64) * 1024 * 1024
+
+
+# Synthetic volume layouts: (size picker, files as a fraction of the scale's count)
+SIZE_DISTRIBUTIONS = {
+    "small": (_small_file_size, 1),
+    "mixed": (_mixed_file_size, 1),
+    "large": (_large_file_size, 0.01),
+}
+
+
+def _percentiles(samples, prefix):
+    """p50/p95/p99/max of samples (seconds) as {prefix_pNN_ms: milliseconds}."""
+    samples = sorted(samples)
+
+    def at(p):
+        return samples[min(len(samples) - 1, int(p / 100 * len(samples)))] * 1000
+
+    return {f"{prefix}_p50_ms": at(50), f"{prefix}_p95_ms": at(95), f"{prefix}_p99_ms": at(99),
+            f"{prefix}_max_ms": samples[-1] * 1000}
+
+
+def _peak_rss_mib():
+    try:
+        import resource
+    except ImportError:
+        return None  # Windows
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 ** 2 if sys.platform == "darwin" else peak / 1024
+
+
+def suite_hash_scan(params, work, distribution):
+    """compute_hashes_for_usb over a fake removable drive, cold and then from the hash cache.
+
+    The tree was just written, so it is in the page cache: this measures the
+    hashing engine, not the disk.
+    """
+    import windows_fakes
+    pick_size, share = SIZE_DISTRIBUTIONS[distribution]
+    files = max(4, int(params["files"] * share))
+    # get_removable_roots appends a backslash to DeviceID; on Linux that is
+    # just part of the directory name
+    device_id = os.path.join(work, "USB_E")
+    total = make_synthetic_tree(device_id + "\\", files, pick_size=pick_size, seed=1)
+    windows_fakes.install([{"device_id": device_id, "serial": "BENCH" + distribution.upper(),
+                            "size": total}])
+    from database import DatabaseManager
+    from hash_utils import compute_hashes_for_usb
+
+    db = DatabaseManager(os.path.join(work, "hash.db"))
+    start = time.perf_counter()
+    compute_hashes_for_usb(db=db)
+    cold = time.perf_counter() - start
+    start = time.perf_counter()
+    compute_hashes_for_usb(db=db)
+    cached = time.perf_counter() - start
+    db.close()
+    return {"files": files, "bytes": total,
+            "cold_mib_per_s": total / 1024 ** 2 / cold,
+            "cold_files_per_s": files / cold,
+            "cached_files_per_s": files / cached}
+
+
+def suite_database(params, work):
+    """file_transfer_events insert throughput, then paged and searched query latency."""
+    from database import DatabaseManager
+
+    db = DatabaseManager(os.path.join(work, "events.db"))
+    rows = params["rows"]
+    serials = [f"SERIAL{i:03d}" for i in range(50)]
+    base = 1700000000
+    start = time.perf_counter()
+    for i in range(rows):
+        db.insert_file_transfer_event({
+            "event_type": ("Created", "Modified", "Deleted")[i % 3],
+            "file_path": f"E:\\dir{i % 1000:03d}\\file{i:08d}.bin",
+            "usb_serial": serials[i % 50],
+            "timestamp": base + i / 100,
+            "file_hash_md5": None, "file_hash_sha256": None,
+            "file_size": 4096, "is_suspicious": 0,
+        })
+    db.flush()
+    insert = time.perf_counter() - start
+
+    rng = random.Random(2)
+    pages, searches = [], []
+    for _ in range(200):
+        # A serial's events in a random window, and the page after the first
+        low = base + rng.random() * rows / 100
+        after = None
+        for _ in range(2):
+            start = time.perf_counter()
+            _, after = db.query_events_page("file_transfer_events", serial=rng.choice(serials),
+                                            start=low, end=low + rows / 1000, after=after,
+                                            limit=100)
+            pages.append(time.perf_counter() - start)
+    for _ in range(20):
+        start = time.perf_counter()
+        db.query_view_page("file_transfer_events", sort="file_path",
+                           search=f"file{rng.randrange(rows):08d}", limit=100)
+        searches.append(time.perf_counter() - start)
+    db.close()
+    metrics = {"rows": rows, "insert_rows_per_s": rows / insert,
+               "db_mib": os.path.getsize(os.path.join(work, "events.db")) / 1024 ** 2}
+    metrics.update(_percentiles(pages, "page"))
+    metrics.update(_percentiles(searches, "search"))
+    return metrics
+
+
+def suite_monitor(params, work):
+    """Raw watchdog event ingestion rate, then real file transfers seen end to end."""
+    import threading
+    from watchdog.events import FileModifiedEvent
+    from monitoring_service import MonitoringService, VolumeEventHandler
+
+    volume = os.path.abspath(os.path.join(work, "volume"))
+    os.makedirs(volume)
+    delivered = {}
+    all_seen = threading.Event()
+    expected = [0]
+
+    def sink(event):
+        delivered[event["file_path"]] = time.monotonic()
+        if len(delivered) >= expected[0]:
+            all_seen.set()
+
+    service = MonitoringService()
+    service.coalescer.quiet_window = 0.2
+    service.add_sink(sink)
+    service.attach(volume, "BENCH")
+    service.start()
+    try:
+        # Bursts of modified events for a few files, fed straight to the handler
+        burst_paths = [os.path.join(volume, f"burst{i:03d}.tmp") for i in range(100)]
+        for path in burst_paths:
+            with open(path, "wb") as f:
+                f.write(b"x" * 4096)
+        expected[0] = len(burst_paths)
+        handler = VolumeEventHandler(service, volume)
+        events = params["events"]
+        start = time.perf_counter()
+        for i in range(events):
+            handler.on_modified(FileModifiedEvent(burst_paths[i % len(burst_paths)]))
+        while service.coalescer._queue.qsize():
+            time.sleep(0.001)
+        ingest = time.perf_counter() - start
+        all_seen.wait(30)
+
+        # Files copied onto the watched volume, picked up by the real observer
+        delivered.clear()
+        all_seen.clear()
+        transfers = params["transfers"]
+        expected[0] = transfers
+        chunk = os.urandom(64 * 1024)
+        closed = {}
+        for i in range(transfers):
+            path = os.path.join(volume, f"copy{i:05d}.bin")
+            with open(path, "wb") as f:
+                for _ in range(16):
+                    f.write(chunk)
+                    f.flush()
+            closed[path] = time.monotonic()
+        all_seen.wait(60)
+        latencies = [delivered[path] - closed[path] for path in closed if path in delivered]
+        metrics = service.metrics()
+    finally:
+        service.stop()
+
+    result = {"events": events, "ingest_events_per_s": events / ingest,
+              "transfers": transfers, "transfers_seen": len(latencies),
+              "dropped": metrics["dropped"],
+              "dispatch_p50_ms": (metrics["latency_p50"] or 0) * 1000,
+              "dispatch_p95_ms": (metrics["latency_p95"] or 0) * 1000}
+    if latencies:
+        # Includes the 0.2 s quiet window and the stability re-check
+        result.update(_percentiles(latencies, "transfer"))
+    return result
+
+
+def suite_report(params, work):
+    """Hash report (PDF, CSV, JSONL) streamed from the hash cache."""
+    import hashlib
+    from database import DatabaseManager
+    from report_generator import iter_hash_records, write_hash_report
+
+    db = DatabaseManager(os.path.join(work, "report.db"))
+    rows = params["report_rows"]
+    for first in range(0, rows, 10000):
+        entries = []
+        for i in range(first, min(first + 10000, rows)):
+            seed = str(i).encode()
+            hashes = {"md5": hashlib.md5(seed).hexdigest(), "sha1": hashlib.sha1(seed).hexdigest(),
+                      "sha256": hashlib.sha256(seed).hexdigest()}
+            entries.append((f"E:\\evidence\\dir{i % 500:03d}\\document_{i:07d}.docx",
+                            4096 + i, 0, i, hashes))
+        db.store_cached_hashes("BENCH0001", entries, max_entries=rows)
+    _, _, records = iter_hash_records(db, "BENCH0001")
+    paths = [os.path.join(work, f"report.{ext}") for ext in ("pdf", "csv", "jsonl")]
+    start = time.perf_counter()
+    written = write_hash_report(records, *paths)
+    elapsed = time.perf_counter() - start
+    db.close()
+    return {"rows": written, "report_rows_per_s": written / elapsed,
+            "pdf_mib": os.path.getsize(paths[0]) / 1024 ** 2}
+
+
+def suite_history(params, work):
+    """USB history from the live registry (a fake winreg) and its sync to the database."""
+    import windows_fakes
+    windows_fakes.install(registry=windows_fakes.make_usb_registry(params["devices"]))
+    from database import DatabaseManager
+    from device_history import HistoryProvider
+
+    provider = HistoryProvider(ttl=0)
+    start = time.perf_counter()
+    records = provider.snapshot()
+    elapsed = time.perf_counter() - start
+    db = DatabaseManager(os.path.join(work, "history.db"))
+    start = time.perf_counter()
+    provider.sync_to_database(db)
+    db.flush()
+    sync = time.perf_counter() - start
+    db.close()
+    return {"devices": len(records), "registry_ms": elapsed * 1000,
+            "registry_devices_per_s": len(records) / elapsed,
+            "sync_devices_per_s": len(records) / sync}
+
+
+def _fill_timeline_sources(db, events, devices):
+    """Write events transfers spread over USB sessions, plus the sessions' live events.
+
+    Sessions start every 3 minutes, last an hour and take drive letters in
+    turn, so each letter is reused by many devices over time. Returns the
+    sessions as (serial, letter, start, end) in epoch seconds.
+    """
+    base = 1700000000
+    letters = [chr(ord("D") + i) + ":" for i in range(20)]
+    sessions = [(f"SERIAL{k % devices:05d}", letters[k % 20], base + k * 180, base + k * 180 + 3600)
+                for k in range(max(100, events // 1000))]
+    conn = db.conn
+    with conn:
+        for serial, letter, start, end in sessions:
+            conn.executemany(
+                "INSERT INTO live_usb_events (event_type, device_name, serial_number, timestamp, "
+                "details, ts_us) VALUES (?, 'Bench USB Device', ?, ?, ?, ?)",
+                [("Connected", serial, None, f"{letter}, 16.0 GB", start * 1000000),
+                 ("Mounted", serial, None, f"mounted at {letter}\\", start * 1000000),
+                 ("Unmounted", serial, None, f"mounted at {letter}\\", end * 1000000),
+                 ("Disconnected", serial, None, f"{letter}, 16.0 GB", end * 1000000)])
+    for batch in range(0, events, 100000):
+        rows = []
+        for i in range(batch, min(batch + 100000, events)):
+            serial, letter, start, end = sessions[i % len(sessions)]
+            rows.append((("Created", "Modified", "Deleted")[i % 3],
+                         f"{letter}\\dir{i % 1000:03d}\\file{i:08d}.bin", serial,
+                         (start + (i * 7919) % 3600) * 1000000))
+        with conn:
+            conn.executemany("INSERT INTO file_transfer_events (event_type, file_path, usb_serial, "
+                             "file_size, is_suspicious, ts_us) VALUES (?, ?, ?, 4096, 0, ?)", rows)
+    return sessions
+
+
+def suite_timeline(params, work):
+    """Timeline sync of every event row, then serial/range, mount and file-to-device queries."""
+    from database import DatabaseManager
+    from timeline import Timeline
+
+    db = DatabaseManager(os.path.join(work, "timeline.db"))
+    events = params["rows"]
+    sessions = _fill_timeline_sources(db, events, params["devices"])
+    timeline = Timeline(db, log_path=os.path.join(work, "none.jsonl"))
+    start = time.perf_counter()
+    timeline.sync()
+    sync = time.perf_counter() - start
+
+    rng = random.Random(3)
+    by_serial, by_range, mounted, files = [], [], [], []
+    for _ in range(200):
+        serial, letter, low, high = rng.choice(sessions)
+        start = time.perf_counter()
+        timeline.events(serial=serial, start=low, end=high, limit=1000)
+        by_serial.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        timeline.events(start=low, end=low + 60, limit=1000)
+        by_range.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        timeline.mounted_at(rng.uniform(sessions[0][2], sessions[-1][3]))
+        mounted.append(time.perf_counter() - start)
+        i = rng.randrange(events)
+        letter = sessions[i % len(sessions)][1]
+        start = time.perf_counter()
+        found = timeline.devices_for_file(f"{letter}\\dir{i % 1000:03d}\\file{i:08d}.bin")
+        files.append(time.perf_counter() - start)
+        assert found and found[0][3][0][0] == sessions[i % len(sessions)][0]
+    db.close()
+    metrics = {"events": events, "sync_events_per_s": events / sync,
+               "db_mib": os.path.getsize(os.path.join(work, "timeline.db")) / 1024 ** 2}
+    metrics.update(_percentiles(by_serial, "serial_range"))
+    metrics.update(_percentiles(by_range, "time_range"))
+    metrics.update(_percentiles(mounted, "mounted_at"))
+    metrics.update(_percentiles(files, "file_device"))
+    return metrics
+
+
+def bench_timeline(args):
+    root = tempfile.mkdtemp(prefix="usbbench_")
+    try:
+        metrics = suite_timeline({"rows": args.events, "devices": args.devices}, root)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    for name, value in metrics.items():
+        print(f"{name:<24} {value:12.2f}" if isinstance(value, float) else f"{name:<24} {value:12}")
+
+
+def suite_carve(params, work, fs):
+    """Deleted-file recovery from a generated FAT32/exFAT image.
+
+    A third of the files are deleted, one folder is deleted whole and some
+    files are left in free clusters with no entry. Every one of them must
+    come back byte for byte. The scan (directory walk and signature match,
+    no file data read) and the hashed recovery are timed against a plain
+    sequential read of the image; all three run from the page cache.
+    """
+    import hashlib
+    from config import HASH_ALGORITHMS
+    from fat_carving import FatVolume, carve_image
+
+    rng = random.Random(7)
+    size = params["image_mib"] * 1024 ** 2
+    cluster_size = 4096 if size <= 1024 ** 3 else 32768
+    files, budget = [], size // 2
+    i = 0
+    while budget > 0:
+        kind = SAMPLE_FILE_KINDS[i % len(SAMPLE_FILE_KINDS)]
+        data = make_sample_file(rng, kind, min(int(rng.lognormvariate(10, 1.5)), 32 * 1024 ** 2))
+        files.append((f"/DCIM/{i // 500:03d}/{kind} {i:06d}.{_SAMPLE_EXTENSIONS[kind]}", data,
+                      i % 3 == 0))
+        budget -= len(data) + cluster_size
+        i += 1
+    files += [(f"/Old Stuff/note {j}.{_SAMPLE_EXTENSIONS[kind]}",
+               make_sample_file(rng, kind, 20000), False)
+              for j, kind in enumerate(SAMPLE_FILE_KINDS)]
+    orphans = [make_sample_file(rng, kind, rng.randint(1000, 200000))
+               for kind in SAMPLE_FILE_KINDS[:-1] * max(1, len(files) // 100)]
+    path = os.path.join(work, f"sample.{fs}")
+    write_sample_fat_image(path, files, size, fs, cluster_size, orphans,
+                           deleted_dirs=("/Old Stuff",), seed=1)
+    expected = {file_path: hashlib.sha256(data).hexdigest() for file_path, data, deleted in files
+                if deleted or file_path.startswith("/Old Stuff/")}
+    expected_orphans = {hashlib.sha256(data).hexdigest() for data in orphans}
+
+    buffer = bytearray(4 * 1024 ** 2)
+    start = time.perf_counter()
+    with open(path, "rb", buffering=0) as f:
+        while f.readinto(buffer):
+            pass
+    read = time.perf_counter() - start
+    start = time.perf_counter()
+    with FatVolume(path) as volume:
+        found = sum(1 for _ in volume.carve())
+    scan = time.perf_counter() - start
+    start = time.perf_counter()
+    records = carve_image(path, HASH_ALGORITHMS, analysers=())
+    carve = time.perf_counter() - start
+
+    by_path = {r["path"]: r["hashes"].get("sha256") for r in records
+               if r["carved"]["method"] == "deleted entry"}
+    carved = {r["hashes"].get("sha256") for r in records if r["carved"]["method"] == "signature"}
+    return {"files": len(files), "candidates": found,
+            "deleted": len(expected),
+            "deleted_recovered": sum(1 for p, digest in expected.items() if by_path.get(p) == digest),
+            "orphans": len(expected_orphans),
+            "orphans_recovered": len(expected_orphans & carved),
+            "read_mib_per_s": size / 1024 ** 2 / read,
+            "scan_mib_per_s": size / 1024 ** 2 / scan,
+            "carve_mib_per_s": size / 1024 ** 2 / carve}
+
+
+def bench_carve(args):
+    failed = False
+    for fs in args.filesystems.split(","):
+        root = tempfile.mkdtemp(prefix="usbbench_")
+        try:
+            metrics = suite_carve({"image_mib": args.mib}, root, fs)
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+        print(f"{fs}: {args.mib} MiB image, {metrics['files']} files, "
+              f"{metrics['candidates']} candidates")
+        print(f"  deleted files recovered  {metrics['deleted_recovered']:6} / {metrics['deleted']}")
+        print(f"  orphans carved           {metrics['orphans_recovered']:6} / {metrics['orphans']}")
+        print(f"  sequential read          {metrics['read_mib_per_s']:8.1f} MiB/s")
+        print(f"  scan (no file data read) {metrics['scan_mib_per_s']:8.1f} MiB/s")
+        print(f"  recover + md5/sha1/sha256{metrics['carve_mib_per_s']:8.1f} MiB/s")
+        failed = failed or metrics["deleted_recovered"] != metrics["deleted"] \
+            or metrics["orphans_recovered"] != metrics["orphans"]
+    if failed:
+        print("FAIL: not every deleted file came back intact")
+        raise SystemExit(1)
+
+
+SUITE_CASES = {
+    "hash-scan-small": (suite_hash_scan, "small"),
+    "hash-scan-mixed": (suite_hash_scan, "mixed"),
+    "hash-scan-large": (suite_hash_scan, "large"),
+    "database": (suite_database,),
+    "monitor": (suite_monitor,),
+    "report": (suite_report,),
+    "history": (suite_history,),
+    "timeline": (suite_timeline,),
+    "carve-fat32": (suite_carve, "fat32"),
+    "carve-exfat": (suite_carve, "exfat"),
+}
+
+
+def _run_case(name, scale):
+    fn, *options = SUITE_CASES[name]
+    work = tempfile.mkdtemp(prefix="usbbench_")
+    try:
+        metrics = fn(SUITE_SCALES[scale], work, *options)
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+    metrics["peak_rss_mib"] = _peak_rss_mib()
+    return metrics
+
+
+def _better(metric):
+    """+1 if higher is better, -1 if lower is better, 0 if not compared."""
+    if metric.endswith("_per_s"):
+        return 1
+    if metric.endswith("_ms") or metric.endswith("_mib"):
+        return -1
+    return 0
+
+
+def compare_results(current, baseline, tolerance):
+    """Print current against baseline; returns the (case, metric) pairs that regressed."""
+    if baseline["meta"].get("scale") != current["meta"]["scale"]:
+        print(f"warning: baseline scale {baseline['meta'].get('scale')!r} differs from "
+              f"{current['meta']['scale']!r}")
+    regressions = []
+    print(f"\n{'case':<16} {'metric':<24} {'baseline':>12} {'current':>12} {'change':>8}")
+    for case, metrics in current["cases"].items():
+        old = baseline["cases"].get(case)
+        if not old or "error" in metrics:
+            continue
+        for metric, value in metrics.items():
+            direction = _better(metric)
+            before = old.get(metric)
+            if not direction or value is None or not before:
+                continue
+            change = (value - before) / before
+            regressed = change * direction < -tolerance
+            if metric.endswith("_ms") and abs(value - before) < 1:
+                regressed = False  # sub-millisecond jitter
+            if regressed:
+                regressions.append((case, metric))
+            print(f"{case:<16} {metric:<24} {before:12.2f} {value:12.2f} {change:+8.1%}"
+                  f"{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+
+def bench_suite(args):
+    import json
+    import platform
+    import subprocess
+
+    if args.case_worker:
+        print(json.dumps(_run_case(args.case_worker, args.scale)))
+        return
+    names = args.cases.split(",") if args.cases else list(SUITE_CASES)
+    unknown = [name for name in names if name not in SUITE_CASES]
+    if unknown:
+        raise SystemExit(f"unknown case(s): {', '.join(unknown)}; choose from {', '.join(SUITE_CASES)}")
+
+    results = {"meta": {"scale": args.scale, "python": platform.python_version(),
+                        "platform": platform.platform(), "cpus": os.cpu_count(),
+                        "time": time.strftime("%Y-%m-%d %H:%M:%S")},
+               "cases": {}}
+    for name in names:
+        start = time.perf_counter()
+        proc = subprocess.run([sys.executable, os.path.abspath(__file__), "suite",
+                               "--scale", args.scale, "--case-worker", name],
+                              capture_output=True, text=True)
+        if proc.returncode == 0:
+            metrics = json.loads(proc.stdout.strip().splitlines()[-1])
+        else:
+            metrics = {"error": (proc.stderr.strip().splitlines() or ["failed"])[-1]}
+        results["cases"][name] = metrics
+        summary = ", ".join(f"{k} {v:.1f}" for k, v in metrics.items()
+                            if isinstance(v, float) and _better(k))
+        print(f"{name:<16} {time.perf_counter() - start:6.1f} s  {metrics.get('error', summary)}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    failed = [name for name, metrics in results["cases"].items() if "error" in metrics]
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare_results(results, json.load(f), args.tolerance)
+        print(f"\n{len(regressions)} regression(s) beyond {args.tolerance:.0%}")
+    if failed or regressions:
+        raise SystemExit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="USB Forensic Tool benchmarks")
+    sub = parser.add_subparsers(dest="name", required=True)
+
+    p = sub.add_parser("hash-workers", help="hash throughput from 1 to N workers")
+    p.add_argument("--files", type=int, default=2000)
+    p.add_argument("--max-workers", type=int, default=os.cpu_count() or 4)
+    p.add_argument("--processes", action="store_true")
+    p.set_defaults(func=bench_hash_workers)
+
+    p = sub.add_parser("db-writes", help="event insert throughput before/after batching")
+    p.add_argument("--events", type=int, default=10000)
+    p.set_defaults(func=bench_db_writes)
+
+    p = sub.add_parser("hive", help="parse USB history from a SYSTEM hive")
+    p.add_argument("--hive", help="existing SYSTEM hive (default: generate one)")
+    p.add_argument("--devices", type=int, default=2000)
+    p.add_argument("--filler-keys", type=int, default=200000,
+                   help="unrelated keys that pad the generated hive")
+    p.set_defaults(func=bench_hive)
+
+    p = sub.add_parser("report", help="stream a hash report (PDF, CSV, JSONL) from the database")
+    p.add_argument("--rows", type=int, default=200000)
+    p.add_argument("--max-mib", type=float, default=32,
+                   help="fail if the report's peak Python heap exceeds this")
+    p.set_defaults(func=bench_report)
+
+    p = sub.add_parser("walk", help="directory traversal: os.walk + stat vs VolumeWalker")
+    p.add_argument("--root", help="existing tree to walk (default: generate one)")
+    p.add_argument("--entries", type=int, default=1000000)
+    p.add_argument("--repeat", type=int, default=3)
+    p.set_defaults(func=bench_walk)
+
+    p = sub.add_parser("acquire", help="raw image acquisition vs a plain dd copy")
+    p.add_argument("--source", help="existing image or block device (default: generate one)")
+    p.add_argument("--mib", type=int, default=1024, help="size of the generated image")
+    p.set_defaults(func=bench_acquire)
+
+    p = sub.add_parser("hash-sets", help="known hash set compile, load, size and lookup rate")
+    p.add_argument("--hashes", type=int, default=1000000)
+    p.add_argument("--lookups", type=int, default=200000)
+    p.set_defaults(func=bench_hash_sets)
+
+    p = sub.add_parser("fuzzy", help="CTPH throughput and similarity search over an indexed corpus")
+    p.add_argument("--mib", type=int, default=64, help="data hashed for the throughput figures")
+    p.add_argument("--files", type=int, default=1000000, help="digests in the index")
+    p.add_argument("--queries", type=int, default=200)
+    p.set_defaults(func=bench_fuzzy)
+
+    p = sub.add_parser("transfer-log", help="old per-event text log vs the rotating JSONL log")
+    p.add_argument("--events", type=int, default=500000)
+    p.add_argument("--segment-mib", type=int, default=64, help="rotation size")
+    p.set_defaults(func=bench_transfer_log)
+
+    p = sub.add_parser("timeline", help="timeline sync and query latency over merged event sources")
+    p.add_argument("--events", type=int, default=1000000)
+    p.add_argument("--devices", type=int, default=1000)
+    p.set_defaults(func=bench_timeline)
+
+    p = sub.add_parser("content", help="hash pass with and without file type and entropy "
+                                       "analysis")
+    p.add_argument("--files", type=int, default=400)
+    p.add_argument("--distributions", default="small,mixed,large",
+                   help="comma-separated file size layouts: " + ", ".join(SIZE_DISTRIBUTIONS))
+    p.add_argument("--workers", type=int, default=None)
+    p.add_argument("--repeat", type=int, default=3)
+    p.add_argument("--max-overhead", type=float, default=10,
+                   help="fail if the analysis adds more than this percentage")
+    p.set_defaults(func=bench_content)
+
+    p = sub.add_parser("carve", help="deleted-file recovery from generated FAT32/exFAT images")
+    p.add_argument("--mib", type=int, default=256, help="image size")
+    p.add_argument("--filesystems", default="fat32,exfat")
+    p.set_defaults(func=bench_carve)
+
+    p = sub.add_parser("suite", help="regression suite: JSON results, compared with a baseline")
+    p.add_argument("--scale", choices=sorted(SUITE_SCALES), default="small",
+                   help="small: 10k event rows, medium: 1M, large: 10M")
+    p.add_argument("--cases", help="comma-separated subset of: " + ", ".join(SUITE_CASES))
+    p.add_argument("--json", help="write results to this file (keep one as a baseline)")
+    p.add_argument("--baseline", help="results file to compare with; exits 1 on a regression")
+    p.add_argument("--tolerance", type=float, default=0.2,
+                   help="allowed fraction a metric may get worse before it is a regression")
+    p.add_argument("--case-worker", help=argparse.SUPPRESS)
+    p.set_defaults(func=bench_suite)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,82 @@
 # config.py
 
+import os
+
 APP_NAME = "USB Forensic Tool"
 VERSION = "1.0"
 AUTHOR = "Your Team"
+
+DATABASE = {
+    "path": os.path.join("database", "usb_forensics.db"),
+    "synchronous": "NORMAL",  # safe with WAL; use FULL for fsync on every commit
+    "write_batch_size": 500,  # rows per transaction from the writer thread
+    "write_batch_interval": 0.05,  # seconds to wait while filling a batch
+    "write_queue_size": 100000,  # producers block once this many rows are pending
+}
+
+# Hashing engine
+HASH_ALGORITHMS = ("md5", "sha1", "sha256")
+HASH_CHUNK_SIZE = 1024 * 1024  # bytes read per readinto() call
+HASH_WORKERS = 4  # files hashed concurrently; override with --workers
+HASH_USE_PROCESSES = False  # send batches of small files to a process pool
+SMALL_FILE_THRESHOLD = 64 * 1024
+SMALL_FILE_BATCH = 256
+HASH_CACHE_MAX_ENTRIES = 1000000  # least recently used entries are evicted past this
+
+# Fuzzy (CTPH) hash computed with the digests above when files are hashed;
+# images and reports use HASH_ALGORITHMS only
+FILE_HASH_ALGORITHMS = HASH_ALGORITHMS + ("ctph",)
+# File type and byte entropy (content_analysis.py), worked out on the same
+# read as the digests but recorded apart from them
+CONTENT_ANALYSERS = ("filetype", "entropy")
+FUZZY_MAX_SIZE = 256 * 1024 * 1024  # larger files get no fuzzy hash
+FUZZY_MIN_SCORE = 50  # similarity (0-100) reported as a near-duplicate
+FUZZY_CANDIDATES = 500  # index hits scored per similarity search
+
+# Content analysis (content_analysis.py): entropy is counted over the first
+# ENTROPY_SAMPLE_BLOCK bytes of every ENTROPY_SAMPLE_STRIDE of a file
+ENTROPY_SAMPLE_BLOCK = 4 * 1024
+ENTROPY_SAMPLE_STRIDE = 64 * 1024
+ENTROPY_SUSPICIOUS = 7.9  # bits/byte; data of no known type above this looks encrypted
+ENTROPY_MIN_SIZE = 4096  # smaller files cannot reach a meaningful entropy
+
+# Raw device / image acquisition
+ACQUIRE_BLOCK_SIZE = 4 * 1024 * 1024  # bytes per sequential read, a multiple of 4 KiB
+ACQUIRE_SEGMENT_SIZE = 1024 ** 3  # a separate digest is kept for every segment
+ACQUIRE_BUFFERS = 4  # blocks in flight between the reader and the hash/write threads
+ACQUIRE_SEGMENT_ALGORITHMS = ("md5",)
+
+# Deleted-file recovery from FAT32/exFAT images (fat_carving.py)
+CARVE_SIGNATURES = ("jpeg", "png", "gif", "pdf", "zip", "exe", "sqlite", "webp", "wav", "avi",
+                    "mp4")  # file types carved from free clusters by their headers
+CARVE_MAX_SIZE = 256 * 1024 * 1024  # a signature hit is never carved past this
+
+# Known-file hash sets: (path to a hash list or NSRLFile.txt, "known_good" or "known_bad").
+# Each list is compiled to <path>.<algorithm>.hidx on first use.
+KNOWN_HASH_SETS = []
+
+# Directory names skipped wherever they appear on a scanned volume (case-insensitive).
+# Clear this to include recycle bins in a scan.
+WALK_EXCLUDE_DIRS = ("System Volume Information", "$RECYCLE.BIN", "RECYCLER",
+                     ".Trashes", ".Spotlight-V100", ".fseventsd")
+
+# File transfer monitoring
+COALESCE_QUIET_WINDOW = 1.0  # seconds without events before a file is checked for stability
+COALESCE_MAX_PENDING = 10000  # raw events buffered before backpressure/drops
+MONITOR_QUEUE_SIZE = 10000  # coalesced events waiting for sinks
+TRANSFER_LOG_PATH = os.path.join("database", "file_transfers.jsonl")
+TRANSFER_LOG_MAX_BYTES = 64 * 1024 * 1024  # the log is rotated past this size...
+TRANSFER_LOG_MAX_AGE = 24 * 3600  # ...or once its first entry is this many seconds old
+TRANSFER_LOG_COMPRESS = True  # gzip rotated segments
+TRANSFER_LOG_FLUSH_INTERVAL = 1.0  # seconds a written event may sit in the buffer
+TRANSFER_LOG_INDEX_INTERVAL = 64 * 1024  # bytes of log per offset index entry
+
+# Device detection
+DEVICE_SETTLE_DELAY = 0.3  # seconds without device notifications before devices are re-read
+
+# Chain of custody: signing key for checkpoints ("<scheme>:<hex>", created on first use).
+# Keep a copy outside the case folder; anyone holding it can sign checkpoints.
+CUSTODY_KEY_PATH = os.path.join("database", "custody.key")
+
+# Device history
+HISTORY_CACHE_TTL = 300  # seconds a registry/hive snapshot is reused before re-walking
@@ -0,0 +1,240 @@
+# content_analysis.py
+"""File type identification and byte entropy, computed on the hashing pass.
+
+Two analysers (config.CONTENT_ANALYSERS) are fed alongside the digests by
+hash_utils.MultiHasher, the same way the fuzzy hash is, so no file is read
+a second time. They are not digests: take_results() moves them out of the
+hashes into a record's own fields.
+
+- "filetype" -> file_type: the type whose magic bytes (SIGNATURES) match
+  the start of the file, or None
+- "entropy" -> entropy: Shannon entropy of the byte histogram, in bits per
+  byte (0-8)
+
+The histogram is counted with numpy when it is installed. Counting every
+byte would still cost a good part of a hash pass, so it samples the first
+ENTROPY_SAMPLE_BLOCK bytes of every ENTROPY_SAMPLE_STRIDE; files up to the
+block size are counted whole. Without numpy only the first block is
+counted.
+
+content_flag() then says why a file looks out of place: content that
+does not match its extension (an executable named .pdf, a zip named .txt),
+an encrypted volume, or near-random data of no known type.
+"""
+
+import math
+import os
+from collections import Counter
+
+from config import (ENTROPY_SAMPLE_BLOCK, ENTROPY_SAMPLE_STRIDE, ENTROPY_SUSPICIOUS,
+                    ENTROPY_MIN_SIZE)
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+FILE_TYPE = "filetype"
+ENTROPY = "entropy"
+
+# type: (signatures, extensions). A signature is a tuple of (offset, bytes)
+# that must all match; the first type with a matching signature wins.
+SIGNATURES = (
+    ("exe", (((0, b"MZ"),),), ("exe", "dll", "sys", "scr", "com", "cpl", "ocx", "drv", "efi",
+                                "mui", "ax")),
+    ("elf", (((0, b"\x7fELF"),),), ("", "so", "elf", "ko")),
+    ("macho", (((0, b"\xcf\xfa\xed\xfe"),), ((0, b"\xce\xfa\xed\xfe"),)), ("", "dylib")),
+    ("zip", (((0, b"PK\x03\x04"),), ((0, b"PK\x05\x06"),), ((0, b"PK\x07\x08"),)),
+     ("zip", "docx", "xlsx", "pptx", "docm", "xlsm", "pptm", "odt", "ods", "odp", "jar", "apk",
+      "epub", "xpi", "kmz", "vsdx", "whl", "nupkg")),
+    ("rar", (((0, b"Rar!\x1a\x07"),),), ("rar",)),
+    ("7z", (((0, b"7z\xbc\xaf\x27\x1c"),),), ("7z",)),
+    ("gzip", (((0, b"\x1f\x8b\x08"),),), ("gz", "tgz")),
+    ("bzip2", (((0, b"BZh"),),), ("bz2", "tbz2")),
+    ("xz", (((0, b"\xfd7zXZ\x00"),),), ("xz", "txz")),
+    ("cab", (((0, b"MSCF"),),), ("cab",)),
+    ("tar", (((257, b"ustar"),),), ("tar",)),
+    ("pdf", (((0, b"%PDF-"),),), ("pdf",)),
+    ("ole", (((0, b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"),),), ("doc", "xls", "ppt", "msi", "msg",
+                                                             "vsd", "pub")),
+    ("rtf", (((0, b"{\\rtf"),),), ("rtf", "doc")),
+    ("sqlite", (((0, b"SQLite format 3\x00"),),), ("sqlite", "sqlite3", "db3")),
+    ("lnk", (((0, b"L\x00\x00\x00\x01\x14\x02\x00"),),), ("lnk",)),
+    ("regf", (((0, b"regf"),),), ("hve",)),
+    ("evtx", (((0, b"ElfFile\x00"),),), ("evtx",)),
+    ("jpeg", (((0, b"\xff\xd8\xff"),),), ("jpg", "jpeg", "jpe", "jfif")),
+    ("png", (((0, b"\x89PNG\r\n\x1a\n"),),), ("png",)),
+    ("gif", (((0, b"GIF87a"),), ((0, b"GIF89a"),)), ("gif",)),
+    ("tiff", (((0, b"II*\x00"),), ((0, b"MM\x00*"),)), ("tif", "tiff", "dng", "nef", "cr2")),
+    ("webp", (((0, b"RIFF"), (8, b"WEBP")),), ("webp",)),
+    ("wav", (((0, b"RIFF"), (8, b"WAVE")),), ("wav",)),
+    ("avi", (((0, b"RIFF"), (8, b"AVI ")),), ("avi",)),
+    ("mp4", (((4, b"ftyp"),), ((4, b"moov"),), ((4, b"mdat"),), ((4, b"wide"),), ((4, b"free"),),
+             ((4, b"skip"),)),
+     ("mp4", "m4a", "m4v", "mov", "3gp", "heic", "heif", "avif")),
+    # MPEG audio files often start straight at a frame header instead of an ID3 tag
+    ("mp3", (((0, b"ID3"),), ((0, b"\xff\xfb"),), ((0, b"\xff\xf3"),), ((0, b"\xff\xf2"),)),
+     ("mp3",)),
+    ("ogg", (((0, b"OggS"),),), ("ogg", "oga", "ogv", "opus")),
+    ("flac", (((0, b"fLaC"),),), ("flac",)),
+    ("mkv", (((0, b"\x1a\x45\xdf\xa3"),),), ("mkv", "webm")),
+    ("vhdx", (((0, b"vhdxfile"),),), ("vhdx",)),
+    ("luks", (((0, b"LUKS\xba\xbe"),),), ()),
+    ("bitlocker", (((3, b"-FVE-FS-"),),), ()),
+)
+HEAD_SIZE = max(offset + len(magic) for _, signatures, _ in SIGNATURES
+                for signature in signatures for offset, magic in signature)
+
+# Types that announce an encrypted volume whatever the file is called
+ENCRYPTED_TYPES = ("luks", "bitlocker")
+# Executables are flagged under any extension but their own
+EXECUTABLE_TYPES = ("exe", "elf", "macho")
+# Extensions of formats with no magic bytes: any recognised type under them is a mismatch
+PLAIN_EXTENSIONS = ("txt", "csv", "log", "md", "ini", "cfg", "conf", "json", "xml", "html",
+                    "htm", "css", "js", "py", "bat", "ps1", "sh", "yaml", "yml", "tsv", "sql")
+
+# Signatures by the two bytes they start a file with; the rest are always tried
+_BY_PREFIX = {}
+_UNPREFIXED = []
+for _name, _signatures, _ in SIGNATURES:
+    for _signature in _signatures:
+        if _signature[0][0] == 0 and len(_signature[0][1]) >= 2:
+            _BY_PREFIX.setdefault(_signature[0][1][:2], []).append((_name, _signature))
+        else:
+            _UNPREFIXED.append((_name, _signature))
+
+_TYPE_EXTENSIONS = {name: set(extensions) for name, _, extensions in SIGNATURES}
+_EXPECTED_TYPES = {}
+for _name, _, _extensions in SIGNATURES:
+    for _extension in _extensions:
+        if _extension:
+            _EXPECTED_TYPES.setdefault(_extension, set()).add(_name)
+for _extension in PLAIN_EXTENSIONS:
+    _EXPECTED_TYPES.setdefault(_extension, set()).add(None)
+
+
+def identify(head):
+    """The file type whose signature matches head (the first bytes of a file), or None."""
+    for candidates in (_BY_PREFIX.get(head[:2], ()), _UNPREFIXED):
+        for name, signature in candidates:
+            for offset, magic in signature:
+                if not head.startswith(magic, offset):
+                    break
+            else:
+                return name
+    return None
+
+
+def content_flag(path, file_type, entropy=None, size=None):
+    """Why a file's content looks out of place for its name, or None if it doesn't."""
+    if size == 0:
+        return None  # nothing in it to be out of place
+    extension = os.path.splitext(path)[1].lower().lstrip(".")
+    if file_type in ENCRYPTED_TYPES:
+        return f"{file_type} encrypted volume"
+    if file_type in EXECUTABLE_TYPES and extension not in _TYPE_EXTENSIONS[file_type]:
+        return f"{file_type} executable named .{extension}" if extension else \
+            f"{file_type} executable without an extension"
+    # A missing signature is not flagged: plenty of ordinary files (DOS .com
+    # programs, headerless audio) have none. Only a different known type is.
+    expected = _EXPECTED_TYPES.get(extension)
+    if expected is not None and file_type is not None and file_type not in expected:
+        return f"{file_type} content named .{extension}"
+    if file_type is None and entropy is not None and size is not None and \
+            size >= ENTROPY_MIN_SIZE and float(entropy) >= ENTROPY_SUSPICIOUS:
+        return f"random-looking data ({entropy} bits/byte) of no known type"
+    return None
+
+
+def take_results(hashes):
+    """Remove the analysers' output from a MultiHasher result.
+
+    Returns {"file_type", "entropy"} (entropy as a float), or {} when the
+    analysers did not run.
+    """
+    if FILE_TYPE not in hashes:
+        return {}
+    entropy = hashes.pop(ENTROPY, None)
+    return {"file_type": hashes.pop(FILE_TYPE),
+            "entropy": float(entropy) if entropy is not None else None}
+
+
+def annotate(record):
+    """Set file_type, entropy and content_flag on a hash record; returns the record.
+
+    The analysers' output is taken out of record["hashes"]; records that
+    already carry a file_type (from the hash cache) keep it. Records
+    hashed without the analysers are left alone.
+    """
+    record.update(take_results(record.get("hashes") or {}))
+    if "file_type" in record:
+        record["content_flag"] = content_flag(record["path"], record["file_type"],
+                                              record.get("entropy"), record.get("size"))
+    return record
+
+
+class FileTypeHasher:
+    """Keeps the first HEAD_SIZE bytes of a stream and names their type."""
+
+    def __init__(self):
+        self._head = b""
+
+    def update(self, data):
+        if len(self._head) < HEAD_SIZE:
+            self._head += bytes(data[:HEAD_SIZE - len(self._head)])
+
+    def hexdigest(self):
+        return identify(self._head)
+
+
+class EntropyHasher:
+    """Byte histogram of a stream, sampled as described above, and its entropy."""
+
+    def __init__(self, block=ENTROPY_SAMPLE_BLOCK, stride=ENTROPY_SAMPLE_STRIDE):
+        self.block = block
+        # Counting in Python is too slow for anything but the first block
+        self.stride = max(stride, block) if np is not None else 1 << 62
+        self._position = 0
+        self._total = 0
+        self._counts = None if np is not None else Counter()
+
+    def update(self, data):
+        n = len(data)
+        i = 0
+        while i < n:
+            offset = (self._position + i) % self.stride
+            if offset < self.block:
+                take = min(self.block - offset, n - i)
+                if np is None:
+                    self._counts.update(bytes(data[i:i + take]))
+                elif self._counts is None:
+                    self._counts = np.bincount(np.frombuffer(data[i:i + take], dtype=np.uint8),
+                                               minlength=256)
+                else:
+                    self._counts += np.bincount(np.frombuffer(data[i:i + take], dtype=np.uint8),
+                                                minlength=256)
+                self._total += take
+                i += take
+            else:
+                i += self.stride - offset
+        self._position += n
+
+    def hexdigest(self):
+        # H = log2(N) - sum(c * log2(c)) / N
+        total = self._total
+        if not total:
+            return None
+        if np is None:
+            xlogx = sum(c * math.log2(c) for c in self._counts.values())
+        elif total < len(_XLOGX):
+            xlogx = float(_XLOGX[self._counts].sum())  # the common case: one block or less
+        else:
+            counts = self._counts[self._counts.nonzero()]
+            xlogx = float(counts @ np.log2(counts))
+        return f"{abs(math.log2(total) - xlogx / total):.4f}"
+
+
+if np is not None:
+    # c * log2(c) for every count a single sample block can reach
+    _XLOGX = np.arange(ENTROPY_SAMPLE_BLOCK + 1, dtype=np.float64)
+    _XLOGX[1:] *= np.log2(_XLOGX[1:])
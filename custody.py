@@ -0,0 +1,528 @@
+# custody.py
+"""Tamper-evident chain of custody over everything written to the evidence database.
+
+Triggers (db_migrations._custody) queue every insert, change and deletion
+in the evidence tables; seal() turns the queue into leaves of an
+append-only Merkle tree laid out as in RFC 6962 (Certificate
+Transparency):
+
+    leaf = SHA-256(0x00 || table LF op LF row key LF row content)
+    node = SHA-256(0x01 || left || right)
+
+The root of every complete subtree is stored as it fills up, so the root of
+the tree at any size, and the proof that a leaf or a run of leaves is in
+it, take O(log n) node reads. A checkpoint signs (size, root, time) with
+the examiner's key: Ed25519 when the cryptography package is installed,
+otherwise HMAC-SHA256. Reports print the checkpoint they were made from.
+
+Verification never has to start from the beginning: verify_since()
+checks that the stored subtrees still add up to the last signed root, then
+re-hashes only the leaves appended after it.
+"""
+
+import hashlib
+import hmac
+import importlib.util
+import json
+import os
+import sqlite3
+from datetime import datetime
+
+from config import CUSTODY_KEY_PATH
+from db_migrations import CUSTODY_TABLES, custody_row_sql
+
+CHECKPOINT_FORMAT = "usbforensic-custody-v1"
+EMPTY_ROOT = hashlib.sha256(b"").digest()
+
+
+def leaf_hash(table, op, row_key, content):
+    # row_key and content are JSON text, which never holds a raw newline
+    payload = "\x00" + table + "\n" + op + "\n" + row_key + "\n" + content
+    return hashlib.sha256(payload.encode("utf-8")).digest()
+
+
+def _row_key(values):
+    # The same text SQLite's json_array() gives the triggers
+    return json.dumps(list(values), separators=(",", ":"), ensure_ascii=False)
+
+
+def node_hash(left, right):
+    return hashlib.sha256(b"\x01" + left + right).digest()
+
+
+def _split(size):
+    """Largest power of two smaller than size (RFC 6962's k)."""
+    return 1 << (size - 1).bit_length() - 1
+
+
+def _frontier_nodes(size):
+    """(level, idx) of the complete subtrees that make up a tree of size leaves, left to right."""
+    nodes = []
+    start = 0
+    for level in range(size.bit_length() - 1, -1, -1):
+        if size >> level & 1:
+            nodes.append((level, start >> level))
+            start += 1 << level
+    return nodes
+
+
+def _fold(frontier):
+    """Root of a tree from its complete subtree roots, left to right."""
+    if not frontier:
+        return EMPTY_ROOT
+    root = frontier[-1]
+    for left in reversed(frontier[:-1]):
+        root = node_hash(left, root)
+    return root
+
+
+def seal(conn):
+    """Hash the queued row changes into the tree; returns how many leaves were added.
+
+    Runs inside the caller's write transaction, so a batch of rows and
+    their leaves are committed together.
+    """
+    pending = conn.execute("SELECT id, table_name, op, row_key, content FROM custody_pending "
+                           "ORDER BY id").fetchall()
+    if not pending:
+        return 0
+    size = conn.execute("SELECT IFNULL(MAX(seq) + 1, 0) FROM custody_leaves").fetchone()[0]
+    frontier = {}
+    for level, idx in _frontier_nodes(size):
+        frontier[level] = _node(conn, level, idx)
+    leaves, nodes = [], []
+    for _, table, op, row_key, content in pending:
+        h = leaf_hash(table, op, row_key, content)
+        leaves.append((size, table, op, row_key, h))
+        level = 0
+        # Binary increment: each full level merges with the new subtree and is carried up
+        while level in frontier:
+            h = node_hash(frontier.pop(level), h)
+            level += 1
+            nodes.append((level, size >> level, h))
+        frontier[level] = h
+        size += 1
+    conn.executemany("INSERT INTO custody_leaves (seq, table_name, op, row_key, hash) "
+                     "VALUES (?, ?, ?, ?, ?)", leaves)
+    conn.executemany("INSERT INTO custody_nodes (level, idx, hash) VALUES (?, ?, ?)", nodes)
+    conn.execute("DELETE FROM custody_pending WHERE id <= ?", (pending[-1][0],))
+    return len(leaves)
+
+
+def _node(conn, level, idx, memo=None):
+    if memo is not None and (level, idx) in memo:
+        return memo[(level, idx)]
+    if level == 0:
+        row = conn.execute("SELECT hash FROM custody_leaves WHERE seq = ?", (idx,)).fetchone()
+    else:
+        row = conn.execute("SELECT hash FROM custody_nodes WHERE level = ? AND idx = ?",
+                           (level, idx)).fetchone()
+    if row is None:
+        raise KeyError(f"custody node {level}/{idx} is missing")
+    if memo is not None:
+        memo[(level, idx)] = row[0]
+    return row[0]
+
+
+def root_from_range(leaf_hashes, start, size, proof):
+    """Recompute the root of a size-leaf tree from leaves start.. and a range proof.
+
+    This is the verifier's half of Custody.proof(); it needs nothing from
+    the database.
+    """
+    leaves, hashes = iter(leaf_hashes), iter(proof)
+    end = start + len(leaf_hashes)
+
+    def subtree(lo, hi):
+        if hi <= start or lo >= end:
+            return next(hashes)
+        if hi - lo == 1:
+            return next(leaves)
+        k = _split(hi - lo)
+        return node_hash(subtree(lo, lo + k), subtree(lo + k, hi))
+
+    if size == 0:
+        return EMPTY_ROOT
+    try:
+        root = subtree(0, size)
+    except StopIteration:
+        return None  # proof too short
+    return None if next(hashes, None) is not None else root
+
+
+class _HmacSigner:
+    scheme = "hmac-sha256"
+
+    def __init__(self, secret):
+        self.secret = secret
+        self.key_id = hashlib.sha256(b"key-id" + secret).hexdigest()[:16]
+        self.public_key = None
+
+    def sign(self, message):
+        return hmac.new(self.secret, message, hashlib.sha256).hexdigest()
+
+    def verify(self, message, signature):
+        return hmac.compare_digest(self.sign(message), signature)
+
+
+class _Ed25519Signer:
+    scheme = "ed25519"
+
+    def __init__(self, secret):
+        from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+        from cryptography.hazmat.primitives.serialization import Encoding, PublicFormat
+        self._key = Ed25519PrivateKey.from_private_bytes(secret)
+        public = self._key.public_key().public_bytes(Encoding.Raw, PublicFormat.Raw)
+        self.public_key = public.hex()
+        self.key_id = hashlib.sha256(public).hexdigest()[:16]
+
+    def sign(self, message):
+        return self._key.sign(message).hex()
+
+    def verify(self, message, signature):
+        from cryptography.exceptions import InvalidSignature
+        try:
+            self._key.public_key().verify(bytes.fromhex(signature), message)
+            return True
+        except (InvalidSignature, ValueError):
+            return False
+
+
+def load_signer(key_path=CUSTODY_KEY_PATH):
+    """The examiner's checkpoint signing key, created on first use.
+
+    The key file holds "<scheme>:<hex secret>". A new key is Ed25519 if the
+    cryptography package is installed and an HMAC secret otherwise; an
+    existing key keeps its scheme so older checkpoints still verify.
+    """
+    try:
+        with open(key_path) as f:
+            scheme, secret = f.read().strip().split(":", 1)
+        secret = bytes.fromhex(secret)
+    except FileNotFoundError:
+        if importlib.util.find_spec("cryptography") is not None:
+            scheme = _Ed25519Signer.scheme
+        else:
+            scheme = _HmacSigner.scheme
+        secret = os.urandom(32)
+        os.makedirs(os.path.dirname(key_path) or ".", exist_ok=True)
+        fd = os.open(key_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, "w") as f:
+            f.write(f"{scheme}:{secret.hex()}\n")
+    if scheme == _Ed25519Signer.scheme:
+        return _Ed25519Signer(secret)
+    return _HmacSigner(secret)
+
+
+def checkpoint_message(tree_size, root, created_at):
+    return f"{CHECKPOINT_FORMAT}\n{tree_size}\n{root}\n{created_at}".encode("utf-8")
+
+
+class Custody:
+    """Checkpoints, proofs and verification for a DatabaseManager's custody log."""
+
+    CHECKPOINT_COLUMNS = ("id", "tree_size", "root", "created_at", "scheme", "key_id",
+                          "signature")
+
+    def __init__(self, db, key_path=CUSTODY_KEY_PATH):
+        self.db = db
+        self.key_path = key_path
+        self._signer = None
+
+    @property
+    def signer(self):
+        if self._signer is None:
+            self._signer = load_signer(self.key_path)
+        return self._signer
+
+    def seal(self):
+        """Hash rows still queued (written outside the writer thread) into the tree."""
+        self.db.flush()
+        conn = self.db.conn
+        try:
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                return seal(conn)
+        except sqlite3.Error as e:
+            print(f"Error sealing custody log: {str(e)}")
+            return 0
+
+    def size(self):
+        return self.db.conn.execute(
+            "SELECT IFNULL(MAX(seq) + 1, 0) FROM custody_leaves").fetchone()[0]
+
+    def _subtree(self, lo, hi, memo):
+        size = hi - lo
+        if size & (size - 1) == 0:
+            level = size.bit_length() - 1
+            return _node(self.db.conn, level, lo >> level, memo)
+        k = _split(size)
+        return node_hash(self._subtree(lo, lo + k, memo), self._subtree(lo + k, hi, memo))
+
+    def root(self, size=None):
+        """Merkle root of the first size leaves (default: all of them)."""
+        size = self.size() if size is None else size
+        return EMPTY_ROOT if size == 0 else self._subtree(0, size, {})
+
+    def proof(self, start, end, size):
+        """Sibling hashes proving leaves [start, end) are in the tree of size leaves.
+
+        One leaf is an RFC 6962 audit path; a range needs at most two
+        hashes per level. Check it with root_from_range().
+        """
+        memo = {}
+        hashes = []
+
+        def walk(lo, hi):
+            if hi <= start or lo >= end:
+                hashes.append(self._subtree(lo, hi, memo))
+            elif not (start <= lo and hi <= end) and hi - lo > 1:
+                k = _split(hi - lo)
+                walk(lo, lo + k)
+                walk(lo + k, hi)
+
+        if not 0 <= start < end <= size:
+            raise ValueError(f"leaves {start}..{end} are not in a tree of {size}")
+        walk(0, size)
+        return hashes
+
+    # -- checkpoints ------------------------------------------------------
+
+    def checkpoint(self):
+        """Seal, then sign and store the current (size, root); returns the checkpoint dict."""
+        self.seal()
+        conn = self.db.conn
+        size = self.size()
+        root = self.root(size).hex()
+        created_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        signer = self.signer
+        signature = signer.sign(checkpoint_message(size, root, created_at))
+        with conn:
+            cursor = conn.execute(
+                "INSERT INTO custody_checkpoints (tree_size, root, created_at, scheme, key_id, "
+                "signature) VALUES (?, ?, ?, ?, ?, ?)",
+                (size, root, created_at, signer.scheme, signer.key_id, signature))
+        return dict(zip(self.CHECKPOINT_COLUMNS, (cursor.lastrowid, size, root, created_at,
+                                                  signer.scheme, signer.key_id, signature)))
+
+    def checkpoints(self):
+        rows = self.db.conn.execute(
+            f"SELECT {', '.join(self.CHECKPOINT_COLUMNS)} FROM custody_checkpoints ORDER BY id")
+        return [dict(zip(self.CHECKPOINT_COLUMNS, row)) for row in rows]
+
+    def latest_checkpoint(self):
+        row = self.db.conn.execute(
+            f"SELECT {', '.join(self.CHECKPOINT_COLUMNS)} FROM custody_checkpoints "
+            "ORDER BY id DESC LIMIT 1").fetchone()
+        return dict(zip(self.CHECKPOINT_COLUMNS, row)) if row else None
+
+    def signature_valid(self, checkpoint):
+        signer = self.signer
+        if checkpoint["scheme"] != signer.scheme or checkpoint["key_id"] != signer.key_id:
+            return False  # signed with another key
+        return signer.verify(checkpoint_message(checkpoint["tree_size"], checkpoint["root"],
+                                                checkpoint["created_at"]),
+                             checkpoint["signature"])
+
+    def describe_checkpoint(self, checkpoint):
+        """Lines for printing a checkpoint in a report."""
+        lines = [f"Custody checkpoint #{checkpoint['id']} at {checkpoint['created_at']}: "
+                 f"{checkpoint['tree_size']} records",
+                 f"Merkle root (SHA-256): {checkpoint['root']}",
+                 f"Signature ({checkpoint['scheme']}, key {checkpoint['key_id']}):",
+                 checkpoint["signature"]]
+        if checkpoint["scheme"] == _HmacSigner.scheme:
+            # Written when the cryptography package was not installed for Ed25519
+            lines.append("Shared-secret HMAC: only the examiner's key file can verify it")
+        elif self.signer.public_key and checkpoint["key_id"] == self.signer.key_id:
+            lines.append(f"Ed25519 public key: {self.signer.public_key}")
+        return lines
+
+    # -- verification -----------------------------------------------------
+
+    def _current_hash(self, table, op, row_key, seq):
+        """Re-hash a leaf from its row; None if a later leaf supersedes it.
+
+        Returns (hash or None, problem or None).
+        """
+        conn = self.db.conn
+        latest = conn.execute("SELECT MAX(seq) FROM custody_leaves WHERE table_name = ? AND "
+                              "row_key = ?", (table, row_key)).fetchone()[0]
+        if latest != seq:
+            return None, None  # an older version of the row; the tree alone vouches for it
+        if op == "delete":
+            if self._read_row(table, row_key) is not None:
+                return None, "deleted row is present again"
+            return None, None
+        content = self._read_row(table, row_key)
+        if content is None:
+            return None, "row is missing"
+        return leaf_hash(table, op, row_key, content), None
+
+    def _read_row(self, table, row_key):
+        if table not in CUSTODY_TABLES:
+            return None
+        keys = CUSTODY_TABLES[table][0]
+        _, content = custody_row_sql(table)
+        where = " AND ".join(f"{key} IS ?" for key in keys)
+        row = self.db.conn.execute(f"SELECT {content} FROM {table} WHERE {where}",
+                                   json.loads(row_key)).fetchone()
+        return row[0] if row else None
+
+    def _check_leaves(self, start, end, problems, on_leaf=None):
+        """Re-hash leaves [start, end) from their rows; returns the stored leaf hashes."""
+        hashes = []
+        after = start - 1
+        while after + 1 < end:
+            rows = self.db.conn.execute(
+                "SELECT seq, table_name, op, row_key, hash FROM custody_leaves "
+                "WHERE seq > ? AND seq < ? ORDER BY seq LIMIT 5000", (after, end)).fetchall()
+            if not rows:
+                problems.append((after + 1, None, None, "leaves are missing"))
+                break
+            for seq, table, op, row_key, stored in rows:
+                if seq != after + 1:
+                    problems.append((after + 1, None, None, "leaves are missing"))
+                current, problem = self._current_hash(table, op, row_key, seq)
+                if problem:
+                    problems.append((seq, table, row_key, problem))
+                elif current is not None and current != stored:
+                    problems.append((seq, table, row_key, "row was modified"))
+                hashes.append(stored)
+                if on_leaf:
+                    on_leaf(stored)
+                after = seq
+        return hashes
+
+    def verify_records(self, start, end=None, checkpoint=None):
+        """Verify leaves [start, end) against a checkpoint with a range proof.
+
+        Work is O((end - start) + log n) whatever the size of the log.
+        Returns (ok, problems) where problems lists (seq, table, key, reason).
+        """
+        end = start + 1 if end is None else end
+        checkpoint = checkpoint or self.latest_checkpoint()
+        problems = []
+        if checkpoint is None:
+            return False, [(start, None, None, "no checkpoint covers these records")]
+        if not self.signature_valid(checkpoint):
+            problems.append((None, None, None, f"checkpoint #{checkpoint['id']} signature is "
+                                               "invalid"))
+        size = checkpoint["tree_size"]
+        if not 0 <= start < end <= size:
+            return False, problems + [(start, None, None, f"not covered by checkpoint "
+                                                          f"#{checkpoint['id']}")]
+        hashes = self._check_leaves(start, end, problems)
+        try:
+            root = root_from_range(hashes, start, size, self.proof(start, end, size))
+        except KeyError as e:
+            root = None
+            problems.append((None, None, None, str(e)))
+        if root is None or root.hex() != checkpoint["root"]:
+            problems.append((None, None, None, f"records do not match the root of checkpoint "
+                                               f"#{checkpoint['id']}"))
+        return not problems, problems
+
+    def find_record(self, table, *key):
+        """seq of the latest leaf for a row, by its key column values."""
+        row = self.db.conn.execute(
+            "SELECT MAX(seq) FROM custody_leaves WHERE table_name = ? AND row_key = ?",
+            (table, _row_key(key))).fetchone()
+        return row[0] if row else None
+
+    def verify_record(self, table, *key, checkpoint=None):
+        seq = self.find_record(table, *key)
+        if seq is None:
+            return False, [(None, table, _row_key(key), "row is not in the custody log")]
+        return self.verify_records(seq, seq + 1, checkpoint)
+
+    def verify_since(self, checkpoint=None):
+        """Verify everything appended after a checkpoint (default: the latest one).
+
+        The stored subtree roots covering the checkpoint must fold to its
+        signed root; after that only the newer leaves are re-hashed. With
+        no checkpoint yet, the whole log is verified. Returns (ok, problems,
+        leaves checked).
+        """
+        checkpoint = checkpoint or self.latest_checkpoint()
+        conn = self.db.conn
+        problems = []
+        start = 0
+        frontier = []
+        if checkpoint is not None:
+            if not self.signature_valid(checkpoint):
+                problems.append((None, None, None, f"checkpoint #{checkpoint['id']} signature "
+                                                   "is invalid"))
+            start = checkpoint["tree_size"]
+            try:
+                frontier = [_node(conn, level, idx) for level, idx in _frontier_nodes(start)]
+            except KeyError as e:
+                return False, problems + [(None, None, None, str(e))], 0
+            if _fold(frontier).hex() != checkpoint["root"]:
+                return False, problems + [(None, None, None, f"log no longer matches "
+                                                             f"checkpoint #{checkpoint['id']}")], 0
+        # Carry the complete subtrees forward as the new leaves are appended
+        levels = {level: h for (level, _), h in zip(_frontier_nodes(start), frontier)}
+
+        def append(h):
+            level = 0
+            while level in levels:
+                h = node_hash(levels.pop(level), h)
+                level += 1
+            levels[level] = h
+
+        end = self.size()
+        self._check_leaves(start, end, problems, append)
+        root = _fold([levels[level] for level in sorted(levels, reverse=True)])
+        try:
+            stored = self.root(end)
+        except KeyError as e:
+            stored = None
+            problems.append((None, None, None, str(e)))
+        if stored != root:
+            problems.append((None, None, None, "stored tree nodes do not match the leaves"))
+        return not problems, problems, end - start
+
+    def verify_all(self):
+        """Re-hash the entire log and check every checkpoint's root along the way."""
+        checkpoints = {cp["tree_size"]: cp for cp in self.checkpoints()}
+        problems = []
+        levels = {}
+        state = {"size": 0}
+
+        def append(h):
+            level = 0
+            while level in levels:
+                h = node_hash(levels.pop(level), h)
+                level += 1
+            levels[level] = h
+            state["size"] += 1
+            cp = checkpoints.get(state["size"])
+            if cp is not None:
+                root = _fold([levels[lv] for lv in sorted(levels, reverse=True)])
+                if root.hex() != cp["root"]:
+                    problems.append((None, None, None, f"checkpoint #{cp['id']} root does not "
+                                                       "match the log"))
+                if not self.signature_valid(cp):
+                    problems.append((None, None, None, f"checkpoint #{cp['id']} signature is "
+                                                       "invalid"))
+
+        end = self.size()
+        self._check_leaves(0, end, problems, append)
+        return not problems, problems, end
+
+    def record_artifact(self, path):
+        """Add a finished report (or any output file) and its SHA-256 to the custody log."""
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+        conn = self.db.conn
+        with conn:
+            conn.execute("INSERT INTO custody_artifacts (path, sha256, size, created_at) "
+                         "VALUES (?, ?, ?, ?)",
+                         (os.path.abspath(path), digest.hexdigest(), os.path.getsize(path),
+                          datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+            seal(conn)
+        return digest.hexdigest()
+
@@ -1,27 +1,212 @@
 import sqlite3
 import os
-from PyQt5.QtWidgets import QMessageBox
-from config import DATABASE, Config  # Make sure DATABASE is defined in the config
+import json
+import time
+import queue
+import atexit
+import threading
+from config import DATABASE, HASH_CACHE_MAX_ENTRIES, FUZZY_MIN_SCORE, FUZZY_CANDIDATES
+from db_migrations import run_migrations, to_epoch_us, require_epoch_us
+from fuzzy_hash import ngrams as fuzzy_ngrams, compare as fuzzy_compare
+from custody import seal as seal_custody
+from content_analysis import FILE_TYPE, ENTROPY
+
+_STOP = object()
+
+# Event tables and the column holding each one's device serial
+EVENT_TABLES = {
+    "live_usb_events": "serial_number",
+    "file_transfer_events": "usb_serial",
+}
+
+# Columns the GUI table views may show, sort and filter on, and the text
+# column their search box matches against
+VIEW_COLUMNS = {
+    "file_transfer_events": ("ts_us", "timestamp", "event_type", "file_path", "usb_serial",
+                             "file_size", "file_hash_md5", "file_hash_sha256", "is_suspicious",
+                             "hash_status", "file_type", "entropy", "content_flag"),
+    "live_usb_events": ("ts_us", "timestamp", "event_type", "device_name", "serial_number",
+                        "details"),
+    "usb_history": ("last_connected", "device_name", "serial_number", "manufacturer",
+                    "vendor_id", "product_id", "first_connected", "hash_md5", "hash_sha256"),
+}
+VIEW_SEARCH_COLUMN = {
+    "file_transfer_events": "file_path",
+    "live_usb_events": "device_name",
+    "usb_history": "device_name",
+}
+# Columns that are never NULL can be sorted on directly and use their indexes
+_NOT_NULL_COLUMNS = ("id", "ts_us")
+
+_FUZZY_HASH_SQL = '''
+    INSERT OR IGNORE INTO fuzzy_hashes (digest, device_serial, file_path, file_size, source)
+    VALUES (?, ?, ?, ?, ?)
+'''
+_FUZZY_NGRAM_SQL = '''
+    INSERT OR IGNORE INTO fuzzy_ngrams (block_size, gram, hash_id)
+    SELECT ?, ?, id FROM fuzzy_hashes WHERE digest = ? AND device_serial = ? AND file_path = ?
+'''
+
+
+def _stored_hashes(text, file_type=None, entropy=None):
+    """(digests, {"file_type", "entropy"}) from a hashes column and the columns beside it.
+
+    Rows from before schema v10 kept the content analysers' results in the
+    hashes JSON; they are moved out of the digests here. The second value
+    is {} when the file was hashed without them.
+    """
+    hashes = json.loads(text) if text else {}
+    legacy_type, legacy_entropy = hashes.pop(FILE_TYPE, None), hashes.pop(ENTROPY, None)
+    if file_type is not None or entropy is not None:
+        return hashes, {"file_type": file_type, "entropy": entropy}
+    if legacy_entropy is not None:
+        return hashes, {"file_type": legacy_type, "entropy": float(legacy_entropy)}
+    return hashes, {}
+
+
+def _padded(entry, length):
+    """entry as a tuple of length, optional trailing fields set to None."""
+    return tuple(entry) + (None,) * (length - len(entry))
+
+
+def _event_time(timestamp):
+    """Epoch microseconds for an event, falling back to now for unparseable input."""
+    ts_us = to_epoch_us(timestamp)
+    return ts_us if ts_us is not None else int(time.time() * 1000000)
+
 
 class DatabaseManager:
-    def __init__(self):
-        self.conn = None
-        self.cursor = None
-        self.db_path = DATABASE['path']
+    def __init__(self, db_path=None, settings=None):
+        """Open db_path (default DATABASE["path"]); settings override other DATABASE keys."""
+        self.settings = dict(DATABASE, **(settings or {}))
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self.db_path = db_path or self.settings['path']
         
         # Create database directory if it doesn't exist
-        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
         
         self.connect()
         self.create_tables()
 
+        # Event inserts are queued and committed in batches by one writer thread
+        self._write_queue = queue.Queue(maxsize=self.settings['write_queue_size'])
+        self._write_lock = threading.Lock()  # orders inserts before close()'s stop marker
+        self._closed = False
+        self._writer = threading.Thread(target=self._writer_loop, name="db-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
     def connect(self):
-        """Connect to the SQLite database."""
+        """Connect the calling thread to the SQLite database.
+
+        Each thread (GUI, background tasks, the writer) gets its own
+        connection and cursor; WAL lets them read while the writer commits.
+        """
+        try:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._apply_pragmas(conn)
+            self._local.conn = conn
+            self._local.cursor = conn.cursor()
+            with self._connections_lock:
+                self._connections.append(conn)
+        except sqlite3.Error as e:
+            print(f"Error connecting to database {self.db_path}: {str(e)}")
+
+    @property
+    def conn(self):
+        if getattr(self._local, 'conn', None) is None:
+            self.connect()
+        return self._local.conn
+
+    @property
+    def cursor(self):
+        if getattr(self._local, 'cursor', None) is None:
+            self.connect()
+        return self._local.cursor
+
+    def _apply_pragmas(self, conn):
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(f"PRAGMA synchronous={self.settings['synchronous']}")
+        conn.execute('PRAGMA temp_store=MEMORY')
+        conn.execute('PRAGMA busy_timeout=5000')
+
+    def _enqueue(self, sql, params):
+        """Queue one row for the writer thread; blocks when the queue is full.
+
+        Returns False (and writes nothing) once the database has been closed.
+        """
+        with self._write_lock:
+            if self._closed:
+                print(f"Error queueing write: database {self.db_path} is closed")
+                return False
+            self._write_queue.put((sql, params))
+        return True
+
+    def _writer_loop(self):
+        conn = sqlite3.connect(self.db_path)
+        self._apply_pragmas(conn)
+        batch_size = self.settings['write_batch_size']
+        interval = self.settings['write_batch_interval']
+        running = True
+        while running:
+            batch = [self._write_queue.get()]
+            deadline = time.monotonic() + interval
+            # A flush() barrier or _STOP ends the batch so callers aren't kept waiting
+            while len(batch) < batch_size and isinstance(batch[-1], tuple):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._write_queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            rows = [item for item in batch if isinstance(item, tuple)]
+            if rows:
+                self._write_batch(conn, rows)
+            for item in batch:
+                if isinstance(item, threading.Event):
+                    item.set()
+                elif item is _STOP:
+                    running = False
+        conn.close()
+
+    def _write_batch(self, conn, rows):
+        """Write rows in one transaction, one executemany per run of identical statements."""
+        runs = []
+        for sql, params in rows:
+            if runs and runs[-1][0] == sql:
+                runs[-1][1].append(params)
+            else:
+                runs.append((sql, [params]))
         try:
-            self.conn = sqlite3.connect(self.db_path)
-            self.cursor = self.conn.cursor()
+            with conn:
+                for sql, params in runs:
+                    conn.executemany(sql, params)
+                seal_custody(conn)  # the rows' custody leaves commit with them
         except sqlite3.Error as e:
-            QMessageBox.critical(None, "Database Error", f"Failed to connect to database: {str(e)}")
+            # Fall back to row-by-row so one bad row doesn't drop the batch
+            print(f"Error writing batch of {len(rows)} rows: {str(e)}")
+            for sql, params in rows:
+                try:
+                    with conn:
+                        conn.execute(sql, params)
+                        seal_custody(conn)
+                except sqlite3.Error as e:
+                    print(f"Error writing row: {str(e)}")
+
+    def flush(self, timeout=None):
+        """Block until every queued write has been committed (durability barrier).
+
+        Returns False on timeout, or once the writer has stopped.
+        """
+        if not self._writer.is_alive():
+            return False
+        done = threading.Event()
+        self._write_queue.put(done)
+        return done.wait(timeout)
 
     def create_tables(self):
         """Create necessary tables in the database."""
@@ -70,18 +255,76 @@ class DatabaseManager:
                 )
             ''')
 
+            # Hash Cache Table: digests keyed by file identity on a device
+            self.cursor.execute('''
+                CREATE TABLE IF NOT EXISTS hash_cache (
+                    device_serial TEXT,
+                    file_path TEXT,
+                    file_size INTEGER,
+                    mtime_ns INTEGER,
+                    inode INTEGER,
+                    hashes TEXT,
+                    last_used REAL,
+                    PRIMARY KEY (device_serial, file_path)
+                )
+            ''')
+            self.cursor.execute(
+                'CREATE INDEX IF NOT EXISTS idx_hash_cache_last_used ON hash_cache (last_used)')
+
+            # Scan Manifest Tables: per-device snapshot of every acquisition
+            self.cursor.execute('''
+                CREATE TABLE IF NOT EXISTS scan_manifests (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    serial_number TEXT,
+                    root_path TEXT,
+                    scanned_at TEXT,
+                    file_count INTEGER,
+                    total_bytes INTEGER
+                )
+            ''')
+            self.cursor.execute(
+                'CREATE INDEX IF NOT EXISTS idx_scan_manifests_serial ON scan_manifests (serial_number, id)')
+            self.cursor.execute('''
+                CREATE TABLE IF NOT EXISTS scan_manifest_entries (
+                    manifest_id INTEGER,
+                    file_path TEXT,
+                    file_size INTEGER,
+                    mtime_ns INTEGER,
+                    hashes TEXT,
+                    PRIMARY KEY (manifest_id, file_path)
+                )
+            ''')
+
             self.conn.commit()
+            run_migrations(self.conn)
         except sqlite3.Error as e:
-            QMessageBox.critical(None, "Database Error", f"Failed to create tables: {str(e)}")
+            print(f"Error creating tables: {str(e)}")
 
     def insert_usb_history(self, device_data):
-        """Insert or replace a USB device's history record."""
+        """Insert or update a USB device's history record.
+
+        device_data is a dict or a device_history.DeviceRecord. Fields given
+        as None keep the value already stored, so a registry refresh does not
+        wipe hashes recorded by an earlier acquisition.
+        """
+        if hasattr(device_data, 'to_history_row'):
+            device_data = device_data.to_history_row()
         try:
-            self.cursor.execute('''
-                INSERT OR REPLACE INTO usb_history 
+            return self._enqueue('''
+                INSERT INTO usb_history 
                 (device_name, serial_number, manufacturer, hash_md5, hash_sha256, 
                  storage_capacity, first_connected, last_connected, vendor_id, product_id)
                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(serial_number) DO UPDATE SET
+                    device_name = COALESCE(excluded.device_name, device_name),
+                    manufacturer = COALESCE(excluded.manufacturer, manufacturer),
+                    hash_md5 = COALESCE(excluded.hash_md5, hash_md5),
+                    hash_sha256 = COALESCE(excluded.hash_sha256, hash_sha256),
+                    storage_capacity = COALESCE(excluded.storage_capacity, storage_capacity),
+                    first_connected = COALESCE(first_connected, excluded.first_connected),
+                    last_connected = COALESCE(excluded.last_connected, last_connected),
+                    vendor_id = COALESCE(excluded.vendor_id, vendor_id),
+                    product_id = COALESCE(excluded.product_id, product_id)
             ''', (
                 device_data['device_name'],
                 device_data['serial_number'],
@@ -94,14 +337,13 @@ class DatabaseManager:
                 device_data['vendor_id'],
                 device_data['product_id']
             ))
-            self.conn.commit()
-            return True
-        except sqlite3.Error as e:
-            print(f"Error inserting USB history: {str(e)}")
+        except KeyError as e:
+            print(f"Error inserting USB history: missing {str(e)}")
             return False
 
     def get_usb_history(self):
         """Retrieve USB device history."""
+        self.flush()
         try:
             self.cursor.execute('SELECT * FROM usb_history ORDER BY last_connected DESC')
             return self.cursor.fetchall()
@@ -111,35 +353,25 @@ class DatabaseManager:
 
     def insert_live_event(self, event_type, device_name, serial_number, timestamp, details):
         """Insert live event data."""
-        try:
-            self.cursor.execute('''
-                INSERT INTO live_usb_events 
-                (event_type, device_name, serial_number, timestamp, details)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (event_type, device_name, serial_number, timestamp, details))
-            self.conn.commit()
-            return True
-        except sqlite3.Error as e:
-            print(f"Error inserting live event: {str(e)}")
-            return False
+        return self._enqueue('''
+            INSERT INTO live_usb_events 
+            (event_type, device_name, serial_number, timestamp, details, ts_us)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (event_type, device_name, serial_number, timestamp, details, _event_time(timestamp)))
 
     def get_live_events(self):
         """Retrieve all live USB events."""
-        try:
-            self.cursor.execute('SELECT * FROM live_usb_events ORDER BY timestamp DESC')
-            return self.cursor.fetchall()
-        except sqlite3.Error as e:
-            print(f"Error fetching live events: {str(e)}")
-            return []
+        return list(self.iter_live_events())
 
     def insert_file_transfer_event(self, event_data):
         """Insert file transfer event data."""
         try:
-            self.cursor.execute('''
+            queued = self._enqueue('''
                 INSERT INTO file_transfer_events 
                 (event_type, file_path, usb_serial, timestamp, 
-                 file_hash_md5, file_hash_sha256, file_size, is_suspicious)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                 file_hash_md5, file_hash_sha256, file_size, is_suspicious, ts_us,
+                 hash_status, file_hash_ctph, file_type, entropy, content_flag)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             ''', (
                 event_data['event_type'],
                 event_data['file_path'],
@@ -148,74 +380,518 @@ class DatabaseManager:
                 event_data['file_hash_md5'],
                 event_data['file_hash_sha256'],
                 event_data['file_size'],
-                event_data['is_suspicious']
+                event_data['is_suspicious'],
+                _event_time(event_data['timestamp']),
+                event_data.get('hash_status'),
+                event_data.get('file_hash_ctph'),
+                event_data.get('file_type'),
+                event_data.get('entropy'),
+                event_data.get('content_flag')
             ))
-            self.conn.commit()
+            if not queued:
+                return False
+            if event_data.get('file_hash_ctph'):
+                for sql, rows in self._fuzzy_rows([(
+                        event_data['usb_serial'], event_data['file_path'],
+                        event_data['file_size'], event_data['file_hash_ctph'])], "transfer"):
+                    for row in rows:
+                        self._enqueue(sql, row)
             return True
-        except sqlite3.Error as e:
-            print(f"Error inserting file transfer event: {str(e)}")
+        except KeyError as e:
+            print(f"Error inserting file transfer event: missing {str(e)}")
             return False
 
     def get_file_transfer_events(self, usb_serial=None):
         """Retrieve file transfer events for a specific USB serial or all events."""
+        return list(self.iter_file_transfer_events(usb_serial=usb_serial))
+
+    def table_columns(self, table):
+        """Column names of a table, in SELECT * order."""
+        return [row[1] for row in self.conn.execute(f"PRAGMA table_info({table})")]
+
+    def query_events_page(self, table, serial=None, event_type=None, start=None, end=None,
+                          after=None, limit=500):
+        """Return (rows, next_key) for one page of an event table, newest first.
+
+        table is "live_usb_events" or "file_transfer_events". Pages are keyed on
+        (ts_us, id) rather than OFFSET, so every page is an index range scan;
+        pass the returned next_key as after to get the following page. next_key
+        is None after the last page. start/end accept datetimes, epoch seconds
+        or timestamp strings; a time that cannot be read raises ValueError.
+        """
+        serial_column = EVENT_TABLES[table]
+        where, params = [], []
+        if serial:
+            where.append(f"{serial_column} = ?")
+            params.append(serial)
+        if event_type:
+            where.append("event_type = ?")
+            params.append(event_type)
+        if start is not None:
+            where.append("ts_us >= ?")
+            params.append(require_epoch_us(start))
+        if end is not None:
+            where.append("ts_us <= ?")
+            params.append(require_epoch_us(end))
+        if after is not None:
+            where.append("(ts_us, id) < (?, ?)")
+            params.extend(after)
+        sql = f"SELECT * FROM {table}"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY ts_us DESC, id DESC LIMIT ?"
+        params.append(limit)
+
+        self.flush()
+        try:
+            cursor = self.conn.execute(sql, params)
+            rows = cursor.fetchall()
+        except sqlite3.Error as e:
+            print(f"Error fetching {table}: {str(e)}")
+            return [], None
+        if len(rows) < limit:
+            return rows, None
+        # Migrations append columns, so ts_us is looked up rather than assumed last
+        ts_index = [column[0] for column in cursor.description].index("ts_us")
+        return rows, (rows[-1][ts_index], rows[-1][0])
+
+    def _view_where(self, table, filters, search):
+        where, params = [], []
+        for column, value in (filters or {}).items():
+            if column not in VIEW_COLUMNS[table]:
+                raise ValueError(f"{table} has no view column {column!r}")
+            where.append(f"{column} = ?")
+            params.append(value)
+        if search:
+            where.append(f"{VIEW_SEARCH_COLUMN[table]} LIKE ? ESCAPE '\\'")
+            escaped = search.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            params.append(f"%{escaped}%")
+        return where, params
+
+    def query_view_page(self, table, sort=None, descending=True, filters=None, search=None,
+                        after=None, limit=500, upto_id=None):
+        """Return (rows, next_key) for one page of a GUI table view.
+
+        Rows hold VIEW_COLUMNS[table] plus the row id last. Sorting, exact
+        column filters and the search substring all run in SQL, and pages are
+        keyed on (sort value, id) so fetching the next page costs the same on
+        row 10 as on row 10 million. next_key is None after the last page.
+        upto_id pins the result to rows that existed when paging started.
+        """
+        columns = VIEW_COLUMNS[table]
+        sort = sort or columns[0]
+        if sort not in columns:
+            raise ValueError(f"{table} has no view column {sort!r}")
+        key = sort if sort in _NOT_NULL_COLUMNS else f"IFNULL({sort}, '')"
+        where, params = self._view_where(table, filters, search)
+        if upto_id is not None:
+            where.append("id <= ?")
+            params.append(upto_id)
+        if after is not None:
+            where.append(f"({key}, id) {'<' if descending else '>'} (?, ?)")
+            params.extend(after)
+        order = "DESC" if descending else "ASC"
+        sql = f"SELECT {key}, {', '.join(columns)}, id FROM {table}"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += f" ORDER BY {key} {order}, id {order} LIMIT ?"
+        params.append(limit)
+
+        # No flush(): views poll, so rows still queued for the writer appear next time
+        try:
+            rows = self.conn.execute(sql, params).fetchall()
+        except sqlite3.Error as e:
+            print(f"Error fetching {table}: {str(e)}")
+            return [], None
+        next_key = (rows[-1][0], rows[-1][-1]) if len(rows) == limit else None
+        return [row[1:] for row in rows], next_key
+
+    def view_max_id(self, table):
+        """Highest row id in a view table (0 when empty)."""
+        if table not in VIEW_COLUMNS:
+            raise ValueError(f"{table} is not a view table")
         try:
-            if usb_serial:
+            return self.conn.execute(f"SELECT IFNULL(MAX(id), 0) FROM {table}").fetchone()[0]
+        except sqlite3.Error as e:
+            print(f"Error fetching {table}: {str(e)}")
+            return 0
+
+    def query_view_since(self, table, since_id, filters=None, search=None, limit=5000):
+        """Return up to limit view rows added after row id since_id, oldest first (for live appends)."""
+        where, params = self._view_where(table, filters, search)
+        where.append("id > ?")
+        params.append(since_id)
+        sql = (f"SELECT {', '.join(VIEW_COLUMNS[table])}, id FROM {table} "
+               f"WHERE {' AND '.join(where)} ORDER BY id LIMIT ?")
+        params.append(limit)
+
+        try:
+            return self.conn.execute(sql, params).fetchall()
+        except sqlite3.Error as e:
+            print(f"Error fetching {table}: {str(e)}")
+            return []
+
+    def _iter_events(self, table, page_size, **filters):
+        after = None
+        while True:
+            rows, after = self.query_events_page(table, after=after, limit=page_size, **filters)
+            yield from rows
+            if after is None:
+                return
+
+    def iter_live_events(self, serial=None, event_type=None, start=None, end=None, page_size=500):
+        """Yield live USB events newest first, one page at a time."""
+        return self._iter_events("live_usb_events", page_size, serial=serial,
+                                 event_type=event_type, start=start, end=end)
+
+    def iter_file_transfer_events(self, usb_serial=None, event_type=None, start=None, end=None,
+                                  page_size=500):
+        """Yield file transfer events newest first, one page at a time."""
+        return self._iter_events("file_transfer_events", page_size, serial=usb_serial,
+                                 event_type=event_type, start=start, end=end)
+
+    def get_cached_hashes(self, device_serial, files, algorithms, analysers=()):
+        """Return {path: (hashes, content)} for files whose size, mtime and inode still match.
+
+        files is an iterable of (path, size, mtime_ns, inode); content is
+        {"file_type", "entropy"} or {}. An entry missing any of the requested
+        algorithms, or the content analysis when analysers are given, counts
+        as a miss.
+        """
+        try:
+            self.cursor.execute('''
+                SELECT file_path, file_size, mtime_ns, inode, hashes, file_type, entropy
+                FROM hash_cache WHERE device_serial = ?
+            ''', (device_serial,))
+            cached = {row[0]: row[1:] for row in self.cursor.fetchall()}
+            hits = {}
+            for path, size, mtime_ns, inode in files:
+                entry = cached.get(path)
+                if entry is None or tuple(entry[:3]) != (size, mtime_ns, inode):
+                    continue
+                hashes, content = _stored_hashes(*entry[3:])
+                if analysers and not content:
+                    continue
+                if all(name in hashes for name in algorithms):
+                    hits[path] = ({name: hashes[name] for name in algorithms}, content)
+            if hits:
+                now = time.time()
+                self.cursor.executemany(
+                    'UPDATE hash_cache SET last_used = ? WHERE device_serial = ? AND file_path = ?',
+                    [(now, device_serial, path) for path in hits])
+                self.conn.commit()
+            return hits
+        except sqlite3.Error as e:
+            print(f"Error reading hash cache: {str(e)}")
+            return {}
+
+    def store_cached_hashes(self, device_serial, entries, max_entries=HASH_CACHE_MAX_ENTRIES):
+        """Cache (path, size, mtime_ns, inode, hashes[, file_type, entropy]) tuples.
+
+        The cache is then evicted down to max_entries.
+        """
+        try:
+            now = time.time()
+            self.cursor.executemany('''
+                INSERT OR REPLACE INTO hash_cache
+                (device_serial, file_path, file_size, mtime_ns, inode, hashes, file_type, entropy,
+                 last_used)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', [(device_serial, path, size, mtime_ns, inode, json.dumps(hashes), file_type,
+                   entropy, now)
+                  for path, size, mtime_ns, inode, hashes, file_type, entropy
+                  in (_padded(entry, 7) for entry in entries)])
+            seal_custody(self.conn)
+            self.conn.commit()
+            self.evict_hash_cache(max_entries)
+            return True
+        except sqlite3.Error as e:
+            print(f"Error writing hash cache: {str(e)}")
+            return False
+
+    def evict_hash_cache(self, max_entries=HASH_CACHE_MAX_ENTRIES):
+        """Drop the least recently used cache entries beyond max_entries."""
+        try:
+            self.cursor.execute('SELECT COUNT(*) FROM hash_cache')
+            excess = self.cursor.fetchone()[0] - max_entries
+            if excess > 0:
                 self.cursor.execute('''
-                    SELECT * FROM file_transfer_events 
-                    WHERE usb_serial = ? 
-                    ORDER BY timestamp DESC
-                ''', (usb_serial,))
+                    DELETE FROM hash_cache WHERE rowid IN
+                    (SELECT rowid FROM hash_cache ORDER BY last_used LIMIT ?)
+                ''', (excess,))
+                seal_custody(self.conn)
+                self.conn.commit()
+            return True
+        except sqlite3.Error as e:
+            print(f"Error evicting hash cache: {str(e)}")
+            return False
+
+    def clear_hash_cache(self, device_serial=None):
+        """Forget cached digests for one device, or for every device."""
+        try:
+            if device_serial:
+                self.cursor.execute('DELETE FROM hash_cache WHERE device_serial = ?', (device_serial,))
             else:
-                self.cursor.execute('SELECT * FROM file_transfer_events ORDER BY timestamp DESC')
-            return self.cursor.fetchall()
+                self.cursor.execute('DELETE FROM hash_cache')
+            seal_custody(self.conn)
+            self.conn.commit()
+            return True
+        except sqlite3.Error as e:
+            print(f"Error clearing hash cache: {str(e)}")
+            return False
+
+    def insert_scan_manifest(self, serial_number, root_path, scanned_at, entries):
+        """Store a scan manifest of (relative path, size, mtime_ns, hashes[, file_type, entropy])."""
+        try:
+            entries = [_padded(entry, 6) for entry in entries]
+            self.cursor.execute('''
+                INSERT INTO scan_manifests
+                (serial_number, root_path, scanned_at, file_count, total_bytes)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (serial_number, root_path, scanned_at, len(entries),
+                  sum(entry[1] for entry in entries)))
+            manifest_id = self.cursor.lastrowid
+            self.cursor.executemany('''
+                INSERT INTO scan_manifest_entries
+                (manifest_id, file_path, file_size, mtime_ns, hashes, file_type, entropy)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', [(manifest_id, path, size, mtime_ns, json.dumps(hashes), file_type, entropy)
+                  for path, size, mtime_ns, hashes, file_type, entropy in entries])
+            seal_custody(self.conn)
+            self.conn.commit()
+            return manifest_id
         except sqlite3.Error as e:
-            print(f"Error fetching file transfer events: {str(e)}")
+            print(f"Error inserting scan manifest: {str(e)}")
+            return None
+
+    def get_latest_scan_manifest_info(self, serial_number):
+        """Return (manifest_id, root_path, file_count, total_bytes, scanned_at) of the device's last scan, or None."""
+        try:
+            return self.conn.execute('''
+                SELECT id, root_path, file_count, total_bytes, scanned_at FROM scan_manifests
+                WHERE serial_number = ? ORDER BY id DESC LIMIT 1
+            ''', (serial_number,)).fetchone()
+        except sqlite3.Error as e:
+            print(f"Error fetching scan manifest: {str(e)}")
+            return None
+
+    def iter_scan_manifest_entries(self, manifest_id, page_size=1000):
+        """Yield (relative path, size, mtime_ns, hashes) of a manifest in path order, a page at a time."""
+        after = ""
+        while True:
+            try:
+                rows = self.conn.execute('''
+                    SELECT file_path, file_size, mtime_ns, hashes FROM scan_manifest_entries
+                    WHERE manifest_id = ? AND file_path > ? ORDER BY file_path LIMIT ?
+                ''', (manifest_id, after, page_size)).fetchall()
+            except sqlite3.Error as e:
+                print(f"Error fetching scan manifest entries: {str(e)}")
+                return
+            for path, size, mtime_ns, hashes in rows:
+                yield path, size, mtime_ns, _stored_hashes(hashes)[0]
+            if len(rows) < page_size:
+                return
+            after = rows[-1][0]
+
+    def insert_carved_files(self, image_path, partition_offset, records):
+        """Store hash records of files recovered from an image (fat_carving.carve_image)."""
+        carved_at = time.strftime("%Y-%m-%d %H:%M:%S")
+        try:
+            rows = []
+            for record in records:
+                carved = record["carved"]
+                rows.append((image_path, partition_offset, carved["method"], record["path"],
+                             carved.get("file_type") or record.get("file_type"),
+                             carved.get("offset"), record["size"],
+                             carved.get("clusters"), carved.get("status"), carved.get("modified"),
+                             json.dumps(record["hashes"]), record.get("known"),
+                             record.get("content_flag"), carved_at))
+            self.cursor.executemany('''
+                INSERT INTO carved_files
+                (image_path, partition_offset, method, file_path, file_type, image_offset,
+                 file_size, clusters, status, modified, hashes, hash_status, content_flag,
+                 carved_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', rows)
+            seal_custody(self.conn)
+            self.conn.commit()
+            return len(rows)
+        except sqlite3.Error as e:
+            print(f"Error inserting carved files: {str(e)}")
+            return 0
+
+    def get_carved_files(self, image_path=None):
+        """Return the carved_files rows of an image (or all), in image order."""
+        try:
+            if image_path is None:
+                return self.conn.execute(
+                    "SELECT * FROM carved_files ORDER BY image_path, image_offset").fetchall()
+            return self.conn.execute(
+                "SELECT * FROM carved_files WHERE image_path = ? ORDER BY image_offset",
+                (image_path,)).fetchall()
+        except sqlite3.Error as e:
+            print(f"Error fetching carved files: {str(e)}")
             return []
 
+    def hash_cache_stats(self, device_serial):
+        """Return (entries, total bytes) cached for a device."""
+        try:
+            return self.conn.execute('''
+                SELECT COUNT(*), IFNULL(SUM(file_size), 0) FROM hash_cache WHERE device_serial = ?
+            ''', (device_serial,)).fetchone()
+        except sqlite3.Error as e:
+            print(f"Error reading hash cache: {str(e)}")
+            return 0, 0
+
+    def iter_hash_cache(self, device_serial, page_size=1000):
+        """Yield (path, size, hashes, last_used) cached for a device in path order, a page at a time."""
+        after = ""
+        while True:
+            try:
+                rows = self.conn.execute('''
+                    SELECT file_path, file_size, hashes, last_used FROM hash_cache
+                    WHERE device_serial = ? AND file_path > ? ORDER BY file_path LIMIT ?
+                ''', (device_serial, after, page_size)).fetchall()
+            except sqlite3.Error as e:
+                print(f"Error reading hash cache: {str(e)}")
+                return
+            for path, size, hashes, last_used in rows:
+                yield path, size, _stored_hashes(hashes)[0], last_used
+            if len(rows) < page_size:
+                return
+            after = rows[-1][0]
+
+    def _fuzzy_rows(self, entries, source):
+        """Return [(sql, rows)] for the writer queue adding (device_serial, path, size, ctph digest) entries."""
+        hash_rows = []
+        gram_rows = []
+        for serial, path, size, digest in entries:
+            grams = fuzzy_ngrams(digest) if digest else None
+            if not grams:
+                continue  # too short to ever match anything
+            key = (digest, serial or "", path)
+            hash_rows.append(key + (size, source))
+            gram_rows.extend((block_size, gram) + key for block_size, gram in grams)
+        return [(_FUZZY_HASH_SQL, hash_rows), (_FUZZY_NGRAM_SQL, gram_rows)]
+
+    def index_fuzzy_hashes(self, entries, source):
+        """Add (device_serial, path, size, ctph digest) entries to the similarity index.
+
+        source records where the digest came from ("scan", "manifest" or
+        "transfer"). Entries already indexed are skipped. Returns the number
+        of digests added.
+        """
+        pending = {}
+        for serial, path, size, digest in entries:
+            grams = fuzzy_ngrams(digest) if digest else None
+            if grams:  # digests too short to ever match anything are left out
+                pending[(digest, serial or "", path)] = (size, grams)
+        if not pending:
+            return 0
+        try:
+            last_id = self.cursor.execute(
+                'SELECT IFNULL(MAX(id), 0) FROM fuzzy_hashes').fetchone()[0]
+            self.cursor.executemany(_FUZZY_HASH_SQL, [key + (size, source)
+                                                      for key, (size, _) in pending.items()])
+            # Rows that were not already indexed have ids past last_id
+            added = self.cursor.execute('''
+                SELECT id, digest, device_serial, file_path FROM fuzzy_hashes WHERE id > ?
+            ''', (last_id,)).fetchall()
+            gram_rows = []
+            for hash_id, digest, serial, path in added:
+                entry = pending.get((digest, serial, path))
+                if entry is not None:
+                    gram_rows.extend((block_size, gram, hash_id) for block_size, gram in entry[1])
+            gram_rows.sort()  # fills the index B-tree in key order
+            self.cursor.executemany('''
+                INSERT OR IGNORE INTO fuzzy_ngrams (block_size, gram, hash_id) VALUES (?, ?, ?)
+            ''', gram_rows)
+            self.conn.commit()
+            return len(added)
+        except sqlite3.Error as e:
+            print(f"Error indexing fuzzy hashes: {str(e)}")
+            return 0
+
+    def find_similar(self, digest, min_score=FUZZY_MIN_SCORE, limit=50,
+                     candidates=FUZZY_CANDIDATES):
+        """Return [(score, device_serial, path, size, digest)] for indexed files like digest.
+
+        The n-gram index narrows the corpus to files sharing at least one
+        7-character run of signature with digest (needed for any score
+        above zero); the candidates sharing the most runs are then scored.
+        Best matches come first.
+        """
+        keys = list(fuzzy_ngrams(digest)) if digest else []
+        if not keys:
+            return []
+        values = ", ".join("(?, ?)" for _ in keys)
+        params = [value for key in keys for value in key]
+        try:
+            rows = self.conn.execute(f'''
+                WITH query (block_size, gram) AS (VALUES {values})
+                SELECT h.digest, h.device_serial, h.file_path, h.file_size
+                FROM query JOIN fuzzy_ngrams n
+                    ON n.block_size = query.block_size AND n.gram = query.gram
+                JOIN fuzzy_hashes h ON h.id = n.hash_id
+                GROUP BY h.id ORDER BY COUNT(*) DESC LIMIT ?
+            ''', params + [candidates]).fetchall()
+        except sqlite3.Error as e:
+            print(f"Error searching fuzzy hashes: {str(e)}")
+            return []
+        matches = []
+        for other, serial, path, size in rows:
+            score = fuzzy_compare(digest, other)
+            if score >= min_score:
+                matches.append((score, serial, path, size, other))
+        matches.sort(key=lambda match: (-match[0], match[2]))
+        return matches[:limit]
+
+    def get_latest_scan_manifest(self, serial_number):
+        """Return (manifest_id, {path: (size, mtime_ns, hashes, content)}) for the device's last scan.
+
+        content is {"file_type", "entropy"}, or {} if the scan did not analyse the file.
+        """
+        try:
+            self.cursor.execute('''
+                SELECT id FROM scan_manifests WHERE serial_number = ?
+                ORDER BY id DESC LIMIT 1
+            ''', (serial_number,))
+            row = self.cursor.fetchone()
+            if row is None:
+                return None, {}
+            self.cursor.execute('''
+                SELECT file_path, file_size, mtime_ns, hashes, file_type, entropy
+                FROM scan_manifest_entries WHERE manifest_id = ?
+            ''', (row[0],))
+            return row[0], {path: (size, mtime_ns) + _stored_hashes(hashes, file_type, entropy)
+                            for path, size, mtime_ns, hashes, file_type, entropy
+                            in self.cursor.fetchall()}
+        except sqlite3.Error as e:
+            print(f"Error fetching scan manifest: {str(e)}")
+            return None, {}
+
     def close(self):
-        """Close the database connection."""
-        if self.conn:
-            self.conn.close()
-
-
-# Singleton database instance
-db_manager = DatabaseManager()
-
-if __name__ == "__main__":
-    # Example of inserting a USB device history
-    device_data = {
-        "device_name": "USB Device 1",
-        "serial_number": "12345ABC",
-        "manufacturer": "Generic Manufacturer",
-        "hash_md5": "abc123md5",
-        "hash_sha256": "sha256hash123",
-        "storage_capacity": "64GB",
-        "first_connected": "2025-05-06 10:00:00",
-        "last_connected": "2025-05-06 10:05:00",
-        "vendor_id": "VID_1234",
-        "product_id": "PID_5678"
-    }
-    db_manager.insert_usb_history(device_data)
-
-    # Example of inserting a file transfer event
-    event_data = {
-        "event_type": "Created",
-        "file_path": "/path/to/file.txt",
-        "usb_serial": "12345ABC",
-        "timestamp": "2025-05-06 10:10:00",
-        "file_hash_md5": "hashmd5file123",
-        "file_hash_sha256": "sha256filehash123",
-        "file_size": "2MB",
-        "is_suspicious": 0
-    }
-    db_manager.insert_file_transfer_event(event_data)
-
-    # Retrieve all USB history
-    usb_history = db_manager.get_usb_history()
-    print(usb_history)
-
-    # Retrieve all file transfer events
-    file_transfers = db_manager.get_file_transfer_events()
-    print(file_transfers)
-
-    db_manager.close()
+        """Flush pending writes, stop the writer thread and close every connection."""
+        with self._write_lock:
+            self._closed = True
+        if self._writer.is_alive():
+            self._write_queue.put(_STOP)
+            self._writer.join()
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
+
+
+_db_manager = None
+_db_lock = threading.Lock()
+
+
+def get_db_manager():
+    """Return the process-wide DatabaseManager, opening DATABASE["path"] on first use."""
+    global _db_manager
+    with _db_lock:
+        if _db_manager is None:
+            _db_manager = DatabaseManager()
+        return _db_manager
@@ -0,0 +1,377 @@
+# db_migrations.py
+"""Versioned schema migrations for usb_forensics.db.
+
+DatabaseManager.create_tables lays down the baseline schema (version 1).
+Every later change is a migration below; the applied version is kept in
+PRAGMA user_version, so existing databases are upgraded in place.
+"""
+
+import sqlite3
+from datetime import datetime
+
+TIMESTAMP_FORMATS = (
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%d %H:%M:%S.%f",
+    "%Y-%m-%dT%H:%M:%S",
+    "%Y-%m-%dT%H:%M:%S.%f",
+    "%a %b %d %H:%M:%S %Y",  # time.ctime()
+)
+
+
+def to_epoch_us(value):
+    """Convert a datetime, epoch seconds or timestamp string to epoch microseconds."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, datetime):
+        return int(value.timestamp() * 1000000)
+    if isinstance(value, (int, float)):
+        return int(value * 1000000)
+    text = str(value).strip()
+    for fmt in TIMESTAMP_FORMATS:
+        try:
+            return int(datetime.strptime(text, fmt).timestamp() * 1000000)
+        except ValueError:
+            continue
+    try:
+        return int(datetime.fromisoformat(text).timestamp() * 1000000)
+    except ValueError:
+        return None
+
+
+def require_epoch_us(value):
+    """to_epoch_us for a time the caller asked about; raises ValueError when it cannot be read.
+
+    Strings of epoch seconds (as typed on a command line) are accepted too.
+    """
+    ts_us = to_epoch_us(value)
+    if ts_us is None and isinstance(value, str):
+        try:
+            ts_us = to_epoch_us(float(value))
+        except (ValueError, OverflowError):
+            pass
+    if ts_us is None:
+        raise ValueError(f"unrecognised time {value!r}: use YYYY-MM-DD HH:MM:SS, ISO 8601 "
+                         "or epoch seconds")
+    return ts_us
+
+
+def _event_timestamps(conn):
+    """v2: integer epoch-microsecond timestamps and indexes for the event tables."""
+    conn.create_function("to_epoch_us", 1, to_epoch_us)
+    for table in ("live_usb_events", "file_transfer_events"):
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN ts_us INTEGER")
+        conn.execute(f"UPDATE {table} SET ts_us = COALESCE(to_epoch_us(timestamp), 0)")
+    conn.execute("CREATE INDEX idx_live_events_ts ON live_usb_events (ts_us)")
+    conn.execute("CREATE INDEX idx_live_events_serial_ts ON live_usb_events (serial_number, ts_us)")
+    conn.execute("CREATE INDEX idx_live_events_type_ts ON live_usb_events (event_type, ts_us)")
+    conn.execute("CREATE INDEX idx_transfers_ts ON file_transfer_events (ts_us)")
+    conn.execute("CREATE INDEX idx_transfers_serial_ts ON file_transfer_events (usb_serial, ts_us)")
+    conn.execute("CREATE INDEX idx_transfers_type_ts ON file_transfer_events (event_type, ts_us)")
+
+
+def _hash_status(conn):
+    """v3: known-file hash set classification of transferred files."""
+    conn.execute("ALTER TABLE file_transfer_events ADD COLUMN hash_status TEXT")
+
+
+def _fuzzy_hashes(conn):
+    """v4: CTPH digests of transferred files and the n-gram similarity index."""
+    conn.execute("ALTER TABLE file_transfer_events ADD COLUMN file_hash_ctph TEXT")
+    conn.execute("""
+        CREATE TABLE fuzzy_hashes (
+            id INTEGER PRIMARY KEY,
+            digest TEXT NOT NULL,
+            device_serial TEXT NOT NULL,
+            file_path TEXT NOT NULL,
+            file_size INTEGER,
+            source TEXT,
+            UNIQUE (digest, device_serial, file_path)
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE fuzzy_ngrams (
+            block_size INTEGER,
+            gram INTEGER,
+            hash_id INTEGER,
+            PRIMARY KEY (block_size, gram, hash_id)
+        ) WITHOUT ROWID
+    """)
+
+
+def _timeline(conn):
+    """v5: merged timeline of every event source, device/mount intervals, sync positions."""
+    conn.execute("""
+        CREATE TABLE timeline_events (
+            id INTEGER PRIMARY KEY,
+            ts_us INTEGER NOT NULL,
+            serial TEXT,
+            source TEXT NOT NULL,
+            source_key INTEGER,
+            event_type TEXT,
+            subject TEXT,
+            details TEXT
+        )
+    """)
+    conn.execute("CREATE INDEX idx_timeline_ts ON timeline_events (ts_us)")
+    conn.execute("CREATE INDEX idx_timeline_serial_ts ON timeline_events (serial, ts_us)")
+    conn.execute("CREATE INDEX idx_timeline_subject_ts ON timeline_events (subject, ts_us)")
+    conn.execute("""
+        CREATE TABLE device_intervals (
+            id INTEGER PRIMARY KEY,
+            serial TEXT NOT NULL,
+            device_name TEXT,
+            mount TEXT NOT NULL DEFAULT '',
+            start_us INTEGER NOT NULL,
+            end_us INTEGER
+        )
+    """)
+    conn.execute("CREATE INDEX idx_intervals_open ON device_intervals (serial, mount, end_us)")
+    conn.execute("""
+        CREATE TABLE timeline_sources (
+            source TEXT PRIMARY KEY,
+            position INTEGER NOT NULL DEFAULT 0,
+            marker TEXT
+        )
+    """)
+
+
+# Evidence tables linked into the custody log (custody.py): the columns that
+# identify a row and the columns whose values are hashed. Bookkeeping such as
+# hash_cache.last_used is left out, so reading the cache is not a change.
+CUSTODY_TABLES = {
+    "usb_history": (("serial_number",),
+                    ("device_name", "serial_number", "manufacturer", "hash_md5", "hash_sha256",
+                     "storage_capacity", "first_connected", "last_connected", "vendor_id",
+                     "product_id")),
+    "live_usb_events": (("id",),
+                        ("id", "event_type", "device_name", "serial_number", "timestamp",
+                         "details", "ts_us")),
+    "file_transfer_events": (("id",),
+                             ("id", "event_type", "file_path", "usb_serial", "timestamp",
+                              "file_hash_md5", "file_hash_sha256", "file_hash_ctph", "file_size",
+                              "is_suspicious", "hash_status", "ts_us")),
+    "hash_cache": (("device_serial", "file_path"),
+                   ("device_serial", "file_path", "file_size", "mtime_ns", "inode", "hashes")),
+    "scan_manifests": (("id",),
+                       ("id", "serial_number", "root_path", "scanned_at", "file_count",
+                        "total_bytes")),
+    "scan_manifest_entries": (("manifest_id", "file_path"),
+                              ("manifest_id", "file_path", "file_size", "mtime_ns", "hashes")),
+    "custody_artifacts": (("id",), ("id", "path", "sha256", "size", "created_at")),
+    "carved_files": (("id",),
+                     ("id", "image_path", "partition_offset", "method", "file_path", "file_type",
+                      "image_offset", "file_size", "clusters", "status", "modified", "hashes",
+                      "hash_status", "content_flag", "carved_at")),
+}
+
+# Custody tables created after v6, with the version that created them
+CUSTODY_ADDED_TABLES = {"carved_files": 8}
+
+# Columns added to custody tables since v6, with the version that added them.
+# They join a row's content only once one of them is set, so rows (and
+# leaves) from before they existed hash exactly as they did.
+CUSTODY_ADDED_COLUMNS = {
+    "file_transfer_events": (7, ("file_type", "entropy", "content_flag")),
+    "hash_cache": (10, ("file_type", "entropy")),
+    "scan_manifest_entries": (10, ("file_type", "entropy")),
+}
+
+
+def custody_columns(table, version=None):
+    """(original content columns, columns added since) of a custody table at a schema version."""
+    columns = CUSTODY_TABLES[table][1]
+    added_in, added = CUSTODY_ADDED_COLUMNS.get(table, (None, ()))
+    if version is not None and added and version < added_in:
+        added = ()
+    return columns, added
+
+
+def custody_row_sql(table, ref=None, version=None):
+    """SQL expressions for a row's (key, content) JSON arrays; ref is NEW, OLD or the table.
+
+    version limits the content to the columns that schema version has.
+    """
+    ref = ref or table
+    columns, added = custody_columns(table, version)
+    key = f"json_array({', '.join(f'{ref}.{c}' for c in CUSTODY_TABLES[table][0])})"
+    content = f"json_array({', '.join(f'{ref}.{c}' for c in columns)})"
+    if added:
+        unset = " AND ".join(f"{ref}.{c} IS NULL" for c in added)
+        content = (f"CASE WHEN {unset} THEN {content} ELSE "
+                   f"json_array({', '.join(f'{ref}.{c}' for c in columns + added)}) END")
+    return key, content
+
+
+def _custody_triggers(conn, table, version=None):
+    """(Re)create the triggers that queue a custody table's row changes."""
+    new_key, new_content = custody_row_sql(table, "NEW", version)
+    old_key, old_content = custody_row_sql(table, "OLD", version)
+    columns = ", ".join(sum(custody_columns(table, version), ()))
+    for op in ("insert", "update", "delete"):
+        conn.execute(f"DROP TRIGGER IF EXISTS custody_{table}_{op}")
+    conn.execute(f"""
+        CREATE TRIGGER custody_{table}_insert AFTER INSERT ON {table} BEGIN
+            INSERT INTO custody_pending (table_name, op, row_key, content)
+            VALUES ('{table}', 'insert', {new_key}, {new_content});
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER custody_{table}_update AFTER UPDATE OF {columns} ON {table}
+        WHEN {old_content} IS NOT {new_content} BEGIN
+            INSERT INTO custody_pending (table_name, op, row_key, content)
+            VALUES ('{table}', 'update', {new_key}, {new_content});
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER custody_{table}_delete AFTER DELETE ON {table} BEGIN
+            INSERT INTO custody_pending (table_name, op, row_key, content)
+            VALUES ('{table}', 'delete', {old_key}, {old_content});
+        END
+    """)
+
+
+def _custody(conn):
+    """v6: Merkle custody log over the evidence tables, filled by triggers."""
+    conn.execute("""
+        CREATE TABLE custody_artifacts (
+            id INTEGER PRIMARY KEY,
+            path TEXT,
+            sha256 TEXT,
+            size INTEGER,
+            created_at TEXT
+        )
+    """)
+    # Rows written but not yet hashed into the tree; custody.seal() drains it
+    conn.execute("""
+        CREATE TABLE custody_pending (
+            id INTEGER PRIMARY KEY,
+            table_name TEXT NOT NULL,
+            op TEXT NOT NULL,
+            row_key TEXT NOT NULL,
+            content TEXT NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE custody_leaves (
+            seq INTEGER PRIMARY KEY,
+            table_name TEXT NOT NULL,
+            op TEXT NOT NULL,
+            row_key TEXT NOT NULL,
+            hash BLOB NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX idx_custody_leaves_row ON custody_leaves (table_name, row_key, seq)")
+    # Roots of the complete subtrees above the leaves, 2 ** level leaves each
+    conn.execute("""
+        CREATE TABLE custody_nodes (
+            level INTEGER,
+            idx INTEGER,
+            hash BLOB NOT NULL,
+            PRIMARY KEY (level, idx)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        CREATE TABLE custody_checkpoints (
+            id INTEGER PRIMARY KEY,
+            tree_size INTEGER NOT NULL,
+            root TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            scheme TEXT NOT NULL,
+            key_id TEXT NOT NULL,
+            signature TEXT NOT NULL
+        )
+    """)
+    for table in CUSTODY_TABLES:
+        if table in CUSTODY_ADDED_TABLES:
+            continue
+        # Rows from before the log existed are its first leaves
+        key, content = custody_row_sql(table, version=6)
+        conn.execute(f"INSERT INTO custody_pending (table_name, op, row_key, content) "
+                     f"SELECT '{table}', 'insert', {key}, {content} FROM {table} ORDER BY rowid")
+        _custody_triggers(conn, table, version=6)
+
+
+def _content_analysis(conn):
+    """v7: file type, entropy and content flag of transferred files (content_analysis.py)."""
+    conn.execute("ALTER TABLE file_transfer_events ADD COLUMN file_type TEXT")
+    conn.execute("ALTER TABLE file_transfer_events ADD COLUMN entropy REAL")
+    conn.execute("ALTER TABLE file_transfer_events ADD COLUMN content_flag TEXT")
+    _custody_triggers(conn, "file_transfer_events", version=7)
+
+
+def _carved_files(conn):
+    """v8: files recovered from FAT32/exFAT images and where they were found (fat_carving.py)."""
+    conn.execute("""
+        CREATE TABLE carved_files (
+            id INTEGER PRIMARY KEY,
+            image_path TEXT NOT NULL,
+            partition_offset INTEGER,
+            method TEXT NOT NULL,
+            file_path TEXT,
+            file_type TEXT,
+            image_offset INTEGER,
+            file_size INTEGER,
+            clusters TEXT,
+            status TEXT,
+            modified TEXT,
+            hashes TEXT,
+            hash_status TEXT,
+            content_flag TEXT,
+            carved_at TEXT
+        )
+    """)
+    conn.execute("CREATE INDEX idx_carved_files_image ON carved_files (image_path, image_offset)")
+    _custody_triggers(conn, "carved_files")
+
+
+def _transfer_log_seq(conn):
+    """v9: the timeline reads the JSON Lines transfer log by seq, not the text log by offset."""
+    conn.execute("DELETE FROM timeline_events WHERE source = 'log'")
+    conn.execute("DELETE FROM timeline_sources WHERE source = 'log'")
+
+
+def _content_columns(conn):
+    """v10: file type and entropy beside the digests of cached and manifest hashes.
+
+    Rows written before keep them inside the hashes JSON; readers take them
+    from there while the columns are empty.
+    """
+    for table in ("hash_cache", "scan_manifest_entries"):
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN file_type TEXT")
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN entropy REAL")
+        _custody_triggers(conn, table, version=10)
+
+
+MIGRATIONS = [
+    (2, _event_timestamps),
+    (3, _hash_status),
+    (4, _fuzzy_hashes),
+    (5, _timeline),
+    (6, _custody),
+    (7, _content_analysis),
+    (8, _carved_files),
+    (9, _transfer_log_seq),
+    (10, _content_columns),
+]
+
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def run_migrations(conn):
+    """Apply every migration newer than the database's user_version, each in its own transaction."""
+    current = max(schema_version(conn), 1)
+    for version, migrate in MIGRATIONS:
+        if version <= current:
+            continue
+        try:
+            conn.execute("BEGIN")
+            migrate(conn)
+            conn.execute(f"PRAGMA user_version = {version}")
+            conn.execute("COMMIT")
+        except sqlite3.Error:
+            conn.execute("ROLLBACK")
+            raise
+        current = version
+    return current
@@ -0,0 +1,109 @@
+# device_history.py
+
+import threading
+import time
+
+from usb_registry import get_backend
+from config import HISTORY_CACHE_TTL
+
+
+class DeviceRecord:
+    """One USB storage device seen in the registry."""
+
+    __slots__ = ("device_name", "instance_id", "serial_number", "friendly_name", "manufacturer",
+                 "vendor_id", "product_id", "last_connected", "drive_letters", "source")
+
+    def __init__(self, device_name, instance_id, serial_number, friendly_name=None,
+                 manufacturer=None, vendor_id=None, product_id=None, last_connected=None,
+                 drive_letters=(), source=None):
+        self.device_name = device_name
+        self.instance_id = instance_id
+        self.serial_number = serial_number
+        self.friendly_name = friendly_name
+        self.manufacturer = manufacturer
+        self.vendor_id = vendor_id
+        self.product_id = product_id
+        self.last_connected = last_connected
+        self.drive_letters = tuple(drive_letters)
+        self.source = source
+
+    @classmethod
+    def from_registry(cls, record, source):
+        return cls(record["device_class"], record["instance_id"], record["serial"],
+                   record["friendly_name"], record["manufacturer"], record["vendor_id"],
+                   record["product_id"], record["last_written"], record["drive_letters"], source)
+
+    def describe(self):
+        text = (f"Device: {self.friendly_name}\n"
+                f"Manufacturer: {self.manufacturer}\n"
+                f"Serial: {self.serial_number}")
+        if self.last_connected:
+            text += f"\nLast Connected: {self.last_connected:%Y-%m-%d %H:%M:%S}"
+        if self.drive_letters:
+            text += f"\nDrive: {', '.join(self.drive_letters)}"
+        return text
+
+    def to_history_row(self):
+        """Row for DatabaseManager.insert_usb_history."""
+        last = f"{self.last_connected:%Y-%m-%d %H:%M:%S}" if self.last_connected else None
+        return {
+            "device_name": self.friendly_name or self.device_name,
+            "serial_number": self.serial_number,
+            "manufacturer": self.manufacturer,
+            "hash_md5": None,
+            "hash_sha256": None,
+            "storage_capacity": None,
+            "first_connected": None,
+            "last_connected": last,
+            "vendor_id": self.vendor_id,
+            "product_id": self.product_id,
+        }
+
+    def __repr__(self):
+        return f"DeviceRecord({self.serial_number!r}, {self.friendly_name!r})"
+
+
+class HistoryProvider:
+    """Memoized device history, shared by the GUI, the reports and the database.
+
+    snapshot() walks the registry (or a hive file) at most once per ttl
+    seconds per source and returns the same tuple of DeviceRecords to every
+    caller until it expires or invalidate() is called.
+    """
+
+    def __init__(self, ttl=HISTORY_CACHE_TTL, backend_factory=get_backend):
+        self.ttl = ttl
+        self.backend_factory = backend_factory
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def snapshot(self, hive_path=None):
+        with self._lock:
+            cached = self._cache.get(hive_path)
+            if cached is not None and time.monotonic() - cached[0] < self.ttl:
+                return cached[1]
+            with self.backend_factory(hive_path) as backend:
+                source = hive_path or "live registry"
+                records = tuple(DeviceRecord.from_registry(record, source)
+                                for record in backend.devices())
+            self._cache[hive_path] = (time.monotonic(), records)
+            return records
+
+    def invalidate(self, hive_path=None, everything=False):
+        with self._lock:
+            if everything:
+                self._cache.clear()
+            else:
+                self._cache.pop(hive_path, None)
+
+    def sync_to_database(self, db, hive_path=None):
+        """Upsert the current snapshot into usb_history."""
+        for record in self.snapshot(hive_path):
+            db.insert_usb_history(record)
+
+
+_provider = HistoryProvider()
+
+
+def get_history_provider():
+    return _provider
@@ -0,0 +1,388 @@
+# device_watcher.py
+"""Push-driven USB storage arrival/removal detection.
+
+A device source reports the full set of connected USB storage devices
+whenever the system signals a change (nothing is polled on a timer):
+
+- WmiDeviceSource: WMI instance creation/deletion events for removable
+  logical disks (Windows)
+- LinuxDeviceSource: udev netlink events through pyudev when it is
+  installed, else inotify on /dev; mount changes from POLLPRI on
+  /proc/self/mounts. Devices are then read from /sys/block.
+- SimulatedDeviceSource: plug()/unplug()/mount() calls, for tests and demos
+
+DeviceWatcher diffs each snapshot against the previous one, records
+Connected/Disconnected/Mounted/Unmounted rows in live_usb_events and
+attaches the file transfer monitor to volumes as they are mounted.
+
+A device is a dict: id, name, serial, size (bytes), mounts (tuple of paths).
+"""
+
+import importlib.util
+import os
+import re
+import select
+import threading
+from datetime import datetime
+
+from config import DEVICE_SETTLE_DELAY
+
+
+def _format_size(size):
+    return f"{size / 1024 ** 3:.1f} GB" if size else "no media"
+
+
+class DeviceWatcher:
+    """Keep the set of connected USB storage devices current from a device source.
+
+    With db, every change is written through insert_live_event; with
+    monitor (a MonitoringService), mounted volumes are attached to it and
+    detached again on unmount or removal. on_change(event_type, device,
+    mount) is called from the source's thread.
+    """
+
+    def __init__(self, source, db=None, monitor=None, on_change=None):
+        self.source = source
+        self.db = db
+        self.monitor = monitor
+        self.on_change = on_change
+        self.changes = 0  # bumped on every change, so views can tell when to redraw
+        self._devices = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        self.source.start(self.update)
+
+    def stop(self):
+        self.source.stop()
+
+    def devices(self):
+        with self._lock:
+            return list((self._devices or {}).values())
+
+    def update(self, devices):
+        """Diff a full snapshot of connected devices against the last one and act on it."""
+        with self._lock:
+            current = {device["id"]: device for device in devices}
+            previous, self._devices = self._devices, current
+        if previous is None:
+            # Devices already present when watching starts did not just arrive
+            for device in current.values():
+                self._record("Present", device, None)
+                for mount in device["mounts"]:
+                    self._attach(device, mount)
+                    self._record("Mounted", device, mount)
+            return
+
+        for key in sorted(current.keys() - previous.keys()):
+            self._record("Connected", current[key], None)
+        for key in sorted(current):
+            old = previous[key]["mounts"] if key in previous else ()
+            for mount in current[key]["mounts"]:
+                if mount not in old:
+                    self._attach(current[key], mount)
+                    self._record("Mounted", current[key], mount)
+        for key in sorted(previous):
+            new = current[key]["mounts"] if key in current else ()
+            for mount in previous[key]["mounts"]:
+                if mount not in new:
+                    self._detach(mount)
+                    self._record("Unmounted", previous[key], mount)
+        for key in sorted(previous.keys() - current.keys()):
+            self._record("Disconnected", previous[key], None)
+
+    def _record(self, event_type, device, mount):
+        self.changes += 1
+        if self.db is not None:
+            details = f"mounted at {mount}" if mount else \
+                f"{device['id']}, {_format_size(device.get('size'))}"
+            self.db.insert_live_event(event_type, device["name"], device["serial"],
+                                      datetime.now().strftime("%Y-%m-%d %H:%M:%S"), details)
+        if self.on_change is not None:
+            try:
+                self.on_change(event_type, device, mount)
+            except Exception as e:
+                print(f"Error in device change callback: {str(e)}")
+
+    def _attach(self, device, mount):
+        if self.monitor is None:
+            return
+        try:
+            self.monitor.attach(mount, device["serial"])
+        except OSError as e:
+            print(f"Error attaching transfer monitor to {mount}: {str(e)}")
+
+    def _detach(self, mount):
+        if self.monitor is not None:
+            self.monitor.detach(mount)
+
+
+class SimulatedDeviceSource:
+    """Devices plugged, mounted and removed by method calls; each call emits a snapshot."""
+
+    def __init__(self):
+        self._devices = {}
+        self._emit = None
+
+    def start(self, emit):
+        self._emit = emit
+        self._changed()
+
+    def stop(self):
+        self._emit = None
+
+    def plug(self, device_id, name="Simulated USB Device", serial=None, size=16 * 1024 ** 3,
+             mounts=()):
+        self._devices[device_id] = {"id": device_id, "name": name, "serial": serial or device_id,
+                                    "size": size, "mounts": tuple(mounts)}
+        self._changed()
+
+    def unplug(self, device_id):
+        self._devices.pop(device_id, None)
+        self._changed()
+
+    def mount(self, device_id, path):
+        device = self._devices[device_id]
+        device["mounts"] = device["mounts"] + (path,)
+        self._changed()
+
+    def unmount(self, device_id, path):
+        device = self._devices[device_id]
+        device["mounts"] = tuple(m for m in device["mounts"] if m != path)
+        self._changed()
+
+    def _changed(self):
+        if self._emit is not None:
+            self._emit([dict(device) for device in self._devices.values()])
+
+
+class WmiDeviceSource:
+    """Removable logical disks from WMI, updated by instance creation/deletion events."""
+
+    QUERY = ("SELECT * FROM __InstanceOperationEvent WITHIN 1 "
+             "WHERE TargetInstance ISA 'Win32_LogicalDisk' AND TargetInstance.DriveType = 2")
+
+    def __init__(self):
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self, emit):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(emit,), name="wmi-devices",
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    @staticmethod
+    def _device(disk):
+        try:
+            size = int(disk.Size)
+        except (TypeError, ValueError):
+            size = 0
+        return {"id": disk.DeviceID, "name": disk.VolumeName or "Removable Disk",
+                "serial": disk.VolumeSerialNumber or disk.DeviceID, "size": size,
+                "mounts": (disk.DeviceID + "\\",)}
+
+    def _run(self, emit):
+        try:
+            import pythoncom
+            pythoncom.CoInitialize()  # WMI from a thread other than the main one
+        except ImportError:
+            pass
+        import wmi
+        try:
+            c = wmi.WMI()
+            watcher = c.watch_for(raw_wql=self.QUERY)
+            devices = {disk.DeviceID: self._device(disk)
+                       for disk in c.Win32_LogicalDisk(DriveType=2)}
+        except wmi.x_wmi as e:
+            print(f"Error subscribing to WMI device events: {str(e)}")
+            return
+        emit(list(devices.values()))
+        while not self._stop.is_set():
+            try:
+                event = watcher(timeout_ms=500)
+            except wmi.x_wmi_timed_out:
+                continue
+            except wmi.x_wmi as e:
+                print(f"Error reading WMI device events: {str(e)}")
+                return
+            if event.event_type == "deletion":
+                devices.pop(event.DeviceID, None)
+            else:
+                devices[event.DeviceID] = self._device(event)
+            emit(list(devices.values()))
+
+
+_MOUNT_ESCAPE = re.compile(r"\\([0-7]{3})")
+
+
+def _read(path, default=""):
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return default
+
+
+def read_mounts(path="/proc/self/mounts"):
+    """Return [(device name, mount point)] from a mounts table."""
+    mounts = []
+    for line in _read(path).splitlines():
+        fields = line.split()
+        if len(fields) < 2:
+            continue
+        device, point = fields[0], _MOUNT_ESCAPE.sub(lambda m: chr(int(m.group(1), 8)), fields[1])
+        mounts.append((os.path.basename(os.path.realpath(device) if device.startswith("/dev/")
+                                        else device), point))
+    return mounts
+
+
+class LinuxDeviceSource:
+    """USB block devices from sysfs, rescanned when udev, /dev or the mount table changes.
+
+    Paths default to the live system; pointing them at a directory tree
+    laid out the same way simulates devices for testing.
+    """
+
+    def __init__(self, sys_block="/sys/block", dev_dir="/dev", mounts="/proc/self/mounts",
+                 settle_delay=DEVICE_SETTLE_DELAY, use_udev=None):
+        self.sys_block = sys_block
+        self.dev_dir = dev_dir
+        self.mounts = mounts
+        self.settle_delay = settle_delay
+        self.use_udev = use_udev
+        self._changed = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+        self._observers = []
+
+    def scan(self):
+        """Return the connected USB/removable block devices with their mount points."""
+        mount_table = read_mounts(self.mounts)
+        devices = []
+        try:
+            names = sorted(os.listdir(self.sys_block))
+        except OSError:
+            return devices
+        for name in names:
+            base = os.path.join(self.sys_block, name)
+            if _read(os.path.join(base, "removable")) != "1" and \
+                    "/usb" not in os.path.realpath(base):
+                continue
+            nodes = {name} | {entry for entry in os.listdir(base) if entry.startswith(name)}
+            device_dir = os.path.join(base, "device")
+            label = " ".join(part for part in (_read(os.path.join(device_dir, "vendor")),
+                                               _read(os.path.join(device_dir, "model"))) if part)
+            devices.append({
+                "id": name,
+                "name": label or name,
+                "serial": self._usb_serial(device_dir) or name,
+                "size": int(_read(os.path.join(base, "size"), "0") or 0) * 512,
+                "mounts": tuple(sorted(point for node, point in mount_table if node in nodes)),
+            })
+        return devices
+
+    @staticmethod
+    def _usb_serial(device_dir):
+        # The iSerialNumber lives on the USB device, a few levels above the SCSI device
+        path = os.path.realpath(device_dir)
+        for _ in range(6):
+            serial = _read(os.path.join(path, "serial"))
+            if serial:
+                return serial
+            path = os.path.dirname(path)
+        return None
+
+    def start(self, emit):
+        self._stop.clear()
+        self._start_triggers()
+        thread = threading.Thread(target=self._run, args=(emit,), name="linux-devices",
+                                  daemon=True)
+        self._threads.append(thread)
+        thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._changed.set()
+        for observer in self._observers:
+            observer.stop()
+            observer.join()
+        for thread in self._threads:
+            thread.join()
+        self._threads, self._observers = [], []
+
+    def _start_triggers(self):
+        use_udev = self.use_udev
+        if use_udev is None:
+            use_udev = self.dev_dir == "/dev" and importlib.util.find_spec("pyudev") is not None
+        if use_udev:
+            import pyudev
+            monitor = pyudev.Monitor.from_netlink(pyudev.Context())
+            monitor.filter_by("block")
+            observer = pyudev.MonitorObserver(monitor, callback=lambda device: self._changed.set())
+            observer.start()
+            self._observers.append(observer)
+        else:
+            self._watch_directory(self.dev_dir)
+
+        if os.path.realpath(self.mounts).startswith("/proc/"):
+            thread = threading.Thread(target=self._watch_mount_table, name="mount-table",
+                                      daemon=True)
+            self._threads.append(thread)
+            thread.start()
+        else:
+            # A simulated mount table is a plain file, which POLLPRI never signals
+            self._watch_directory(os.path.dirname(os.path.abspath(self.mounts)))
+
+    def _watch_directory(self, path):
+        from watchdog.observers import Observer
+        from watchdog.events import FileSystemEventHandler
+
+        source = self
+
+        class Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                source._changed.set()
+
+        observer = Observer()
+        observer.schedule(Handler(), path, recursive=False)
+        observer.start()
+        self._observers.append(observer)
+
+    def _watch_mount_table(self):
+        # The kernel flags /proc/self/mounts with POLLPRI whenever the table changes
+        with open(self.mounts) as f:
+            poller = select.poll()
+            poller.register(f.fileno(), select.POLLPRI | select.POLLERR)
+            while not self._stop.is_set():
+                if poller.poll(500):
+                    f.seek(0)
+                    f.read()
+                    self._changed.set()
+
+    def _run(self, emit):
+        emit(self.scan())
+        while True:
+            self._changed.wait()
+            if self._stop.is_set():
+                return
+            # A plugged stick fires a burst (disk, partitions, automount); wait for quiet
+            self._changed.clear()
+            while not self._stop.wait(self.settle_delay) and self._changed.is_set():
+                self._changed.clear()
+            if self._stop.is_set():
+                return
+            emit(self.scan())
+
+
+def get_device_source():
+    """The push-based device source for this platform."""
+    if os.name == "nt":
+        return WmiDeviceSource()
+    return LinuxDeviceSource()
@@ -0,0 +1,175 @@
+# event_coalescer.py
+
+import os
+import stat
+import queue
+import threading
+import time
+from datetime import datetime
+
+from hash_utils import hash_file, with_analysers
+from content_analysis import take_results
+from config import (FILE_HASH_ALGORITHMS, CONTENT_ANALYSERS, COALESCE_QUIET_WINDOW,
+                    COALESCE_MAX_PENDING)
+
+
+class _PendingFile:
+    __slots__ = ("event_type", "src_path", "events", "last_event", "stat")
+
+    def __init__(self, event_type, src_path, now):
+        self.event_type = event_type
+        self.src_path = src_path
+        self.events = 0
+        self.last_event = now
+        self.stat = None
+
+
+class EventCoalescer:
+    """Merge bursts of watchdog events per path into one logical event.
+
+    A copy onto a stick fires a created event followed by dozens of modified
+    events. Events are buffered per path until none has arrived for
+    quiet_window seconds and the file's size and mtime are unchanged between
+    two checks; the file is then hashed once and callback receives a single
+    event dict ("Transfer Completed", "Deleted" or "Moved") with size and
+    digests. Files created and deleted inside one window are dropped as
+    transient.
+
+    Raw events go through a bounded queue. When it is full, submit() blocks
+    for up to backpressure_timeout seconds (slowing the observer thread) and
+    then drops the event, counting it in stats["dropped"].
+    """
+
+    def __init__(self, callback, quiet_window=COALESCE_QUIET_WINDOW,
+                 max_pending=COALESCE_MAX_PENDING, algorithms=FILE_HASH_ALGORITHMS,
+                 backpressure_timeout=0.5, analysers=CONTENT_ANALYSERS):
+        self.callback = callback
+        self.quiet_window = quiet_window
+        self.algorithms = with_analysers(algorithms, analysers)
+        self.backpressure_timeout = backpressure_timeout
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._pending = {}
+        self._stop = threading.Event()
+        self._thread = None
+        self.stats = {"received": 0, "merged": 0, "dropped": 0, "transient": 0, "emitted": 0}
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="event-coalescer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the worker after emitting whatever is still pending."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def submit(self, event_type, path, dest_path=None):
+        """Queue a raw event; safe to call from watchdog's observer thread."""
+        self.stats["received"] += 1
+        try:
+            self._queue.put((event_type.capitalize(), path, dest_path, time.monotonic()),
+                            timeout=self.backpressure_timeout)
+        except queue.Full:
+            self.stats["dropped"] += 1
+
+    def queue_depth(self):
+        return self._queue.qsize() + len(self._pending)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._drain(timeout=self.quiet_window / 4)
+            self._emit_settled(time.monotonic())
+        self._drain(timeout=0)
+        self._emit_settled(None)
+
+    def _drain(self, timeout):
+        try:
+            item = self._queue.get(timeout=timeout) if timeout else self._queue.get_nowait()
+        except queue.Empty:
+            return
+        while True:
+            self._merge(*item)
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return
+
+    def _merge(self, event_type, path, dest_path, now):
+        if event_type == "Moved" and dest_path:
+            moved = self._pending.pop(path, None)
+            entry = _PendingFile("Moved", path, now)
+            if moved is not None and moved.event_type == "Created":
+                entry.event_type, entry.src_path = "Created", None
+            path = dest_path
+        else:
+            entry = self._pending.get(path)
+            if entry is None:
+                entry = _PendingFile(event_type, None, now)
+            else:
+                self.stats["merged"] += 1
+                if event_type == "Deleted":
+                    entry.event_type = "Transient" if entry.event_type == "Created" else "Deleted"
+                elif entry.event_type in ("Deleted", "Transient"):
+                    entry.event_type = "Created"
+        entry.events += 1
+        entry.last_event = now
+        entry.stat = None
+        self._pending[path] = entry
+
+    def _emit_settled(self, now):
+        """Emit every quiet, stable path; now=None flushes everything."""
+        for path in list(self._pending):
+            entry = self._pending[path]
+            if now is not None and now - entry.last_event < self.quiet_window:
+                continue
+            if entry.event_type == "Transient":
+                del self._pending[path]
+                self.stats["transient"] += 1
+                continue
+            if entry.event_type == "Deleted":
+                del self._pending[path]
+                self._emit(entry, path, None, None)
+                continue
+            try:
+                st = os.stat(path)
+            except OSError:
+                # Vanished without a delete event reaching us yet
+                del self._pending[path]
+                self.stats["transient"] += 1
+                continue
+            if stat.S_ISDIR(st.st_mode):
+                del self._pending[path]
+                continue
+            current = (st.st_size, st.st_mtime_ns)
+            if now is not None and entry.stat != current:
+                entry.stat = current
+                entry.last_event = now
+                continue
+            del self._pending[path]
+            try:
+                size, hashes = hash_file(path, self.algorithms)
+            except OSError:
+                size, hashes = st.st_size, None
+            self._emit(entry, path, size, hashes)
+
+    def _emit(self, entry, path, size, hashes):
+        event_type = "Transfer Completed" if entry.event_type in ("Created", "Modified") \
+            else entry.event_type
+        self.stats["emitted"] += 1
+        event = {
+            "event_type": event_type,
+            "file_path": path,
+            "src_path": entry.src_path,
+            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "file_size": size,
+            "hashes": hashes,
+            "merged_events": entry.events,
+        }
+        if hashes:
+            event.update(take_results(hashes))  # file_type and entropy
+        try:
+            self.callback(event)
+        except Exception as e:
+            print(f"Error in coalesced event callback: {str(e)}")
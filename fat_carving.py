@@ -0,0 +1,702 @@
+# fat_carving.py
+"""Recovery of deleted files from FAT32 and exFAT images.
+
+The image is memory-mapped; nothing is read until it is needed, and then
+only the pages that hold it. Two sources of candidates:
+
+- deleted directory entries: every directory reachable from the root
+  (deleted ones included) is parsed, and each deleted file is mapped back
+  to the clusters it most likely occupied. FAT32 zeroes a deleted file's
+  FAT chain, so its clusters are the free ones following the first; exFAT
+  usually keeps a contiguous file's layout in the entry itself.
+- file signatures: FAT allocates files on cluster boundaries, so only the
+  start of each free cluster is matched against the content_analysis
+  signatures (one dictionary lookup per cluster, not a per-byte search).
+  The end of a hit comes from its format: a footer found with mmap.find,
+  or a length in its header.
+
+Each candidate is a CarvedFile whose data is read lazily, in chunks, when
+it is hashed or saved. Only image files (not raw devices) can be mapped.
+"""
+
+import mmap
+import os
+import struct
+import sys
+from array import array
+from datetime import datetime
+
+from config import (FILE_HASH_ALGORITHMS, CONTENT_ANALYSERS, HASH_CHUNK_SIZE, CARVE_SIGNATURES,
+                    CARVE_MAX_SIZE)
+from content_analysis import SIGNATURES, identify, annotate
+from hash_utils import (ScanProgress, ScanCancelled, hash_stream, format_hash_record,
+                        with_analysers)
+
+FAT32_END = 0x0FFFFFF8
+FAT32_MASK = 0x0FFFFFFF
+EXFAT_END = 0xFFFFFFF7  # bad cluster; anything above ends the chain
+DELETED = 0xE5
+ATTR_DIRECTORY = 0x10
+ATTR_VOLUME = 0x08
+ATTR_LONG_NAME = 0x0F
+
+_EXTENSIONS = {name: extensions[0] for name, _, extensions in SIGNATURES if extensions}
+
+
+class CarveError(Exception):
+    pass
+
+
+def _fat_datetime(date, time_of_day):
+    """FAT/exFAT packed date and time as "YYYY-MM-DD HH:MM:SS", or None."""
+    if not date:
+        return None
+    try:
+        return datetime(1980 + (date >> 9), (date >> 5) & 15, date & 31, time_of_day >> 11,
+                        (time_of_day >> 5) & 63, (time_of_day & 31) * 2).strftime(
+            "%Y-%m-%d %H:%M:%S")
+    except ValueError:
+        return None
+
+
+def _runs(clusters):
+    """[(first cluster, count)] of a cluster list."""
+    runs = []
+    for cluster in clusters:
+        if runs and runs[-1][0] + runs[-1][1] == cluster:
+            runs[-1] = (runs[-1][0], runs[-1][1] + 1)
+        else:
+            runs.append((cluster, 1))
+    return runs
+
+
+def runs_text(runs):
+    """Cluster runs as text, e.g. "2-5,9"."""
+    return ",".join(f"{first}-{first + count - 1}" if count > 1 else str(first)
+                    for first, count in runs)
+
+
+def _short_name_checksum(name):
+    checksum = 0
+    for byte in name:
+        checksum = (((checksum & 1) << 7) + (checksum >> 1) + byte) & 0xFF
+    return checksum
+
+
+def _short_name(name, flags):
+    base, extension = name[:8].rstrip(b" "), name[8:].rstrip(b" ")
+    base, extension = base.decode("cp437"), extension.decode("cp437")
+    if flags & 0x08:
+        base = base.lower()
+    if flags & 0x10:
+        extension = extension.lower()
+    return base + "." + extension if extension else base
+
+
+def _long_name(parts, name, deleted):
+    """The long name spread over LFN entries (in disk order), or None if they don't belong to name.
+
+    A deleted entry has lost the first byte of its short name; the byte that
+    makes the LFN checksum match is restored into name (a bytearray).
+    """
+    if not parts or len({checksum for checksum, _ in parts}) != 1:
+        return None
+    checksum = parts[0][0]
+    if deleted:
+        for byte in range(0x20, 0x100):
+            name[0] = byte
+            if _short_name_checksum(name) == checksum:
+                break
+        else:
+            name[0] = ord("_")
+            return None
+    elif _short_name_checksum(name) != checksum:
+        return None
+    text = b"".join(chars for _, chars in reversed(parts)).decode("utf-16-le", "replace")
+    return text.split("\x00", 1)[0] or None
+
+
+def _exfat_checksum(entries):
+    checksum = 0
+    for i, byte in enumerate(entries):
+        if i != 2 and i != 3:
+            checksum = ((checksum >> 1) | ((checksum & 1) << 15)) + byte & 0xFFFF
+    return checksum
+
+
+# -- where a signature hit ends ------------------------------------------------
+# Each returns the file's length from its start, or None if the end isn't found
+# before limit. data is the image map.
+
+def _footer_size(footer):
+    def size(data, start, limit):
+        end = data.find(footer, start, limit)
+        return end + len(footer) - start if end >= 0 else None
+    return size
+
+
+def _jpeg_size(data, start, limit):
+    # Skip the header segments (an EXIF thumbnail has an end marker of its own);
+    # after start-of-scan, FF D9 can only be the end of the image
+    pos = start + 2
+    while pos + 4 <= limit and data[pos] == 0xFF:
+        marker = data[pos + 1]
+        if marker == 0xDA:
+            end = data.find(b"\xff\xd9", pos, limit)
+            return end + 2 - start if end >= 0 else None
+        if marker == 0xFF:
+            pos += 1
+        elif 0xD0 <= marker <= 0xD7 or marker == 0x01:
+            pos += 2
+        else:
+            pos += 2 + struct.unpack_from(">H", data, pos + 2)[0]
+    return None
+
+
+def _zip_size(data, start, limit):
+    end = data.find(b"PK\x05\x06", start, limit)
+    if end < 0 or end + 22 > limit:
+        return None
+    return end + 22 + struct.unpack_from("<H", data, end + 20)[0] - start
+
+
+def _riff_size(data, start, limit):
+    return struct.unpack_from("<I", data, start + 4)[0] + 8
+
+
+def _sqlite_size(data, start, limit):
+    page_size, = struct.unpack_from(">H", data, start + 16)
+    pages, = struct.unpack_from(">I", data, start + 28)
+    return (65536 if page_size == 1 else page_size) * pages or None
+
+
+def _mp4_size(data, start, limit):
+    # A run of top-level boxes: 32-bit size (1: 64-bit size follows), 4-letter type
+    pos = start
+    while pos + 8 <= limit:
+        size, kind = struct.unpack_from(">I4s", data, pos)
+        if not kind.isalnum() and kind != b"uuid":
+            break
+        if size == 1:
+            size, = struct.unpack_from(">Q", data, pos + 8)
+        if size < 8:
+            break
+        pos += size
+    return pos - start if pos > start else None
+
+
+def _exe_size(data, start, limit):
+    # Headers plus the last section's raw data (an appended overlay is not included)
+    if start + 0x40 > limit:
+        return None
+    pe = start + struct.unpack_from("<I", data, start + 0x3C)[0]
+    if pe + 24 > limit or data[pe:pe + 4] != b"PE\x00\x00":
+        return None
+    sections, optional = struct.unpack_from("<H", data, pe + 6)[0], \
+        struct.unpack_from("<H", data, pe + 20)[0]
+    table = pe + 24 + optional
+    if not 0 < sections <= 96 or table + 40 * sections > limit:
+        return None
+    end = table + 40 * sections - start
+    for i in range(sections):
+        raw_size, raw_offset = struct.unpack_from("<II", data, table + 40 * i + 16)
+        end = max(end, raw_offset + raw_size)
+    return end
+
+
+CARVED_SIZE = {
+    "jpeg": _jpeg_size,
+    "png": _footer_size(b"IEND\xaeB`\x82"),
+    "gif": _footer_size(b"\x00;"),
+    "pdf": _footer_size(b"%%EOF"),
+    "zip": _zip_size,
+    "exe": _exe_size,
+    "sqlite": _sqlite_size,
+    "webp": _riff_size,
+    "wav": _riff_size,
+    "avi": _riff_size,
+    "mp4": _mp4_size,
+}
+
+
+class CarvedFile:
+    """A file found in a FatVolume: where it was and, read lazily, what it held."""
+
+    def __init__(self, volume, method, path, size, runs, file_type=None, status="recovered",
+                 modified=None):
+        self.volume = volume
+        self.method = method      # "deleted entry" or "signature"
+        self.path = path          # path in the volume, or a made-up one for signature hits
+        self.size = size          # bytes the file held (from its entry or its format)
+        self.runs = runs          # [(first cluster, count)] it was recovered from
+        self.file_type = file_type
+        self.status = status
+        self.modified = modified
+
+    @property
+    def offset(self):
+        """Byte offset of the file's first byte in the image, or None if nothing is left of it."""
+        return self.volume.cluster_offset(self.runs[0][0]) if self.runs else None
+
+    def recovered_size(self):
+        return min(self.size, sum(count for _, count in self.runs) * self.volume.cluster_size)
+
+    def extents(self):
+        """(image offset, length) of each run, cut to the file's size."""
+        remaining = self.recovered_size()
+        for first, count in self.runs:
+            length = min(remaining, count * self.volume.cluster_size)
+            if length <= 0:
+                break
+            yield self.volume.cluster_offset(first), length
+            remaining -= length
+
+    def chunks(self, chunk_size=HASH_CHUNK_SIZE):
+        for offset, length in self.extents():
+            for start in range(offset, offset + length, chunk_size):
+                yield self.volume.read(start, min(chunk_size, offset + length - start))
+
+    def read(self):
+        return b"".join(self.chunks())
+
+    def provenance(self):
+        return {"image": self.volume.path, "partition_offset": self.volume.partition_offset,
+                "filesystem": self.volume.kind, "method": self.method, "offset": self.offset,
+                "clusters": runs_text(self.runs) or None, "status": self.status,
+                "modified": self.modified, "file_type": self.file_type,
+                "original_size": self.size}
+
+
+class FatVolume:
+    """A memory-mapped FAT32 or exFAT image, or a disk image holding one.
+
+    Usage:
+        with FatVolume("stick.dd") as volume:
+            for carved in volume.carve():
+                ...
+    """
+
+    def __init__(self, path, partition_offset=None):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise CarveError(f"{path} is empty")
+        self.size = len(self._map)
+        self._fat = self._bitmap = None
+        try:
+            self.partition_offset = partition_offset if partition_offset is not None \
+                else self._find_partition()
+            self.kind = self._boot_kind(self.partition_offset)
+            if self.kind == "fat32":
+                self._open_fat32()
+            elif self.kind == "exfat":
+                self._open_exfat()
+            else:
+                raise CarveError(f"no FAT32 or exFAT boot sector at offset {self.partition_offset}")
+        except (CarveError, struct.error, IndexError) as e:
+            self.close()
+            raise e if isinstance(e, CarveError) else CarveError(f"{path}: bad boot sector")
+
+    def close(self):
+        if isinstance(self._fat, memoryview):
+            self._fat.release()
+        self._fat = None
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def read(self, offset, length):
+        return self._map[offset:offset + length]
+
+    # -- layout -----------------------------------------------------------
+
+    def _boot_kind(self, offset):
+        if self._map[offset + 3:offset + 11] == b"EXFAT   ":
+            return "exfat"
+        if self._map[offset + 82:offset + 90] == b"FAT32   " and \
+                self._map[offset + 510:offset + 512] == b"\x55\xaa":
+            return "fat32"
+        return None
+
+    def _find_partition(self):
+        """Offset of the first FAT32/exFAT partition: the image itself, or from its MBR or GPT."""
+        if self._boot_kind(0):
+            return 0
+        starts = []
+        if self._map[510:512] == b"\x55\xaa":
+            for i in range(4):
+                kind, = struct.unpack_from("<B", self._map, 0x1BE + 16 * i + 4)
+                lba, = struct.unpack_from("<I", self._map, 0x1BE + 16 * i + 8)
+                if kind == 0xEE and self._map[512:520] == b"EFI PART":
+                    table, count, size = struct.unpack_from("<QII", self._map, 512 + 72)
+                    for j in range(min(count, 128)):
+                        first, = struct.unpack_from("<Q", self._map, table * 512 + j * size + 32)
+                        starts.append(first * 512)
+                elif kind and lba:
+                    starts.append(lba * 512)
+        for start in starts:
+            if 0 < start < self.size - 512 and self._boot_kind(start):
+                return start
+        raise CarveError(f"{self.path}: no FAT32 or exFAT volume found")
+
+    def _map_fat(self, offset, entries):
+        end = offset + 4 * entries
+        if end > self.size:
+            raise CarveError(f"{self.path}: the FAT runs past the end of the image")
+        if sys.byteorder == "little":
+            return memoryview(self._map)[offset:end].cast("I")
+        fat = array("I", self._map[offset:end])
+        fat.byteswap()
+        return fat
+
+    def _open_fat32(self):
+        base = self.partition_offset
+        sector, per_cluster, reserved, fats = struct.unpack_from("<HBHB", self._map, base + 11)
+        small_total, = struct.unpack_from("<H", self._map, base + 19)
+        total, fat_sectors, _, _, self.root_cluster = struct.unpack_from("<IIHHI", self._map,
+                                                                         base + 32)
+        total = total or small_total
+        if not sector or not per_cluster or not fat_sectors:
+            raise CarveError(f"{self.path}: bad FAT32 boot sector")
+        self.cluster_size = sector * per_cluster
+        fat_offset = base + reserved * sector
+        self.data_start = fat_offset + fats * fat_sectors * sector
+        self.cluster_count = min((total - reserved - fats * fat_sectors) // per_cluster,
+                                 fat_sectors * sector // 4 - 2)
+        self._fat = self._map_fat(fat_offset, self.cluster_count + 2)
+
+    def _open_exfat(self):
+        base = self.partition_offset
+        fat_offset, fat_length, heap, self.cluster_count, self.root_cluster = \
+            struct.unpack_from("<IIIII", self._map, base + 0x50)
+        sector_shift, cluster_shift = struct.unpack_from("<BB", self._map, base + 0x6C)
+        sector = 1 << sector_shift
+        self.cluster_size = sector << cluster_shift
+        self.data_start = base + heap * sector
+        self._fat = self._map_fat(base + fat_offset * sector,
+                                  min(self.cluster_count + 2, fat_length * sector // 4))
+        root = self._read_runs(_runs(self.chain(self.root_cluster)))
+        for pos in range(0, len(root) - 31, 32):
+            if root[pos] == 0x81:  # allocation bitmap
+                first, length = struct.unpack_from("<IQ", root, pos + 20)
+                self._bitmap = self.read(self.cluster_offset(first), length)
+                break
+        else:
+            raise CarveError(f"{self.path}: exFAT allocation bitmap not found")
+
+    def cluster_offset(self, cluster):
+        return self.data_start + (cluster - 2) * self.cluster_size
+
+    def valid_cluster(self, cluster):
+        return 2 <= cluster < self.cluster_count + 2
+
+    def allocated(self, cluster):
+        if self._bitmap is not None:
+            return self._bitmap[(cluster - 2) >> 3] >> ((cluster - 2) & 7) & 1
+        return self._fat[cluster] & FAT32_MASK != 0
+
+    def chain(self, first):
+        """Clusters of a FAT chain from first; stops at a free, bad or looping entry."""
+        clusters = []
+        cluster = first
+        end = FAT32_END if self.kind == "fat32" else EXFAT_END
+        while self.valid_cluster(cluster) and len(clusters) <= self.cluster_count:
+            clusters.append(cluster)
+            following = self._fat[cluster]
+            if self.kind == "fat32":
+                following &= FAT32_MASK
+            if not following or following >= end:
+                break
+            cluster = following
+        return clusters
+
+    def free_runs(self):
+        """Yield (first cluster, count) of every run of unallocated clusters."""
+        first = None
+        end = self.cluster_count + 2
+        if self._bitmap is not None:
+            bitmap = self._bitmap
+            for index in range(min(len(bitmap), (self.cluster_count + 7) // 8)):
+                byte = bitmap[index]
+                cluster = 2 + index * 8
+                if byte == 0:
+                    if first is None:
+                        first = cluster
+                    continue
+                for bit in range(8):
+                    if byte >> bit & 1:
+                        if first is not None:
+                            yield first, cluster + bit - first
+                            first = None
+                    elif first is None:
+                        first = cluster + bit
+        else:
+            for cluster, value in enumerate(self._fat[2:end], 2):
+                if value & FAT32_MASK:
+                    if first is not None:
+                        yield first, cluster - first
+                        first = None
+                elif first is None:
+                    first = cluster
+        if first is not None and first < end:
+            yield first, end - first
+
+    def _read_runs(self, runs, limit=64 * 1024 * 1024):
+        data = []
+        for first, count in runs:
+            data.append(self.read(self.cluster_offset(first), count * self.cluster_size))
+            limit -= count * self.cluster_size
+            if limit <= 0:
+                break
+        return b"".join(data)
+
+    # -- directory entries ------------------------------------------------
+
+    def _fat32_entries(self, data):
+        """Yield (name, is_dir, deleted, first cluster, size, modified, contiguous) per entry."""
+        parts = []
+        for pos in range(0, len(data) - 31, 32):
+            status = data[pos]
+            if status == 0:
+                break  # never used past here
+            attributes = data[pos + 11]
+            if attributes & 0x3F == ATTR_LONG_NAME:
+                parts.append((data[pos + 13], data[pos + 1:pos + 11] + data[pos + 14:pos + 26]
+                              + data[pos + 28:pos + 32]))
+                continue
+            lfn, parts = parts, []
+            if attributes & ATTR_VOLUME or status == 0x2E:
+                continue
+            deleted = status == DELETED
+            name = bytearray(data[pos:pos + 11])
+            if name[0] == 0x05:
+                name[0] = DELETED  # a real 0xE5 first character
+            long_name = _long_name(lfn, name, deleted)
+            if deleted and long_name is None and name[0] == DELETED:
+                name[0] = ord("_")
+            high, time_of_day, date, low, size = struct.unpack_from("<HHHHI", data, pos + 20)
+            yield (long_name or _short_name(bytes(name), data[pos + 12]),
+                   bool(attributes & ATTR_DIRECTORY), deleted, high << 16 | low, size,
+                   _fat_datetime(date, time_of_day), False)
+
+    def _exfat_entries(self, data):
+        """Yield the same tuples as _fat32_entries from exFAT file directory entry sets."""
+        pos = 0
+        while pos + 32 <= len(data):
+            kind = data[pos]
+            if kind == 0:
+                break
+            if kind & 0x7F != 0x05:
+                pos += 32
+                continue
+            count = data[pos + 1]
+            entries = bytearray(data[pos:pos + 32 * (count + 1)])
+            if count < 2 or len(entries) < 32 * (count + 1) or entries[32] & 0x7F != 0x40:
+                pos += 32
+                continue
+            for i in range(0, len(entries), 32):
+                entries[i] |= 0x80  # checksums cover the in-use bits
+            if _exfat_checksum(entries) != struct.unpack_from("<H", entries, 2)[0]:
+                pos += 32  # overwritten or not an entry set
+                continue
+            attributes, = struct.unpack_from("<H", entries, 4)
+            modified, = struct.unpack_from("<I", entries, 12)
+            flags, name_length = entries[33], entries[35]
+            first, size = struct.unpack_from("<IQ", entries, 32 + 20)
+            name = b"".join(entries[i + 2:i + 32] for i in range(64, len(entries), 32)
+                            if entries[i] == 0xC1)
+            yield (name[:2 * name_length].decode("utf-16-le", "replace"),
+                   bool(attributes & ATTR_DIRECTORY), not kind & 0x80, first, size,
+                   _fat_datetime(modified >> 16, modified & 0xFFFF), bool(flags & 0x02))
+            pos += len(entries)
+
+    def _directory_runs(self, first, size, deleted, contiguous):
+        if not self.valid_cluster(first):
+            return []
+        if deleted:
+            if self.allocated(first):
+                return []  # reused since
+            count = -(-size // self.cluster_size) if contiguous and size else 1
+            return [(first, min(count, self.cluster_count + 2 - first))]
+        if contiguous:
+            return [(first, max(1, -(-size // self.cluster_size)))]
+        return _runs(self.chain(first))
+
+    def _deleted_file(self, path, first, size, modified, contiguous):
+        if not self.valid_cluster(first):
+            return CarvedFile(self, "deleted entry", path, size, [], status="no first cluster",
+                              modified=modified)
+        if self.allocated(first):
+            return CarvedFile(self, "deleted entry", path, size, [],
+                              status="first cluster reallocated", modified=modified)
+        needed = -(-size // self.cluster_size)
+        end = self.cluster_count + 2
+        if contiguous:
+            # exFAT recorded the file as one run; any part reused since is lost
+            count = min(needed, end - first)
+            reused = sum(1 for c in range(first, first + count) if self.allocated(c))
+            status = f"contiguous, {reused} clusters reallocated" if reused else "contiguous"
+            return CarvedFile(self, "deleted entry", path, size, [(first, count)],
+                              status=status if count == needed else status + ", truncated",
+                              modified=modified)
+        if self.kind == "exfat":
+            clusters = self.chain(first)
+            if len(clusters) == needed and not any(self.allocated(c) for c in clusters):
+                return CarvedFile(self, "deleted entry", path, size, _runs(clusters),
+                                  status="FAT chain", modified=modified)
+        # The FAT chain is gone: take the free clusters that follow the first
+        clusters = []
+        cluster = first
+        while len(clusters) < needed and cluster < end:
+            if not self.allocated(cluster):
+                clusters.append(cluster)
+            cluster += 1
+        status = "free clusters from the first"
+        if len(clusters) < needed:
+            status += ", truncated"
+        return CarvedFile(self, "deleted entry", path, size, _runs(clusters), status=status,
+                          modified=modified)
+
+    def deleted_files(self):
+        """Yield a CarvedFile for every deleted file entry, in live and deleted directories."""
+        entries = self._fat32_entries if self.kind == "fat32" else self._exfat_entries
+        stack = [(_runs(self.chain(self.root_cluster)), "", False)]
+        seen = set()
+        while stack:
+            runs, path, in_deleted = stack.pop()
+            if not runs or runs[0][0] in seen:
+                continue
+            seen.add(runs[0][0])
+            data = self._read_runs(runs)
+            if in_deleted and self.kind == "fat32" and data[:2] != b". ":
+                continue  # the cluster no longer holds the directory
+            for name, is_dir, deleted, first, size, modified, contiguous in entries(data):
+                deleted = deleted or in_deleted
+                full = f"{path}/{name}"
+                if is_dir:
+                    stack.append((self._directory_runs(first, size, deleted, contiguous), full,
+                                  deleted))
+                elif deleted and size:
+                    yield self._deleted_file(full, first, size, modified, contiguous)
+
+    # -- signatures -------------------------------------------------------
+
+    def signature_hits(self, types=CARVE_SIGNATURES, claimed=None, max_size=CARVE_MAX_SIZE):
+        """Yield a CarvedFile for every free cluster starting a file of one of types.
+
+        claimed is a bytearray with a non-zero byte per cluster already
+        accounted for (e.g. by deleted entries); hits never extend into one.
+        """
+        types = [name for name in types if name in CARVED_SIZE]
+        # Only as many bytes as the signatures of these types look at
+        head = max((offset + len(magic) for name, signatures, _ in SIGNATURES if name in types
+                    for signature in signatures for offset, magic in signature), default=0)
+        claimed = claimed if claimed is not None else bytearray(self.cluster_count + 2)
+        cluster_size = self.cluster_size
+        base = self.data_start - 2 * cluster_size
+        for first, count in self.free_runs():
+            cluster, end = first, first + count
+            while cluster < end:
+                if claimed[cluster]:
+                    cluster += 1
+                    continue
+                offset = base + cluster * cluster_size
+                file_type = identify(self._map[offset:offset + head])
+                if file_type not in types:
+                    cluster += 1
+                    continue
+                stop = claimed.find(1, cluster, end)
+                limit = min(offset + max_size, self.cluster_offset(stop if stop >= 0 else end),
+                            self.size)
+                try:
+                    size = CARVED_SIZE[file_type](self._map, offset, limit)
+                except (struct.error, IndexError):
+                    size = None
+                if not size or size < 0:
+                    cluster += 1  # a header without a recognisable end is not carved
+                    continue
+                status = "recovered"
+                if offset + size > limit:
+                    status = "truncated at the end of the free run"
+                clusters = -(-min(size, limit - offset) // cluster_size)
+                yield CarvedFile(self, "signature", f"/$Carved/{offset:012X}."
+                                 f"{_EXTENSIONS.get(file_type, file_type)}", size,
+                                 [(cluster, clusters)], file_type, status)
+                cluster += clusters
+
+    def carve(self, signatures=True):
+        """Yield deleted entries first, then signature hits in the clusters they left free."""
+        claimed = bytearray(self.cluster_count + 2)
+        for carved in self.deleted_files():
+            for first, count in carved.runs:
+                claimed[first:first + count] = b"\x01" * count
+            yield carved
+        if signatures:
+            yield from self.signature_hits(claimed=claimed)
+
+
+def carve_image(image_path, algorithms=FILE_HASH_ALGORITHMS, signatures=True, partition_offset=None,
+                output_dir=None, db=None, progress=None, known=None, analysers=CONTENT_ANALYSERS):
+    """Recover deleted files from a FAT32/exFAT image and hash each one as it is read.
+
+    Returns hash records ({"path", "size", "hashes", "carved": provenance})
+    in the order they were found. Files are streamed through the hashing
+    path straight from the map; with output_dir each is also written there,
+    in the same pass. With a DatabaseManager as db the records go to
+    carved_files.
+    """
+    progress = progress or ScanProgress()
+    algorithms = with_analysers(algorithms, analysers)
+    records = []
+    with FatVolume(image_path, partition_offset) as volume:
+        progress.plan(0, volume.size)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        for carved in volume.carve(signatures):
+            if progress.cancelled():
+                raise ScanCancelled(f"carving cancelled after {len(records)} files")
+            record = {"path": carved.path, "size": carved.recovered_size(), "hashes": {},
+                      "carved": carved.provenance()}
+            if carved.runs:
+                chunks = carved.chunks()
+                if output_dir:
+                    chunks = _saving(chunks, os.path.join(
+                        output_dir, f"{carved.offset:012X}_{os.path.basename(carved.path)}"))
+                record["size"], record["hashes"] = hash_stream(chunks, algorithms,
+                                                               carved.recovered_size())
+            annotate(record)
+            if known is not None:
+                known.annotate(record)
+            records.append(record)
+            progress.advance(record)
+    if db is not None:
+        db.insert_carved_files(image_path, volume.partition_offset, records)
+    return records
+
+
+def _saving(chunks, path):
+    with open(path, "wb") as f:
+        for chunk in chunks:
+            f.write(chunk)
+            yield chunk
+
+
+def format_carved_record(record):
+    carved = record["carved"]
+    lines = [record["path"]] + format_hash_record(record).splitlines()[1:]
+    if carved["offset"] is not None:
+        lines.append(f"Offset: {carved['offset']} (0x{carved['offset']:X}), "
+                     f"clusters {carved['clusters']}")
+    lines.append(f"Recovered: {carved['method']}, {carved['status']}"
+                 + (f", modified {carved['modified']}" if carved.get("modified") else ""))
+    return "\n".join(lines) + "\n"
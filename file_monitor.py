@@ -1,35 +1,48 @@
 # file_monitor.py
 
 import time
-import os
-from watchdog.observers import Observer
-from watchdog.events import FileSystemEventHandler
+from datetime import datetime
+from monitoring_service import get_monitoring_service, TransferLogSink, DatabaseSink
+from database import get_db_manager
+from device_watcher import DeviceWatcher, get_device_source
+from transfer_log import get_transfer_log
 
-class FileTransferHandler(FileSystemEventHandler):
-    def on_created(self, event):
-        if not event.is_directory:
-            log_transfer("Created", event.src_path)
+def log_transfer(action, path, size=None, hashes=None):
+    get_transfer_log().write({"event_type": action, "file_path": path, "file_size": size,
+                              "hashes": hashes,
+                              "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")})
 
-    def on_modified(self, event):
-        if not event.is_directory:
-            log_transfer("Modified", event.src_path)
-
-    def on_deleted(self, event):
-        if not event.is_directory:
-            log_transfer("Deleted", event.src_path)
+def monitor_volume(path, serial=None, db=None):
+    """Log and record file transfers on a mounted volume until interrupted."""
+    service = get_monitoring_service()
+    sink = service.add_sink_once(TransferLogSink, TransferLogSink)
+    # Feeds the GUI transfer view
+    service.add_sink_once(DatabaseSink, lambda: DatabaseSink(db or get_db_manager()))
+    service.attach(path, serial)
+    service.start()
+    try:
+        while True:
+            time.sleep(10)
+    except KeyboardInterrupt:
+        service.stop()
+    sink.close()
 
-def log_transfer(action, path):
-    with open("database/file_transfers.log", "a") as log:
-        log.write(f"[{time.ctime()}] {action}: {path}\n")
+def monitor_usb_drive(drive_letter, serial=None):
+    monitor_volume(drive_letter + ":\\", serial)
 
-def monitor_usb_drive(drive_letter):
-    observer = Observer()
-    handler = FileTransferHandler()
-    observer.schedule(handler, drive_letter + ":\\", recursive=True)
-    observer.start()
+def monitor_usb_devices(db=None, source=None, on_change=None):
+    """Record USB arrivals/removals and transfers on every USB volume mounted, until interrupted."""
+    db = db or get_db_manager()
+    service = get_monitoring_service()
+    sink = service.add_sink_once(TransferLogSink, TransferLogSink)
+    service.add_sink_once(DatabaseSink, lambda: DatabaseSink(db))
+    service.start()
+    watcher = DeviceWatcher(source or get_device_source(), db, service, on_change)
+    watcher.start()
     try:
         while True:
             time.sleep(10)
     except KeyboardInterrupt:
-        observer.stop()
-    observer.join()
+        watcher.stop()
+        service.stop()
+    sink.close()
@@ -0,0 +1,244 @@
+# fuzzy_hash.py
+"""Context-triggered piecewise hashing (CTPH) for finding edited copies of files.
+
+In the style of ssdeep: a rolling hash over a small window of bytes marks
+piece boundaries wherever its low bits are all ones, each piece is reduced
+to one base64 character, and the digest "<block size>:<sig1>:<sig2>" holds
+the pieces for two block sizes. An edit only changes the characters of the
+pieces it touches, so two versions of a document still share most of
+their signature and compare() scores them by edit distance.
+
+The rolling hash is not ssdeep's: it is computed for a whole chunk at once
+with big-integer shifts and candidate boundaries are found with
+bytes.find, so no Python code runs per byte. Digests are therefore not
+interchangeable with the ssdeep tool's.
+"""
+
+import hashlib
+import re
+import struct
+import zlib
+
+ALGORITHM = "ctph"
+B64 = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/"
+_B64_VALUE = {c: i for i, c in enumerate(B64)}
+SIGNATURE_LENGTH = 64
+MIN_LEVEL = 3    # block sizes are 2 ** level bytes, 8 at the smallest
+MAX_LEVEL = 30
+NGRAM = 7        # two signatures must share this many characters to be compared
+_GRAM_MASK = (1 << 6 * NGRAM) - 1
+
+# Byte substitution, then the XOR of the stream shifted by these bit counts.
+# Each output byte depends on a few neighbouring input bytes; four
+# consecutive output bytes form the 32-bit trigger value of a position.
+_SBOX = bytes(sorted(range(256), key=lambda i: hashlib.sha256(bytes([i])).digest()))
+_SHIFTS = (0, 9, 19, 28, 37, 46, 55)
+WINDOW = (max(_SHIFTS) + 7) // 8 + 1 + 3  # input bytes behind one trigger value
+
+# Small block sizes cap the score, so tiny files with short signatures don't
+# report high similarity from a handful of matching characters
+_SCORE_CAP_BLOCK_SIZE = (99 + NGRAM) // NGRAM << MIN_LEVEL
+
+
+def _candidates(lanes, level, start, end):
+    """Yield positions whose first trigger byte(s) allow the low level bits to be all ones.
+
+    bytes.find and a one-byte character class both scan at C speed; the
+    caller checks the remaining bits of each candidate.
+    """
+    if level >= 8:
+        prefix = b"\xff" * min(level // 8, 4)
+        p = lanes.find(prefix, start, end + len(prefix) - 1)
+        while p != -1:
+            yield p
+            p = lanes.find(prefix, p + 1, end + len(prefix) - 1)
+    else:
+        mask = (1 << level) - 1
+        if level not in _LOW_TRIGGERS:
+            _LOW_TRIGGERS[level] = re.compile(
+                b"[" + b"".join(re.escape(bytes([b])) for b in range(256) if b & mask == mask) + b"]")
+        for match in _LOW_TRIGGERS[level].finditer(lanes, start, end):
+            yield match.start()
+
+
+_LOW_TRIGGERS = {}
+
+
+class _Level:
+    __slots__ = ("level", "mask", "pieces", "crc", "start", "fed")
+
+    def __init__(self, level):
+        self.level = level
+        self.mask = (1 << level) - 1
+        self.pieces = []
+        self.crc = 0
+        self.start = 0   # offset where the open piece begins
+        self.fed = 0     # bytes of the open piece already in crc
+
+    def close(self, view, base, end):
+        self.crc = zlib.crc32(view[self.fed - base:end - base], self.crc)
+        self.pieces.append(self.crc)
+        self.crc = 0
+        self.start = self.fed = end
+
+    def signature(self, total, length):
+        values = list(self.pieces)
+        if self.start < total:
+            values.append(self.crc)
+        if len(values) > length:
+            # The last character stands for everything after the first length - 1 pieces
+            rest = values[length - 1:]
+            values = values[:length - 1] + [zlib.crc32(struct.pack(f"<{len(rest)}I", *rest))]
+        return "".join(B64[value & 63] for value in values)
+
+
+def _block_level(size):
+    level = MIN_LEVEL
+    while (1 << level) * SIGNATURE_LENGTH < size and level < MAX_LEVEL - 1:
+        level += 1
+    return level
+
+
+class CTPHHasher:
+    """hashlib-style streaming CTPH digest; size is the expected input length.
+
+    The block size is chosen from size, so the digest of a file is the
+    same however it is fed. Inputs over max_size are not fuzzy hashed and
+    hexdigest() returns None.
+    """
+
+    name = ALGORITHM
+
+    def __init__(self, size, max_size=None):
+        self._total = 0
+        self._tail = b""
+        self._levels = None
+        if max_size is None or size <= max_size:
+            level = _block_level(size)
+            self._levels = [_Level(n) for n in range(max(MIN_LEVEL, level - 1), level + 2)]
+            self._level = level
+
+    def update(self, data):
+        if self._levels is None or not len(data):
+            return
+        buf = self._tail + bytes(data)
+        base = self._total - len(self._tail)
+        view = memoryview(buf)
+        positions = len(buf) - WINDOW + 1
+        cap = SIGNATURE_LENGTH - 1
+        open_levels = [lv for lv in self._levels if len(lv.pieces) < cap]
+        if positions > 0 and open_levels:
+            value = int.from_bytes(buf.translate(_SBOX), "little")
+            mixed = value
+            for shift in _SHIFTS[1:]:
+                mixed ^= value >> shift
+            lanes = mixed.to_bytes(len(buf), "little")
+            pos = 0
+            while open_levels:
+                lowest = open_levels[0]
+                rescan = False
+                for p in _candidates(lanes, lowest.level, pos, positions):
+                    trigger = int.from_bytes(lanes[p:p + 4], "little")
+                    if trigger & lowest.mask != lowest.mask:
+                        continue
+                    end = base + p + WINDOW
+                    for lv in open_levels:
+                        if trigger & lv.mask != lv.mask:
+                            break  # levels are nested: a higher one cannot match either
+                        lv.close(view, base, end)
+                    if len(lowest.pieces) >= cap:
+                        open_levels = [lv for lv in open_levels if len(lv.pieces) < cap]
+                        pos = p + 1
+                        rescan = True
+                        break
+                if not rescan:
+                    break
+        self._total += len(data)
+        for lv in self._levels:
+            lv.crc = zlib.crc32(view[lv.fed - base:], lv.crc)
+            lv.fed = self._total
+        self._tail = buf[-(WINDOW - 1):]
+
+    def hexdigest(self):
+        if self._levels is None:
+            return None
+        levels = {lv.level: lv for lv in self._levels}
+        level = self._level
+        if level - 1 in levels and \
+                len(levels[level].signature(self._total, SIGNATURE_LENGTH)) < SIGNATURE_LENGTH // 2:
+            level -= 1
+        return "%d:%s:%s" % (1 << level,
+                             levels[level].signature(self._total, SIGNATURE_LENGTH),
+                             levels[level + 1].signature(self._total, SIGNATURE_LENGTH // 2))
+
+
+def parse(digest):
+    """Split a digest into (block size, sig1, sig2)."""
+    block_size, sig1, sig2 = digest.split(":", 2)
+    return int(block_size), sig1, sig2
+
+
+def _normalize(signature):
+    # Runs of one character carry little information (ssdeep drops them too)
+    return re.sub(r"(.)\1{3,}", r"\1\1\1", signature)
+
+
+def _grams(signature):
+    """Every NGRAM-character run of a signature, packed 6 bits per character."""
+    grams = set()
+    value = 0
+    for i, c in enumerate(signature):
+        value = (value << 6 | _B64_VALUE[c]) & _GRAM_MASK
+        if i >= NGRAM - 1:
+            grams.add(value)
+    return grams
+
+
+def ngrams(digest):
+    """Return the (block size, n-gram) keys a digest is indexed under.
+
+    Two digests can only score above zero if they share one of these keys.
+    """
+    block_size, sig1, sig2 = parse(digest)
+    keys = {(block_size, gram) for gram in _grams(_normalize(sig1))}
+    keys.update((block_size * 2, gram) for gram in _grams(_normalize(sig2)))
+    return keys
+
+
+def _edit_distance(a, b):
+    """Insertions and deletions cost 1, substitutions 2."""
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1,
+                               previous[j - 1] + (0 if ca == cb else 2)))
+        previous = current
+    return previous[-1]
+
+
+def _score(a, b, block_size):
+    if len(a) < NGRAM or len(b) < NGRAM or not _grams(a) & _grams(b):
+        return 0
+    score = 100 - 100 * _edit_distance(a, b) // (len(a) + len(b))
+    if block_size < _SCORE_CAP_BLOCK_SIZE:
+        score = min(score, (block_size >> MIN_LEVEL) * min(len(a), len(b)))
+    return max(0, score)
+
+
+def compare(digest1, digest2):
+    """Similarity of two digests from 0 (unrelated) to 100 (identical)."""
+    if not digest1 or not digest2:
+        return 0
+    bs1, a1, b1 = parse(digest1)
+    bs2, a2, b2 = parse(digest2)
+    if digest1 == digest2 and len(a1) >= NGRAM:
+        return 100
+    a1, b1, a2, b2 = (_normalize(s) for s in (a1, b1, a2, b2))
+    if bs1 == bs2:
+        return max(_score(a1, a2, bs1), _score(b1, b2, bs1 * 2))
+    if bs1 == bs2 * 2:
+        return _score(a1, b2, bs1)
+    if bs2 == bs1 * 2:
+        return _score(b1, a2, bs2)
+    return 0
@@ -3,19 +3,124 @@
 from PyQt5.QtWidgets import (
     QWidget, QPushButton, QVBoxLayout, QLabel, QStackedWidget, QHBoxLayout,
     QListWidget, QTextEdit, QFileDialog, QMainWindow, QTableWidget,
-    QTableWidgetItem
+    QTableWidgetItem, QSpinBox, QCheckBox, QLineEdit, QInputDialog
 )
 from PyQt5.QtGui import QFont, QPixmap, QIcon
-from PyQt5.QtCore import Qt
-from usb_history import get_usb_history
-from usb_monitor import get_connected_usb_devices, get_file_transfers
-from hash_utils import compute_hashes_for_usb
+from PyQt5.QtCore import Qt, QTimer
+from device_history import get_history_provider
+from device_watcher import DeviceWatcher, get_device_source
+from monitoring_service import get_monitoring_service, DatabaseSink, TransferLogSink
+from hash_utils import hash_directory, hash_file, get_removable_roots
+from gui_tasks import start_task, format_progress
+from table_models import EventTableModel, RecordTableModel, make_table_view
+from incremental_scan import rescan_device, format_scan_diff
+from acquisition import acquire_image, record_acquisition
+from config import HASH_WORKERS, HASH_USE_PROCESSES
+from database import get_db_manager
 from report_generator import generate_usb_history_report, generate_hash_report
 import os
 
+DEVICE_COLUMNS = [
+    ("Device", lambda r: r.friendly_name),
+    ("Manufacturer", lambda r: r.manufacturer),
+    ("Serial", lambda r: r.serial_number),
+    ("VID", lambda r: r.vendor_id),
+    ("PID", lambda r: r.product_id),
+    ("Last Connected", lambda r: r.last_connected and f"{r.last_connected:%Y-%m-%d %H:%M:%S}"),
+    ("Drive", lambda r: ", ".join(r.drive_letters)),
+]
+
+DISK_COLUMNS = [
+    ("Device", lambda d: d["name"]),
+    ("Serial", lambda d: d["serial"]),
+    ("Size (GB)", lambda d: round(d["size"] / 1024 ** 3, 2) if d["size"] else None),
+    ("Mounted At", lambda d: ", ".join(d["mounts"])),
+]
+
+HASH_COLUMNS = [
+    ("File", lambda r: r["path"]),
+    ("Size", lambda r: r["size"]),
+    ("MD5", lambda r: r["hashes"].get("md5")),
+    ("SHA1", lambda r: r["hashes"].get("sha1")),
+    ("SHA256", lambda r: r["hashes"].get("sha256")),
+    ("CTPH", lambda r: r["hashes"].get("ctph")),
+    ("Cached", lambda r: "yes" if r.get("cached") else ""),
+    ("Known", lambda r: r.get("known", "")),
+    ("Similarity", lambda r: r.get("similarity", "")),
+]
+
+LIVE_EVENT_HEADERS = {
+    "ts_us": "Time", "event_type": "Event", "device_name": "Device",
+    "serial_number": "Serial", "details": "Details",
+}
+
+TRANSFER_HEADERS = {
+    "ts_us": "Time", "event_type": "Event", "file_path": "File", "usb_serial": "USB Serial",
+    "file_size": "Size", "file_hash_sha256": "SHA256", "is_suspicious": "Suspicious",
+    "hash_status": "Known", "file_type": "Type", "content_flag": "Content",
+}
+
+# How often open event views pick up newly written rows (ms)
+LIVE_REFRESH_INTERVAL = 2000
+
+
+def hash_roots_task(context, hash_root, workers, use_processes, force):
+    roots = [(hash_root, None)] if hash_root else get_removable_roots()
+    for root, serial in roots:
+        hash_directory(root, workers=workers, use_processes=use_processes, db=get_db_manager(),
+                       device_serial=serial, force=force, progress=context)
+
+
+def rescan_roots_task(context, hash_root, workers, use_processes):
+    if hash_root:
+        roots = [(hash_root, os.path.abspath(hash_root))]
+    else:
+        roots = get_removable_roots()
+    return [format_scan_diff(rescan_device(root, serial, get_db_manager(), workers=workers,
+                                           use_processes=use_processes, progress=context))
+            for root, serial in roots]
+
+
+def find_similar_task(context, path):
+    _, hashes = hash_file(path, ("ctph",))
+    if hashes["ctph"] is None:
+        return f"{path} is larger than FUZZY_MAX_SIZE and has no fuzzy hash"
+    matches = get_db_manager().find_similar(hashes["ctph"])
+    context.plan(len(matches), 0)
+    for score, serial, match_path, match_size, digest in matches:
+        context.advance({"path": match_path, "size": match_size or 0, "hashes": {"ctph": digest},
+                         "similarity": score, "device_serial": serial})
+    return f"{len(matches)} indexed files similar to {path}\nCTPH: {hashes['ctph']}"
+
+
+def acquire_task(context, source, image_path, serial):
+    result = acquire_image(source, image_path, progress=context)
+    if serial:
+        record_acquisition(get_db_manager(), result, serial)
+    return result
+
+
+def format_acquisition(result):
+    lines = [f"Acquired {result.source} -> {result.image_path}",
+             f"{result.size} bytes in {result.elapsed:.1f} s ({result.mb_per_sec():.1f} MB/s)"]
+    lines.extend(f"{name.upper()}: {digest}" for name, digest in result.hashes.items())
+    if result.bad_ranges:
+        lines.append(f"{len(result.bad_ranges)} unreadable ranges zero-filled, "
+                     f"first at offset {result.bad_ranges[0][0]}")
+    return "\n".join(lines)
+
+
 class ForensicMainWindow(QMainWindow):
-    def __init__(self):
+    def __init__(self, workers=HASH_WORKERS, use_processes=HASH_USE_PROCESSES):
         super().__init__()
+        self.workers = workers
+        self.use_processes = use_processes
+        self.hash_task = None
+        self.tasks = set()  # keeps running tasks' signal objects alive
+        self.transfer_page = None
+        self.device_watcher = None
+        self.transfer_log = None
+        self._shown_device_changes = None
         self.setWindowTitle("USB Forensic Tool")
         self.setGeometry(100, 100, 1000, 700)
         self.stack = QStackedWidget()
@@ -27,9 +132,38 @@ class ForensicMainWindow(QMainWindow):
         self.live_monitor_screen()
         self.hash_calc_screen()
 
+        # Screens that query the registry or WMI load on first view
+        self._loaded_screens = set()
+        self.stack.currentChanged.connect(self.on_screen_shown)
+
+        # New live and transfer events are appended while their view is shown
+        self.live_timer = QTimer(self)
+        self.live_timer.setInterval(LIVE_REFRESH_INTERVAL)
+        self.live_timer.timeout.connect(self.append_new_events)
+
         # Show home
         self.stack.setCurrentIndex(0)
 
+    def on_screen_shown(self, index):
+        loaders = {1: self.update_usb_history, 2: self.update_live_monitor}
+        if index in loaders and index not in self._loaded_screens:
+            self._loaded_screens.add(index)
+            loaders[index]()
+        page = self.stack.widget(index)
+        if page is self.live_page or page is self.transfer_page:
+            self.live_timer.start()
+        else:
+            self.live_timer.stop()
+
+    def append_new_events(self):
+        page = self.stack.currentWidget()
+        if page is self.live_page:
+            self.live_events_model.append_new()
+            if self.device_watcher.changes != self._shown_device_changes:
+                self.show_usb_disks()
+        elif page is self.transfer_page:
+            self.transfer_model.append_new()
+
     def home_screen(self):
         home_widget = QWidget()
         layout = QVBoxLayout()
@@ -70,40 +204,75 @@ class ForensicMainWindow(QMainWindow):
         page = QWidget()
         layout = QVBoxLayout()
 
-        self.history_list = QTextEdit()
-        self.history_list.setReadOnly(True)
-        self.update_usb_history()
+        self.history_model = RecordTableModel(DEVICE_COLUMNS)
+        self.history_view = make_table_view(self.history_model)
+        self.history_status = QLabel("")
+        self.hive_path = None
+
+        refresh_btn = QPushButton("Refresh History")
+        refresh_btn.clicked.connect(self.refresh_usb_history)
+
+        hive_btn = QPushButton("Load Acquired SYSTEM Hive...")
+        hive_btn.clicked.connect(self.select_hive)
 
         report_btn = QPushButton("Generate USB History Report")
         report_btn.setIcon(QIcon("assets/report_icon.png"))
-        report_btn.clicked.connect(generate_usb_history_report)
+        report_btn.clicked.connect(lambda: self.run_task(
+            lambda context: generate_usb_history_report(self.hive_path),
+            on_finished=lambda _: self.statusBar().showMessage("USB history report written")))
 
         back_btn = QPushButton("Back")
         back_btn.clicked.connect(lambda: self.stack.setCurrentIndex(0))
 
         layout.addWidget(QLabel("Previously Connected USBs:"))
-        layout.addWidget(self.history_list)
+        layout.addWidget(self.history_view)
+        layout.addWidget(self.history_status)
+        layout.addWidget(refresh_btn)
+        layout.addWidget(hive_btn)
         layout.addWidget(report_btn)
         layout.addWidget(back_btn)
 
         page.setLayout(layout)
         self.stack.addWidget(page)
 
+    def select_hive(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Select SYSTEM Hive")
+        if path:
+            self.hive_path = path
+            self.update_usb_history()
+
+    def refresh_usb_history(self):
+        get_history_provider().invalidate(self.hive_path)
+        self.update_usb_history()
+
     def update_usb_history(self):
-        data = get_usb_history()
-        display = "\n\n".join(data)
-        self.history_list.setText(display)
+        hive_path = self.hive_path
+        self.history_status.setText("Reading device history...")
+        self.run_task(lambda context: get_history_provider().snapshot(hive_path),
+                      on_finished=lambda records: self.show_usb_history(records, hive_path),
+                      on_failed=lambda error: self.history_status.setText(
+                          f"Error reading registry: {error}"))
+
+    def show_usb_history(self, records, hive_path):
+        self.history_model.set_records(records)
+        self.history_status.setText(f"{len(records)} devices from {hive_path or 'live registry'}")
+        get_history_provider().sync_to_database(get_db_manager(), hive_path)
 
     def live_monitor_screen(self):
         page = QWidget()
         layout = QVBoxLayout()
 
-        self.live_list = QTextEdit()
-        self.live_list.setReadOnly(True)
-        self.update_live_monitor()
+        self.live_model = RecordTableModel(DISK_COLUMNS)
+        self.live_view = make_table_view(self.live_model)
+        self.live_status = QLabel("")
 
-        refresh_btn = QPushButton("Refresh USB Devices")
-        refresh_btn.clicked.connect(self.update_live_monitor)
+        self.live_events_model = EventTableModel(get_db_manager(), "live_usb_events",
+                                                 LIVE_EVENT_HEADERS)
+        live_events_view = make_table_view(self.live_events_model)
+        live_filter = QLineEdit()
+        live_filter.setPlaceholderText("Filter events by device name...")
+        live_filter.editingFinished.connect(
+            lambda: self.live_events_model.set_filter(search=live_filter.text()))
 
         file_transfer_btn = QPushButton("File Transfer Activity")
         file_transfer_btn.clicked.connect(self.open_file_transfer_view)
@@ -112,71 +281,255 @@ class ForensicMainWindow(QMainWindow):
         back_btn.clicked.connect(lambda: self.stack.setCurrentIndex(0))
 
         layout.addWidget(QLabel("Connected USB Devices:"))
-        layout.addWidget(self.live_list)
-        layout.addWidget(refresh_btn)
+        layout.addWidget(self.live_view)
+        layout.addWidget(self.live_status)
+        layout.addWidget(QLabel("USB Events:"))
+        layout.addWidget(live_filter)
+        layout.addWidget(live_events_view)
         layout.addWidget(file_transfer_btn)
         layout.addWidget(back_btn)
 
         page.setLayout(layout)
         self.stack.addWidget(page)
+        self.live_page = page
 
     def update_live_monitor(self):
-        data = get_connected_usb_devices()
-        self.live_list.setText("\n\n".join(data))
+        if self.device_watcher is None:
+            self.start_device_watcher()
+        self.show_usb_disks()
+
+    def start_device_watcher(self):
+        """Record USB arrivals/removals and watch file transfers on every mounted USB volume.
+
+        The device list and event table are redrawn from the watcher by the
+        live refresh timer; nothing queries WMI on a schedule.
+        """
+        db = get_db_manager()
+        service = get_monitoring_service()
+        self.transfer_log = service.add_sink_once(TransferLogSink, TransferLogSink)
+        service.add_sink_once(DatabaseSink, lambda: DatabaseSink(db))
+        service.start()
+        self.device_watcher = DeviceWatcher(get_device_source(), db, service)
+        self.device_watcher.start()
+
+    def show_usb_disks(self):
+        self._shown_device_changes = self.device_watcher.changes
+        disks = self.device_watcher.devices()
+        self.live_model.set_records(disks)
+        self.live_status.setText(f"{len(disks)} USB disks connected")
+
+    def closeEvent(self, event):
+        if self.device_watcher is not None:
+            self.device_watcher.stop()
+            get_monitoring_service().stop()
+            self.transfer_log.close()
+        super().closeEvent(event)
 
     def open_file_transfer_view(self):
+        if self.transfer_page is None:
+            self.transfer_page = self.file_transfer_screen()
+        self.stack.setCurrentWidget(self.transfer_page)
+
+    def file_transfer_screen(self):
         page = QWidget()
         layout = QVBoxLayout()
 
-        self.transfer_logs = QTextEdit()
-        self.transfer_logs.setReadOnly(True)
-        self.update_transfer_logs()
+        self.transfer_model = EventTableModel(get_db_manager(), "file_transfer_events",
+                                              TRANSFER_HEADERS)
+        transfer_view = make_table_view(self.transfer_model)
+
+        filters = QHBoxLayout()
+        path_filter = QLineEdit()
+        path_filter.setPlaceholderText("File path contains...")
+        serial_filter = QLineEdit()
+        serial_filter.setPlaceholderText("USB serial")
+
+        def apply_filter():
+            self.transfer_model.set_filter(search=path_filter.text(),
+                                           usb_serial=serial_filter.text())
+
+        path_filter.editingFinished.connect(apply_filter)
+        serial_filter.editingFinished.connect(apply_filter)
+        filters.addWidget(path_filter)
+        filters.addWidget(serial_filter)
 
         refresh_btn = QPushButton("Refresh File Transfers")
-        refresh_btn.clicked.connect(self.update_transfer_logs)
+        refresh_btn.clicked.connect(self.transfer_model.append_new)
 
         back_btn = QPushButton("Back to Monitor")
         back_btn.clicked.connect(lambda: self.stack.setCurrentIndex(2))
 
         layout.addWidget(QLabel("Live File Transfer Logs:"))
-        layout.addWidget(self.transfer_logs)
+        layout.addLayout(filters)
+        layout.addWidget(transfer_view)
         layout.addWidget(refresh_btn)
         layout.addWidget(back_btn)
 
         page.setLayout(layout)
         self.stack.addWidget(page)
-        self.stack.setCurrentWidget(page)
-
-    def update_transfer_logs(self):
-        logs = get_file_transfers()
-        self.transfer_logs.setText("\n\n".join(logs))
+        return page
 
     def hash_calc_screen(self):
         page = QWidget()
         layout = QVBoxLayout()
 
-        self.hash_output = QTextEdit()
-        self.hash_output.setReadOnly(True)
+        self.hash_model = RecordTableModel(HASH_COLUMNS)
+        self.hash_view = make_table_view(self.hash_model)
+        self.hash_summary = QTextEdit()
+        self.hash_summary.setReadOnly(True)
+        self.hash_summary.setMaximumHeight(120)
+
+        self.hash_root = None
+        self.hash_root_label = QLabel("Source: all removable drives")
+
+        folder_btn = QPushButton("Select Folder / Mounted Image...")
+        folder_btn.clicked.connect(self.select_hash_root)
+
+        options = QHBoxLayout()
+        self.workers_spin = QSpinBox()
+        self.workers_spin.setRange(1, 64)
+        self.workers_spin.setValue(self.workers)
+        self.processes_check = QCheckBox("Process pool for small files")
+        self.processes_check.setChecked(self.use_processes)
+        options.addWidget(QLabel("Hash workers:"))
+        options.addWidget(self.workers_spin)
+        options.addWidget(self.processes_check)
+        self.force_check = QCheckBox("Force full re-verify (ignore hash cache)")
+        options.addWidget(self.force_check)
 
         scan_btn = QPushButton("Scan and Calculate Hashes")
         scan_btn.clicked.connect(self.calculate_hashes)
 
+        rescan_btn = QPushButton("Incremental Re-scan (changes since last acquisition)")
+        rescan_btn.clicked.connect(self.incremental_rescan)
+
         report_btn = QPushButton("Generate Hash Report")
         report_btn.setIcon(QIcon("assets/report_icon.png"))
-        report_btn.clicked.connect(generate_hash_report)
+        report_btn.clicked.connect(self.hash_report)
+
+        acquire_btn = QPushButton("Acquire Raw Image (device or .dd/.img)...")
+        acquire_btn.clicked.connect(self.acquire_raw_image)
+
+        similar_btn = QPushButton("Find Similar Files on Acquired Drives...")
+        similar_btn.clicked.connect(self.find_similar_files)
+
+        self.hash_progress = QLabel("")
+        self.cancel_btn = QPushButton("Cancel")
+        self.cancel_btn.setEnabled(False)
+        self.cancel_btn.clicked.connect(lambda: self.hash_task and self.hash_task.cancel())
+        self.hash_buttons = [folder_btn, scan_btn, rescan_btn, report_btn, acquire_btn,
+                             similar_btn]
 
         back_btn = QPushButton("Back")
         back_btn.clicked.connect(lambda: self.stack.setCurrentIndex(0))
 
         layout.addWidget(QLabel("USB Hash Calculator:"))
-        layout.addWidget(self.hash_output)
+        layout.addWidget(self.hash_root_label)
+        layout.addWidget(self.hash_view)
+        layout.addWidget(self.hash_summary)
+        layout.addWidget(self.hash_progress)
+        layout.addLayout(options)
+        layout.addWidget(folder_btn)
         layout.addWidget(scan_btn)
+        layout.addWidget(rescan_btn)
         layout.addWidget(report_btn)
+        layout.addWidget(acquire_btn)
+        layout.addWidget(similar_btn)
+        layout.addWidget(self.cancel_btn)
         layout.addWidget(back_btn)
 
         page.setLayout(layout)
         self.stack.addWidget(page)
 
+    def select_hash_root(self):
+        folder = QFileDialog.getExistingDirectory(self, "Select Folder to Hash")
+        if folder:
+            self.hash_root = folder
+            self.hash_root_label.setText(f"Source: {folder}")
+
+    def run_task(self, fn, *args, **slots):
+        """Start fn(context, *args) on the thread pool; slots are on_batch, on_finished, ..."""
+        task = None
+
+        def done(slot):
+            def handler(*result):
+                self.tasks.discard(task)
+                if slot is not None:
+                    slot(*result)
+            return handler
+
+        for name in ("on_finished", "on_failed", "on_cancelled"):
+            slots[name] = done(slots.get(name))
+        task = start_task(fn, *args, **slots)
+        self.tasks.add(task)
+        return task
+
+    def start_hash_task(self, fn, *args, on_finished=None):
+        if self.hash_task is not None:
+            return
+        self.hash_model.clear()
+        self.hash_summary.clear()
+        self.hash_progress.setText("Walking file tree...")
+        for btn in self.hash_buttons:
+            btn.setEnabled(False)
+        self.cancel_btn.setEnabled(True)
+
+        def finished(result):
+            self.end_hash_task("Done. " + self.hash_progress.text())
+            if on_finished:
+                on_finished(result)
+
+        self.hash_task = self.run_task(
+            fn, *args,
+            on_batch=self.hash_model.append_records,
+            on_progress=lambda progress: self.hash_progress.setText(format_progress(progress)),
+            on_finished=finished,
+            on_failed=lambda error: self.end_hash_task(f"Failed: {error}"),
+            on_cancelled=lambda: self.end_hash_task("Cancelled. " + self.hash_progress.text()))
+
+    def end_hash_task(self, message):
+        self.hash_task = None
+        self.hash_progress.setText(message)
+        for btn in self.hash_buttons:
+            btn.setEnabled(True)
+        self.cancel_btn.setEnabled(False)
+
+    def hash_options(self):
+        return self.hash_root, self.workers_spin.value(), self.processes_check.isChecked()
+
     def calculate_hashes(self):
-        output = compute_hashes_for_usb()
-        self.hash_output.setText(output)
+        self.start_hash_task(hash_roots_task, *self.hash_options(), self.force_check.isChecked())
+
+    def incremental_rescan(self):
+        self.start_hash_task(
+            rescan_roots_task, *self.hash_options(),
+            on_finished=lambda reports: self.hash_summary.setText("\n\n".join(reports)))
+
+    def hash_report(self):
+        # Reports the hashes already recorded for the source; nothing is re-hashed
+        root = self.hash_root
+        self.start_hash_task(
+            lambda context: generate_hash_report(root, get_db_manager(), context),
+            on_finished=lambda rows: self.hash_summary.setText(
+                f"Wrote {rows} rows to USB_Hash_Report.pdf, .csv and .jsonl"))
+
+    def find_similar_files(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Find Files Similar To")
+        if path:
+            self.start_hash_task(find_similar_task, path,
+                                 on_finished=self.hash_summary.setText)
+
+    def acquire_raw_image(self):
+        # Block devices (\\.\PhysicalDrive1, /dev/sdb) can be typed into the file name box
+        source, _ = QFileDialog.getOpenFileName(self, "Select Device or Image to Acquire")
+        if not source:
+            return
+        image_path, _ = QFileDialog.getSaveFileName(self, "Save Image As", "evidence.dd")
+        if not image_path:
+            return
+        serial, ok = QInputDialog.getText(self, "Device Serial",
+                                          "Serial number to record the image hashes under "
+                                          "(leave empty to skip):")
+        self.start_hash_task(
+            acquire_task, source, image_path, serial.strip() if ok else "",
+            on_finished=lambda result: self.hash_summary.setText(format_acquisition(result)))
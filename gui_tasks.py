@@ -0,0 +1,174 @@
+# gui_tasks.py
+"""Run scans, hashing and report generation on QThreadPool workers.
+
+Work functions take a TaskContext as their first argument. It reports
+progress (files/sec, bytes/sec, ETA), collects results into batches for
+the view and carries the cancellation flag. Everything reaches the GUI
+through queued Qt signals, so slots always run on the GUI thread. Works
+headless with QT_QPA_PLATFORM=offscreen.
+"""
+
+import threading
+import time
+import traceback
+
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+from hash_utils import ScanProgress, ScanCancelled
+
+
+class TaskSignals(QObject):
+    progress = pyqtSignal(dict)
+    batch = pyqtSignal(list)
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+
+
+class TaskContext(ScanProgress):
+    """Progress, batching and cancellation for one background task.
+
+    Implements the hash_utils.ScanProgress hooks, so it can be passed
+    straight to hash_directory/compute_hashes_for_usb as progress.
+    """
+
+    def __init__(self, signals, batch_size=200, interval=0.25):
+        super().__init__()
+        self.signals = signals
+        self.batch_size = batch_size
+        self.interval = interval
+        self._cancel = threading.Event()
+        self._batch = []
+        self._started = time.monotonic()
+        self._last_emit = 0.0
+        self.files_total = 0
+        self.bytes_total = 0
+        self.files_done = 0
+        self.bytes_done = 0
+
+    # ScanProgress hooks
+    def plan(self, files, total_bytes):
+        self.files_total += files
+        self.bytes_total += total_bytes
+        self._emit_progress(force=True)
+
+    def advance(self, record):
+        self.files_done += 1
+        if not record.get("cached"):
+            self.bytes_done += record.get("size", 0)
+        else:
+            self.bytes_total -= record.get("size", 0)
+        self.emit_item(record)
+
+    def error(self, error):
+        super().error(error)
+        self._emit_progress()
+
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def check_cancelled(self):
+        if self._cancel.is_set():
+            raise ScanCancelled("cancelled")
+
+    def emit_item(self, item):
+        """Queue one result for the view; sent in batches, not one signal per item."""
+        self._batch.append(item)
+        if len(self._batch) >= self.batch_size or self._due():
+            self.flush()
+
+    def flush(self):
+        if self._batch:
+            batch, self._batch = self._batch, []
+            self.signals.batch.emit(batch)
+        self._emit_progress(force=True)
+
+    def _due(self):
+        return time.monotonic() - self._last_emit >= self.interval
+
+    def _emit_progress(self, force=False):
+        if not force and not self._due():
+            return
+        now = time.monotonic()
+        self._last_emit = now
+        elapsed = max(now - self._started, 1e-6)
+        bytes_per_sec = self.bytes_done / elapsed
+        remaining = max(self.bytes_total - self.bytes_done, 0)
+        self.signals.progress.emit({
+            "files_done": self.files_done,
+            "files_total": self.files_total,
+            "bytes_done": self.bytes_done,
+            "bytes_total": self.bytes_total,
+            "files_per_sec": self.files_done / elapsed,
+            "bytes_per_sec": bytes_per_sec,
+            "eta": remaining / bytes_per_sec if bytes_per_sec else None,
+            "elapsed": elapsed,
+            "errors": len(self.errors),
+        })
+
+
+class BackgroundTask(QRunnable):
+    """Run fn(context, *args, **kwargs) on the global QThreadPool."""
+
+    def __init__(self, fn, *args, **kwargs):
+        super().__init__()
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.signals = TaskSignals()
+        self.context = TaskContext(self.signals)
+
+    def cancel(self):
+        self.context.cancel()
+
+    def run(self):
+        _init_com()
+        try:
+            result = self.fn(self.context, *self.args, **self.kwargs)
+        except ScanCancelled:
+            self.context.flush()
+            self.signals.cancelled.emit()
+            return
+        except Exception as e:
+            traceback.print_exc()
+            self.signals.failed.emit(str(e))
+            return
+        self.context.flush()
+        self.signals.finished.emit(result)
+
+
+def _init_com():
+    # WMI calls from a worker thread need COM initialised on that thread (Windows only)
+    try:
+        import pythoncom
+    except ImportError:
+        return
+    pythoncom.CoInitialize()
+
+
+def start_task(fn, *args, on_batch=None, on_progress=None, on_finished=None, on_failed=None,
+               on_cancelled=None, **kwargs):
+    """Start fn on the global thread pool and connect the given slots."""
+    task = BackgroundTask(fn, *args, **kwargs)
+    for signal, slot in ((task.signals.batch, on_batch), (task.signals.progress, on_progress),
+                         (task.signals.finished, on_finished), (task.signals.failed, on_failed),
+                         (task.signals.cancelled, on_cancelled)):
+        if slot is not None:
+            signal.connect(slot)
+    QThreadPool.globalInstance().start(task)
+    return task
+
+
+def format_progress(progress):
+    text = (f"{progress['files_done']}/{progress['files_total']} files, "
+            f"{progress['bytes_done'] / 1024 ** 2:.1f} MiB "
+            f"({progress['files_per_sec']:.0f} files/s, "
+            f"{progress['bytes_per_sec'] / 1024 ** 2:.1f} MiB/s)")
+    if progress["eta"] is not None:
+        text += f", ETA {progress['eta']:.0f} s"
+    if progress["errors"]:
+        text += f", {progress['errors']} unreadable"
+    return text
@@ -0,0 +1,236 @@
+# hash_sets.py
+"""Known-file hash sets (NSRL-style allowlists, case blocklists).
+
+A hash set is compiled once into a sorted array of raw digests with a
+65536-entry prefix table in front, saved next to its source as
+<source>.<algorithm>.hidx and memory-mapped on later loads. A lookup reads
+the two table slots for the digest's first two bytes and binary-searches
+the handful of records between them, so memory is the digests themselves
+(16 bytes per MD5, 32 per SHA-256) with no Python object per entry.
+"""
+
+import binascii
+import mmap
+import os
+import re
+import struct
+import threading
+
+from config import KNOWN_HASH_SETS
+
+KNOWN_GOOD = "known_good"
+KNOWN_BAD = "known_bad"
+UNKNOWN = "unknown"
+
+DIGEST_SIZES = {"md5": 16, "sha1": 20, "sha256": 32}
+_ALGORITHM_BY_HEX_LENGTH = {size * 2: name for name, size in DIGEST_SIZES.items()}
+_HEX_TOKEN = re.compile(rb"(?<![0-9A-Fa-f])(?:[0-9A-Fa-f]{64}|[0-9A-Fa-f]{40}|[0-9A-Fa-f]{32})"
+                        rb"(?![0-9A-Fa-f])")
+
+MAGIC = b"USBHIDX1"
+_HEADER = struct.Struct("<8s16sIQ")
+HEADER_SIZE = 64
+PREFIXES = 65536
+TABLE_SIZE = (PREFIXES + 1) * 8
+
+
+class HashSetError(Exception):
+    pass
+
+
+def parse_hash_file(path):
+    """Yield (algorithm, raw digest) for every MD5/SHA-1/SHA-256 hex token in a text or CSV file.
+
+    Covers one-hash-per-line lists, md5sum/sha256sum output and NSRL
+    NSRLFile.txt CSV (its CRC32 column is too short to be mistaken for a
+    digest).
+    """
+    with open(path, "rb") as f:
+        for line in f:
+            for token in _HEX_TOKEN.findall(line):
+                yield _ALGORITHM_BY_HEX_LENGTH[len(token)], binascii.unhexlify(token)
+
+
+class HashSetIndex:
+    """Sorted, deduplicated digests of one algorithm with a two-byte prefix table."""
+
+    def __init__(self, data, path=None):
+        if len(data) < HEADER_SIZE + TABLE_SIZE:
+            raise HashSetError(f"{path or 'index'} is too short to be a hash set index")
+        magic, algorithm, width, count = _HEADER.unpack_from(data, 0)
+        if magic != MAGIC:
+            raise HashSetError(f"{path or 'index'} is not a hash set index")
+        self.algorithm = algorithm.rstrip(b"\0").decode("ascii")
+        self.width = width
+        self.count = count
+        self.path = path
+        self._data = data
+        self._records = HEADER_SIZE + TABLE_SIZE
+
+    @classmethod
+    def build(cls, digests, algorithm, path=None):
+        """Compile an iterable of raw digests; written to path (and mmapped) if given."""
+        buckets = _new_buckets()
+        for digest in digests:
+            buckets[digest[0]] += digest
+        return cls.from_buckets(buckets, algorithm, path)
+
+    @classmethod
+    def from_buckets(cls, buckets, algorithm, path=None):
+        """Compile digests already split by first byte into 256 flat bytearrays.
+
+        Buckets are sorted one at a time, so the Python objects sorting needs
+        exist for 1/256 of the set at most. The buckets are emptied.
+        """
+        width = DIGEST_SIZES[algorithm]
+        counts = [0] * PREFIXES
+        chunks = []
+        for bucket in buckets:
+            unique = sorted({bytes(bucket[i:i + width]) for i in range(0, len(bucket), width)})
+            for digest in unique:
+                counts[digest[0] << 8 | digest[1]] += 1
+            chunks.append(b"".join(unique))
+            bucket.clear()
+        table = [0] * (PREFIXES + 1)
+        for prefix in range(PREFIXES):
+            table[prefix + 1] = table[prefix] + counts[prefix]
+
+        header = _HEADER.pack(MAGIC, algorithm.encode("ascii"), width, table[-1])
+        parts = [header.ljust(HEADER_SIZE, b"\0"), struct.pack(f"<{PREFIXES + 1}Q", *table)]
+        parts.extend(chunks)
+        if path is None:
+            return cls(b"".join(parts))
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            for part in parts:
+                f.write(part)
+        os.replace(tmp, path)
+        return cls.open(path)
+
+    @classmethod
+    def open(cls, path):
+        """Memory-map a compiled index; loading costs no more than opening the file."""
+        with open(path, "rb") as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(data, path)
+
+    def close(self):
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, digest):
+        if isinstance(digest, str):
+            try:
+                digest = binascii.unhexlify(digest)
+            except (binascii.Error, ValueError):
+                return False
+        if len(digest) != self.width:
+            return False
+        data = self._data
+        width = self.width
+        prefix = digest[0] << 8 | digest[1]
+        lo, hi = struct.unpack_from("<QQ", data, HEADER_SIZE + prefix * 8)
+        base = self._records
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = base + mid * width
+            probe = data[start:start + width]
+            if probe < digest:
+                lo = mid + 1
+            elif probe > digest:
+                hi = mid
+            else:
+                return True
+        return False
+
+
+class KnownHashSets:
+    """Known-good and known-bad hash sets, consulted together.
+
+    classify() returns KNOWN_BAD if any digest of a file is in a bad set,
+    else KNOWN_GOOD if any is in a good set, else UNKNOWN.
+    """
+
+    def __init__(self):
+        self._sets = []  # (status, label, {algorithm: HashSetIndex})
+
+    def add(self, path, status):
+        """Load a hash list, compiling it (or recompiling a stale index) first if needed."""
+        if status not in (KNOWN_GOOD, KNOWN_BAD):
+            raise ValueError(f"status must be {KNOWN_GOOD!r} or {KNOWN_BAD!r}")
+        indexes = {}
+        compiled = [name for name in DIGEST_SIZES if _fresh(f"{path}.{name}.hidx", path)]
+        if compiled:
+            for name in compiled:
+                indexes[name] = HashSetIndex.open(f"{path}.{name}.hidx")
+        else:
+            buckets = {}
+            for algorithm, digest in parse_hash_file(path):
+                if algorithm not in buckets:
+                    buckets[algorithm] = _new_buckets()
+                buckets[algorithm][digest[0]] += digest
+            if not buckets:
+                raise HashSetError(f"no MD5, SHA-1 or SHA-256 digests found in {path}")
+            for name in DIGEST_SIZES:
+                if name in buckets:
+                    indexes[name] = HashSetIndex.from_buckets(buckets.pop(name), name,
+                                                              f"{path}.{name}.hidx")
+        self._sets.append((status, os.path.basename(path), indexes))
+        return sum(len(index) for index in indexes.values())
+
+    def __len__(self):
+        return len(self._sets)
+
+    def match(self, hashes):
+        """Return (status, set name) for a {algorithm: hexdigest} dict."""
+        found = None
+        for status, label, indexes in self._sets:
+            for name, index in indexes.items():
+                digest = hashes.get(name)
+                if digest and digest in index:
+                    if status == KNOWN_BAD:
+                        return status, label
+                    found = found or (status, label)
+                    break
+        return found or (UNKNOWN, None)
+
+    def classify(self, hashes):
+        return self.match(hashes)[0]
+
+    def annotate(self, record):
+        """Set record["known"] from record["hashes"]; returns the record."""
+        record["known"] = self.classify(record.get("hashes") or {})
+        return record
+
+
+def _new_buckets():
+    return [bytearray() for _ in range(256)]
+
+
+def _fresh(index_path, source_path):
+    try:
+        return os.path.getmtime(index_path) >= os.path.getmtime(source_path)
+    except OSError:
+        return False
+
+
+_known = None
+_known_lock = threading.Lock()
+
+
+def get_known_hash_sets():
+    """Return the process-wide KnownHashSets loaded from config.KNOWN_HASH_SETS."""
+    global _known
+    with _known_lock:
+        if _known is None:
+            known = KnownHashSets()
+            for path, status in KNOWN_HASH_SETS:
+                try:
+                    known.add(path, status)
+                except (OSError, HashSetError) as e:
+                    print(f"Error loading hash set {path}: {str(e)}")
+            _known = known
+        return _known
@@ -2,25 +2,353 @@
 
 import os
 import hashlib
+import threading
+from concurrent.futures import (ThreadPoolExecutor, ProcessPoolExecutor, as_completed, wait,
+                                FIRST_COMPLETED)
 
-def compute_hashes_for_usb():
+from config import (
+    HASH_ALGORITHMS, FILE_HASH_ALGORITHMS, CONTENT_ANALYSERS, HASH_CHUNK_SIZE, HASH_WORKERS,
+    HASH_USE_PROCESSES, SMALL_FILE_THRESHOLD, SMALL_FILE_BATCH, FUZZY_MAX_SIZE
+)
+from volume_walker import VolumeWalker, WalkError
+from hash_sets import get_known_hash_sets
+from fuzzy_hash import CTPHHasher, ALGORITHM as FUZZY_ALGORITHM
+import content_analysis
+
+
+class ScanCancelled(Exception):
+    pass
+
+
+class ScanProgress:
+    """Hooks for reporting on a long scan; this default only keeps the errors.
+
+    plan() is called with the number of files and bytes found (possibly
+    several times while a walk is still running), advance() with every
+    finished record and error() with a WalkError for every path that could
+    not be listed, stat'ed or read. The scan stops with ScanCancelled soon
+    after cancelled() returns True.
+    """
+
+    def __init__(self):
+        self.errors = []
+
+    def plan(self, files, total_bytes):
+        pass
+
+    def advance(self, record):
+        pass
+
+    def error(self, error):
+        self.errors.append(error)
+
+    def cancelled(self):
+        return False
+
+
+def new_hasher(name, size=0):
+    """hashlib.new(name), or a CTPHHasher for "ctph" (which needs the input size up front).
+
+    "filetype" and "entropy" are the content analysers from content_analysis;
+    they share the interface but their results are not digests.
+    """
+    if name == FUZZY_ALGORITHM:
+        return CTPHHasher(size, FUZZY_MAX_SIZE)
+    if name == content_analysis.FILE_TYPE:
+        return content_analysis.FileTypeHasher()
+    if name == content_analysis.ENTROPY:
+        return content_analysis.EntropyHasher()
+    return hashlib.new(name)
+
+
+class MultiHasher:
+    """Feed one byte stream into several digests at once.
+
+    size is the expected stream length, used only by the fuzzy hash; it
+    reports None for streams over FUZZY_MAX_SIZE.
+    """
+
+    def __init__(self, algorithms=HASH_ALGORITHMS, size=0):
+        self.algorithms = tuple(algorithms)
+        self._hashers = [new_hasher(name, size) for name in self.algorithms]
+
+    def update(self, data):
+        for h in self._hashers:
+            h.update(data)
+
+    def hexdigests(self):
+        return {name: h.hexdigest() for name, h in zip(self.algorithms, self._hashers)}
+
+
+def hash_file(path, algorithms=FILE_HASH_ALGORITHMS, chunk_size=HASH_CHUNK_SIZE, buffer=None):
+    """Hash a file in one pass, reading fixed-size chunks into a reused buffer.
+
+    Returns (size, {algorithm: hexdigest}). Memory use is bounded by
+    chunk_size no matter how large the file is.
+    """
+    if buffer is None:
+        buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    size = 0
+    with open(path, 'rb', buffering=0) as f:
+        hasher = MultiHasher(algorithms, os.fstat(f.fileno()).st_size)
+        while True:
+            n = f.readinto(view)
+            if not n:
+                break
+            hasher.update(view[:n])
+            size += n
+    return size, hasher.hexdigests()
+
+
+def hash_stream(chunks, algorithms=FILE_HASH_ALGORITHMS, size=0):
+    """Hash an iterable of byte chunks in one pass, such as a file carved from an image.
+
+    size is the expected length (for the fuzzy hash). Returns (bytes
+    hashed, {algorithm: hexdigest}) like hash_file.
+    """
+    hasher = MultiHasher(algorithms, size)
+    total = 0
+    for chunk in chunks:
+        hasher.update(chunk)
+        total += len(chunk)
+    return total, hasher.hexdigests()
+
+
+def with_analysers(algorithms, analysers=CONTENT_ANALYSERS):
+    """The names to feed a MultiHasher: the digests plus the content analysers."""
+    return tuple(algorithms) + tuple(name for name in analysers if name not in algorithms)
+
+
+def collect_files(root, walker=None, on_error=None):
+    """Return (path, size, mtime_ns, inode) for every file below root as a list.
+
+    Uses a VolumeWalker (system folders excluded, errors reported to
+    on_error); pass walker to change its filters.
+    """
+    walker = walker or VolumeWalker(on_error=on_error)
+    return list(walker.walk(root))
+
+
+_thread_buffers = threading.local()
+
+
+def _hash_one(path, algorithms, chunk_size):
+    buffer = getattr(_thread_buffers, "buffer", None)
+    if buffer is None or len(buffer) != chunk_size:
+        buffer = _thread_buffers.buffer = bytearray(chunk_size)
+    try:
+        size, hashes = hash_file(path, algorithms, chunk_size, buffer)
+    except OSError as e:
+        return WalkError.from_oserror(path, "read", e)
+    return content_analysis.annotate({"path": path, "size": size, "hashes": hashes})
+
+
+def _hash_batch(paths, algorithms, chunk_size):
+    """Process pool entry point: hash a batch of small files."""
+    return [_hash_one(path, algorithms, chunk_size) for path in paths]
+
+
+def hash_files(files, algorithms=FILE_HASH_ALGORITHMS, chunk_size=HASH_CHUNK_SIZE,
+               workers=None, use_processes=None, progress=None, known=None,
+               analysers=CONTENT_ANALYSERS):
+    """Hash files, given as tuples starting with (path, size), on a worker pool.
+
+    For a list, the largest files are scheduled first so a single huge file
+    does not end up running alone at the tail of the scan, and with
+    use_processes files under SMALL_FILE_THRESHOLD are sent in batches to a
+    process pool, where per-file Python overhead rather than I/O dominates.
+    Any other iterable (such as VolumeWalker.walk) is consumed lazily, so
+    hashing overlaps the directory walk. Records are returned sorted by
+    path so reports are reproducible; unreadable files go to progress.error.
+    With a KnownHashSets as known, each record gets a "known" status.
+    The analysers add file_type, entropy and content_flag to each record.
+    """
+    algorithms = with_analysers(algorithms, analysers)
+    workers = max(1, workers or HASH_WORKERS)
+    if use_processes is None:
+        use_processes = HASH_USE_PROCESSES
+    progress = progress or ScanProgress()
+    if not isinstance(files, (list, tuple)):
+        return _hash_stream(files, algorithms, chunk_size, workers, progress, known)
+
+    ordered = sorted(files, key=lambda item: item[1], reverse=True)
+    small = []
+    if use_processes and workers > 1:
+        small = [item[0] for item in ordered if item[1] < SMALL_FILE_THRESHOLD]
+        ordered = [item for item in ordered if item[1] >= SMALL_FILE_THRESHOLD]
+
+    results = []
+    threads = ThreadPoolExecutor(max_workers=workers)
+    processes = ProcessPoolExecutor(max_workers=workers) if small else None
+    try:
+        futures = [threads.submit(_hash_one, item[0], algorithms, chunk_size)
+                   for item in ordered]
+        for i in range(0, len(small), SMALL_FILE_BATCH):
+            futures.append(processes.submit(
+                _hash_batch, small[i:i + SMALL_FILE_BATCH], algorithms, chunk_size))
+        for future in as_completed(futures):
+            done = future.result()
+            for record in done if isinstance(done, list) else [done]:
+                if isinstance(record, WalkError):
+                    progress.error(record)
+                else:
+                    if known is not None:
+                        known.annotate(record)
+                    results.append(record)
+                    progress.advance(record)
+            if progress.cancelled():
+                raise ScanCancelled(f"cancelled after {len(results)} files")
+    finally:
+        threads.shutdown(cancel_futures=True)
+        if processes:
+            processes.shutdown(cancel_futures=True)
+
+    results.sort(key=lambda record: record["path"])
+    return results
+
+
+def _hash_stream(items, algorithms, chunk_size, workers, progress, known=None):
+    """Hash work items as an iterator yields them, keeping a bounded number in flight."""
+    results = []
+    pending = set()
+
+    def collect(done):
+        for future in done:
+            record = future.result()
+            if isinstance(record, WalkError):
+                progress.error(record)
+            else:
+                if known is not None:
+                    known.annotate(record)
+                results.append(record)
+                progress.advance(record)
+
+    threads = ThreadPoolExecutor(max_workers=workers)
+    try:
+        for item in items:
+            if len(pending) >= workers * 4:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+                if progress.cancelled():
+                    raise ScanCancelled(f"cancelled after {len(results)} files")
+            pending.add(threads.submit(_hash_one, item[0], algorithms, chunk_size))
+        collect(wait(pending)[0])
+    finally:
+        threads.shutdown(cancel_futures=True)
+
+    results.sort(key=lambda record: record["path"])
+    return results
+
+
+def _planned(items, progress, every=1000):
+    """Pass work items through, reporting them to progress.plan in blocks."""
+    files = total = 0
+    for item in items:
+        files += 1
+        total += item[1]
+        if files == every:
+            progress.plan(files, total)
+            files = total = 0
+        yield item
+    progress.plan(files, total)
+
+
+def hash_directory(root, algorithms=FILE_HASH_ALGORITHMS, chunk_size=HASH_CHUNK_SIZE,
+                   workers=None, use_processes=None, db=None, device_serial=None,
+                   force=False, progress=None, walker=None, known=None,
+                   analysers=CONTENT_ANALYSERS):
+    """Hash every readable file below root, returning records in path order.
+
+    walker is an optional VolumeWalker carrying the traversal filters.
+
+    With a DatabaseManager as db, files whose (size, mtime, inode) match the
+    hash cache for device_serial are served from it and flagged "cached";
+    force=True ignores the cache and re-reads everything (court-grade runs)
+    while still refreshing it. Fuzzy hashes of newly hashed files are added
+    to the database's similarity index.
+
+    Records are classified against known (default: the configured known
+    hash sets), cached ones included.
+    """
+    progress = progress or ScanProgress()
+    walker = walker or VolumeWalker()
+    walker.on_error = progress.error
+    known = known if known is not None else get_known_hash_sets()
+    if not len(known):
+        known = None
+    if db is None:
+        # Nothing to look up first, so hash files while the walk is still running
+        return hash_files(_planned(walker.walk(root), progress), algorithms, chunk_size,
+                          workers, use_processes, progress, known, analysers)
+
+    files = list(walker.walk(root))
+    progress.plan(len(files), sum(item[1] for item in files))
+
+    device_serial = device_serial or os.path.abspath(root)
+    hits = {} if force else db.get_cached_hashes(device_serial, files, algorithms, analysers)
+    records = [dict(hits[path][1], path=path, size=size, hashes=hits[path][0], cached=True)
+               for path, size, _, _ in files if path in hits]
+    for record in records:
+        content_analysis.annotate(record)
+        if known is not None:
+            known.annotate(record)
+        progress.advance(record)
+    misses = [item for item in files if item[0] not in hits]
+    fresh = hash_files(misses, algorithms, chunk_size, workers, use_processes, progress, known,
+                       analysers)
+
+    identity = {item[0]: item for item in misses}
+    db.store_cached_hashes(device_serial, [identity[r["path"]] + (r["hashes"], r.get("file_type"),
+                                                                  r.get("entropy"))
+                                           for r in fresh])
+    db.index_fuzzy_hashes([(device_serial, r["path"], r["size"], r["hashes"].get(FUZZY_ALGORITHM))
+                           for r in fresh], "scan")
+    records.extend(fresh)
+    records.sort(key=lambda record: record["path"])
+    return records
+
+
+def get_removable_roots():
+    """Return (root path, volume serial) for every removable drive (Windows only)."""
     import wmi
     c = wmi.WMI()
+    return [(disk.DeviceID + "\\", disk.VolumeSerialNumber)
+            for disk in c.Win32_LogicalDisk() if disk.DriveType == 2]
+
+
+def format_hash_record(record):
+    lines = [os.path.basename(record["path"])]
+    for name, digest in record["hashes"].items():
+        if digest is not None and name not in CONTENT_ANALYSERS:
+            lines.append(f"{name.upper()}: {digest}")
+    if "file_type" in record:
+        lines.append(f"Type: {record['file_type'] or 'unknown'}")
+    if record.get("entropy") is not None:
+        lines.append(f"Entropy: {record['entropy']:.4f} bits/byte")
+    if record.get("known"):
+        lines.append(f"Known: {record['known']}")
+    if record.get("content_flag"):
+        lines.append(f"Suspicious: {record['content_flag']}")
+    return "\n".join(lines) + "\n"
+
+
+def compute_hashes_for_usb(root=None, workers=None, use_processes=None, db=None, force=False,
+                           progress=None):
+    """Hash every file on the removable drives, or below root if given."""
+    roots = [(root, None)] if root else get_removable_roots()
+    progress = progress or ScanProgress()
     output = []
 
-    for disk in c.Win32_LogicalDisk():
-        if disk.DriveType == 2:  # Removable
-            path = disk.DeviceID + "\\"
-            output.append(f"Scanning {path}")
-            for root, _, files in os.walk(path):
-                for file in files:
-                    full_path = os.path.join(root, file)
-                    try:
-                        with open(full_path, 'rb') as f:
-                            data = f.read()
-                            md5 = hashlib.md5(data).hexdigest()
-                            sha256 = hashlib.sha256(data).hexdigest()
-                        output.append(f"{file}\nMD5: {md5}\nSHA256: {sha256}\n")
-                    except:
-                        continue
+    for path, serial in roots:
+        records = hash_directory(path, workers=workers, use_processes=use_processes,
+                                 db=db, device_serial=serial, force=force, progress=progress)
+        cached = sum(1 for record in records if record.get("cached"))
+        bytes_read = sum(record["size"] for record in records if not record.get("cached"))
+        output.append(f"Scanning {path} ({len(records)} files, {cached} from cache, "
+                      f"{bytes_read} bytes read)")
+        for record in records:
+            output.append(format_hash_record(record))
+    for error in progress.errors:
+        output.append(f"Error ({error.operation}) {error.path}: {error.message}")
     return "\n".join(output)
@@ -0,0 +1,140 @@
+# incremental_scan.py
+
+import os
+from datetime import datetime
+
+from hash_utils import collect_files, hash_files, ScanProgress
+from hash_sets import get_known_hash_sets
+import content_analysis
+from fuzzy_hash import ALGORITHM as FUZZY_ALGORITHM
+from config import FILE_HASH_ALGORITHMS, CONTENT_ANALYSERS
+
+
+class ScanDiff:
+    """Outcome of a re-scan compared with the device's previous manifest."""
+
+    def __init__(self, serial_number, root, previous_id):
+        self.serial_number = serial_number
+        self.root = root
+        self.previous_id = previous_id
+        self.manifest_id = None
+        self.added = []
+        self.removed = []
+        self.changed = []    # content differs from the last acquisition
+        self.touched = []    # size/mtime differ but digests are identical
+        self.unchanged = []
+        self.unreadable = []  # could not be listed or read; previous entries are kept
+        self.records = []
+        self.bytes_hashed = 0
+
+
+def rescan_device(root, serial_number, db, algorithms=FILE_HASH_ALGORITHMS,
+                  workers=None, use_processes=None, progress=None, known=None,
+                  analysers=CONTENT_ANALYSERS):
+    """Re-scan root, hashing only files that are new or modified since the last manifest.
+
+    Paths are compared relative to root so a stick mounted under a different
+    drive letter still matches its previous acquisition. The new manifest is
+    stored in the database and the returned ScanDiff lists added, removed and
+    changed files. Paths that could not be listed or read are reported as
+    unreadable rather than removed, and their previous manifest entries are
+    carried over so the next scan does not see them as added. Records are
+    classified against known (default: the configured known hash sets).
+    """
+    progress = progress or ScanProgress()
+    known = known if known is not None else get_known_hash_sets()
+    if not len(known):
+        known = None
+    previous_id, previous = db.get_latest_scan_manifest(serial_number)
+    diff = ScanDiff(serial_number, root, previous_id)
+    first_error = len(progress.errors)
+
+    files = collect_files(root, on_error=progress.error)
+    progress.plan(len(files), sum(item[1] for item in files))
+    to_hash = []
+    entries = []
+    for item in files:
+        path, size, mtime_ns, _ = item
+        rel = os.path.relpath(path, root)
+        old = previous.get(rel)
+        if old is not None and old[:2] == (size, mtime_ns) and \
+                all(name in old[2] for name in algorithms) and (old[3] or not analysers):
+            hashes = {name: old[2][name] for name in algorithms}
+            diff.unchanged.append(rel)
+            record = content_analysis.annotate(dict(old[3], path=path, size=size, hashes=hashes,
+                                                    cached=True))
+            if known is not None:
+                known.annotate(record)
+            diff.records.append(record)
+            progress.advance(record)
+            entries.append(_entry(rel, size, mtime_ns, record))
+        else:
+            to_hash.append(item)
+
+    stats = {item[0]: item for item in to_hash}
+    hashed = hash_files(to_hash, algorithms, workers=workers, use_processes=use_processes,
+                        progress=progress, known=known, analysers=analysers)
+    for record in hashed:
+        rel = os.path.relpath(record["path"], root)
+        old = previous.get(rel)
+        if old is None:
+            diff.added.append(rel)
+        # Manifests from before the fuzzy hash was added have no value for it;
+        # only what both scans recorded is compared
+        elif all(old[2].get(name, digest) == digest
+                 for name, digest in record["hashes"].items()):
+            diff.touched.append(rel)
+        else:
+            diff.changed.append(rel)
+        diff.bytes_hashed += record["size"]
+        diff.records.append(record)
+        entries.append(_entry(rel, record["size"], stats[record["path"]][2], record))
+
+    seen = {entry[0] for entry in entries}
+    unreadable = {os.path.relpath(error.path, root) for error in progress.errors[first_error:]
+                  if error.operation != "loop"}
+    diff.unreadable = list(unreadable)
+    for rel, old in previous.items():
+        if rel in seen:
+            continue
+        if _below_any(rel, unreadable):
+            entries.append(_entry(rel, old[0], old[1], dict(old[3], hashes=old[2])))
+        else:
+            diff.removed.append(rel)
+    for names in (diff.added, diff.removed, diff.changed, diff.touched, diff.unchanged,
+                  diff.unreadable):
+        names.sort()
+    diff.records.sort(key=lambda record: record["path"])
+
+    scanned_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    diff.manifest_id = db.insert_scan_manifest(serial_number, root, scanned_at, entries)
+    db.index_fuzzy_hashes([(serial_number, r["path"], r["size"], r["hashes"].get(FUZZY_ALGORITHM))
+                           for r in hashed], "manifest")
+    return diff
+
+
+def _entry(rel, size, mtime_ns, record):
+    """A scan manifest entry for a hash record."""
+    return rel, size, mtime_ns, record["hashes"], record.get("file_type"), record.get("entropy")
+
+
+def _below_any(rel, paths):
+    """True if rel is one of paths or lies in a directory among them."""
+    if "." in paths:
+        return True
+    parts = rel.split(os.sep)
+    return any(os.sep.join(parts[:i]) in paths for i in range(1, len(parts) + 1))
+
+
+def format_scan_diff(diff):
+    lines = [f"Re-scan of {diff.root} (serial {diff.serial_number})"]
+    if diff.previous_id is None:
+        lines.append("No previous acquisition: full baseline scan.")
+    lines.append(f"{len(diff.records)} files, {diff.bytes_hashed} bytes hashed, "
+                 f"{len(diff.unchanged)} unchanged")
+    for title, names in (("Added", diff.added), ("Removed", diff.removed),
+                         ("Changed", diff.changed), ("Touched (same content)", diff.touched),
+                         ("Unreadable (kept from last scan)", diff.unreadable)):
+        lines.append(f"\n{title}: {len(names)}")
+        lines.extend(f"  {name}" for name in names)
+    return "\n".join(lines)
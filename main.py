@@ -1,12 +1,38 @@
 # main.py
 
-from PyQt5.QtWidgets import QApplication
-from gui import ForensicMainWindow
+import argparse
 import sys
 
-if __name__ == "__main__":
-    app = QApplication(sys.argv)
+from config import HASH_WORKERS
+
+# Subcommands handed to the headless CLI (usbforensic.py) instead of the GUI
+CLI_COMMANDS = ("scan", "hash", "history", "monitor", "report", "export", "timeline",
+                "custody", "carve")
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="USB Forensic Tool")
+    parser.add_argument("--workers", type=int, default=HASH_WORKERS,
+                        help="number of files hashed concurrently")
+    parser.add_argument("--processes", action="store_true",
+                        help="hash batches of small files in a process pool")
+    return parser.parse_known_args(argv)
+
+
+def run_gui(argv):
+    from PyQt5.QtWidgets import QApplication
+    from gui import ForensicMainWindow
+    args, qt_args = parse_args(argv)
+    app = QApplication(sys.argv[:1] + qt_args)
     app.setStyle("Fusion")
-    window = ForensicMainWindow()
+    window = ForensicMainWindow(workers=args.workers, use_processes=args.processes)
     window.show()
-    sys.exit(app.exec_())
+    return app.exec_()
+
+
+if __name__ == "__main__":
+    argv = sys.argv[1:]
+    if argv and (argv[0] in CLI_COMMANDS or argv[0] == "--db"):
+        import usbforensic
+        sys.exit(usbforensic.main(argv))
+    sys.exit(run_gui(argv))
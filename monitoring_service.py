@@ -0,0 +1,373 @@
+# monitoring_service.py
+
+import os
+import queue
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from watchdog.observers import Observer
+from watchdog.events import FileSystemEventHandler
+
+from event_coalescer import EventCoalescer
+from hash_sets import KNOWN_BAD, get_known_hash_sets
+from content_analysis import content_flag
+from transfer_log import get_transfer_log
+from config import MONITOR_QUEUE_SIZE, TRANSFER_LOG_PATH
+
+
+class VolumeEventHandler(FileSystemEventHandler):
+    """Forward file events under one watched volume to the monitoring service."""
+
+    def __init__(self, service, volume):
+        self.service = service
+        self.volume = volume
+
+    def on_created(self, event):
+        if not event.is_directory:
+            self.service.raw_event(self.volume, "Created", event.src_path)
+
+    def on_modified(self, event):
+        if not event.is_directory:
+            self.service.raw_event(self.volume, "Modified", event.src_path)
+
+    def on_deleted(self, event):
+        if not event.is_directory:
+            self.service.raw_event(self.volume, "Deleted", event.src_path)
+
+    def on_moved(self, event):
+        if not event.is_directory:
+            self.service.raw_event(self.volume, "Moved", event.src_path, event.dest_path)
+
+
+class _Volume:
+    __slots__ = ("path", "serial", "coalesce", "watch")
+
+    def __init__(self, path, serial, coalesce, watch):
+        self.path = path
+        self.serial = serial
+        self.coalesce = coalesce
+        self.watch = watch
+
+
+class MonitoringService:
+    """One watchdog Observer for every attached volume, fanning events out to sinks.
+
+    Volumes are attached and detached while the service runs. Events (after
+    optional coalescing) go onto one bounded queue that a single dispatcher
+    thread delivers to every registered sink. A sink is any callable taking
+    the event dict, so the database, the transfer log and the GUI share one
+    observer, one dispatcher thread and one log file handle. Hashed files
+    are classified against the known hash sets (event["hash_status"]) and
+    checked for content that does not fit their name (event["content_flag"]).
+    """
+
+    def __init__(self, queue_size=MONITOR_QUEUE_SIZE, known=None):
+        self.observer = Observer()
+        self.known = known if known is not None else get_known_hash_sets()
+        self.coalescer = EventCoalescer(self._publish)
+        self._volumes = {}
+        self._sinks = []
+        self._lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._dispatcher = None
+        self._running = False
+        self._started_at = None
+        self._delivered = 0
+        self._dropped = 0
+        self._recent = deque(maxlen=1000)  # (delivered at, latency) samples
+
+    # Volumes ---------------------------------------------------------------
+
+    def attach(self, path, serial=None, coalesce=True):
+        """Start watching a mounted volume; serial tags its events."""
+        path = os.path.abspath(path)
+        with self._lock:
+            if path in self._volumes:
+                return
+            watch = self.observer.schedule(VolumeEventHandler(self, path), path, recursive=True)
+            self._volumes[path] = _Volume(path, serial, coalesce, watch)
+
+    def detach(self, path):
+        """Stop watching a volume, e.g. after the device was removed."""
+        path = os.path.abspath(path)
+        with self._lock:
+            volume = self._volumes.pop(path, None)
+        if volume is not None:
+            try:
+                self.observer.unschedule(volume.watch)
+            except (KeyError, OSError):
+                pass  # the mount point is already gone
+
+    def volumes(self):
+        with self._lock:
+            return {path: volume.serial for path, volume in self._volumes.items()}
+
+    # Sinks -----------------------------------------------------------------
+
+    def add_sink(self, sink):
+        with self._lock:
+            self._sinks = self._sinks + [sink]
+
+    def add_sink_once(self, sink_type, factory):
+        """Add factory() unless a sink_type sink is registered already; returns the one in use.
+
+        For sinks that record events (the transfer log, the database), which
+        would record every event twice if added by each caller.
+        """
+        with self._lock:
+            for sink in self._sinks:
+                if isinstance(sink, sink_type):
+                    return sink
+            sink = factory()
+            self._sinks = self._sinks + [sink]
+            return sink
+
+    def remove_sink(self, sink):
+        with self._lock:
+            self._sinks = [s for s in self._sinks if s is not sink]
+
+    # Lifecycle -------------------------------------------------------------
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._started_at = time.monotonic()
+        self.coalescer.start()
+        self._dispatcher = threading.Thread(target=self._dispatch, name="monitor-dispatch",
+                                            daemon=True)
+        self._dispatcher.start()
+        self.observer.start()
+
+    def stop(self):
+        if not self._running:
+            return
+        self.observer.stop()
+        self.observer.join()
+        self.coalescer.stop()
+        self._running = False
+        self._queue.put(None)
+        self._dispatcher.join()
+        self.observer = Observer()  # an Observer thread cannot be restarted
+        with self._lock:
+            volumes = list(self._volumes.values())
+            self._volumes.clear()
+        for volume in volumes:
+            self.attach(volume.path, volume.serial, volume.coalesce)
+
+    def is_running(self):
+        return self._running
+
+    # Event flow ------------------------------------------------------------
+
+    def raw_event(self, volume, event_type, path, dest_path=None):
+        with self._lock:
+            entry = self._volumes.get(volume)
+        if entry is None:
+            return
+        if entry.coalesce:
+            self.coalescer.submit(event_type, path, dest_path)
+        else:
+            self._publish({
+                "event_type": event_type,
+                "file_path": dest_path or path,
+                "src_path": path if dest_path else None,
+                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "file_size": None,
+                "hashes": None,
+                "merged_events": 1,
+            })
+
+    def _volume_for(self, path):
+        with self._lock:
+            best = None
+            for volume in self._volumes.values():
+                if path == volume.path or path.startswith(volume.path.rstrip(os.sep) + os.sep):
+                    if best is None or len(volume.path) > len(best.path):
+                        best = volume
+            return best
+
+    def _publish(self, event):
+        volume = self._volume_for(os.path.abspath(event["file_path"]))
+        event["volume"] = volume.path if volume else None
+        event["usb_serial"] = volume.serial if volume else None
+        if event.get("hashes") and len(self.known):
+            event["hash_status"] = self.known.classify(event["hashes"])
+        if "file_type" in event:
+            event["content_flag"] = content_flag(event["file_path"], event["file_type"],
+                                                 event.get("entropy"), event.get("file_size"))
+        try:
+            self._queue.put_nowait((time.monotonic(), event))
+        except queue.Full:
+            self._dropped += 1
+
+    def _dispatch(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            queued_at, event = item
+            for sink in self._sinks:
+                try:
+                    sink(event)
+                except Exception as e:
+                    print(f"Error in monitoring sink {sink!r}: {str(e)}")
+            now = time.monotonic()
+            self._delivered += 1
+            self._recent.append((now, now - queued_at))
+
+    # Metrics ---------------------------------------------------------------
+
+    def metrics(self):
+        """Throughput and event-to-sink latency figures for display or benchmarking."""
+        recent = list(self._recent)
+        latencies = sorted(latency for _, latency in recent)
+        rate = 0.0
+        if len(recent) > 1 and recent[-1][0] > recent[0][0]:
+            rate = (len(recent) - 1) / (recent[-1][0] - recent[0][0])
+
+        def percentile(p):
+            if not latencies:
+                return None
+            return latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))]
+
+        return {
+            "volumes": len(self._volumes),
+            "sinks": len(self._sinks),
+            "delivered": self._delivered,
+            "dropped": self._dropped + self.coalescer.stats["dropped"],
+            "queue_depth": self._queue.qsize(),
+            "coalescer": dict(self.coalescer.stats),
+            "events_per_sec": rate,
+            "latency_p50": percentile(50),
+            "latency_p95": percentile(95),
+            "latency_max": latencies[-1] if latencies else None,
+        }
+
+
+class TransferLogSink:
+    """Append events to the JSON Lines transfer log through its shared buffered writer."""
+
+    def __init__(self, path=TRANSFER_LOG_PATH):
+        self.log = get_transfer_log(path)
+
+    def __call__(self, event):
+        self.log.write(event)
+
+    def close(self):
+        self.log.flush()
+
+
+class DatabaseSink:
+    """Record events in file_transfer_events through DatabaseManager's writer queue.
+
+    Files matching a known-bad hash set, or whose content was flagged, are
+    stored as suspicious.
+    """
+
+    def __init__(self, db):
+        self.db = db
+
+    def __call__(self, event):
+        hashes = event.get("hashes") or {}
+        status = event.get("hash_status")
+        self.db.insert_file_transfer_event({
+            "event_type": event["event_type"],
+            "file_path": event["file_path"],
+            "usb_serial": event.get("usb_serial"),
+            "timestamp": event["timestamp"],
+            "file_hash_md5": hashes.get("md5"),
+            "file_hash_sha256": hashes.get("sha256"),
+            "file_hash_ctph": hashes.get("ctph"),
+            "file_size": event.get("file_size"),
+            "is_suspicious": 1 if status == KNOWN_BAD or event.get("content_flag") else 0,
+            "hash_status": status,
+            "file_type": event.get("file_type"),
+            "entropy": event.get("entropy"),
+            "content_flag": event.get("content_flag"),
+        })
+
+
+class QueueSink:
+    """Buffer events for a consumer that polls, such as a GUI timer.
+
+    When full, the oldest events are discarded and counted in dropped.
+    """
+
+    def __init__(self, maxsize=10000):
+        self.events = deque(maxlen=maxsize)
+        self.dropped = 0
+
+    def __call__(self, event):
+        if len(self.events) == self.events.maxlen:
+            self.dropped += 1
+        self.events.append(event)
+
+    def drain(self):
+        items = []
+        while self.events:
+            items.append(self.events.popleft())
+        return items
+
+
+class AsyncioSink:
+    """Expose events as an asyncio stream: ``async for event in sink``."""
+
+    def __init__(self, loop, maxsize=10000):
+        import asyncio
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def __call__(self, event):
+        self.loop.call_soon_threadsafe(self._put, event)
+
+    def _put(self, event):
+        if self.queue.full():
+            self.dropped += 1
+        else:
+            self.queue.put_nowait(event)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self.queue.get()
+
+
+class FileTransferMonitor:
+    """Watch one path on a shared MonitoringService and call callback(action, path)."""
+
+    def __init__(self, path, callback, coalesce=False, service=None):
+        self.path = os.path.abspath(path)
+        self.callback = callback
+        self.coalesce = coalesce
+        self.service = service or get_monitoring_service()
+
+    def _sink(self, event):
+        if event.get("volume") == self.path:
+            self.callback(event["event_type"], event["file_path"])
+
+    def start(self):
+        self.service.add_sink(self._sink)
+        self.service.attach(self.path, coalesce=self.coalesce)
+        self.service.start()
+
+    def stop(self):
+        self.service.detach(self.path)
+        self.service.remove_sink(self._sink)
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_monitoring_service():
+    """Return the process-wide MonitoringService, creating it on first use."""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = MonitoringService()
+        return _service
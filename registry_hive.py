@@ -0,0 +1,220 @@
+# registry_hive.py
+"""Read-only parser for Windows registry hive (REGF) files.
+
+The hive is memory-mapped and cells are decoded on demand with
+struct.unpack_from, so only the pages a lookup touches are read; a 100+ MB
+SYSTEM hive costs no more memory than the keys actually visited.
+"""
+
+import mmap
+import struct
+from datetime import datetime, timedelta
+
+HBIN_START = 0x1000
+BIG_DATA_SEGMENT = 16344
+
+REG_SZ = 1
+REG_EXPAND_SZ = 2
+REG_BINARY = 3
+REG_DWORD = 4
+REG_DWORD_BIG_ENDIAN = 5
+REG_MULTI_SZ = 7
+REG_QWORD = 11
+
+_EPOCH_1601 = datetime(1601, 1, 1)
+
+
+class HiveError(Exception):
+    pass
+
+
+def filetime_to_datetime(filetime):
+    """Convert a Windows FILETIME (100 ns ticks since 1601) to a naive UTC datetime."""
+    if not filetime:
+        return None
+    return _EPOCH_1601 + timedelta(microseconds=filetime // 10)
+
+
+class RegistryHive:
+    """A memory-mapped registry hive file.
+
+    Usage:
+        with RegistryHive("SYSTEM") as hive:
+            key = hive.open_key(r"ControlSet001\\Enum\\USBSTOR")
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise HiveError(f"{path} is empty")
+        if self._map[:4] != b"regf":
+            self.close()
+            raise HiveError(f"{path} is not a registry hive (missing regf signature)")
+        self.root_offset = struct.unpack_from("<I", self._map, 0x24)[0]
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def cell(self, offset):
+        """Return (start, size) of the cell data at a hive-relative offset."""
+        start = HBIN_START + offset
+        size = struct.unpack_from("<i", self._map, start)[0]
+        return start + 4, abs(size) - 4
+
+    def root(self):
+        return RegistryKey(self, self.root_offset)
+
+    def open_key(self, path):
+        """Open a key by backslash-separated path below the root (case-insensitive)."""
+        key = self.root()
+        for part in filter(None, path.split("\\")):
+            key = key.subkey(part)
+            if key is None:
+                return None
+        return key
+
+
+class RegistryKey:
+    """A key node ("nk" cell) in a hive."""
+
+    __slots__ = ("hive", "offset", "_start")
+
+    def __init__(self, hive, offset):
+        self.hive = hive
+        self.offset = offset
+        self._start, _ = hive.cell(offset)
+        if hive._map[self._start:self._start + 2] != b"nk":
+            raise HiveError(f"no key node at offset {offset:#x}")
+
+    def _field(self, fmt, pos):
+        return struct.unpack_from(fmt, self.hive._map, self._start + pos)[0]
+
+    @property
+    def name(self):
+        length = self._field("<H", 72)
+        raw = self.hive._map[self._start + 76:self._start + 76 + length]
+        if self._field("<H", 2) & 0x20:  # KEY_COMP_NAME: stored as Latin-1
+            return raw.decode("latin-1")
+        return raw.decode("utf-16-le", "replace")
+
+    @property
+    def last_written(self):
+        return filetime_to_datetime(self._field("<Q", 4))
+
+    def subkey_count(self):
+        return self._field("<I", 20)
+
+    def value_count(self):
+        return self._field("<I", 36)
+
+    def subkeys(self):
+        """Yield the direct subkeys, following lf/lh/li/ri index cells."""
+        if not self.subkey_count():
+            return
+        yield from self._walk_list(self._field("<I", 28))
+
+    def _walk_list(self, offset):
+        data = self.hive._map
+        start, _ = self.hive.cell(offset)
+        sig = data[start:start + 2]
+        count = struct.unpack_from("<H", data, start + 2)[0]
+        if sig in (b"lf", b"lh"):
+            for i in range(count):
+                yield RegistryKey(self.hive, struct.unpack_from("<I", data, start + 4 + i * 8)[0])
+        elif sig in (b"li", b"ri"):
+            for i in range(count):
+                child = struct.unpack_from("<I", data, start + 4 + i * 4)[0]
+                if sig == b"ri":
+                    yield from self._walk_list(child)
+                else:
+                    yield RegistryKey(self.hive, child)
+        else:
+            raise HiveError(f"unknown subkey list {sig!r} at offset {offset:#x}")
+
+    def subkey(self, name):
+        name = name.lower()
+        for key in self.subkeys():
+            if key.name.lower() == name:
+                return key
+        return None
+
+    def values(self):
+        """Yield (name, type, data) for every value of the key."""
+        count = self.value_count()
+        if not count:
+            return
+        start, _ = self.hive.cell(self._field("<I", 40))
+        for i in range(count):
+            offset = struct.unpack_from("<I", self.hive._map, start + i * 4)[0]
+            yield self._read_value(offset)
+
+    def value(self, name, default=None):
+        """Return the decoded data of a named value ("" is the default value)."""
+        name = name.lower()
+        for value_name, _, data in self.values():
+            if value_name.lower() == name:
+                return data
+        return default
+
+    def _read_value(self, offset):
+        data = self.hive._map
+        start, _ = self.hive.cell(offset)
+        if data[start:start + 2] != b"vk":
+            raise HiveError(f"no value node at offset {offset:#x}")
+        name_length, size, data_offset, value_type, flags = \
+            struct.unpack_from("<HIIIH", data, start + 2)
+        raw_name = data[start + 20:start + 20 + name_length]
+        name = raw_name.decode("latin-1") if flags & 1 else raw_name.decode("utf-16-le", "replace")
+
+        if size & 0x80000000:  # data stored inline in the offset field
+            size &= 0x7FFFFFFF
+            raw = struct.pack("<I", data_offset)[:size]
+        elif size > BIG_DATA_SEGMENT and data[HBIN_START + data_offset + 4:
+                                              HBIN_START + data_offset + 6] == b"db":
+            raw = self._read_big_data(data_offset, size)
+        else:
+            cell_start, _ = self.hive.cell(data_offset)
+            raw = data[cell_start:cell_start + size]
+        return name, value_type, decode_value(value_type, raw)
+
+    def _read_big_data(self, offset, size):
+        data = self.hive._map
+        start, _ = self.hive.cell(offset)
+        count, list_offset = struct.unpack_from("<HI", data, start + 2)
+        list_start, _ = self.hive.cell(list_offset)
+        parts = []
+        remaining = size
+        for i in range(count):
+            segment = struct.unpack_from("<I", data, list_start + i * 4)[0]
+            seg_start, _ = self.hive.cell(segment)
+            n = min(remaining, BIG_DATA_SEGMENT)
+            parts.append(data[seg_start:seg_start + n])
+            remaining -= n
+        return b"".join(parts)
+
+
+def decode_value(value_type, raw):
+    if value_type in (REG_SZ, REG_EXPAND_SZ):
+        return raw.decode("utf-16-le", "replace").split("\x00", 1)[0]
+    if value_type == REG_MULTI_SZ:
+        return [s for s in raw.decode("utf-16-le", "replace").split("\x00") if s]
+    if value_type == REG_DWORD and len(raw) >= 4:
+        return struct.unpack_from("<I", raw)[0]
+    if value_type == REG_DWORD_BIG_ENDIAN and len(raw) >= 4:
+        return struct.unpack_from(">I", raw)[0]
+    if value_type == REG_QWORD and len(raw) >= 8:
+        return struct.unpack_from("<Q", raw)[0]
+    return bytes(raw)
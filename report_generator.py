@@ -1,27 +1,346 @@
 # report_generator.py
 
-from fpdf import FPDF
+import csv
+import hashlib
+import heapq
+import json
 import os
+import zlib
+
+from fpdf import FPDF
+from hash_utils import ScanProgress, ScanCancelled, get_removable_roots
+from config import HASH_ALGORITHMS
+from db_migrations import to_epoch_us
 
-def generate_usb_history_report():
-    from usb_history import get_usb_history
+def custody_checkpoint(db):
+    """Sign a custody checkpoint for a report; returns (Custody, lines to print)."""
+    from custody import Custody
+    custody = Custody(db)
+    return custody, custody.describe_checkpoint(custody.checkpoint())
+
+
+def generate_usb_history_report(hive_path=None, db=None, pdf_path="USB_History_Report.pdf"):
+    from device_history import get_history_provider
+    if db is None:
+        from database import get_db_manager
+        db = get_db_manager()
+    custody, checkpoint = custody_checkpoint(db)
     pdf = FPDF()
     pdf.add_page()
     pdf.set_font("Arial", size=12)
     pdf.cell(200, 10, "USB History Report", ln=True, align="C")
 
-    for entry in get_usb_history():
-        pdf.multi_cell(0, 10, entry + "\n")
+    for record in get_history_provider().snapshot(hive_path):
+        pdf.multi_cell(0, 10, record.describe() + "\n")
 
-    pdf.output("USB_History_Report.pdf")
+    pdf.set_font("Courier", size=7)
+    for line in checkpoint:
+        pdf.multi_cell(0, 4, line)
+    pdf.output(pdf_path)
+    custody.record_artifact(pdf_path)
 
-def generate_hash_report():
-    from hash_utils import compute_hashes_for_usb
-    hashes = compute_hashes_for_usb()
-    pdf = FPDF()
-    pdf.add_page()
-    pdf.set_font("Arial", size=12)
-    pdf.cell(200, 10, "USB Hash Report", ln=True, align="C")
-    pdf.multi_cell(0, 10, hashes)
 
-    pdf.output("USB_Hash_Report.pdf")
+class StreamingPDF(FPDF):
+    """FPDF that writes each page to the output file as soon as it is finished.
+
+    Stock FPDF keeps every page in memory until output(), so a report's
+    memory grows with its row count. Here a finished page is compressed,
+    written and dropped, and memory stays at about one page. Page-number
+    aliases ({nb}) and internal links are not supported.
+    """
+
+    def __init__(self, path, orientation="P", unit="mm", format="A4"):
+        super().__init__(orientation, unit, format)
+        self.path = path
+        self._file = open(path, "wb")
+        self._written = 0
+        self._putheader()
+
+    def _offset(self):
+        return self._written + len(self.buffer)
+
+    def _flush(self):
+        self._file.write(self.buffer.encode("latin1"))
+        self._written += len(self.buffer)
+        self.buffer = ""
+
+    def _newobj(self):
+        self.n += 1
+        self.offsets[self.n] = self._offset()
+        self._out(str(self.n) + " 0 obj")
+
+    def _page_size(self):
+        if self.def_orientation == "P":
+            return self.fw_pt, self.fh_pt
+        return self.fh_pt, self.fw_pt
+
+    def _endpage(self):
+        super()._endpage()
+        self._putpage(self.page)
+        self.pages[self.page] = ""
+        self._flush()
+
+    def _putpage(self, n):
+        w_pt, h_pt = self._page_size()
+        self._newobj()
+        self._out("<</Type /Page")
+        self._out("/Parent 1 0 R")
+        if n in self.orientation_changes:
+            self._out("/MediaBox [0 0 %.2f %.2f]" % (h_pt, w_pt))
+        self._out("/Resources 2 0 R")
+        if self.pdf_version > "1.3":
+            self._out("/Group <</Type /Group /S /Transparency /CS /DeviceRGB>>")
+        self._out("/Contents " + str(self.n + 1) + " 0 R>>")
+        self._out("endobj")
+        content = self.pages[n].encode("latin1")
+        stream_filter = ""
+        if self.compress:
+            content = zlib.compress(content)
+            stream_filter = "/Filter /FlateDecode "
+        self._newobj()
+        self._out("<<" + stream_filter + "/Length " + str(len(content)) + ">>")
+        self._putstream(content)
+        self._out("endobj")
+
+    def _putpages(self):
+        # Page objects (3, 4, 5, ...) were written as each page ended; only the tree is left
+        w_pt, h_pt = self._page_size()
+        self.offsets[1] = self._offset()
+        self._out("1 0 obj")
+        self._out("<</Type /Pages")
+        self._out("/Kids [" + "".join(f"{3 + 2 * i} 0 R " for i in range(self.page)) + "]")
+        self._out("/Count " + str(self.page))
+        self._out("/MediaBox [0 0 %.2f %.2f]" % (w_pt, h_pt))
+        self._out(">>")
+        self._out("endobj")
+
+    def _putresources(self):
+        self._putfonts()
+        self._putimages()
+        self.offsets[2] = self._offset()
+        self._out("2 0 obj")
+        self._out("<<")
+        self._putresourcedict()
+        self._out(">>")
+        self._out("endobj")
+
+    def _enddoc(self):
+        self._putpages()
+        self._putresources()
+        self._newobj()
+        self._out("<<")
+        self._putinfo()
+        self._out(">>")
+        self._out("endobj")
+        self._newobj()
+        self._out("<<")
+        self._putcatalog()
+        self._out(">>")
+        self._out("endobj")
+        xref = self._offset()
+        self._out("xref")
+        self._out("0 " + str(self.n + 1))
+        self._out("0000000000 65535 f ")
+        for i in range(1, self.n + 1):
+            self._out("%010d 00000 n " % self.offsets[i])
+        self._out("trailer")
+        self._out("<<")
+        self._puttrailer()
+        self._out(">>")
+        self._out("startxref")
+        self._out(xref)
+        self._out("%%EOF")
+        self.state = 3
+
+    def output(self, name="", dest=""):
+        """Finish the document on disk (the file was given to the constructor)."""
+        if self.state < 3:
+            self.close()
+        self._flush()
+        self._file.close()
+        return ""
+
+    def discard(self):
+        """Abandon a half-written document and delete the file."""
+        self._file.close()
+        os.remove(self.path)
+
+
+class HashReportPDF(StreamingPDF):
+    """Landscape hash table in a monospaced font, column headings repeated on every page."""
+
+    FONT_SIZE = 6
+    ROW_HEIGHT = 3
+
+    def __init__(self, path, title, algorithms):
+        super().__init__(path, orientation="L")
+        self.title = title
+        self.algorithms = algorithms
+        self.set_auto_page_break(True, margin=12)
+        self.set_font("Courier", size=self.FONT_SIZE)
+        line_chars = int((self.w - self.l_margin - self.r_margin) / self.get_string_width("0"))
+        self.digest_widths = [hashlib.new(name).digest_size * 2 for name in algorithms]
+        self.path_width = max(20, line_chars - 13 - sum(w + 1 for w in self.digest_widths))
+        self.add_page()
+
+    def header(self):
+        self.set_font("Arial", "B", 12)
+        self.cell(0, 8, self.title, ln=True, align="C")
+        self.set_font("Courier", "B", self.FONT_SIZE)
+        self.cell(0, self.ROW_HEIGHT, self.format_row(
+            "File", "Size", [name.upper() for name in self.algorithms]), ln=True)
+        self.set_font("Courier", size=self.FONT_SIZE)
+
+    def footer(self):
+        self.set_y(-10)
+        self.set_font("Arial", "I", 8)
+        self.cell(0, 5, f"Page {self.page_no()}", align="C")
+
+    def format_row(self, path, size, digests):
+        if len(path) > self.path_width:
+            path = "..." + path[-(self.path_width - 3):]  # keep the file name visible
+        cells = [f"{path:<{self.path_width}}", f"{size:>12}"]
+        cells.extend(f"{digest or '':<{width}}" for digest, width in zip(digests, self.digest_widths))
+        return " ".join(cells)
+
+    def add_section(self, text):
+        self.set_font("Courier", "B", self.FONT_SIZE)
+        self.cell(0, self.ROW_HEIGHT, text, ln=True)
+        self.set_font("Courier", size=self.FONT_SIZE)
+
+    def add_record(self, record):
+        row = self.format_row(record["path"], record["size"],
+                              [record["hashes"].get(name) for name in self.algorithms])
+        # Core fonts are Latin-1 only
+        self.cell(0, self.ROW_HEIGHT, row.encode("latin-1", "replace").decode("latin-1"), ln=True)
+
+
+def iter_hash_records(db, device_serial):
+    """Return (file count, total bytes, records) for a device's last recorded hashes.
+
+    The device's latest scan manifest and its hash cache are merged by path.
+    Where both hold a file, the digests recorded more recently win. Both are
+    read from the database a page at a time, in path order, without
+    re-hashing anything. The count and bytes (for progress) are those of the
+    larger source, so they are 0 only when nothing is recorded.
+    """
+    count, total_bytes = db.hash_cache_stats(device_serial)
+
+    def cached():
+        for path, size, hashes, last_used in db.iter_hash_cache(device_serial):
+            yield path, int((last_used or 0) * 1000000), {
+                "device_serial": device_serial, "path": path, "size": size, "hashes": hashes}
+    sources = [cached()]
+
+    manifest = db.get_latest_scan_manifest_info(device_serial)
+    if manifest is not None:
+        manifest_id, root, manifest_count, manifest_bytes, scanned_at = manifest
+        scanned_us = to_epoch_us(scanned_at) or 0
+        count, total_bytes = max((count, total_bytes), (manifest_count, manifest_bytes))
+
+        def scanned():
+            for rel, size, _, hashes in db.iter_scan_manifest_entries(manifest_id):
+                path = os.path.join(root, rel)
+                yield path, scanned_us, {"device_serial": device_serial, "path": path,
+                                         "size": size, "hashes": hashes}
+        sources.insert(0, scanned())
+    return count, total_bytes, _newest_by_path(sources)
+
+
+def _newest_by_path(sources):
+    """Merge (path, recorded_us, record) streams sorted by path, keeping each path's newest record."""
+    best = None
+    for item in heapq.merge(*sources, key=lambda item: item[0]):
+        if best is not None and item[0] != best[0]:
+            yield best[2]
+            best = None
+        if best is None or item[1] > best[1]:
+            best = item
+    if best is not None:
+        yield best[2]
+
+
+def write_hash_report(records, pdf_path="USB_Hash_Report.pdf", csv_path=None, jsonl_path=None,
+                      title="USB Hash Report", algorithms=HASH_ALGORITHMS, progress=None,
+                      checkpoint=(), unrecorded=()):
+    """Write records to a PDF table and optional CSV and JSON Lines files in one pass.
+
+    records is any iterable of {"device_serial", "path", "size", "hashes"}
+    dicts; it is consumed once and never held in memory. Devices listed in
+    unrecorded are noted as having no recorded hashes, and a report without
+    any rows says so rather than showing an empty table. checkpoint lines
+    (a custody checkpoint) are printed after the table. Returns the number
+    of rows written.
+    """
+    progress = progress or ScanProgress()
+    pdf = HashReportPDF(pdf_path, title, algorithms)
+    files = []
+    try:
+        csv_writer = jsonl = None
+        if csv_path:
+            files.append(open(csv_path, "w", newline="", encoding="utf-8"))
+            csv_writer = csv.writer(files[-1])
+            csv_writer.writerow(["device_serial", "path", "size"] + list(algorithms))
+        if jsonl_path:
+            files.append(open(jsonl_path, "w", encoding="utf-8"))
+            jsonl = files[-1]
+
+        rows = 0
+        device = object()
+        for record in records:
+            if record.get("device_serial") != device:
+                device = record.get("device_serial")
+                pdf.add_section(f"Device {device}")
+            pdf.add_record(record)
+            hashes = record["hashes"]
+            if csv_writer:
+                csv_writer.writerow([device, record["path"], record["size"]] +
+                                    [hashes.get(name) for name in algorithms])
+            if jsonl:
+                jsonl.write(json.dumps({"device_serial": device, "path": record["path"],
+                                        "size": record["size"], "hashes": hashes}) + "\n")
+            rows += 1
+            progress.advance(record)
+            if progress.cancelled():
+                raise ScanCancelled(f"report cancelled after {rows} rows")
+        for device in unrecorded:
+            pdf.add_section(f"Device {device}: no hashes recorded")
+        if rows:
+            pdf.add_section(f"{rows} files")
+        else:
+            pdf.add_section("No hashes recorded: hash or re-scan the device first")
+        for line in checkpoint:
+            pdf.add_section(line)
+        pdf.output()
+        return rows
+    except BaseException:
+        pdf.discard()
+        raise
+    finally:
+        for f in files:
+            f.close()
+
+
+def generate_hash_report(root=None, db=None, progress=None, pdf_path="USB_Hash_Report.pdf",
+                         csv_path="USB_Hash_Report.csv", jsonl_path="USB_Hash_Report.jsonl"):
+    """Report the hashes last recorded for root (or every removable drive) from the database."""
+    if db is None:
+        from database import get_db_manager
+        db = get_db_manager()
+    progress = progress or ScanProgress()
+    serials = [os.path.abspath(root)] if root else [serial for _, serial in get_removable_roots()]
+
+    sources = [iter_hash_records(db, serial) for serial in serials]
+    progress.plan(sum(count for count, _, _ in sources), sum(size for _, size, _ in sources))
+
+    def records():
+        for _, _, device_records in sources:
+            yield from device_records
+    custody, checkpoint = custody_checkpoint(db)
+    unrecorded = [serial for serial, (count, _, _) in zip(serials, sources) if not count]
+    rows = write_hash_report(records(), pdf_path, csv_path, jsonl_path, progress=progress,
+                             checkpoint=checkpoint, unrecorded=unrecorded)
+    for path in (pdf_path, csv_path, jsonl_path):
+        if path:
+            custody.record_artifact(path)
+    return rows
@@ -0,0 +1,212 @@
+# table_models.py
+"""Qt table models for the result views.
+
+QTableView only asks a model for the rows it is drawing, so these views
+cost the same with 100 rows as with 1,000,000. EventTableModel pages rows
+in from DatabaseManager as the user scrolls (canFetchMore/fetchMore), and
+sorting and filtering are pushed down to SQL. RecordTableModel holds
+results produced in memory (hash records, registry devices) and grows by
+appending batches.
+"""
+
+from datetime import datetime
+
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex
+from PyQt5.QtWidgets import QTableView, QHeaderView, QAbstractItemView
+
+from database import VIEW_COLUMNS
+
+
+class EventTableModel(QAbstractTableModel):
+    """Database-backed rows of one VIEW_COLUMNS table, fetched a page at a time."""
+
+    def __init__(self, db, table, headers, page_size=500, parent=None):
+        super().__init__(parent)
+        self.db = db
+        self.table = table
+        self.columns = VIEW_COLUMNS[table]
+        self.headers = headers  # {column: header}; only these columns are shown
+        self.visible = [self.columns.index(column) for column in headers]
+        self.page_size = page_size
+        self.sort_column = self.columns[0]
+        self.descending = True
+        self.filters = {}
+        self.search = None
+        self._rows = []
+        self._next_key = None
+        self._exhausted = False
+        self._max_id = None
+
+    # Qt model interface -------------------------------------------------
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.visible)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole or not index.isValid():
+            return None
+        column = self.visible[index.column()]
+        return _format_cell(self.columns[column], self._rows[index.row()][column])
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return list(self.headers.values())[section]
+        return section + 1
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self._exhausted
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self._exhausted:
+            return
+        if self._max_id is None:
+            # Page over a fixed snapshot; later rows come in through append_new
+            self._max_id = self.db.view_max_id(self.table)
+        rows, self._next_key = self.db.query_view_page(
+            self.table, sort=self.sort_column, descending=self.descending,
+            filters=self.filters, search=self.search, after=self._next_key,
+            limit=self.page_size, upto_id=self._max_id)
+        self._exhausted = self._next_key is None
+        if not rows:
+            return
+        self.beginInsertRows(QModelIndex(), len(self._rows), len(self._rows) + len(rows) - 1)
+        self._rows.extend(rows)
+        self.endInsertRows()
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        self.sort_column = self.columns[self.visible[column]]
+        self.descending = order == Qt.DescendingOrder
+        self.reload()
+
+    # Filtering and live updates -----------------------------------------
+
+    def set_filter(self, search=None, **filters):
+        """Filter on exact column values and a search substring; None clears a filter."""
+        self.search = search or None
+        self.filters = {column: value for column, value in filters.items() if value}
+        self.reload()
+
+    def reload(self):
+        """Drop the loaded rows; the view fetches the first page again."""
+        self.beginResetModel()
+        self._rows = []
+        self._next_key = None
+        self._exhausted = False
+        self._max_id = None
+        self.endResetModel()
+
+    def append_new(self):
+        """Insert rows written since the last fetch at the top; returns how many.
+
+        New events are shown first whatever the sort order, until the next
+        re-sort or reload places them properly.
+        """
+        if self._max_id is None:
+            return 0  # nothing loaded yet; the first fetch will include them
+        rows = self.db.query_view_since(self.table, self._max_id, filters=self.filters,
+                                        search=self.search)
+        if not rows:
+            return 0
+        self._max_id = rows[-1][-1]
+        self.beginInsertRows(QModelIndex(), 0, len(rows) - 1)
+        self._rows[0:0] = reversed(rows)
+        self.endInsertRows()
+        return len(rows)
+
+
+class RecordTableModel(QAbstractTableModel):
+    """In-memory records shown through column getters, grown by append_records.
+
+    columns is a list of (header, getter) where getter(record) returns the
+    cell value.
+    """
+
+    def __init__(self, columns, parent=None):
+        super().__init__(parent)
+        self.columns = columns
+        self._records = []
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._records)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.columns)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole or not index.isValid():
+            return None
+        value = self.columns[index.column()][1](self._records[index.row()])
+        return "" if value is None else str(value)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return self.columns[section][0]
+        return section + 1
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        getter = self.columns[column][1]
+        self.layoutAboutToBeChanged.emit()
+        self._records.sort(key=lambda record: _sort_key(getter(record)),
+                           reverse=order == Qt.DescendingOrder)
+        self.layoutChanged.emit()
+
+    def append_records(self, records):
+        if not records:
+            return
+        self.beginInsertRows(QModelIndex(), len(self._records),
+                             len(self._records) + len(records) - 1)
+        self._records.extend(records)
+        self.endInsertRows()
+
+    def set_records(self, records):
+        self.beginResetModel()
+        self._records = list(records)
+        self.endResetModel()
+
+    def clear(self):
+        self.set_records([])
+
+    def records(self):
+        return self._records
+
+
+def _format_cell(column, value):
+    if value is None:
+        return ""
+    if column == "ts_us":
+        return datetime.fromtimestamp(value / 1000000).strftime("%Y-%m-%d %H:%M:%S")
+    return str(value)
+
+
+def _sort_key(value):
+    # None sorts first and numbers before text, so mixed columns never raise
+    if value is None:
+        return (0, 0, "")
+    if isinstance(value, (int, float)):
+        return (1, value, "")
+    return (2, 0, str(value))
+
+
+def make_table_view(model):
+    """A QTableView set up for large models: fixed row height, sortable headers."""
+    view = QTableView()
+    view.setModel(model)
+    view.setSortingEnabled(True)
+    view.sortByColumn(0, Qt.DescendingOrder)
+    view.setSelectionBehavior(QAbstractItemView.SelectRows)
+    view.setEditTriggers(QAbstractItemView.NoEditTriggers)
+    view.setAlternatingRowColors(True)
+    view.setWordWrap(False)
+    # Uniform rows let the view map scroll positions to rows without measuring
+    view.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+    view.verticalHeader().setDefaultSectionSize(22)
+    view.horizontalHeader().setSectionResizeMode(QHeaderView.Interactive)
+    view.horizontalHeader().setStretchLastSection(True)
+    return view
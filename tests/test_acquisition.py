@@ -0,0 +1,87 @@
+# test_acquisition.py
+
+import hashlib
+import json
+import random
+
+import pytest
+
+from acquisition import acquire_image
+from hash_utils import ScanCancelled, ScanProgress
+
+BLOCK = 4096
+SEGMENT = 3 * BLOCK
+
+
+@pytest.fixture
+def source(tmp_path):
+    # Four whole segments and a partial one ending mid-block
+    path = tmp_path / "stick.raw"
+    path.write_bytes(random.Random(3).randbytes(4 * SEGMENT + BLOCK + 123))
+    return path
+
+
+class _Recorder(ScanProgress):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def advance(self, record):
+        self.records.append(record)
+
+
+def test_image_round_trip_with_segment_and_total_hashes(tmp_path, source):
+    data = source.read_bytes()
+    image = tmp_path / "stick.dd"
+    progress = _Recorder()
+
+    result = acquire_image(str(source), str(image), algorithms=("md5", "sha256"),
+                           segment_size=SEGMENT, block_size=BLOCK, buffers=2,
+                           segment_algorithms=("md5", "sha1"), progress=progress)
+
+    assert image.read_bytes() == data
+    assert result.size == len(data)
+    assert result.bad_ranges == []
+    assert result.hashes == {"md5": hashlib.md5(data).hexdigest(),
+                             "sha256": hashlib.sha256(data).hexdigest()}
+    assert [(index, offset, length) for index, offset, length, _ in result.segments] == \
+        [(0, 0, SEGMENT), (1, SEGMENT, SEGMENT), (2, 2 * SEGMENT, SEGMENT),
+         (3, 3 * SEGMENT, SEGMENT), (4, 4 * SEGMENT, BLOCK + 123)]
+    for _, offset, length, hashes in result.segments:
+        piece = data[offset:offset + length]
+        assert hashes == {"md5": hashlib.md5(piece).hexdigest(),
+                          "sha1": hashlib.sha1(piece).hexdigest()}
+    assert [record["offset"] for record in progress.records] == \
+        [offset for _, offset, _, _ in result.segments]
+
+    sidecar = json.loads((tmp_path / "stick.dd.json").read_text())
+    assert sidecar["hashes"] == result.hashes
+    assert [segment["hashes"] for segment in sidecar["segments"]] == \
+        [hashes for _, _, _, hashes in result.segments]
+
+    # Hashing the image again without writing verifies it
+    verified = acquire_image(str(image), algorithms=("md5", "sha256"), segment_size=SEGMENT,
+                             block_size=BLOCK, segment_algorithms=("md5", "sha1"))
+    assert verified.hashes == result.hashes
+    assert verified.segments == result.segments
+
+
+def test_odd_sizes_are_rounded_to_whole_sectors(source):
+    data = source.read_bytes()
+    result = acquire_image(str(source), segment_size=SEGMENT + 1, block_size=BLOCK - 1,
+                           segment_algorithms=("md5",))
+    # Blocks round up to 4 KiB and segments to whole blocks
+    assert [length for _, _, length, _ in result.segments] == \
+        [4 * BLOCK, 4 * BLOCK, 4 * BLOCK, 1 * BLOCK + 123]
+    assert result.hashes["sha1"] == hashlib.sha1(data).hexdigest()
+
+
+def test_cancelled_acquisition_raises(tmp_path, source):
+    class Cancelled(ScanProgress):
+        def cancelled(self):
+            return True
+
+    with pytest.raises(ScanCancelled):
+        acquire_image(str(source), str(tmp_path / "partial.dd"), block_size=BLOCK,
+                      progress=Cancelled())
+    assert not (tmp_path / "partial.dd.json").exists()
@@ -0,0 +1,53 @@
+# test_content_analysis.py
+
+import os
+
+from content_analysis import identify, content_flag
+from hash_utils import hash_file, with_analysers
+import content_analysis
+
+
+def _analyse(tmp_path, name, data):
+    path = str(tmp_path / name)
+    with open(path, "wb") as f:
+        f.write(data)
+    size, hashes = hash_file(path, with_analysers(("md5",)))
+    return content_analysis.annotate({"path": path, "size": size, "hashes": hashes})
+
+
+def test_identify_by_signature():
+    assert identify(b"\xff\xd8\xff\xe0\x00\x10JFIF") == "jpeg"
+    assert identify(b"MZ\x90\x00") == "exe"
+    assert identify(b"ID3\x04\x00") == "mp3"
+    assert identify(b"\xff\xfb\x90\x64") == "mp3"  # MPEG frame sync, no ID3 tag
+    assert identify(b"hello world") is None
+
+
+def test_executable_under_another_name_is_flagged(tmp_path):
+    record = _analyse(tmp_path, "holiday.jpg", b"MZ" + bytes(200))
+
+    assert record["file_type"] == "exe"
+    assert record["content_flag"] == "exe executable named .jpg"
+    assert set(record["hashes"]) == {"md5"}  # the analysers' output is not a digest
+
+
+def test_plain_and_matching_files_are_not_flagged(tmp_path):
+    assert _analyse(tmp_path, "notes.txt", b"just text\n" * 100)["content_flag"] is None
+    assert _analyse(tmp_path, "song.mp3", b"ID3\x04\x00" + bytes(500))["content_flag"] is None
+    assert content_flag("empty.jpg", "exe", 0.0, 0) is None
+
+
+def test_missing_signature_is_not_flagged(tmp_path):
+    assert content_flag("GAME.COM", None, 5.1, 30000) is None
+    assert content_flag("photo.jpg", None, 5.1, 30000) is None
+    assert _analyse(tmp_path, "song.mp3", b"\xff\xfb\x90\x64" + bytes(500))["content_flag"] is None
+    # A different known type under the name still is
+    assert content_flag("photo.jpg", "zip", 7.9, 30000) == "zip content named .jpg"
+
+
+def test_random_data_of_no_known_type_is_flagged(tmp_path):
+    record = _analyse(tmp_path, "vault.dat", os.urandom(256 * 1024))
+
+    assert record["file_type"] is None
+    assert record["entropy"] > 7.9
+    assert record["content_flag"].startswith("random-looking data")
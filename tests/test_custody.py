@@ -0,0 +1,122 @@
+# test_custody.py
+
+import pytest
+
+from custody import Custody, root_from_range
+from database import DatabaseManager
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = DatabaseManager(str(tmp_path / "custody.db"))
+    yield db
+    db.close()
+
+
+@pytest.fixture
+def custody(db, tmp_path):
+    return Custody(db, key_path=str(tmp_path / "custody.key"))
+
+
+def _live_events(db, count, serial="SN1"):
+    for i in range(count):
+        db.insert_live_event("Connected", "Stick", serial, f"2024-01-01 10:00:{i:02d}", "")
+    db.flush()
+
+
+def _tamper(db, sql, params=()):
+    """Change a row behind the triggers' back, as an edit with another tool would."""
+    with db.conn:
+        db.conn.execute(sql, params)
+        db.conn.execute("DELETE FROM custody_pending")
+
+
+def test_inclusion_proof_verifies_against_a_signed_checkpoint(db, custody):
+    _live_events(db, 7)
+    cp = custody.checkpoint()
+    assert cp["tree_size"] == 7
+    assert custody.signature_valid(cp)
+
+    leaves = [row[0] for row in db.conn.execute("SELECT hash FROM custody_leaves ORDER BY seq")]
+    for start, end in ((0, 1), (3, 4), (6, 7), (2, 5), (0, 7)):
+        proof = custody.proof(start, end, cp["tree_size"])
+        assert root_from_range(leaves[start:end], start, cp["tree_size"], proof).hex() == cp["root"]
+    assert custody.verify_records(2, 5, cp) == (True, [])
+    assert custody.verify_record("live_usb_events", 1, checkpoint=cp) == (True, [])
+
+
+def test_consistency_with_an_older_checkpoint(db, custody):
+    _live_events(db, 5)
+    old = custody.checkpoint()
+    _live_events(db, 6, serial="SN2")
+    new = custody.checkpoint()
+
+    assert new["tree_size"] == 11
+    assert custody.root(old["tree_size"]).hex() == old["root"]
+    ok, problems, checked = custody.verify_since(old)
+    assert (ok, problems, checked) == (True, [], 6)
+    assert custody.verify_records(0, 5, new) == (True, [])
+    assert custody.verify_all()[0]
+
+
+def test_a_changed_event_row_fails_verification(db, custody):
+    _live_events(db, 4)
+    cp = custody.checkpoint()
+    _tamper(db, "UPDATE live_usb_events SET serial_number = 'FORGED' WHERE id = 2")
+
+    ok, problems = custody.verify_record("live_usb_events", 2, checkpoint=cp)
+    assert not ok
+    assert [reason for _, _, _, reason in problems] == ["row was modified"]
+    assert custody.verify_record("live_usb_events", 1, checkpoint=cp) == (True, [])
+    assert not custody.verify_all()[0]
+
+
+def test_a_deleted_event_row_fails_verification(db, custody):
+    _live_events(db, 3)
+    cp = custody.checkpoint()
+    _tamper(db, "DELETE FROM live_usb_events WHERE id = 3")
+
+    ok, problems = custody.verify_record("live_usb_events", 3, checkpoint=cp)
+    assert not ok
+    assert problems[0][3] == "row is missing"
+
+
+def test_a_changed_hash_cache_entry_fails_verification(db, custody):
+    db.store_cached_hashes("SN1", [("/evidence/a.txt", 3, 1, 10, {"sha256": "aa"}),
+                                   ("/evidence/b.txt", 4, 2, 11, {"sha256": "bb"})])
+    cp = custody.checkpoint()
+    assert custody.verify_record("hash_cache", "SN1", "/evidence/a.txt", checkpoint=cp) == \
+        (True, [])
+
+    _tamper(db, "UPDATE hash_cache SET hashes = ? WHERE file_path = ?",
+            ('{"sha256": "ff"}', "/evidence/a.txt"))
+    ok, problems = custody.verify_record("hash_cache", "SN1", "/evidence/a.txt", checkpoint=cp)
+    assert not ok
+    assert problems[0][3] == "row was modified"
+    assert custody.verify_record("hash_cache", "SN1", "/evidence/b.txt", checkpoint=cp)[0]
+
+
+def test_a_forged_checkpoint_root_is_rejected(db, custody):
+    _live_events(db, 3)
+    cp = custody.checkpoint()
+    forged = dict(cp, root="00" * 32)
+
+    assert not custody.signature_valid(forged)
+    ok, problems = custody.verify_records(0, 3, forged)
+    assert not ok
+    assert any("signature is invalid" in reason for _, _, _, reason in problems)
+
+
+def test_hmac_fallback_is_reported_in_the_checkpoint(db, tmp_path):
+    key_path = tmp_path / "hmac.key"
+    key_path.write_text("hmac-sha256:" + "11" * 32 + "\n")
+    custody = Custody(db, key_path=str(key_path))
+    _live_events(db, 2)
+
+    cp = custody.checkpoint()
+    assert cp["scheme"] == "hmac-sha256"
+    assert custody.signature_valid(cp)
+    assert custody.latest_checkpoint() == cp
+    assert "Shared-secret HMAC: only the examiner's key file can verify it" in \
+        custody.describe_checkpoint(cp)
+    assert custody.verify_record("live_usb_events", 2, checkpoint=cp) == (True, [])
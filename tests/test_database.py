@@ -0,0 +1,105 @@
+# test_database.py
+
+import pytest
+
+from database import DatabaseManager
+from db_migrations import to_epoch_us
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = DatabaseManager(str(tmp_path / "events.db"))
+    yield db
+    db.close()
+
+
+def _live_events(db, count):
+    for i in range(count):
+        db.insert_live_event("Connected", "Stick", f"SN{i % 2}",
+                             f"2024-01-01 10:{i // 60:02d}:{i % 60:02d}", "")
+    db.flush()
+
+
+def test_keyset_pages_cover_every_row_newest_first(db):
+    _live_events(db, 25)
+
+    rows, after = db.query_events_page("live_usb_events", limit=10)
+    seen = list(rows)
+    while after is not None:
+        rows, after = db.query_events_page("live_usb_events", after=after, limit=10)
+        seen.extend(rows)
+
+    assert len(seen) == 25 and len({row[0] for row in seen}) == 25
+    assert [row[4] for row in seen] == sorted((row[4] for row in seen), reverse=True)
+    assert len(list(db.iter_live_events(serial="SN1", page_size=4))) == 12
+
+
+def test_time_filters(db):
+    _live_events(db, 25)
+    start = "2024-01-01 10:00:20"
+
+    assert len(list(db.iter_live_events(start=start, end="2024-01-01 10:00:22"))) == 3
+    # Epoch seconds, also as a string typed on a command line
+    epoch = to_epoch_us(start) // 1000000
+    assert len(list(db.iter_live_events(start=epoch))) == 5
+    assert len(list(db.iter_live_events(start=str(epoch)))) == 5
+
+
+def test_unreadable_time_is_an_error_not_an_empty_result(db):
+    _live_events(db, 3)
+
+    with pytest.raises(ValueError):
+        list(db.iter_live_events(start="garbage"))
+    with pytest.raises(ValueError):
+        db.query_events_page("file_transfer_events", end="31/31/2024")
+
+
+def _count(db, table):
+    return db.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def test_flush_is_a_barrier_that_does_not_wait_for_the_batch_interval(tmp_path):
+    db = DatabaseManager(str(tmp_path / "slow.db"), {"write_batch_interval": 30})
+    try:
+        for i in range(5):
+            assert db.insert_live_event("Connected", "Stick", "SN1", f"2024-01-01 10:00:0{i}", "")
+        assert db.flush(timeout=5)
+        assert _count(db, "live_usb_events") == 5
+    finally:
+        db.close()
+
+
+def test_rows_are_visible_after_flush_across_several_batches(tmp_path):
+    db = DatabaseManager(str(tmp_path / "small.db"), {"write_batch_size": 3})
+    try:
+        for i in range(10):
+            db.insert_file_transfer_event({
+                "event_type": "created", "file_path": f"/media/f{i}.txt", "usb_serial": "SN1",
+                "timestamp": "2024-01-01 10:00:00", "file_hash_md5": None,
+                "file_hash_sha256": None, "file_size": i, "is_suspicious": 0})
+        db.flush()
+        assert _count(db, "file_transfer_events") == 10
+    finally:
+        db.close()
+
+
+def test_close_commits_queued_rows_then_refuses_writes(tmp_path):
+    path = str(tmp_path / "closed.db")
+    db = DatabaseManager(path)
+    _live_events(db, 3)
+    db.insert_live_event("Removed", "Stick", "SN1", "2024-01-01 11:00:00", "")
+    db.close()
+
+    assert db.insert_live_event("Connected", "Stick", "SN1", "2024-01-01 12:00:00", "") is False
+    assert db.insert_file_transfer_event({
+        "event_type": "created", "file_path": "/media/late.txt", "usb_serial": "SN1",
+        "timestamp": "2024-01-01 12:00:00", "file_hash_md5": None, "file_hash_sha256": None,
+        "file_size": 1, "is_suspicious": 0}) is False
+    assert db.flush() is False
+
+    reopened = DatabaseManager(path)
+    try:
+        assert _count(reopened, "live_usb_events") == 4
+        assert _count(reopened, "file_transfer_events") == 0
+    finally:
+        reopened.close()
@@ -0,0 +1,116 @@
+# test_db_migrations.py
+
+import sqlite3
+
+import pytest
+
+import db_migrations
+from db_migrations import MIGRATIONS, run_migrations, schema_version, to_epoch_us
+
+# The tables DatabaseManager.create_tables laid down before any migration
+V1_SCHEMA = """
+    CREATE TABLE usb_history (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, device_name TEXT, serial_number TEXT UNIQUE,
+        manufacturer TEXT, hash_md5 TEXT, hash_sha256 TEXT, storage_capacity TEXT,
+        first_connected TEXT, last_connected TEXT, vendor_id TEXT, product_id TEXT);
+    CREATE TABLE live_usb_events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, event_type TEXT, device_name TEXT,
+        serial_number TEXT, timestamp TEXT, details TEXT);
+    CREATE TABLE file_transfer_events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, event_type TEXT, file_path TEXT, usb_serial TEXT,
+        timestamp TEXT, file_hash_md5 TEXT, file_hash_sha256 TEXT, file_size TEXT,
+        is_suspicious INTEGER DEFAULT 0);
+    CREATE TABLE hash_cache (
+        device_serial TEXT, file_path TEXT, file_size INTEGER, mtime_ns INTEGER, inode INTEGER,
+        hashes TEXT, last_used REAL, PRIMARY KEY (device_serial, file_path));
+    CREATE TABLE scan_manifests (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, serial_number TEXT, root_path TEXT,
+        scanned_at TEXT, file_count INTEGER, total_bytes INTEGER);
+    CREATE TABLE scan_manifest_entries (
+        manifest_id INTEGER, file_path TEXT, file_size INTEGER, mtime_ns INTEGER, hashes TEXT,
+        PRIMARY KEY (manifest_id, file_path));
+"""
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "v1.db"))
+    conn.executescript(V1_SCHEMA)
+    conn.execute("INSERT INTO usb_history (device_name, serial_number) VALUES ('Stick', 'SN1')")
+    conn.execute("INSERT INTO live_usb_events (event_type, device_name, serial_number, timestamp, "
+                 "details) VALUES ('Connected', 'Stick', 'SN1', '2024-01-01 10:00:00', '')")
+    conn.execute("INSERT INTO live_usb_events (event_type, device_name, serial_number, timestamp, "
+                 "details) VALUES ('Removed', 'Stick', 'SN1', 'not a time', '')")
+    conn.execute("INSERT INTO file_transfer_events (event_type, file_path, usb_serial, timestamp) "
+                 "VALUES ('created', '/media/a.txt', 'SN1', '2024-01-01 10:00:05')")
+    conn.execute("INSERT INTO hash_cache VALUES ('SN1', '/media/a.txt', 3, 1, 2, "
+                 "'{\"sha256\": \"aa\"}', 0)")
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def _columns(conn, table):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def _schema(conn):
+    return conn.execute("SELECT type, name, sql FROM sqlite_master ORDER BY name").fetchall()
+
+
+def test_v1_database_is_migrated_one_version_at_a_time(conn, monkeypatch):
+    applied = []
+
+    def recording(version, migrate):
+        def step(conn):
+            applied.append((version, schema_version(conn)))
+            migrate(conn)
+        return step
+
+    monkeypatch.setattr(db_migrations, "MIGRATIONS",
+                        [(version, recording(version, migrate)) for version, migrate in MIGRATIONS])
+
+    assert schema_version(conn) == 0
+    assert run_migrations(conn) == 10
+    assert schema_version(conn) == 10
+    # Each step sees the version left by the one before it
+    assert applied == [(version, version - 1 if version > 2 else 0) for version, _ in MIGRATIONS]
+
+
+def test_v1_rows_are_carried_into_the_new_schema(conn):
+    run_migrations(conn)
+
+    assert _columns(conn, "live_usb_events")[-1] == "ts_us"
+    assert conn.execute("SELECT timestamp, ts_us FROM live_usb_events ORDER BY id").fetchall() == \
+        [("2024-01-01 10:00:00", to_epoch_us("2024-01-01 10:00:00")), ("not a time", 0)]
+    for column in ("hash_status", "file_hash_ctph", "file_type", "entropy", "content_flag"):
+        assert column in _columns(conn, "file_transfer_events")
+    assert {"file_type", "entropy"} <= set(_columns(conn, "hash_cache"))
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert {"fuzzy_hashes", "timeline_events", "custody_leaves", "carved_files"} <= tables
+    # Rows from before the custody log are queued as its first leaves
+    assert conn.execute("SELECT table_name, op FROM custody_pending ORDER BY id").fetchall() == [
+        ("usb_history", "insert"), ("live_usb_events", "insert"), ("live_usb_events", "insert"),
+        ("file_transfer_events", "insert"), ("hash_cache", "insert")]
+
+
+def test_second_run_changes_nothing(conn):
+    run_migrations(conn)
+    schema = _schema(conn)
+    pending = conn.execute("SELECT COUNT(*) FROM custody_pending").fetchone()[0]
+
+    assert run_migrations(conn) == 10
+    assert _schema(conn) == schema
+    assert conn.execute("SELECT COUNT(*) FROM custody_pending").fetchone()[0] == pending
+
+
+def test_failed_migration_rolls_back_its_step(conn, monkeypatch):
+    def broken(conn):
+        conn.execute("CREATE TABLE half_done (id INTEGER)")
+        conn.execute("SELECT * FROM no_such_table")
+
+    monkeypatch.setattr(db_migrations, "MIGRATIONS", MIGRATIONS[:2] + [(4, broken)])
+    with pytest.raises(sqlite3.Error):
+        run_migrations(conn)
+    assert schema_version(conn) == 3
+    assert "half_done" not in {row[1] for row in _schema(conn)}
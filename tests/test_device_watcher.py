@@ -0,0 +1,108 @@
+# test_device_watcher.py
+
+import os
+
+from database import DatabaseManager
+from device_watcher import DeviceWatcher, SimulatedDeviceSource, LinuxDeviceSource
+
+
+class RecordingMonitor:
+    def __init__(self):
+        self.calls = []
+
+    def attach(self, mount, serial):
+        self.calls.append(("attach", mount, serial))
+
+    def detach(self, mount):
+        self.calls.append(("detach", mount))
+
+
+def _watch(source, **kwargs):
+    changes = []
+    watcher = DeviceWatcher(source, on_change=lambda event_type, device, mount:
+                            changes.append((event_type, device["id"], mount)), **kwargs)
+    watcher.start()
+    return watcher, changes
+
+
+def test_devices_present_at_start_are_not_arrivals():
+    source = SimulatedDeviceSource()
+    source.plug("sdb", serial="AAA111", mounts=("/media/a",))
+    monitor = RecordingMonitor()
+
+    watcher, changes = _watch(source, monitor=monitor)
+
+    assert changes == [("Present", "sdb", None), ("Mounted", "sdb", "/media/a")]
+    assert monitor.calls == [("attach", "/media/a", "AAA111")]
+    assert [device["serial"] for device in watcher.devices()] == ["AAA111"]
+
+
+def test_plug_mount_unmount_unplug():
+    source = SimulatedDeviceSource()
+    monitor = RecordingMonitor()
+    watcher, changes = _watch(source, monitor=monitor)
+    assert changes == [] and watcher.devices() == []
+
+    source.plug("sdc", name="Kingston DataTraveler", serial="XYZ")
+    source.mount("sdc", "/media/usb")
+    source.unmount("sdc", "/media/usb")
+    source.mount("sdc", "/media/usb2")
+    source.unplug("sdc")
+
+    assert changes == [("Connected", "sdc", None), ("Mounted", "sdc", "/media/usb"),
+                       ("Unmounted", "sdc", "/media/usb"), ("Mounted", "sdc", "/media/usb2"),
+                       ("Unmounted", "sdc", "/media/usb2"), ("Disconnected", "sdc", None)]
+    assert monitor.calls == [("attach", "/media/usb", "XYZ"), ("detach", "/media/usb"),
+                             ("attach", "/media/usb2", "XYZ"), ("detach", "/media/usb2")]
+    assert watcher.changes == 6
+    assert watcher.devices() == []
+
+
+def test_changes_are_recorded_in_the_database(tmp_path):
+    db = DatabaseManager(str(tmp_path / "live.db"))
+    try:
+        source = SimulatedDeviceSource()
+        watcher, _ = _watch(source, db=db)
+        source.plug("sdd", name="SanDisk Cruzer", serial="SN42", size=8 * 1024 ** 3)
+        source.mount("sdd", "/media/cruzer")
+        source.unplug("sdd")
+        db.flush()
+        rows = [(row[1], row[2], row[3]) for row in db.get_live_events()]
+    finally:
+        db.close()
+
+    assert ("Connected", "SanDisk Cruzer", "SN42") in rows
+    assert ("Mounted", "SanDisk Cruzer", "SN42") in rows
+    assert ("Unmounted", "SanDisk Cruzer", "SN42") in rows
+    assert ("Disconnected", "SanDisk Cruzer", "SN42") in rows
+
+
+def _write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(text)
+
+
+def test_linux_source_reads_a_sysfs_tree(tmp_path):
+    sys_block = tmp_path / "sys" / "block"
+    usb_device = tmp_path / "sys" / "devices" / "usb1" / "1-1"
+    scsi_device = usb_device / "1-1:1.0" / "host0" / "target0" / "0:0:0:0"
+    _write(str(usb_device / "serial"), "0123456789AB\n")
+    _write(str(scsi_device / "vendor"), "Generic \n")
+    _write(str(scsi_device / "model"), "Flash Disk\n")
+    _write(str(sys_block / "sdb" / "removable"), "1\n")
+    _write(str(sys_block / "sdb" / "size"), "2048\n")
+    os.makedirs(sys_block / "sdb" / "sdb1")
+    os.symlink(scsi_device, sys_block / "sdb" / "device")
+    # A fixed disk is left out
+    _write(str(sys_block / "sda" / "removable"), "0\n")
+    mounts = tmp_path / "mounts"
+    _write(str(mounts), "/dev/sda1 / ext4 rw 0 0\n"
+                        "/dev/sdb1 /media/My\\040Stick vfat rw 0 0\n")
+
+    source = LinuxDeviceSource(sys_block=str(sys_block), dev_dir=str(tmp_path / "dev"),
+                               mounts=str(mounts))
+
+    assert source.scan() == [{"id": "sdb", "name": "Generic Flash Disk",
+                              "serial": "0123456789AB", "size": 2048 * 512,
+                              "mounts": ("/media/My Stick",)}]
@@ -0,0 +1,104 @@
+# test_event_coalescer.py
+
+import hashlib
+
+from event_coalescer import EventCoalescer
+
+
+def _coalesce(submit, **kwargs):
+    """Queue events with the worker stopped, then start and stop it so everything is flushed."""
+    events = []
+    coalescer = EventCoalescer(events.append, quiet_window=0.2, **kwargs)
+    submit(coalescer)
+    coalescer.start()
+    coalescer.stop()
+    return coalescer, events
+
+
+def test_burst_becomes_one_transfer(tmp_path):
+    path = str(tmp_path / "copy.bin")
+    data = b"x" * 100000
+    with open(path, "wb") as f:
+        f.write(data)
+
+    def submit(coalescer):
+        coalescer.submit("created", path)
+        for _ in range(20):
+            coalescer.submit("modified", path)
+
+    coalescer, events = _coalesce(submit, algorithms=("md5", "sha256"))
+
+    assert len(events) == 1
+    event = events[0]
+    assert event["event_type"] == "Transfer Completed"
+    assert event["file_path"] == path
+    assert event["file_size"] == len(data)
+    assert event["merged_events"] == 21
+    assert event["hashes"] == {"md5": hashlib.md5(data).hexdigest(),
+                               "sha256": hashlib.sha256(data).hexdigest()}
+    assert event["entropy"] == 0.0
+    assert coalescer.stats == {"received": 21, "merged": 20, "dropped": 0, "transient": 0,
+                               "emitted": 1}
+
+
+def test_created_then_deleted_is_transient(tmp_path):
+    path = str(tmp_path / "temp.tmp")
+
+    def submit(coalescer):
+        coalescer.submit("created", path)
+        coalescer.submit("modified", path)
+        coalescer.submit("deleted", path)
+
+    coalescer, events = _coalesce(submit)
+
+    assert events == []
+    assert coalescer.stats["transient"] == 1
+
+
+def test_delete_of_existing_file_is_reported(tmp_path):
+    path = str(tmp_path / "old.doc")
+
+    coalescer, events = _coalesce(lambda c: c.submit("deleted", path))
+
+    assert [(e["event_type"], e["file_path"], e["hashes"]) for e in events] == \
+        [("Deleted", path, None)]
+
+
+def test_move_keeps_source_and_new_file_is_a_transfer(tmp_path):
+    moved = str(tmp_path / "renamed.txt")
+    fresh = str(tmp_path / "fresh.txt")
+    for path in (moved, fresh):
+        with open(path, "wb") as f:
+            f.write(b"content")
+
+    def submit(coalescer):
+        coalescer.submit("moved", str(tmp_path / "original.txt"), moved)
+        # A file written under a temporary name and renamed into place
+        coalescer.submit("created", str(tmp_path / "fresh.part"))
+        coalescer.submit("moved", str(tmp_path / "fresh.part"), fresh)
+
+    _, events = _coalesce(submit, analysers=())
+    by_path = {event["file_path"]: event for event in events}
+
+    assert sorted(by_path) == sorted([moved, fresh])
+    assert by_path[moved]["event_type"] == "Moved"
+    assert by_path[moved]["src_path"] == str(tmp_path / "original.txt")
+    assert by_path[fresh]["event_type"] == "Transfer Completed"
+    assert by_path[fresh]["src_path"] is None
+    assert "file_type" not in by_path[fresh]
+
+
+def test_full_queue_drops_events(tmp_path):
+    path = str(tmp_path / "busy.bin")
+
+    def submit(coalescer):
+        for _ in range(5):
+            coalescer.submit("modified", path)
+
+    coalescer, events = _coalesce(submit, max_pending=2, backpressure_timeout=0.01)
+
+    assert coalescer.stats["received"] == 5
+    assert coalescer.stats["dropped"] == 3
+    # The two queued events were for a file that never appeared
+    assert coalescer.stats["transient"] == 1
+    assert events == []
@@ -0,0 +1,111 @@
+# test_fat_carving.py
+
+import hashlib
+import os
+import random
+import struct
+
+import pytest
+
+from benchmark import write_sample_fat_image, make_sample_file
+from config import HASH_ALGORITHMS
+from database import DatabaseManager
+from fat_carving import FatVolume, CarveError, carve_image
+
+IMAGE_SIZE = 8 * 1024 ** 2
+
+
+def _sample(tmp_path, fs):
+    rng = random.Random(3)
+    files = [
+        ("/DCIM/photo 1.jpg", make_sample_file(rng, "jpeg", 30000), False),
+        ("/DCIM/photo 2.jpg", make_sample_file(rng, "jpeg", 50000), True),
+        ("/Reports/quarterly report with a long name.pdf",
+         make_sample_file(rng, "pdf", 9000), True),
+        ("/Reports/kept.zip", make_sample_file(rng, "zip", 7000), False),
+        ("/Old/setup.exe", make_sample_file(rng, "exe", 40000), False),
+        ("/Old/notes.bin", make_sample_file(rng, "bin", 5000), False),
+    ]
+    orphans = [make_sample_file(rng, "png", 12000), make_sample_file(rng, "zip", 25000)]
+    path = str(tmp_path / f"stick.{fs}")
+    offsets = write_sample_fat_image(path, files, IMAGE_SIZE, fs, orphans=orphans,
+                                     deleted_dirs=("/Old",), seed=1)
+    return path, files, orphans, offsets
+
+
+def _sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+@pytest.mark.parametrize("fs", ["fat32", "exfat"])
+def test_deleted_files_and_orphans_come_back_intact(tmp_path, fs):
+    path, files, orphans, offsets = _sample(tmp_path, fs)
+
+    records = carve_image(path, HASH_ALGORITHMS)
+
+    by_path = {record["path"]: record for record in records}
+    for file_path, data, deleted in files:
+        if deleted or file_path.startswith("/Old/"):
+            record = by_path.pop(file_path)
+            assert record["carved"]["method"] == "deleted entry"
+            assert record["carved"]["offset"] == offsets[file_path]
+            assert record["size"] == len(data)
+            assert record["hashes"]["sha256"] == _sha256(data)
+        else:
+            assert file_path not in by_path  # live files are not carved
+    # What is left came from signatures in clusters no entry accounts for
+    carved = {record["hashes"]["sha256"]: record for record in by_path.values()}
+    for i, data in enumerate(orphans):
+        record = carved[_sha256(data)]
+        assert record["carved"]["method"] == "signature"
+        assert record["carved"]["offset"] == offsets[i]
+    assert {record["carved"]["file_type"] for record in carved.values()} >= {"png", "zip"}
+
+
+def test_recovered_files_are_saved_and_stored(tmp_path):
+    path, files, _, _ = _sample(tmp_path, "fat32")
+    output_dir = str(tmp_path / "recovered")
+    db = DatabaseManager(str(tmp_path / "carve.db"))
+    try:
+        records = carve_image(path, HASH_ALGORITHMS, signatures=False, output_dir=output_dir,
+                              db=db, analysers=())
+        rows = db.get_carved_files(path)
+    finally:
+        db.close()
+
+    saved = {}
+    for name in os.listdir(output_dir):
+        with open(os.path.join(output_dir, name), "rb") as f:
+            saved[name.split("_", 1)[1]] = _sha256(f.read())
+    expected = {os.path.basename(file_path): _sha256(data) for file_path, data, deleted in files
+                if deleted or file_path.startswith("/Old/")}
+    assert saved == expected
+    assert len(rows) == len(records) == len(expected)
+
+
+def test_volume_inside_a_partitioned_image(tmp_path):
+    volume_path, files, _, offsets = _sample(tmp_path, "exfat")
+    start = 1024 * 1024
+    mbr = bytearray(512)
+    struct.pack_into("<BII", mbr, 0x1BE + 4, 0x07, 0, 0)
+    struct.pack_into("<II", mbr, 0x1BE + 8, start // 512, IMAGE_SIZE // 512)
+    mbr[510:512] = b"\x55\xaa"
+    disk = str(tmp_path / "disk.dd")
+    with open(disk, "wb") as out, open(volume_path, "rb") as volume:
+        out.write(bytes(mbr) + bytes(start - 512) + volume.read())
+
+    expected = {file_path: data for file_path, data, _ in files}["/DCIM/photo 2.jpg"]
+    with FatVolume(disk) as volume:
+        assert (volume.partition_offset, volume.kind) == (start, "exfat")
+        carved = {carved.path: carved for carved in volume.deleted_files()}["/DCIM/photo 2.jpg"]
+        assert carved.offset == start + offsets["/DCIM/photo 2.jpg"]
+        assert carved.read() == expected
+
+
+def test_image_without_a_fat_volume_is_rejected(tmp_path):
+    path = str(tmp_path / "random.dd")
+    with open(path, "wb") as f:
+        f.write(os.urandom(64 * 1024))
+
+    with pytest.raises(CarveError):
+        FatVolume(path)
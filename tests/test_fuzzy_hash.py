@@ -0,0 +1,83 @@
+# test_fuzzy_hash.py
+
+import random
+
+import pytest
+
+from config import FUZZY_MIN_SCORE
+from database import DatabaseManager
+from fuzzy_hash import CTPHHasher, compare, parse
+
+
+def _digest(data, chunk=1 << 20):
+    hasher = CTPHHasher(len(data))
+    for i in range(0, len(data), chunk):
+        hasher.update(data[i:i + chunk])
+    return hasher.hexdigest()
+
+
+@pytest.fixture(scope="module")
+def document():
+    # Word-like text, so pieces look like those of a real document
+    rng = random.Random(7)
+    words = ["".join(rng.choice("abcdefghij") for _ in range(rng.randint(2, 9)))
+             for _ in range(500)]
+    return " ".join(rng.choice(words) for _ in range(40000)).encode()
+
+
+def _edited(document):
+    data = bytearray(document)
+    data[100000:100010] = b"an inserted sentence"
+    return bytes(data)
+
+
+def test_digest_does_not_depend_on_how_the_input_is_fed(document):
+    assert _digest(document) == _digest(document, chunk=4096) == _digest(document, chunk=777)
+
+
+def test_identical_input_scores_100(document):
+    assert compare(_digest(document), _digest(document)) == 100
+
+
+def test_unrelated_input_scores_0(document):
+    noise = random.Random(1).randbytes(len(document))
+    assert compare(_digest(document), _digest(noise)) == 0
+    assert compare(_digest(document), None) == 0
+
+
+def test_small_edit_stays_above_the_near_duplicate_threshold(document):
+    score = compare(_digest(document), _digest(_edited(document)))
+    assert FUZZY_MIN_SCORE <= score < 100
+
+
+def test_adjacent_block_sizes_are_compared(document):
+    whole = _digest(document)
+    half = _digest(document[:len(document) // 2])
+    assert parse(whole)[0] == 2 * parse(half)[0]
+
+    score = compare(whole, half)
+    assert score >= FUZZY_MIN_SCORE
+    assert compare(half, whole) == score
+    # Block sizes two steps apart share no signature
+    quarter = _digest(document[:len(document) // 4])
+    assert parse(whole)[0] == 4 * parse(quarter)[0]
+    assert compare(whole, quarter) == 0
+
+
+def test_find_similar_returns_the_edited_copy_first(tmp_path, document):
+    noise = random.Random(2).randbytes(len(document))
+    db = DatabaseManager(str(tmp_path / "fuzzy.db"))
+    try:
+        assert db.index_fuzzy_hashes([
+            ("SN1", "/media/report.txt", len(document), _digest(document)),
+            ("SN1", "/media/half.txt", len(document) // 2, _digest(document[:len(document) // 2])),
+            ("SN2", "/media/noise.bin", len(noise), _digest(noise)),
+        ], "scan") == 3
+
+        matches = db.find_similar(_digest(_edited(document)))
+        assert [(serial, path) for _, serial, path, _, _ in matches] == \
+            [("SN1", "/media/report.txt"), ("SN1", "/media/half.txt")]
+        assert matches[0][0] > matches[1][0] >= FUZZY_MIN_SCORE
+        assert db.find_similar(_digest(document), min_score=101) == []
+    finally:
+        db.close()
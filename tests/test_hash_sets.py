@@ -0,0 +1,109 @@
+# test_hash_sets.py
+
+import hashlib
+import os
+import struct
+
+import pytest
+
+from hash_sets import (HEADER_SIZE, KNOWN_BAD, KNOWN_GOOD, UNKNOWN, HashSetError, HashSetIndex,
+                       KnownHashSets, _new_buckets)
+
+
+def _md5(text):
+    return hashlib.md5(text.encode()).digest()
+
+
+def test_index_finds_members_and_misses_others():
+    members = [_md5(f"file {i}") for i in range(200)]
+    index = HashSetIndex.build(members + members[:10], "md5")
+
+    assert len(index) == 200
+    assert all(digest in index for digest in members)
+    assert all(digest.hex() in index for digest in members[:5])
+    assert members[0].hex().upper() in index
+    assert _md5("not in the set") not in index
+
+
+def test_from_buckets_counts_and_prefix_boundaries(tmp_path):
+    lowest = b"\x00\x00" + b"\x01" * 14
+    highest = b"\xff\xff" + b"\xfe" * 14
+    middle = b"\x12\x34" + b"\x00" * 14
+    buckets = _new_buckets()
+    for digest in (highest, lowest, middle, lowest):
+        buckets[digest[0]] += digest
+
+    path = str(tmp_path / "set.md5.hidx")
+    index = HashSetIndex.from_buckets(buckets, "md5", path)
+    try:
+        assert all(len(bucket) == 0 for bucket in buckets)
+        assert (index.algorithm, index.width, len(index)) == ("md5", 16, 3)
+        table = struct.unpack_from("<65537Q", index._data, HEADER_SIZE)
+        assert (table[0], table[1], table[0x1234], table[0x1235]) == (0, 1, 1, 2)
+        assert (table[0xFFFF], table[0x10000]) == (2, 3)
+        for digest in (lowest, middle, highest):
+            assert digest in index
+        assert b"\x00\x00" + b"\x00" * 14 not in index
+        assert b"\xff\xff" + b"\xff" * 14 not in index
+    finally:
+        index.close()
+
+
+def test_wrong_width_and_non_hex_are_misses():
+    digest = _md5("a")
+    index = HashSetIndex.build([digest], "md5")
+
+    assert digest[:8] not in index
+    assert hashlib.sha256(b"a").digest() not in index
+    assert "zz" * 16 not in index
+    assert "abc" not in index
+
+
+def test_bad_index_files_are_rejected(tmp_path):
+    path = tmp_path / "broken.hidx"
+    path.write_bytes(b"short")
+    with pytest.raises(HashSetError):
+        HashSetIndex.open(str(path))
+
+
+def test_known_bad_wins_over_known_good(tmp_path):
+    shared = hashlib.md5(b"tool.exe").hexdigest()
+    good_only = hashlib.md5(b"notepad.exe").hexdigest()
+    good = tmp_path / "nsrl.txt"
+    good.write_text(f"{shared}\n{good_only}\n")
+    bad = tmp_path / "case.txt"
+    bad.write_text(f"{shared}  tool.exe\n")
+
+    known = KnownHashSets()
+    assert known.add(str(good), KNOWN_GOOD) == 2
+    assert known.add(str(bad), KNOWN_BAD) == 1
+
+    assert known.match({"md5": shared}) == (KNOWN_BAD, "case.txt")
+    assert known.match({"md5": good_only}) == (KNOWN_GOOD, "nsrl.txt")
+    assert known.match({"md5": hashlib.md5(b"other").hexdigest()}) == (UNKNOWN, None)
+    assert known.annotate({"hashes": {"md5": shared}})["known"] == KNOWN_BAD
+
+
+def test_stale_index_is_recompiled_from_a_newer_source(tmp_path):
+    source = tmp_path / "list.txt"
+    first = hashlib.sha256(b"first").hexdigest()
+    second = hashlib.sha256(b"second").hexdigest()
+    source.write_text(first + "\n")
+    KnownHashSets().add(str(source), KNOWN_GOOD)
+    index_path = str(source) + ".sha256.hidx"
+    assert os.path.exists(index_path)
+
+    # An index at least as new as its source is reused as is
+    reused = KnownHashSets()
+    source.write_text(second + "\n")
+    stamp = os.path.getmtime(index_path)
+    os.utime(source, (stamp - 10, stamp - 10))
+    reused.add(str(source), KNOWN_GOOD)
+    assert reused.classify({"sha256": first}) == KNOWN_GOOD
+    assert reused.classify({"sha256": second}) == UNKNOWN
+
+    os.utime(source, (stamp + 10, stamp + 10))
+    rebuilt = KnownHashSets()
+    rebuilt.add(str(source), KNOWN_GOOD)
+    assert rebuilt.classify({"sha256": first}) == UNKNOWN
+    assert rebuilt.classify({"sha256": second}) == KNOWN_GOOD
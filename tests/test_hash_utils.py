@@ -0,0 +1,75 @@
+# test_hash_utils.py
+
+import hashlib
+import os
+
+import pytest
+
+import hash_utils
+from hash_utils import MultiHasher, hash_file
+
+ALGORITHMS = ("md5", "sha1", "sha256")
+CHUNK = 4096
+
+
+def _expected(data):
+    return {name: hashlib.new(name, data).hexdigest() for name in ALGORITHMS}
+
+
+def _write(tmp_path, name, data):
+    path = str(tmp_path / name)
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+
+@pytest.mark.parametrize("size", [0, 1, 4095, 4096, 4097, 3 * 4096 + 17])
+def test_hash_file_matches_hashlib(tmp_path, size):
+    data = os.urandom(size)
+    path = _write(tmp_path, "data.bin", data)
+
+    assert hash_file(path, ALGORITHMS, CHUNK) == (size, _expected(data))
+
+
+def test_reused_buffer_does_not_leak_between_files(tmp_path):
+    buffer = bytearray(CHUNK)
+    large = os.urandom(5 * CHUNK + 100)
+    small = b"short file"
+    results = [hash_file(_write(tmp_path, name, data), ALGORITHMS, CHUNK, buffer)
+               for name, data in (("large.bin", large), ("small.bin", small))]
+
+    # The second file is shorter than what the buffer still holds from the first
+    assert results == [(len(large), _expected(large)), (len(small), _expected(small))]
+    assert bytes(buffer[:len(small)]) == small
+
+
+def test_multihasher_takes_any_chunking():
+    data = os.urandom(10000)
+    hasher = MultiHasher(ALGORITHMS)
+    for start in range(0, len(data), 777):
+        hasher.update(memoryview(data)[start:start + 777])
+
+    assert hasher.hexdigests() == _expected(data)
+    assert list(hasher.hexdigests()) == list(ALGORITHMS)
+
+
+def test_hash_files_schedules_largest_first_and_sorts_by_path(tmp_path, monkeypatch):
+    sizes = {"b.bin": 300, "a.bin": 20000, "d.bin": 0, "c.bin": 9000}
+    files = [(_write(tmp_path, name, os.urandom(size)), size) for name, size in sizes.items()]
+    files.append((str(tmp_path / "missing.bin"), 50000))
+    order = []
+    real_hash_file = hash_utils.hash_file
+
+    def recording_hash_file(path, *args, **kwargs):
+        order.append(os.path.basename(path))
+        return real_hash_file(path, *args, **kwargs)
+
+    monkeypatch.setattr(hash_utils, "hash_file", recording_hash_file)
+    records = hash_utils.hash_files(files, ALGORITHMS, workers=1, use_processes=False)
+
+    assert order == ["missing.bin", "a.bin", "c.bin", "b.bin", "d.bin"]
+    assert [os.path.basename(r["path"]) for r in records] == ["a.bin", "b.bin", "c.bin", "d.bin"]
+    for record in records:
+        with open(record["path"], "rb") as f:
+            data = f.read()
+        assert (record["size"], record["hashes"]) == (len(data), _expected(data))
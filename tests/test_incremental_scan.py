@@ -0,0 +1,138 @@
+# test_incremental_scan.py
+
+import os
+
+import pytest
+
+import database
+import hash_utils
+from incremental_scan import rescan_device, format_scan_diff
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setitem(database.DATABASE, "path", str(tmp_path / "scan.db"))
+    db = database.DatabaseManager()
+    yield db
+    db.close()
+
+
+def _write(root, rel, data, mtime=None):
+    path = os.path.join(root, rel)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+    return path
+
+
+def _rescan(root, db):
+    return rescan_device(str(root), "SERIAL1", db, use_processes=False)
+
+
+def test_first_scan_is_a_baseline(tmp_path, db):
+    root = tmp_path / "stick"
+    _write(root, "a.txt", b"alpha\n")
+    _write(root, os.path.join("docs", "b.txt"), b"bravo\n")
+
+    diff = _rescan(root, db)
+
+    assert diff.previous_id is None
+    assert diff.added == ["a.txt", os.path.join("docs", "b.txt")]
+    assert diff.removed == diff.changed == diff.unchanged == []
+    assert diff.bytes_hashed == 12
+    assert "No previous acquisition" in format_scan_diff(diff)
+
+
+def test_rescan_classifies_every_file(tmp_path, db):
+    root = tmp_path / "stick"
+    _write(root, "same.txt", b"unchanged", 1000000000)
+    _write(root, "edited.txt", b"version 1", 1000000000)
+    _write(root, "touched.txt", b"same bytes", 1000000000)
+    _write(root, "gone.txt", b"deleted later", 1000000000)
+    first = _rescan(root, db)
+
+    _write(root, "edited.txt", b"version 2", 1000000100)
+    os.utime(os.path.join(root, "touched.txt"), (1000000200, 1000000200))
+    os.remove(os.path.join(root, "gone.txt"))
+    _write(root, "new.txt", b"fresh")
+    diff = _rescan(root, db)
+
+    assert diff.previous_id == first.manifest_id
+    assert diff.added == ["new.txt"]
+    assert diff.removed == ["gone.txt"]
+    assert diff.changed == ["edited.txt"]
+    assert diff.touched == ["touched.txt"]
+    assert diff.unchanged == ["same.txt"]
+    # Only the new, edited and touched files were read again
+    assert diff.bytes_hashed == len(b"fresh") + len(b"version 2") + len(b"same bytes")
+    unchanged = next(r for r in diff.records if r["path"].endswith("same.txt"))
+    assert unchanged["cached"] is True
+    assert unchanged["hashes"] == next(r for r in first.records
+                                       if r["path"].endswith("same.txt"))["hashes"]
+
+
+def test_rescan_from_another_mount_point(tmp_path, db):
+    _write(tmp_path / "E", os.path.join("docs", "report.doc"), b"report", 1000000000)
+    _rescan(tmp_path / "E", db)
+    os.rename(tmp_path / "E", tmp_path / "F")
+
+    diff = _rescan(tmp_path / "F", db)
+
+    assert diff.unchanged == [os.path.join("docs", "report.doc")]
+    assert diff.added == diff.removed == []
+    assert diff.bytes_hashed == 0
+
+
+def test_unreadable_file_is_kept_not_removed(tmp_path, db, monkeypatch):
+    root = tmp_path / "stick"
+    _write(root, "ok.txt", b"fine", 1000000000)
+    locked = _write(root, "locked.bin", b"secret", 1000000000)
+    _rescan(root, db)
+
+    # A changed file that can no longer be read
+    _write(root, "locked.bin", b"secret!", 1000000500)
+    real_hash_file = hash_utils.hash_file
+
+    def failing_hash_file(path, *args, **kwargs):
+        if path == locked:
+            raise PermissionError(13, "Permission denied", path)
+        return real_hash_file(path, *args, **kwargs)
+
+    monkeypatch.setattr(hash_utils, "hash_file", failing_hash_file)
+    diff = _rescan(root, db)
+    assert diff.unreadable == ["locked.bin"]
+    assert diff.removed == []
+    assert "Unreadable (kept from last scan): 1" in format_scan_diff(diff)
+
+    # The carried-over entry means the file is not "added" once it can be read again
+    monkeypatch.setattr(hash_utils, "hash_file", real_hash_file)
+    diff = _rescan(root, db)
+    assert diff.added == []
+    assert diff.changed == ["locked.bin"]
+
+
+def test_unlistable_folder_is_kept_not_removed(tmp_path, db, monkeypatch):
+    root = tmp_path / "stick"
+    _write(root, os.path.join("private", "a.txt"), b"a", 1000000000)
+    _write(root, os.path.join("private", "b.txt"), b"b", 1000000000)
+    _write(root, "public.txt", b"p", 1000000000)
+    _rescan(root, db)
+
+    real_scandir = os.scandir
+    private = os.path.join(str(root), "private")
+
+    def failing_scandir(path="."):
+        if os.fspath(path) == private:
+            raise PermissionError(13, "Permission denied", path)
+        return real_scandir(path)
+
+    monkeypatch.setattr(os, "scandir", failing_scandir)
+    diff = _rescan(root, db)
+    monkeypatch.setattr(os, "scandir", real_scandir)
+
+    assert diff.unreadable == ["private"]
+    assert diff.removed == []
+    assert _rescan(root, db).unchanged == [os.path.join("private", "a.txt"),
+                                           os.path.join("private", "b.txt"), "public.txt"]
@@ -0,0 +1,113 @@
+# test_registry_hive.py
+
+from datetime import datetime
+
+import pytest
+
+from benchmark import make_sample_system_hive, write_sample_hive
+from registry_hive import HiveError, RegistryHive, filetime_to_datetime
+from usb_registry import HiveFileBackend
+
+FILETIME = 133000000000000000  # 2022-06-18 04:26:40 UTC
+SECOND = 10000000
+GUID = "{53f56307-b6bf-11d0-94f2-00a0c91efb8b}"
+
+
+def _instance(serial, friendly, filetime):
+    return (serial + "&0", {"FriendlyName": friendly,
+                            "Mfg": "@disk.inf,%genmanufacturer%;(Standard disk drives)"},
+            [], filetime)
+
+
+def _control_set(name, instances, filetime=FILETIME):
+    usbstor = ("USBSTOR", {}, [("Disk&Ven_SanDisk&Prod_Cruzer&Rev_1.00", {}, instances,
+                                filetime)], filetime)
+    usb = ("USB", {}, [("VID_0781&PID_5567", {}, [("AA11", {}, [], filetime)], filetime),
+                       ("ROOT_HUB30", {}, [("4&1", {}, [], filetime)], filetime)], filetime)
+    return (name, {}, [("Enum", {}, [usbstor, usb], filetime)], filetime)
+
+
+@pytest.fixture
+def hive_path(tmp_path):
+    path = str(tmp_path / "SYSTEM")
+    mounted = {
+        "\\DosDevices\\E:": f"_??_USBSTOR#Disk&Ven_SanDisk&Prod_Cruzer&Rev_1.00#AA11&0#{GUID}"
+                            .encode("utf-16-le"),
+        "\\DosDevices\\C:": b"\x01\x02\x03\x04\x00\x7e\x00\x00\x00\x00\x00\x00",
+        "\\??\\Volume{1234}": b"\x00" * 12,
+    }
+    write_sample_hive(path, ("ROOT", {}, [
+        # ControlSet001 holds an older copy of AA11 and a device the current set lacks
+        _control_set("ControlSet001", [_instance("AA11", "Old name", FILETIME),
+                                       _instance("BB22", "Cruzer Blade", FILETIME + 5 * SECOND)]),
+        _control_set("ControlSet002", [_instance("AA11", "SanDisk Cruzer USB Device",
+                                                 FILETIME + 60 * SECOND)]),
+        ("Select", {"Current": 2}, [], FILETIME),
+        ("MountedDevices", mounted, [], FILETIME),
+        ("Setup", {"Blob": bytes(range(256)) * 100, "Count": 7}, [], FILETIME),
+    ], FILETIME))
+    return path
+
+
+def test_keys_and_values_are_read(hive_path):
+    with RegistryHive(hive_path) as hive:
+        assert sorted(key.name for key in hive.root().subkeys()) == \
+            ["ControlSet001", "ControlSet002", "MountedDevices", "Select", "Setup"]
+        setup = hive.open_key("setup")
+        assert setup.value("Count") == 7
+        assert setup.value("Blob") == bytes(range(256)) * 100
+        assert setup.value("Missing", "default") == "default"
+        assert hive.open_key(r"ControlSet002\Enum\USBSTOR").subkey_count() == 1
+        assert hive.open_key(r"ControlSet002\Enum\Missing") is None
+        assert hive.open_key("Select").last_written == filetime_to_datetime(FILETIME)
+
+
+def test_devices_merge_control_sets_usb_ids_and_drive_letters(hive_path):
+    with HiveFileBackend(hive_path) as backend:
+        assert backend.control_sets() == ["ControlSet002", "ControlSet001"]
+        devices = {record["serial"]: record for record in backend.devices()}
+
+    assert sorted(devices) == ["AA11", "BB22"]
+    aa11 = devices["AA11"]
+    assert aa11["friendly_name"] == "SanDisk Cruzer USB Device"
+    assert aa11["control_set"] == "ControlSet002"
+    assert aa11["manufacturer"] == "(Standard disk drives)"
+    assert (aa11["vendor_id"], aa11["product_id"]) == ("0781", "5567")
+    assert aa11["drive_letters"] == ["E:"]
+    assert aa11["last_written"] == datetime(2022, 6, 18, 4, 27, 40)
+    assert devices["BB22"]["drive_letters"] == []
+    assert devices["BB22"]["vendor_id"] is None
+
+
+def test_generated_system_hive_with_split_subkey_lists(tmp_path):
+    path = str(tmp_path / "SYSTEM")
+    # Over 1024 subkeys under one key are split into lf cells under an ri index
+    make_sample_system_hive(path, devices=30, filler_keys=2100)
+    with HiveFileBackend(path) as backend:
+        devices = backend.devices()
+        services = backend.open_key(r"ControlSet001\Services")
+        assert services.subkey_count() == 2100
+        assert sum(1 for _ in services.subkeys()) == 2100
+        assert services.subkey("Service0002099").value("Start") == 3
+
+    assert len(devices) == 30
+    assert len({record["serial"] for record in devices}) == 30
+    assert sum(1 for record in devices if record["drive_letters"]) == 23
+    assert all(record["vendor_id"] for record in devices)
+    assert all(record["friendly_name"].endswith("USB Device") for record in devices)
+
+
+def test_files_that_are_not_hives_are_rejected(tmp_path):
+    empty = tmp_path / "empty"
+    empty.write_bytes(b"")
+    other = tmp_path / "other"
+    other.write_bytes(b"MZ" + b"\x00" * 8190)
+    for path in (empty, other):
+        with pytest.raises(HiveError):
+            RegistryHive(str(path))
+
+
+def test_filetime_conversion():
+    assert filetime_to_datetime(0) is None
+    assert filetime_to_datetime(116444736000000000) == datetime(1970, 1, 1)
+    assert filetime_to_datetime(FILETIME) == datetime(2022, 6, 18, 4, 26, 40)
@@ -0,0 +1,104 @@
+# test_timeline.py
+
+import pytest
+
+from database import DatabaseManager
+from db_migrations import to_epoch_us
+from timeline import IntervalIndex, Timeline
+
+
+def test_stab_open_ended_boundary_and_nested_intervals():
+    index = IntervalIndex([
+        (10, 100, "outer"),
+        (20, 30, "inner"),
+        (25, 26, "innermost"),
+        (30, 40, "touching"),
+        (50, None, "open"),
+        (200, None, "late"),
+    ])
+
+    assert len(index) == 6
+    assert sorted(index.stab(25)) == ["inner", "innermost", "outer"]
+    # Both ends are inclusive
+    assert sorted(index.stab(30)) == ["inner", "outer", "touching"]
+    assert sorted(index.stab(10)) == ["outer"]
+    assert sorted(index.stab(100)) == ["open", "outer"]
+    assert sorted(index.stab(101)) == ["open"]
+    assert sorted(index.stab(10 ** 15)) == ["late", "open"]
+    assert index.stab(9) == []
+    assert IntervalIndex([]).stab(0) == []
+
+
+def test_stab_matches_a_linear_scan():
+    intervals = [(start, None if start % 7 == 0 else start + start % 13, start)
+                 for start in range(0, 300, 3)]
+    index = IntervalIndex(intervals)
+    for t in range(-1, 320):
+        expected = [item for start, end, item in intervals
+                    if start <= t and (end is None or t <= end)]
+        assert sorted(index.stab(t)) == expected
+
+
+@pytest.fixture
+def timeline(tmp_path):
+    db = DatabaseManager(str(tmp_path / "timeline.db"))
+    events = [
+        ("Present", "SN1", "2024-01-01 10:00:00", ""),
+        ("Mounted", "SN1", "2024-01-01 10:00:05", "mounted at /media/stick"),
+        ("Present", "SN2", "2024-01-01 10:30:00", ""),
+        ("Mounted", "SN2", "2024-01-01 10:30:05", "mounted at /media/stick"),
+        ("Unmounted", "SN1", "2024-01-01 11:00:00", "mounted at /media/stick"),
+        ("Disconnected", "SN1", "2024-01-01 11:00:01", ""),
+    ]
+    for event_type, serial, when, details in events:
+        db.insert_live_event(event_type, f"Stick {serial}", serial, when, details)
+    for when in ("2024-01-01 10:10:00", "2024-01-01 10:45:00", "2024-01-01 12:00:00"):
+        db.insert_file_transfer_event({
+            "event_type": "created", "file_path": "/media/stick/secret.doc", "usb_serial": None,
+            "timestamp": when, "file_hash_md5": None, "file_hash_sha256": None,
+            "file_size": 1, "is_suspicious": 0})
+    timeline = Timeline(db, log_path=str(tmp_path / "transfers.log"))
+    assert timeline.sync()["live"] == 6
+    yield timeline
+    db.close()
+
+
+def test_mounted_at_lists_connections_and_mounts(timeline):
+    def mounted(when):
+        return sorted((serial, mount) for serial, _, mount, _, _ in timeline.mounted_at(when))
+
+    assert mounted("2024-01-01 09:59:59") == []
+    assert mounted("2024-01-01 10:00:05") == [("SN1", ""), ("SN1", "/media/stick")]
+    assert mounted("2024-01-01 10:45:00") == [("SN1", ""), ("SN1", "/media/stick"),
+                                              ("SN2", ""), ("SN2", "/media/stick")]
+    # Ends are inclusive; times may also be epoch seconds
+    removed = to_epoch_us("2024-01-01 11:00:01") / 1e6
+    assert ("SN1", "") in mounted(removed)
+    assert mounted(removed + 1) == [("SN2", ""), ("SN2", "/media/stick")]
+    open_end = [end for serial, _, mount, _, end in timeline.mounted_at("2030-01-01 00:00:00")
+                if serial == "SN2" and mount]
+    assert open_end == [None]
+
+
+def test_devices_for_file_names_the_mount_that_held_it(timeline):
+    found = timeline.devices_for_file("/media/stick/secret.doc")
+    owners = [(ts_us, sorted(serial for serial, *_ in devices)) for ts_us, _, _, devices in found]
+    assert owners == [
+        (to_epoch_us("2024-01-01 10:10:00"), ["SN1"]),
+        (to_epoch_us("2024-01-01 10:45:00"), ["SN1", "SN2"]),
+        (to_epoch_us("2024-01-01 12:00:00"), ["SN2"]),
+    ]
+    assert len(timeline.devices_for_file("/media/stick/secret.doc",
+                                         start="2024-01-01 10:30:00",
+                                         end="2024-01-01 11:00:00")) == 1
+    assert timeline.devices_for_file("/media/other/secret.doc") == []
+
+
+@pytest.mark.parametrize("when", ["yesterday", "2024-13-45 10:00:00", object()])
+def test_unreadable_times_raise_value_error(timeline, when):
+    with pytest.raises(ValueError):
+        timeline.mounted_at(when)
+    with pytest.raises(ValueError):
+        timeline.devices_for_file("/media/stick/secret.doc", start=when)
+    with pytest.raises(ValueError):
+        timeline.events(end=when)
@@ -0,0 +1,147 @@
+# test_transfer_log.py
+
+import os
+
+import pytest
+
+from db_migrations import to_epoch_us
+from transfer_log import TransferLogWriter, TransferLogReader, import_legacy_log
+
+
+def _writer(tmp_path, **kwargs):
+    settings = dict(max_bytes=1000, compress=False, flush_interval=60, index_interval=100)
+    settings.update(kwargs)
+    return TransferLogWriter(str(tmp_path / "file_transfers.jsonl"), **settings)
+
+
+def _event(i):
+    return {"event_type": "Transfer Completed", "file_path": f"/media/usb/file{i:03d}.bin",
+            "usb_serial": "SN1", "file_size": i, "hashes": {"md5": f"{i:032x}"}}
+
+
+def _fill(writer, count, first=1):
+    for i in range(first, first + count):
+        assert writer.write(_event(i)) == i
+    writer.flush()
+
+
+def test_rotation_keeps_seq_order_across_segments(tmp_path):
+    writer = _writer(tmp_path)
+    _fill(writer, 60)
+    reader = TransferLogReader(writer.path)
+
+    segments = reader.segments()
+    assert len(segments) > 3
+    assert segments[-1][1] == writer.path
+    assert [record["seq"] for record in reader.records()] == list(range(1, 61))
+    assert [record["seq"] for record in reader.records(after_seq=37)] == list(range(38, 61))
+    record = next(reader.records(after_seq=41))
+    assert record["file_path"] == "/media/usb/file042.bin"
+    assert record["hashes"] == {"md5": f"{42:032x}"}
+    writer.close()
+
+    # A new writer picks up the seq where the last one stopped
+    writer = _writer(tmp_path)
+    assert writer.write(_event(61)) == 61
+    writer.close()
+
+
+def test_tail_pages_through_new_records(tmp_path):
+    writer = _writer(tmp_path)
+    reader = TransferLogReader(writer.path)
+    _fill(writer, 25)
+
+    first, after = reader.tail(limit=10)
+    rest, after = reader.tail(after)
+    assert [r["seq"] for r in first + rest] == list(range(1, 26))
+    assert reader.tail(after) == ([], 25)
+
+    _fill(writer, 3, first=26)
+    assert [r["seq"] for r in reader.tail(after)[0]] == [26, 27, 28]
+    writer.close()
+
+
+def test_since_reads_by_time(tmp_path):
+    writer = _writer(tmp_path)
+    _fill(writer, 50)
+    reader = TransferLogReader(writer.path)
+    records = list(reader.records())
+    when = records[44]["ts_us"] / 1000000  # epoch seconds
+
+    assert [r["seq"] for r in reader.since(when)] == \
+        [r["seq"] for r in records if r["ts_us"] >= to_epoch_us(when)]
+    assert len(list(reader.since(0))) == 50
+    assert len(list(reader.since(str(int(when))))) >= 6  # epoch seconds typed on a command line
+    with pytest.raises(ValueError):
+        list(reader.since("not a time"))
+    writer.close()
+
+
+def test_compressed_segments_are_read(tmp_path):
+    writer = _writer(tmp_path, compress=True)
+    _fill(writer, 40)
+    writer.close()  # waits for the compressors
+    reader = TransferLogReader(writer.path)
+
+    rotated = [path for _, path in reader.segments()[:-1]]
+    assert rotated and all(path.endswith(".jsonl.gz") for path in rotated)
+    assert [r["seq"] for r in reader.records(after_seq=5)] == list(range(6, 41))
+
+
+def test_line_cut_short_by_a_crash_is_dropped(tmp_path):
+    writer = _writer(tmp_path, max_bytes=10 ** 6)
+    _fill(writer, 3)
+    writer.close()
+    with open(writer.path, "ab") as f:
+        f.write(b'{"seq":4,"ts_us":17000')
+
+    assert [r["seq"] for r in TransferLogReader(writer.path).records()] == [1, 2, 3]
+    writer = _writer(tmp_path, max_bytes=10 ** 6)
+    assert writer.write(_event(4)) == 4
+    writer.close()
+    assert [r["seq"] for r in TransferLogReader(writer.path).records()] == [1, 2, 3, 4]
+
+
+def test_writing_continues_after_the_index_is_lost(tmp_path):
+    writer = _writer(tmp_path, max_bytes=3000)
+    _fill(writer, 10)
+    writer.close()
+    os.remove(writer.path + ".idx")
+
+    writer = _writer(tmp_path, max_bytes=3000, max_age=3600)
+    _fill(writer, 30, first=11)
+    writer.close()
+    reader = TransferLogReader(writer.path)
+
+    assert [r["seq"] for r in reader.records()] == list(range(1, 41))
+    assert [r["seq"] for r in reader.records(after_seq=7)] == list(range(8, 41))
+    # The rebuilt index named the first rotated segment from its first record
+    first, path = reader.segments()[0]
+    assert first == 1
+    assert os.path.basename(path).startswith("file_transfers.000000000001-")
+
+
+def test_legacy_text_log_is_imported_once(tmp_path):
+    legacy = tmp_path / "file_transfers.log"
+    legacy.write_text(
+        "[Tue Nov 14 22:13:20 2023] Transfer Completed: /media/usb/a.txt (12 bytes) "
+        "MD5=0cc175b9c0f1b6a831c399e269772661 [known_good]\n"
+        "[Tue Nov 14 22:14:00 2023] Moved: /media/usb/b.txt (from /media/usb/old.txt)\n"
+        "garbage line\n")
+    writer = _writer(tmp_path)
+
+    assert import_legacy_log(writer) == 2
+    assert not legacy.exists() and os.path.exists(str(legacy) + ".imported")
+    first, second = TransferLogReader(writer.path).records()
+    assert first["ts_us"] == to_epoch_us("Tue Nov 14 22:13:20 2023")
+    assert (first["event_type"], first["file_path"], first["file_size"]) == \
+        ("Transfer Completed", "/media/usb/a.txt", 12)
+    assert first["hashes"] == {"md5": "0cc175b9c0f1b6a831c399e269772661"}
+    assert first["hash_status"] == "known_good"
+    assert (second["event_type"], second["src_path"]) == ("Moved", "/media/usb/old.txt")
+
+    # Only into an empty log
+    legacy.write_text("[Tue Nov 14 22:15:00 2023] Deleted: /media/usb/c.txt\n")
+    assert import_legacy_log(writer) == 0
+    assert legacy.exists()
+    writer.close()
@@ -0,0 +1,44 @@
+# test_usbforensic.py
+
+import hashlib
+import json
+
+import pytest
+
+import usbforensic
+
+
+def test_export_rejects_an_unreadable_time_before_writing(tmp_path, capsys):
+    output = tmp_path / "out.jsonl"
+    output.write_text("earlier export\n")
+
+    status = usbforensic.main(["--db", str(tmp_path / "case.db"), "export", "live",
+                               "--start", "bogus", "-o", str(output)])
+
+    assert status == 1
+    assert "unrecognised time 'bogus'" in capsys.readouterr().err
+    assert output.read_text() == "earlier export\n"
+
+
+def test_export_accepts_epoch_seconds(tmp_path, capsys):
+    status = usbforensic.main(["--db", str(tmp_path / "case.db"), "export", "live",
+                               "--start", "1700000000", "--end", "2024-01-01 00:00:00"])
+
+    assert status == 0
+    assert "Exported 0 rows" in capsys.readouterr().err
+
+
+def test_hash_checks_algorithm_names(tmp_path, capsys):
+    path = tmp_path / "f.txt"
+    path.write_bytes(b"hello\n")
+
+    with pytest.raises(SystemExit) as exit_info:
+        usbforensic.main(["hash", "--no-cache", "--algorithms", "md5,nope", str(path)])
+    assert exit_info.value.code == 2
+    assert "unsupported algorithm nope" in capsys.readouterr().err
+
+    assert usbforensic.main(["hash", "--no-cache", "--json", "--algorithms", "MD5, sha256",
+                             str(path)]) == 0
+    record = json.loads(capsys.readouterr().out)
+    assert record["hashes"] == {"md5": hashlib.md5(b"hello\n").hexdigest(),
+                                "sha256": hashlib.sha256(b"hello\n").hexdigest()}
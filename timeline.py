@@ -0,0 +1,318 @@
+# timeline.py
+"""One time-ordered index over every record of USB activity.
+
+Timeline.sync() copies new rows from each evidence source into
+timeline_events, indexed by (ts_us), (serial, ts_us) and (subject, ts_us):
+
+- live:     live_usb_events (device arrivals, removals, mounts)
+- transfer: file_transfer_events
+- log:      the JSON Lines transfer log and its rotated segments (transfer_log)
+- registry: last-write times of USBSTOR keys (DeviceRecords from device_history)
+
+Every source is read incrementally: table sources from the last copied id,
+the log from the last sequence number. Live events are also folded into
+device_intervals, one row per connection and per mount of a device, and
+an in-memory interval tree answers "what was mounted at time T".
+"""
+
+import re
+import sqlite3
+from datetime import timezone
+
+from config import TRANSFER_LOG_PATH
+from db_migrations import to_epoch_us, require_epoch_us
+from transfer_log import TransferLogReader, format_transfer_details
+
+# Sources copied with one INSERT ... SELECT of the ids added since the last sync
+_TABLE_SOURCES = {
+    "live": """
+        INSERT INTO timeline_events (ts_us, serial, source, source_key, event_type, subject, details)
+        SELECT ts_us, serial_number, 'live', id, event_type, device_name, details
+        FROM live_usb_events WHERE id > ? AND id <= ? ORDER BY id
+    """,
+    "transfer": """
+        INSERT INTO timeline_events (ts_us, serial, source, source_key, event_type, subject, details)
+        SELECT ts_us, usb_serial, 'transfer', id, event_type, file_path, hash_status
+        FROM file_transfer_events WHERE id > ? AND id <= ? ORDER BY id
+    """,
+}
+_INSERT_SQL = '''
+    INSERT INTO timeline_events (ts_us, serial, source, source_key, event_type, subject, details)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+'''
+_MOUNT_DETAILS = re.compile(r"^mounted at (?P<mount>.+)$")
+_OPEN_EVENTS = ("Present", "Connected")
+_LOG_BATCH = 10000
+
+
+def _under(path, mount):
+    """True if path is mount itself or inside it."""
+    mount = mount.rstrip("/\\")
+    if not mount:
+        return False
+    return path == mount or (path.startswith(mount) and path[len(mount)] in "/\\")
+
+
+class IntervalIndex:
+    """Static interval tree for stabbing queries ("which intervals contain t").
+
+    Intervals (start, end, item) are sorted by start and read as an implicit
+    balanced binary tree, the middle of each range being its root. Every node
+    stores the largest end in its subtree, so a query skips any subtree that
+    ends before t and any right subtree that starts after it: O(log n + k).
+    An end of None means still open.
+    """
+
+    def __init__(self, intervals):
+        self._intervals = sorted(intervals, key=lambda interval: interval[0])
+        self._starts = [interval[0] for interval in self._intervals]
+        self._ends = [float("inf") if interval[1] is None else interval[1]
+                      for interval in self._intervals]
+        self._max_end = list(self._ends)
+        self._build(0, len(self._intervals))
+
+    def __len__(self):
+        return len(self._intervals)
+
+    def _build(self, lo, hi):
+        if lo >= hi:
+            return float("-inf")
+        mid = (lo + hi) // 2
+        self._max_end[mid] = max(self._ends[mid], self._build(lo, mid), self._build(mid + 1, hi))
+        return self._max_end[mid]
+
+    def stab(self, t):
+        """Return the items of every interval with start <= t <= end."""
+        found = []
+        stack = [(0, len(self._intervals))]
+        while stack:
+            lo, hi = stack.pop()
+            if lo >= hi:
+                continue
+            mid = (lo + hi) // 2
+            if self._max_end[mid] < t:
+                continue
+            stack.append((lo, mid))
+            if self._starts[mid] <= t:
+                if self._ends[mid] >= t:
+                    found.append(self._intervals[mid][2])
+                stack.append((mid + 1, hi))
+        return found
+
+
+class Timeline:
+    """The merged event timeline of a DatabaseManager."""
+
+    def __init__(self, db, log_path=TRANSFER_LOG_PATH):
+        self.db = db
+        self.log_path = log_path
+        self._index = None
+
+    # -- building ---------------------------------------------------------
+
+    def _position(self, source):
+        row = self.db.conn.execute("SELECT position, marker FROM timeline_sources WHERE source = ?",
+                                   (source,)).fetchone()
+        return row if row else (0, None)
+
+    def _set_position(self, conn, source, position, marker=None):
+        conn.execute("INSERT OR REPLACE INTO timeline_sources (source, position, marker) "
+                     "VALUES (?, ?, ?)", (source, position, marker))
+
+    def sync(self, registry=()):
+        """Copy everything new from each source; returns {source: rows added}.
+
+        registry is an iterable of DeviceRecords, e.g.
+        get_history_provider().snapshot(hive_path).
+        """
+        self.db.flush()
+        added = {}
+        try:
+            added["live"] = self._sync_table("live", "live_usb_events")
+            added["transfer"] = self._sync_table("transfer", "file_transfer_events")
+            self._sync_intervals()
+            added["log"] = self._sync_log()
+            added["registry"] = self.add_registry(registry)
+        except sqlite3.Error as e:
+            print(f"Error updating timeline: {str(e)}")
+        return added
+
+    def _sync_table(self, source, table):
+        conn = self.db.conn
+        last = self._position(source)[0]
+        newest = conn.execute(f"SELECT MAX(id) FROM {table}").fetchone()[0]
+        if newest is None or newest <= last:
+            return 0
+        with conn:
+            count = conn.execute(_TABLE_SOURCES[source], (last, newest)).rowcount
+            self._set_position(conn, source, newest)
+        return count
+
+    def _sync_intervals(self):
+        """Open and close device_intervals from live events not folded in yet."""
+        conn = self.db.conn
+        last = self._position("intervals")[0]
+        rows = conn.execute("""
+            SELECT id, ts_us, serial_number, device_name, event_type, details
+            FROM live_usb_events WHERE id > ? ORDER BY id
+        """, (last,)).fetchall()
+        if not rows:
+            return
+        with conn:
+            for row_id, ts_us, serial, name, event_type, details in rows:
+                if not serial:
+                    continue
+                match = _MOUNT_DETAILS.match(details or "")
+                mount = match.group("mount") if match else ""
+                if event_type in _OPEN_EVENTS or event_type == "Mounted" and mount:
+                    open_row = conn.execute(
+                        "SELECT 1 FROM device_intervals WHERE serial = ? AND mount = ? "
+                        "AND end_us IS NULL", (serial, mount)).fetchone()
+                    if open_row is None:
+                        conn.execute("INSERT INTO device_intervals "
+                                     "(serial, device_name, mount, start_us) VALUES (?, ?, ?, ?)",
+                                     (serial, name, mount, ts_us))
+                elif event_type == "Unmounted" and mount:
+                    conn.execute("UPDATE device_intervals SET end_us = ? WHERE serial = ? "
+                                 "AND mount = ? AND end_us IS NULL", (ts_us, serial, mount))
+                elif event_type == "Disconnected":
+                    # Removal ends the connection and any mount left behind
+                    conn.execute("UPDATE device_intervals SET end_us = ? WHERE serial = ? "
+                                 "AND end_us IS NULL", (ts_us, serial))
+            self._set_position(conn, "intervals", rows[-1][0])
+        self._index = None
+
+    def _sync_log(self):
+        """Index transfer log records written since the last sync, across rotations."""
+        conn = self.db.conn
+        last = self._position("log")[0]
+        count = 0
+        batch = []
+        for record in TransferLogReader(self.log_path).records(last):
+            path = record.get("file_path")
+            serial = record.get("usb_serial") or self._serial_for_path(path, record["ts_us"])
+            batch.append((record["ts_us"], serial, "log", record["seq"], record.get("event_type"),
+                          path, format_transfer_details(record) or None))
+            last = record["seq"]
+            if len(batch) >= _LOG_BATCH:
+                count += self._write_log_batch(conn, batch, last)
+                batch = []
+        return count + self._write_log_batch(conn, batch, last)
+
+    def _write_log_batch(self, conn, batch, seq):
+        if batch:
+            with conn:
+                conn.executemany(_INSERT_SQL, batch)
+                self._set_position(conn, "log", seq)
+        return len(batch)
+
+    def _serial_for_path(self, path, ts_us):
+        # Records from log_transfer carry no serial; the device mounted over the path owns it
+        for serial, name, mount, start, end in self.index().stab(ts_us):
+            if _under(path, mount):
+                return serial
+        return None
+
+    def add_registry(self, records):
+        """Add the registry last-write time of each DeviceRecord; returns rows added."""
+        conn = self.db.conn
+        count = 0
+        with conn:
+            for record in records:
+                if record.last_connected is None:
+                    continue
+                # Registry times are naive UTC, not local time like the other sources
+                ts_us = to_epoch_us(record.last_connected.replace(tzinfo=timezone.utc))
+                exists = conn.execute(
+                    "SELECT 1 FROM timeline_events WHERE serial = ? AND ts_us = ? "
+                    "AND source = 'registry'", (record.serial_number, ts_us)).fetchone()
+                if exists:
+                    continue
+                letters = ", ".join(record.drive_letters)
+                conn.execute(_INSERT_SQL, (ts_us, record.serial_number, "registry", None,
+                                           "Last Connected",
+                                           record.friendly_name or record.device_name,
+                                           f"drive {letters}" if letters else None))
+                count += 1
+        return count
+
+    # -- queries ----------------------------------------------------------
+
+    def index(self):
+        """The interval tree over device_intervals, rebuilt after intervals change."""
+        if self._index is None:
+            rows = self.db.conn.execute(
+                "SELECT start_us, end_us, serial, device_name, mount FROM device_intervals"
+            ).fetchall()
+            self._index = IntervalIndex(
+                (start, end, (serial, name, mount, start, end))
+                for start, end, serial, name, mount in rows)
+        return self._index
+
+    def events(self, serial=None, start=None, end=None, sources=None, limit=1000):
+        """Events in time order as (ts_us, serial, source, event_type, subject, details).
+
+        start/end accept datetimes, epoch seconds or timestamp strings (a
+        ValueError for anything else); with a serial the (serial, ts_us)
+        index serves the whole range.
+        """
+        where, params = [], []
+        if serial:
+            where.append("serial = ?")
+            params.append(serial)
+        if start is not None:
+            where.append("ts_us >= ?")
+            params.append(require_epoch_us(start))
+        if end is not None:
+            where.append("ts_us <= ?")
+            params.append(require_epoch_us(end))
+        if sources:
+            where.append(f"source IN ({', '.join('?' * len(sources))})")
+            params.extend(sources)
+        sql = "SELECT ts_us, serial, source, event_type, subject, details FROM timeline_events"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY ts_us, id"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+        try:
+            return self.db.conn.execute(sql, params).fetchall()
+        except sqlite3.Error as e:
+            print(f"Error reading timeline: {str(e)}")
+            return []
+
+    def mounted_at(self, when):
+        """(serial, device_name, mount, start_us, end_us) of everything connected at a time.
+
+        Connections have an empty mount; each mount of a device is its own entry.
+        Raises ValueError if when is not a readable time.
+        """
+        return self.index().stab(require_epoch_us(when))
+
+    def devices_for_file(self, path, start=None, end=None):
+        """For each event on path, the devices whose mount held it at that moment.
+
+        Returns [(ts_us, source, event_type, [(serial, device_name, mount,
+        start_us, end_us), ...])]. Events recorded with a serial but no
+        matching mount (from before the device was watched) name that serial
+        with an unknown mount.
+        """
+        where, params = ["subject = ?"], [path]
+        if start is not None:
+            where.append("ts_us >= ?")
+            params.append(require_epoch_us(start))
+        if end is not None:
+            where.append("ts_us <= ?")
+            params.append(require_epoch_us(end))
+        rows = self.db.conn.execute(
+            "SELECT ts_us, serial, source, event_type FROM timeline_events WHERE "
+            + " AND ".join(where) + " ORDER BY ts_us, id", params).fetchall()
+        index = self.index()
+        found = []
+        for ts_us, serial, source, event_type in rows:
+            devices = [interval for interval in index.stab(ts_us) if _under(path, interval[2])]
+            if not devices and serial:
+                devices = [(serial, None, None, None, None)]
+            found.append((ts_us, source, event_type, devices))
+        return found
@@ -0,0 +1,414 @@
+# transfer_log.py
+"""Append-only JSON Lines transfer log with rotation and a sparse offset index.
+
+Every record is one JSON object per line carrying a sequence number (seq)
+that keeps counting across rotations, and its time in epoch microseconds
+(ts_us). Readers keep the last seq they saw and ask for what came after it.
+
+Files, for the default database/file_transfers.jsonl:
+
+    file_transfers.jsonl                         the segment being written
+    file_transfers.jsonl.idx                     its index
+    file_transfers.000000000001-000000051234.jsonl.gz
+    file_transfers.000000000001-000000051234.jsonl.idx
+
+A segment is rotated out once it reaches max_bytes or its first record is
+max_age seconds old, and compressed in the background. Index files are a
+flat array of (seq, ts_us, offset) entries, one every index_interval bytes
+of log, so a reader bisects to the block holding a seq or time instead of
+reading the segment from the start.
+
+A plain-text log left by older versions (file_transfers.log next to the
+JSON Lines log) is imported once when the writer is first created, then
+renamed to file_transfers.log.imported.
+"""
+
+import atexit
+import gzip
+import json
+import os
+import re
+import shutil
+import struct
+import threading
+import time
+from bisect import bisect_right
+
+from config import (TRANSFER_LOG_PATH, TRANSFER_LOG_MAX_BYTES, TRANSFER_LOG_MAX_AGE,
+                    TRANSFER_LOG_COMPRESS, TRANSFER_LOG_FLUSH_INTERVAL,
+                    TRANSFER_LOG_INDEX_INTERVAL)
+from db_migrations import to_epoch_us, require_epoch_us
+
+INDEX_ENTRY = struct.Struct("<qqq")  # seq, ts_us, byte offset of the record's line
+_ENCODER = json.JSONEncoder(separators=(",", ":"))
+# "[<time.ctime()>] <event>: <path>[ (from <src>)][ (<n> bytes)][ ALGO=<digest>...][ [<status>]]"
+_LEGACY_LINE = re.compile(r"^\[(?P<time>[^\]]+)\] (?P<event>[^:]+): (?P<path>.+?)"
+                          r"(?: \(from (?P<src>.+)\))?(?: \((?P<size>\d+) bytes\))?"
+                          r"(?P<hashes>(?: [A-Z0-9]+=\S+)*)(?: \[(?P<status>\w+)\])?$")
+_RECORD_FIELDS = ("event_type", "file_path", "src_path", "usb_serial", "timestamp", "file_size",
+                  "hashes", "file_type", "entropy", "hash_status", "content_flag")
+
+
+def _index_path(data_path):
+    return (data_path[:-3] if data_path.endswith(".gz") else data_path) + ".idx"
+
+
+def _read_index(data_path):
+    try:
+        with open(_index_path(data_path), "rb") as f:
+            data = f.read()
+    except OSError:
+        return []
+    return [INDEX_ENTRY.unpack_from(data, i) for i in range(0, len(data) - len(data) % 24, 24)]
+
+
+def _split(path):
+    stem, ext = os.path.splitext(path)
+    return stem, ext or ".jsonl"
+
+
+def format_transfer_details(event):
+    details = ""
+    if event.get("src_path"):
+        details += f" (from {event['src_path']})"
+    if event.get("file_size") is not None:
+        details += f" ({event['file_size']} bytes)"
+    if event.get("hashes"):
+        details += " " + " ".join(f"{name.upper()}={digest}"
+                                  for name, digest in event["hashes"].items()
+                                  if digest is not None)
+    if event.get("hash_status"):
+        details += f" [{event['hash_status']}]"
+    if event.get("content_flag"):
+        details += f" [suspicious: {event['content_flag']}]"
+    return details.strip()
+
+
+def format_transfer_line(event):
+    """One human-readable line for a transfer event or transfer log record."""
+    details = format_transfer_details(event)
+    return (f"[{event.get('timestamp') or time.ctime()}] {event['event_type']}: "
+            f"{event['file_path']}{' ' + details if details else ''}")
+
+
+class TransferLogWriter:
+    """Buffered appender for one transfer log.
+
+    Lines are written through a large buffer and flushed at most
+    flush_interval seconds after an event arrives, so readers in other
+    processes lag by no more than that. Use get_transfer_log() rather than
+    creating writers directly, so there is one per file in a process.
+    """
+
+    def __init__(self, path=TRANSFER_LOG_PATH, max_bytes=TRANSFER_LOG_MAX_BYTES,
+                 max_age=TRANSFER_LOG_MAX_AGE, compress=TRANSFER_LOG_COMPRESS,
+                 flush_interval=TRANSFER_LOG_FLUSH_INTERVAL,
+                 index_interval=TRANSFER_LOG_INDEX_INTERVAL):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.compress = compress
+        self.flush_interval = flush_interval
+        self.index_interval = index_interval
+        self._lock = threading.Lock()
+        self._timer = None
+        self._compressors = []
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._open()
+
+    def _open(self):
+        """Open the active segment, recovering seq and size from what is on disk.
+
+        Index entries missing for records in the segment (the .idx file was
+        deleted, or not flushed before a crash) are rebuilt from the records.
+        """
+        entries = _read_index(self.path)
+        self._next_seq = TransferLogReader(self.path).last_rotated_seq() + 1
+        offset = entries[-1][2] if entries else 0
+        if os.path.exists(self.path):
+            with open(self.path, "r+b") as f:
+                f.seek(offset)
+                end = offset
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    try:
+                        record = json.loads(line)
+                        self._next_seq = record["seq"] + 1
+                        if not entries or end - entries[-1][2] >= self.index_interval:
+                            entries.append((record["seq"], record["ts_us"], end))
+                    except (ValueError, KeyError):
+                        pass
+                    end += len(line)
+                # Drop a line cut short by a crash, so the next one starts cleanly
+                f.truncate(end)
+        self._file = open(self.path, "ab", buffering=1024 * 1024)
+        self._index = open(_index_path(self.path), "wb")
+        self._index.write(b"".join(INDEX_ENTRY.pack(*entry) for entry in entries))
+        self._first_ts = entries[0][1] if entries else None
+        self._indexed = entries[-1][2] if entries else None
+        self._size = self._file.tell()
+
+    def write(self, event, ts_us=None):
+        """Append one transfer event (a monitoring service event dict); returns its seq.
+
+        ts_us overrides the record time, for events imported from older logs.
+        """
+        now_us = ts_us if ts_us is not None else int(time.time() * 1000000)
+        record = {"seq": None, "ts_us": now_us}
+        for field in _RECORD_FIELDS:
+            if event.get(field) is not None:
+                record[field] = event[field]
+        with self._lock:
+            if self._size and (self._size >= self.max_bytes or
+                               now_us - self._first_ts >= self.max_age * 1000000):
+                self._rotate()
+            record["seq"] = seq = self._next_seq
+            line = (_ENCODER.encode(record) + "\n").encode("utf-8")
+            if self._indexed is None or self._size - self._indexed >= self.index_interval:
+                self._index.write(INDEX_ENTRY.pack(seq, now_us, self._size))
+                self._indexed = self._size
+                if self._first_ts is None:
+                    self._first_ts = now_us
+            self._file.write(line)
+            self._size += len(line)
+            self._next_seq += 1
+            if self._timer is None:
+                self._timer = threading.Timer(self.flush_interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        return seq
+
+    def flush(self):
+        with self._lock:
+            self._timer = None
+            if not self._file.closed:
+                self._file.flush()
+                self._index.flush()
+
+    def _rotate(self):
+        self._file.close()
+        self._index.close()
+        stem, ext = _split(self.path)
+        first = _read_index(self.path)[0][0]
+        rotated = f"{stem}.{first:012d}-{self._next_seq - 1:012d}{ext}"
+        os.replace(_index_path(self.path), _index_path(rotated))
+        os.replace(self.path, rotated)
+        if self.compress:
+            thread = threading.Thread(target=_compress, args=(rotated,), name="log-compress")
+            thread.start()
+            self._compressors = [t for t in self._compressors if t.is_alive()] + [thread]
+        self._file = open(self.path, "ab", buffering=1024 * 1024)
+        self._index = open(_index_path(self.path), "ab")
+        self._size = 0
+        self._first_ts = self._indexed = None
+
+    def records_written(self):
+        return self._next_seq - 1
+
+    def rotate(self):
+        """Start a new segment now (e.g. before handing the old one to an examiner)."""
+        with self._lock:
+            if self._size:
+                self._rotate()
+
+    def close(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._file.closed:
+                self._file.close()
+                self._index.close()
+        for thread in self._compressors:
+            thread.join()
+
+
+def _compress(path):
+    try:
+        with open(path, "rb") as src, gzip.open(path + ".gz.tmp", "wb", compresslevel=6) as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        os.replace(path + ".gz.tmp", path + ".gz")
+        os.remove(path)
+    except OSError as e:
+        print(f"Error compressing transfer log {path}: {str(e)}")
+
+
+class TransferLogReader:
+    """Read a transfer log and its rotated segments by seq or by time."""
+
+    def __init__(self, path=TRANSFER_LOG_PATH):
+        self.path = path
+
+    def segments(self):
+        """[(first seq, data path)] oldest first; the active segment comes last."""
+        stem, ext = _split(self.path)
+        pattern = re.compile(re.escape(os.path.basename(stem)) + r"\.(\d{12})-(\d{12})"
+                             + re.escape(ext) + r"(\.gz)?$")
+        found = {}
+        try:
+            names = os.listdir(os.path.dirname(self.path) or ".")
+        except OSError:
+            names = []
+        for name in names:
+            match = pattern.match(name)
+            if match:
+                # While a segment is being compressed both copies exist; keep the plain one
+                key = int(match.group(1)), int(match.group(2))
+                if key not in found or not match.group(3):
+                    found[key] = os.path.join(os.path.dirname(self.path), name)
+        segments = [(first, found[(first, last)]) for first, last in sorted(found)]
+        if os.path.exists(self.path):
+            entries = _read_index(self.path)
+            segments.append((entries[0][0] if entries else self.last_rotated_seq() + 1,
+                             self.path))
+        return segments
+
+    def last_rotated_seq(self):
+        stem, ext = _split(self.path)
+        pattern = re.compile(re.escape(os.path.basename(stem)) + r"\.\d{12}-(\d{12})"
+                             + re.escape(ext))
+        try:
+            names = os.listdir(os.path.dirname(self.path) or ".")
+        except OSError:
+            return 0
+        return max((int(m.group(1)) for m in map(pattern.match, names) if m), default=0)
+
+    @staticmethod
+    def _open(data_path):
+        try:
+            if data_path.endswith(".gz"):
+                return gzip.open(data_path, "rb")
+            return open(data_path, "rb")
+        except FileNotFoundError:
+            if data_path.endswith(".gz"):
+                raise
+            return gzip.open(data_path + ".gz", "rb")  # compressed since it was listed
+
+    def _scan(self, segments, key, value):
+        """Yield records from the first segment/index block that can hold key >= value."""
+        column = 0 if key == "seq" else 1
+        for first, data_path in segments:
+            entries = _read_index(data_path)
+            block = bisect_right([entry[column] for entry in entries], value)
+            offset = entries[block - 1][2] if block else 0
+            try:
+                f = self._open(data_path)
+            except OSError:
+                continue
+            with f:
+                f.seek(offset)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break  # not completely written yet
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    if record[key] >= value:
+                        yield record
+
+    def records(self, after_seq=0):
+        """Yield every record with seq > after_seq, in order."""
+        segments = self.segments()
+        start = 0
+        for i, (first, data_path) in enumerate(segments):
+            if first <= after_seq + 1:
+                start = i
+        yield from self._scan(segments[start:], "seq", after_seq + 1)
+
+    def since(self, when):
+        """Yield records written at or after when (datetime, epoch seconds or timestamp string).
+
+        Raises ValueError if when is not a readable time.
+        """
+        ts_us = require_epoch_us(when)
+        segments = self.segments()
+        start = 0
+        for i, (first, data_path) in enumerate(segments):
+            entries = _read_index(data_path)
+            if entries and entries[0][1] <= ts_us:
+                start = i
+        yield from self._scan(segments[start:], "ts_us", ts_us)
+
+    def tail(self, after_seq=0, limit=None):
+        """Return (records after after_seq, seq to pass next time)."""
+        records = []
+        for record in self.records(after_seq):
+            records.append(record)
+            after_seq = record["seq"]
+            if limit and len(records) >= limit:
+                break
+        return records, after_seq
+
+
+def _legacy_record(line):
+    """Parse one line of the old plain-text log into (ts_us, event), or None."""
+    match = _LEGACY_LINE.match(line)
+    ts_us = to_epoch_us(match.group("time")) if match else None
+    if ts_us is None:
+        return None
+    event = {"event_type": match.group("event"), "file_path": match.group("path"),
+             "src_path": match.group("src"), "timestamp": match.group("time"),
+             "hash_status": match.group("status")}
+    if match.group("size") is not None:
+        event["file_size"] = int(match.group("size"))
+    if match.group("hashes"):
+        event["hashes"] = {name.lower(): digest for name, digest in
+                           (item.split("=", 1) for item in match.group("hashes").split())}
+    return ts_us, event
+
+
+def import_legacy_log(writer, legacy_path=None):
+    """Copy a pre-JSONL text transfer log into writer once; returns the records imported.
+
+    legacy_path defaults to the .log file beside the writer's log. Records
+    keep the time of their line and go into a segment of their own. This
+    only happens while the JSON Lines log is still empty, so seq order stays
+    time order; the text file is then renamed to <name>.imported.
+    """
+    legacy_path = legacy_path or _split(writer.path)[0] + ".log"
+    if not os.path.exists(legacy_path):
+        return 0
+    if writer.records_written():
+        print(f"Transfer log {legacy_path} not imported: {writer.path} already has records")
+        return 0
+    count = skipped = 0
+    try:
+        with open(legacy_path, "r", encoding="utf-8", errors="replace") as f:
+            for line in f:
+                parsed = _legacy_record(line.rstrip("\r\n"))
+                if parsed is None:
+                    skipped += line.strip() != ""
+                    continue
+                writer.write(parsed[1], ts_us=parsed[0])
+                count += 1
+        writer.rotate()
+        os.replace(legacy_path, legacy_path + ".imported")
+    except OSError as e:
+        print(f"Error importing transfer log {legacy_path}: {str(e)}")
+    if skipped:
+        print(f"Transfer log {legacy_path}: {skipped} unreadable lines not imported")
+    return count
+
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+def get_transfer_log(path=TRANSFER_LOG_PATH):
+    """Return the process-wide writer for a transfer log, creating it on first use."""
+    with _writers_lock:
+        writer = _writers.get(os.path.abspath(path))
+        if writer is None:
+            writer = TransferLogWriter(path)
+            import_legacy_log(writer)
+            _writers[os.path.abspath(path)] = writer
+        return writer
+
+
+@atexit.register
+def _close_writers():
+    with _writers_lock:
+        for writer in _writers.values():
+            writer.close()
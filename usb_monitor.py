@@ -1,24 +1,33 @@
 # usb_monitor.py
 
 import wmi
-import os
-import time
+from transfer_log import TransferLogReader, format_transfer_line
 
-def get_connected_usb_devices():
-    result = []
+def list_usb_disks():
+    """Return one dict (caption, serial, size_gb) per connected USB disk."""
+    disks = []
     c = wmi.WMI()
     for disk in c.Win32_DiskDrive():
         if "USB" in disk.InterfaceType:
             try:
-                size_gb = int(disk.Size) / (1024**3)
-            except:
-                size_gb = "Unknown"
-            result.append(f"Device: {disk.Caption}\nSerial: {disk.SerialNumber or 'Unknown'}\nSize: {size_gb:.2f} GB")
+                size_gb = round(int(disk.Size) / (1024**3), 2)
+            except (TypeError, ValueError):
+                size_gb = None
+            disks.append({"caption": disk.Caption, "serial": disk.SerialNumber or "Unknown",
+                          "size_gb": size_gb})
+    return disks
+
+def get_connected_usb_devices():
+    result = []
+    for disk in list_usb_disks():
+        size = f"{disk['size_gb']:.2f} GB" if disk['size_gb'] is not None else "Unknown"
+        result.append(f"Device: {disk['caption']}\nSerial: {disk['serial']}\nSize: {size}")
     return result
 
-def get_file_transfers():
-    log_file = "database/file_transfers.log"
-    if os.path.exists(log_file):
-        with open(log_file, "r") as f:
-            return f.readlines()
-    return ["No transfers logged."]
+def get_file_transfers(after_seq=0, limit=None):
+    """Return (lines, seq) for transfers logged after after_seq; pass seq back next time.
+
+    Only the log blocks after after_seq are read, however long the log is.
+    """
+    records, seq = TransferLogReader().tail(after_seq, limit)
+    return [format_transfer_line(record) for record in records], seq
@@ -0,0 +1,197 @@
+# usb_registry.py
+"""USB device history from the SYSTEM registry hive.
+
+Both backends expose the same small key interface (name, last_written,
+subkeys(), subkey(), value(), values()), so one extraction routine serves
+the live registry (winreg, Windows only) and acquired SYSTEM hive files
+(registry_hive, any platform).
+"""
+
+import re
+
+from registry_hive import RegistryHive, filetime_to_datetime
+
+_INSTANCE_SUFFIX = re.compile(r"&\d+$")
+_VID_PID = re.compile(r"VID_([0-9A-F]{4})&PID_([0-9A-F]{4})", re.IGNORECASE)
+
+
+class UsbRegistryBackend:
+    """Base class: subclasses provide control_sets() and open_key(path)."""
+
+    def control_sets(self):
+        raise NotImplementedError
+
+    def open_key(self, path):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def devices(self):
+        """Return one dict per USB mass-storage device instance found in USBSTOR."""
+        mounted = self._mounted_devices()
+        found = {}
+        for control_set in self.control_sets():
+            ids = self._usb_ids(control_set)
+            usbstor = self.open_key(control_set + r"\Enum\USBSTOR")
+            if usbstor is None:
+                continue
+            for device_key in usbstor.subkeys():
+                for instance in device_key.subkeys():
+                    serial = _INSTANCE_SUFFIX.sub("", instance.name)
+                    record = {
+                        "device_class": device_key.name,
+                        "instance_id": instance.name,
+                        "serial": serial,
+                        "friendly_name": instance.value("FriendlyName") or "Unknown",
+                        "manufacturer": _strip_inf_prefix(instance.value("Mfg")) or "Unknown",
+                        "last_written": instance.last_written,
+                        "vendor_id": None,
+                        "product_id": None,
+                        "drive_letters": mounted.get(instance.name.lower(), []),
+                        "control_set": control_set,
+                    }
+                    vid_pid = ids.get(serial.lower())
+                    if vid_pid:
+                        record["vendor_id"], record["product_id"] = vid_pid
+                    # The same device shows up in every control set; keep the newest
+                    previous = found.get(instance.name.lower())
+                    if previous is None or _newer(record, previous):
+                        found[instance.name.lower()] = record
+        return sorted(found.values(), key=lambda r: (r["device_class"], r["instance_id"]))
+
+    def _usb_ids(self, control_set):
+        """Map serial -> (VID, PID) from Enum\\USB."""
+        usb = self.open_key(control_set + r"\Enum\USB")
+        ids = {}
+        if usb is None:
+            return ids
+        for device_key in usb.subkeys():
+            match = _VID_PID.search(device_key.name)
+            if not match:
+                continue
+            for instance in device_key.subkeys():
+                ids[instance.name.lower()] = (match.group(1).upper(), match.group(2).upper())
+        return ids
+
+    def _mounted_devices(self):
+        """Map USBSTOR instance id -> drive letters from MountedDevices."""
+        key = self.open_key("MountedDevices")
+        letters = {}
+        if key is None:
+            return letters
+        for name, _, data in key.values():
+            if not name.startswith("\\DosDevices\\") or not isinstance(data, bytes):
+                continue
+            text = data.decode("utf-16-le", "ignore")
+            if "USBSTOR#" not in text.upper():
+                continue
+            parts = text.split("#")
+            if len(parts) > 2:
+                letters.setdefault(parts[2].lower(), []).append(name[len("\\DosDevices\\"):])
+        return letters
+
+
+def _newer(record, other):
+    if record["last_written"] is None:
+        return False
+    return other["last_written"] is None or record["last_written"] > other["last_written"]
+
+
+def _strip_inf_prefix(value):
+    # Mfg is often an INF reference such as "@disk.inf,%genmanufacturer%;(Standard disk drives)"
+    if isinstance(value, str) and ";" in value:
+        return value.rsplit(";", 1)[1]
+    return value
+
+
+class HiveFileBackend(UsbRegistryBackend):
+    """Offline SYSTEM hive file, e.g. from a dead-box acquisition."""
+
+    def __init__(self, path):
+        self.hive = RegistryHive(path)
+
+    def close(self):
+        self.hive.close()
+
+    def open_key(self, path):
+        return self.hive.open_key(path)
+
+    def control_sets(self):
+        names = [key.name for key in self.hive.root().subkeys()
+                 if key.name.lower().startswith("controlset")]
+        select = self.hive.open_key("Select")
+        current = select.value("Current") if select else None
+        if current:
+            preferred = f"ControlSet{current:03d}".lower()
+            names.sort(key=lambda name: name.lower() != preferred)
+        return names
+
+
+class _WinregKey:
+    """Adapter giving a winreg handle the RegistryKey interface."""
+
+    def __init__(self, winreg, handle, name):
+        self._winreg = winreg
+        self.handle = handle
+        self.name = name
+        self._subkey_count, self._value_count, modified = winreg.QueryInfoKey(handle)
+        self.last_written = filetime_to_datetime(modified)
+
+    def subkeys(self):
+        for i in range(self._subkey_count):
+            name = self._winreg.EnumKey(self.handle, i)
+            child = self.subkey(name)
+            if child is not None:
+                yield child
+
+    def subkey(self, name):
+        try:
+            return _WinregKey(self._winreg, self._winreg.OpenKey(self.handle, name), name)
+        except OSError:
+            return None
+
+    def values(self):
+        for i in range(self._value_count):
+            yield self._winreg.EnumValue(self.handle, i)
+
+    def value(self, name, default=None):
+        try:
+            return self._winreg.QueryValueEx(self.handle, name)[0]
+        except OSError:
+            return default
+
+
+class LiveRegistryBackend(UsbRegistryBackend):
+    """The running system's registry via winreg (Windows only)."""
+
+    def __init__(self):
+        import winreg
+        self._winreg = winreg
+        self._system = winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, "SYSTEM")
+
+    def close(self):
+        self._winreg.CloseKey(self._system)
+
+    def open_key(self, path):
+        try:
+            return _WinregKey(self._winreg, self._winreg.OpenKey(self._system, path),
+                              path.rsplit("\\", 1)[-1])
+        except OSError:
+            return None
+
+    def control_sets(self):
+        return ["CurrentControlSet"]
+
+
+def get_backend(hive_path=None):
+    """Return a hive-file backend for hive_path, else the live registry backend."""
+    if hive_path:
+        return HiveFileBackend(hive_path)
+    return LiveRegistryBackend()
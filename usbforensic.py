@@ -0,0 +1,474 @@
+# usbforensic.py
+"""Command-line interface for scheduled and headless runs.
+
+    python usbforensic.py [--db PATH] {scan,hash,history,monitor,report,export,timeline,custody,carve} ...
+
+Nothing beyond argparse is imported at startup: each command imports the
+modules it needs when it runs, so PyQt5 is never loaded and the database is
+only opened (at --db, or DATABASE["path"]) by commands that use it.
+"""
+
+import argparse
+import os
+import sys
+
+EXPORT_TABLES = {"transfers": "file_transfer_events", "live": "live_usb_events"}
+
+
+def open_db(args):
+    from database import DatabaseManager
+    return DatabaseManager(args.db)
+
+
+def _roots(args):
+    """(root, serial) pairs for args.root, or every removable drive without one."""
+    if args.root:
+        return [(args.root, args.serial or os.path.abspath(args.root))]
+    from hash_utils import get_removable_roots
+    return get_removable_roots()
+
+
+def _algorithms(args):
+    from config import FILE_HASH_ALGORITHMS
+    return args.algorithms or FILE_HASH_ALGORITHMS
+
+
+def algorithm_list(text):
+    """argparse type for --algorithms: comma-separated digest names, checked up front."""
+    import hashlib
+    from fuzzy_hash import ALGORITHM as FUZZY_ALGORITHM
+    names = tuple(name.strip().lower() for name in text.split(",") if name.strip())
+    # shake_* digests have no fixed length, so they have no plain hexdigest()
+    supported = {name for name in hashlib.algorithms_available if not name.startswith("shake_")}
+    supported.add(FUZZY_ALGORITHM)
+    unknown = [name for name in names if name not in supported]
+    if not names or unknown:
+        raise argparse.ArgumentTypeError(
+            f"unsupported algorithm {', '.join(unknown) or repr(text)}; choose from "
+            f"{', '.join(sorted(supported))}")
+    return names
+
+
+def _print_errors(progress):
+    for error in progress.errors:
+        print(f"Error ({error.operation}) {error.path}: {error.message}", file=sys.stderr)
+
+
+def cmd_scan(args):
+    """Incremental re-scan against each device's previous manifest."""
+    from hash_utils import ScanProgress
+    from incremental_scan import rescan_device, format_scan_diff
+    db = open_db(args)
+    progress = ScanProgress()
+    try:
+        for root, serial in _roots(args):
+            diff = rescan_device(root, serial, db, _algorithms(args), workers=args.workers,
+                                 use_processes=args.processes, progress=progress)
+            print(format_scan_diff(diff))
+    finally:
+        db.close()
+    _print_errors(progress)
+    return 1 if progress.errors else 0
+
+
+def cmd_hash(args):
+    import json
+    from hash_utils import (ScanProgress, hash_directory, hash_file, format_hash_record,
+                            with_analysers)
+    from content_analysis import annotate
+    from hash_sets import get_known_hash_sets
+    algorithms = _algorithms(args)
+    db = None if args.no_cache else open_db(args)
+    progress = ScanProgress()
+    known = get_known_hash_sets()
+    failed = 0
+    try:
+        for path in args.paths:
+            if os.path.isdir(path):
+                records = hash_directory(path, algorithms, workers=args.workers,
+                                         use_processes=args.processes, db=db,
+                                         device_serial=args.serial, force=args.force,
+                                         progress=progress)
+            else:
+                try:
+                    size, hashes = hash_file(path, with_analysers(algorithms))
+                except OSError as e:
+                    print(f"Error hashing {path}: {str(e)}", file=sys.stderr)
+                    failed += 1
+                    continue
+                records = [annotate({"path": path, "size": size, "hashes": hashes})]
+                if len(known):
+                    known.annotate(records[0])
+            for record in records:
+                if args.json:
+                    print(json.dumps(record))
+                else:
+                    print(format_hash_record(record))
+    finally:
+        if db is not None:
+            db.close()
+    _print_errors(progress)
+    return 1 if progress.errors or failed else 0
+
+
+def cmd_history(args):
+    import json
+    from device_history import get_history_provider
+    from registry_hive import HiveError
+    try:
+        records = get_history_provider().snapshot(args.hive)
+    except ImportError:
+        print("Error: the live registry needs Windows; pass --hive with a SYSTEM hive",
+              file=sys.stderr)
+        return 1
+    except (OSError, HiveError) as e:
+        print(f"Error reading USB history: {str(e)}", file=sys.stderr)
+        return 1
+    for record in records:
+        if args.json:
+            row = record.to_history_row()
+            row["drive_letters"] = list(record.drive_letters)
+            print(json.dumps(row))
+        else:
+            print(record.describe() + "\n")
+    if args.sync:
+        db = open_db(args)
+        try:
+            for record in records:
+                db.insert_usb_history(record)
+        finally:
+            db.close()
+    return 0
+
+
+def cmd_monitor(args):
+    from file_monitor import monitor_volume, monitor_usb_devices
+    db = open_db(args)
+    try:
+        if args.path:
+            print(f"Monitoring {args.path}; press Ctrl+C to stop")
+            monitor_volume(args.path, args.serial, db)
+        else:
+            print("Watching for USB devices; press Ctrl+C to stop")
+            monitor_usb_devices(db, on_change=lambda event_type, device, mount: print(
+                f"{event_type}: {device['name']} ({device['serial']}) {mount or ''}".rstrip(),
+                flush=True))
+    finally:
+        db.close()
+    return 0
+
+
+def cmd_report(args):
+    if args.history:
+        from report_generator import generate_usb_history_report
+        pdf_path = args.pdf or "USB_History_Report.pdf"
+        db = open_db(args)
+        try:
+            generate_usb_history_report(args.hive, db=db, pdf_path=pdf_path)
+        finally:
+            db.close()
+        print(f"Wrote {pdf_path}")
+        return 0
+    from report_generator import generate_hash_report
+    pdf_path = args.pdf or "USB_Hash_Report.pdf"
+    db = open_db(args)
+    try:
+        rows = generate_hash_report(args.root, db, pdf_path=pdf_path, csv_path=args.csv,
+                                    jsonl_path=args.jsonl)
+    finally:
+        db.close()
+    if not rows:
+        print("No hashes recorded: hash or re-scan the device first", file=sys.stderr)
+    print(f"Wrote {rows} files to {', '.join(p for p in (pdf_path, args.csv, args.jsonl) if p)}")
+    return 0
+
+
+def cmd_export(args):
+    """Stream an event table to CSV or JSON Lines, newest first."""
+    import csv
+    import json
+    from db_migrations import require_epoch_us
+    try:
+        for when in (args.start, args.end):
+            if when is not None:
+                require_epoch_us(when)
+    except ValueError as e:
+        print(f"Error: {str(e)}", file=sys.stderr)
+        return 1
+    table = EXPORT_TABLES[args.table]
+    db = open_db(args)
+    out = open(args.output, "w", newline="", encoding="utf-8") if args.output else sys.stdout
+    try:
+        columns = db.table_columns(table)
+        if table == "live_usb_events":
+            rows = db.iter_live_events(args.serial, args.event_type, args.start, args.end)
+        else:
+            rows = db.iter_file_transfer_events(args.serial, args.event_type, args.start, args.end)
+        count = 0
+        if args.format == "csv":
+            writer = csv.writer(out)
+            writer.writerow(columns)
+            for row in rows:
+                writer.writerow(row)
+                count += 1
+        else:
+            for row in rows:
+                out.write(json.dumps(dict(zip(columns, row))) + "\n")
+                count += 1
+    finally:
+        if out is not sys.stdout:
+            out.close()
+        db.close()
+    print(f"Exported {count} rows", file=sys.stderr)
+    return 0
+
+
+def _time(ts_us):
+    from datetime import datetime
+    return datetime.fromtimestamp(ts_us / 1000000).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def cmd_timeline(args):
+    """Bring the timeline up to date, then list events, mounts or a file's devices."""
+    import json
+    from timeline import Timeline
+    records = ()
+    if args.registry or args.hive:
+        from device_history import get_history_provider
+        try:
+            records = get_history_provider().snapshot(args.hive)
+        except ImportError:
+            print("Error: the live registry needs Windows; pass --hive with a SYSTEM hive",
+                  file=sys.stderr)
+            return 1
+    db = open_db(args)
+    try:
+        timeline = Timeline(db, args.log) if args.log else Timeline(db)
+        added = timeline.sync(records)
+        print("Indexed " + ", ".join(f"{count} {source}" for source, count in added.items()),
+              file=sys.stderr)
+        if args.file:
+            for ts_us, source, event_type, devices in timeline.devices_for_file(
+                    args.file, args.start, args.end):
+                names = "; ".join(f"{serial} ({name or 'unknown'}) at {mount or '?'}"
+                                  for serial, name, mount, start, end in devices) or "no device"
+                print(f"{_time(ts_us)}  {event_type:<12} {source:<9} {names}")
+        elif args.at:
+            for serial, name, mount, start, end in timeline.mounted_at(args.at):
+                print(f"{serial}  {name or ''}  {mount or '(connected)'}  since {_time(start)}")
+        else:
+            for row in timeline.events(args.serial, args.start, args.end, limit=args.limit):
+                if args.json:
+                    print(json.dumps(dict(zip(("ts_us", "serial", "source", "event_type",
+                                               "subject", "details"), row))))
+                else:
+                    ts_us, serial, source, event_type, subject, details = row
+                    print(f"{_time(ts_us)}  {serial or '-':<20} {source:<9} {event_type:<12} "
+                          f"{subject or ''} {details or ''}".rstrip())
+    except ValueError as e:
+        print(f"Error: {str(e)}", file=sys.stderr)
+        return 1
+    finally:
+        db.close()
+    return 0
+
+
+def _print_problems(problems):
+    for seq, table, row_key, reason in problems:
+        where = f"leaf {seq}" if seq is not None else "log"
+        if table:
+            where += f" ({table} {row_key})"
+        print(f"FAIL {where}: {reason}", file=sys.stderr)
+
+
+def cmd_custody(args):
+    """Sign a checkpoint, verify the custody log, or prove one record against a checkpoint."""
+    from custody import Custody
+    from db_migrations import CUSTODY_TABLES
+    db = open_db(args)
+    try:
+        custody = Custody(db, args.key) if args.key else Custody(db)
+        if args.action == "checkpoint":
+            for line in custody.describe_checkpoint(custody.checkpoint()):
+                print(line)
+            return 0
+        if args.action == "list":
+            for checkpoint in custody.checkpoints():
+                valid = "ok" if custody.signature_valid(checkpoint) else "BAD SIGNATURE"
+                print(f"#{checkpoint['id']}  {checkpoint['created_at']}  "
+                      f"{checkpoint['tree_size']:>10} records  {checkpoint['root']}  {valid}")
+            return 0
+        if args.action == "prove":
+            if not args.args or args.args[0] not in CUSTODY_TABLES:
+                print(f"Error: prove needs a table ({', '.join(CUSTODY_TABLES)}) and its key "
+                      f"values", file=sys.stderr)
+                return 2
+            table, values = args.args[0], args.args[1:]
+            columns = CUSTODY_TABLES[table][0]
+            if len(values) != len(columns):
+                print(f"Error: {table} is keyed by {', '.join(columns)}", file=sys.stderr)
+                return 2
+            key = [int(value) if column.endswith("id") else value
+                   for column, value in zip(columns, values)]
+            ok, problems = custody.verify_record(table, *key)
+            seq = custody.find_record(table, *key)
+            print(f"{table} {' '.join(values)}: leaf {seq} "
+                  f"{'verified against' if ok else 'FAILED against'} the latest checkpoint")
+        else:
+            if args.full:
+                ok, problems, checked = custody.verify_all()
+            else:
+                ok, problems, checked = custody.verify_since()
+            print(f"Checked {checked} records: {'ok' if ok else f'{len(problems)} problems'}")
+        _print_problems(problems)
+        return 0 if ok else 1
+    finally:
+        db.close()
+
+
+def cmd_carve(args):
+    """Recover deleted files from a FAT32/exFAT image, hash them and record where they were."""
+    import json
+    from fat_carving import FatVolume, CarveError, carve_image, format_carved_record, runs_text
+    from hash_sets import get_known_hash_sets
+    try:
+        if args.list:
+            with FatVolume(args.image, args.partition_offset) as volume:
+                for carved in volume.carve(not args.no_signatures):
+                    print(f"{carved.offset if carved.offset is not None else '-':>14} "
+                          f"{carved.recovered_size():>12}  {carved.method:<13} "
+                          f"{carved.path}  [{carved.status}; clusters "
+                          f"{runs_text(carved.runs) or '-'}]")
+            return 0
+        known = get_known_hash_sets()
+        db = None if args.no_db else open_db(args)
+        try:
+            records = carve_image(args.image, _algorithms(args), not args.no_signatures,
+                                  args.partition_offset, args.output, db,
+                                  known=known if len(known) else None)
+        finally:
+            if db is not None:
+                db.close()
+    except (OSError, CarveError) as e:
+        print(f"Error carving {args.image}: {str(e)}", file=sys.stderr)
+        return 1
+    for record in records:
+        print(json.dumps(record) if args.json else format_carved_record(record))
+    return 0
+
+
+def build_parser():
+    from config import HASH_WORKERS, HASH_USE_PROCESSES
+    parser = argparse.ArgumentParser(prog="usbforensic",
+                                     description="USB Forensic Tool (headless)")
+    parser.add_argument("--db", help="SQLite database (default: DATABASE['path'] in config.py)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def hashing_options(p):
+        p.add_argument("--serial", help="device serial to record results under "
+                                        "(default: the absolute root path)")
+        p.add_argument("--algorithms", type=algorithm_list,
+                       help="comma-separated, e.g. md5,sha256 (default: FILE_HASH_ALGORITHMS)")
+        p.add_argument("--workers", type=int, default=HASH_WORKERS)
+        p.add_argument("--processes", action="store_true", default=HASH_USE_PROCESSES,
+                       help="hash batches of small files in a process pool")
+
+    p = sub.add_parser("scan", help="re-scan a volume, hashing only files changed since "
+                                    "the last scan")
+    p.add_argument("root", nargs="?", help="volume or directory (default: every removable drive)")
+    hashing_options(p)
+    p.set_defaults(func=cmd_scan)
+
+    p = sub.add_parser("hash", help="hash files and directories")
+    p.add_argument("paths", nargs="+")
+    hashing_options(p)
+    p.add_argument("--force", action="store_true",
+                   help="ignore the hash cache and re-read every file")
+    p.add_argument("--no-cache", action="store_true", help="don't open the database at all")
+    p.add_argument("--json", action="store_true", help="one JSON record per line")
+    p.set_defaults(func=cmd_hash)
+
+    p = sub.add_parser("history", help="USB devices from the registry or an offline SYSTEM hive")
+    p.add_argument("--hive", help="path to an offline SYSTEM hive")
+    p.add_argument("--sync", action="store_true", help="also store the devices in usb_history")
+    p.add_argument("--json", action="store_true", help="one JSON record per line")
+    p.set_defaults(func=cmd_history)
+
+    p = sub.add_parser("monitor", help="record USB arrivals and file transfers until Ctrl+C")
+    p.add_argument("path", nargs="?", help="watch only this volume (default: every USB volume "
+                                           "as it is mounted)")
+    p.add_argument("--serial", help="device serial recorded with each event")
+    p.set_defaults(func=cmd_monitor)
+
+    p = sub.add_parser("report", help="hash report (PDF/CSV/JSONL) from recorded hashes")
+    p.add_argument("root", nargs="?", help="scanned root (default: every removable drive)")
+    p.add_argument("--pdf", help="default: USB_Hash_Report.pdf, or USB_History_Report.pdf "
+                                  "with --history")
+    p.add_argument("--csv", default="USB_Hash_Report.csv")
+    p.add_argument("--jsonl", default="USB_Hash_Report.jsonl")
+    p.add_argument("--history", action="store_true", help="USB history report instead")
+    p.add_argument("--hive", help="SYSTEM hive for --history")
+    p.set_defaults(func=cmd_report)
+
+    p = sub.add_parser("export", help="stream transfer or live events to CSV/JSONL")
+    p.add_argument("table", choices=sorted(EXPORT_TABLES))
+    p.add_argument("--format", choices=("csv", "jsonl"), default="jsonl")
+    p.add_argument("-o", "--output", help="output file (default: stdout)")
+    p.add_argument("--serial")
+    p.add_argument("--event-type")
+    p.add_argument("--start", help="earliest timestamp, e.g. 2025-05-06 10:00:00")
+    p.add_argument("--end", help="latest timestamp")
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser("timeline", help="merged timeline of registry, live, transfer and log "
+                                        "events")
+    p.add_argument("--serial")
+    p.add_argument("--start", help="earliest timestamp, e.g. 2025-05-06 10:00:00")
+    p.add_argument("--end", help="latest timestamp")
+    p.add_argument("--file", help="show which device held this path at each of its events")
+    p.add_argument("--at", help="show the devices connected and mounted at this time")
+    p.add_argument("--registry", action="store_true",
+                   help="also index last-connected times from the live registry")
+    p.add_argument("--hive", help="index last-connected times from an offline SYSTEM hive")
+    p.add_argument("--log", help="transfer log to index (default: TRANSFER_LOG_PATH)")
+    p.add_argument("--limit", type=int, default=1000)
+    p.add_argument("--json", action="store_true", help="one JSON record per line")
+    p.set_defaults(func=cmd_timeline)
+
+    p = sub.add_parser("custody", help="signed Merkle checkpoints over the evidence database")
+    p.add_argument("action", choices=("checkpoint", "list", "verify", "prove"))
+    p.add_argument("args", nargs="*", help="for prove: TABLE KEY... e.g. "
+                                           "file_transfer_events 42")
+    p.add_argument("--full", action="store_true",
+                   help="verify: re-hash the whole log, not just what followed the last "
+                        "checkpoint")
+    p.add_argument("--key", help="signing key file (default: CUSTODY_KEY_PATH)")
+    p.set_defaults(func=cmd_custody)
+
+    p = sub.add_parser("carve", help="recover deleted files from a FAT32/exFAT image")
+    p.add_argument("image", help="image of the volume, or of a disk with an MBR/GPT")
+    p.add_argument("--partition-offset", type=int,
+                   help="byte offset of the volume (default: found from the partition table)")
+    p.add_argument("-o", "--output", help="also write the recovered files to this directory")
+    p.add_argument("--algorithms", type=algorithm_list,
+                   help="comma-separated, e.g. md5,sha256 (default: FILE_HASH_ALGORITHMS)")
+    p.add_argument("--no-signatures", action="store_true",
+                   help="only deleted directory entries, no carving of free clusters")
+    p.add_argument("--list", action="store_true",
+                   help="list what would be recovered without reading it")
+    p.add_argument("--no-db", action="store_true", help="don't record results in carved_files")
+    p.add_argument("--json", action="store_true", help="one JSON record per line")
+    p.set_defaults(func=cmd_carve)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        return args.func(args)
+    except KeyboardInterrupt:
+        return 130
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,161 @@
+# volume_walker.py
+"""Directory traversal for removable volumes and acquisition roots.
+
+Built on os.scandir: the DirEntry type and stat results are reused, so a
+file is stat'ed at most once (on Windows not at all, scandir already has
+the metadata). System folders, globs, extensions and sizes are pruned
+before anything is opened. Paths that cannot be listed or stat'ed become
+WalkError records instead of being silently skipped. Work items are
+yielded lazily, so hashing can start before the walk finishes.
+"""
+
+import errno
+import fnmatch
+import os
+import re
+
+from config import WALK_EXCLUDE_DIRS
+
+
+class WalkError:
+    """A path the scan could not list, stat or read."""
+
+    __slots__ = ("path", "operation", "errno", "message")
+
+    def __init__(self, path, operation, errno=None, message=None):
+        self.path = path
+        self.operation = operation  # "scandir", "stat", "read" or "loop"
+        self.errno = errno
+        self.message = message
+
+    @classmethod
+    def from_oserror(cls, path, operation, error):
+        return cls(path, operation, error.errno, error.strerror or str(error))
+
+    def to_dict(self):
+        return {"path": self.path, "operation": self.operation,
+                "errno": self.errno, "message": self.message}
+
+    def __repr__(self):
+        return f"WalkError({self.path!r}, {self.operation!r}, {self.message!r})"
+
+
+def _compile_globs(patterns):
+    if not patterns:
+        return None
+    return re.compile("|".join(fnmatch.translate(p.lower()) for p in patterns))
+
+
+class VolumeWalker:
+    """Walk a directory tree yielding (path, size, mtime_ns, inode) per regular file.
+
+    exclude_dirs are directory names pruned wherever they appear (compared
+    case-insensitively, as on FAT/NTFS); exclude_globs match file and
+    directory names. include_extensions (when given) and exclude_extensions
+    are lowercase suffixes such as ".tmp". Symlinks are not followed unless
+    follow_symlinks is set, in which case directories already visited are
+    skipped and reported as "loop" errors. Errors are passed to on_error
+    and kept in self.errors.
+    """
+
+    def __init__(self, exclude_dirs=WALK_EXCLUDE_DIRS, exclude_globs=(), include_extensions=None,
+                 exclude_extensions=(), min_size=None, max_size=None, follow_symlinks=False,
+                 on_error=None):
+        self.exclude_dirs = {name.lower() for name in exclude_dirs}
+        self.exclude_re = _compile_globs(exclude_globs)
+        self.include_extensions = ({ext.lower() for ext in include_extensions}
+                                   if include_extensions else None)
+        self.exclude_extensions = {ext.lower() for ext in exclude_extensions}
+        self.min_size = min_size
+        self.max_size = max_size
+        self.follow_symlinks = follow_symlinks
+        self.on_error = on_error
+        self.errors = []
+        self.stats = {"dirs": 0, "files": 0, "bytes": 0, "skipped": 0, "errors": 0}
+
+    def _error(self, error):
+        self.errors.append(error)
+        self.stats["errors"] += 1
+        if self.on_error is not None:
+            self.on_error(error)
+
+    def _keep_file(self, name):
+        if self.include_extensions is None and not self.exclude_extensions:
+            return True
+        ext = os.path.splitext(name)[1].lower()
+        if self.include_extensions is not None and ext not in self.include_extensions:
+            return False
+        return ext not in self.exclude_extensions
+
+    def walk(self, root):
+        """Yield a work item for every file below root that passes the filters."""
+        follow = self.follow_symlinks
+        visited = set()
+        try:
+            st = os.stat(root)
+            visited.add((st.st_dev, st.st_ino))
+        except OSError as e:
+            self._error(WalkError.from_oserror(root, "stat", e))
+            return
+
+        stats = self.stats
+        pending = [root]
+        while pending:
+            directory = pending.pop()
+            stats["dirs"] += 1
+            try:
+                it = os.scandir(directory)
+            except OSError as e:
+                self._error(WalkError.from_oserror(directory, "scandir", e))
+                continue
+            with it:
+                while True:
+                    try:
+                        entry = next(it)
+                    except StopIteration:
+                        break
+                    except OSError as e:  # e.g. a corrupt FAT directory mid-listing
+                        self._error(WalkError.from_oserror(directory, "scandir", e))
+                        break
+                    name = entry.name
+                    if self.exclude_re is not None and self.exclude_re.match(name.lower()):
+                        stats["skipped"] += 1
+                        continue
+                    try:
+                        if entry.is_dir(follow_symlinks=follow):
+                            if name.lower() in self.exclude_dirs:
+                                stats["skipped"] += 1
+                                continue
+                            if follow or os.name == "nt":
+                                # Symlinks and junctions can point back up the tree. A full
+                                # stat: the cached one has no inode number on Windows
+                                st = os.stat(entry.path)
+                                key = (st.st_dev, st.st_ino)
+                                if key in visited:
+                                    self._error(WalkError(entry.path, "loop", errno.ELOOP,
+                                                          "directory already visited"))
+                                    continue
+                                visited.add(key)
+                            pending.append(entry.path)
+                        elif entry.is_file(follow_symlinks=follow):
+                            if not self._keep_file(name):
+                                stats["skipped"] += 1
+                                continue
+                            st = entry.stat(follow_symlinks=follow)
+                            size = st.st_size
+                            if (self.min_size is not None and size < self.min_size) or \
+                                    (self.max_size is not None and size > self.max_size):
+                                stats["skipped"] += 1
+                                continue
+                            stats["files"] += 1
+                            stats["bytes"] += size
+                            yield entry.path, size, st.st_mtime_ns, st.st_ino or entry.inode()
+                        else:
+                            stats["skipped"] += 1  # symlinks (unfollowed), devices, sockets
+                    except OSError as e:
+                        self._error(WalkError.from_oserror(entry.path, "stat", e))
+
+
+def walk_volume(root, **options):
+    """Shortcut: VolumeWalker(**options).walk(root)."""
+    return VolumeWalker(**options).walk(root)
@@ -0,0 +1,153 @@
+# windows_fakes.py
+"""In-memory stand-ins for the wmi and winreg modules.
+
+The benchmark suite installs these so the code that lists removable drives
+(hash_utils.get_removable_roots, usb_monitor) and reads the live registry
+(usb_registry.LiveRegistryBackend) runs on Linux exactly as on Windows,
+against synthetic volumes and devices.
+"""
+
+import random
+import sys
+import types
+
+REG_SZ = 1
+REG_BINARY = 3
+REG_DWORD = 4
+
+
+class _WmiObject:
+    def __init__(self, **properties):
+        self.__dict__.update(properties)
+
+
+class FakeWMI:
+    """wmi.WMI() answering Win32_LogicalDisk and Win32_DiskDrive for a list of volumes.
+
+    Each volume is a dict with "device_id" (the drive, as in "E:"), "serial"
+    and "size" in bytes.
+    """
+
+    def __init__(self, volumes):
+        self._volumes = volumes
+
+    def Win32_LogicalDisk(self):
+        return [_WmiObject(DeviceID=v["device_id"], VolumeSerialNumber=v["serial"], DriveType=2)
+                for v in self._volumes]
+
+    def Win32_DiskDrive(self):
+        return [_WmiObject(Caption=f"Fake USB Flash Drive {i}", SerialNumber=v["serial"],
+                           InterfaceType="USB", Size=str(v["size"]))
+                for i, v in enumerate(self._volumes)]
+
+
+class FakeKey:
+    """A registry key: named values, ordered subkeys and a last-written FILETIME."""
+
+    def __init__(self, name, modified=0):
+        self.name = name
+        self.modified = modified
+        self.values = []      # (name, data, type), as winreg.EnumValue returns them
+        self.subkeys = []
+        self._children = {}
+
+    def add(self, path, values=None, modified=0):
+        """Create (or find) the key at a backslash-separated path below this one."""
+        key = self
+        for part in path.split("\\"):
+            child = key._children.get(part.lower())
+            if child is None:
+                child = FakeKey(part, modified)
+                key._children[part.lower()] = child
+                key.subkeys.append(child)
+            key = child
+        for name, data in (values or {}).items():
+            if isinstance(data, int):
+                kind = REG_DWORD
+            elif isinstance(data, bytes):
+                kind = REG_BINARY
+            else:
+                kind = REG_SZ
+            key.values.append((name, data, kind))
+        return key
+
+    def child(self, name):
+        return self._children.get(name.lower())
+
+
+def make_winreg(hklm):
+    """Return a module with the winreg functions usb_registry calls, over a FakeKey tree."""
+    module = types.ModuleType("winreg")
+    module.HKEY_LOCAL_MACHINE = hklm
+    module.REG_SZ, module.REG_BINARY, module.REG_DWORD = REG_SZ, REG_BINARY, REG_DWORD
+
+    def OpenKey(key, sub_key, reserved=0, access=0):
+        for part in sub_key.split("\\"):
+            if part:
+                key = key.child(part)
+                if key is None:
+                    raise FileNotFoundError(2, "The system cannot find the file specified")
+        return key
+
+    def CloseKey(key):
+        pass
+
+    def QueryInfoKey(key):
+        return len(key.subkeys), len(key.values), key.modified
+
+    def EnumKey(key, index):
+        if index >= len(key.subkeys):
+            raise OSError(259, "No more data is available")
+        return key.subkeys[index].name
+
+    def EnumValue(key, index):
+        if index >= len(key.values):
+            raise OSError(259, "No more data is available")
+        return key.values[index]
+
+    def QueryValueEx(key, name):
+        for value_name, data, kind in key.values:
+            if value_name.lower() == name.lower():
+                return data, kind
+        raise FileNotFoundError(2, "The system cannot find the file specified")
+
+    for fn in (OpenKey, CloseKey, QueryInfoKey, EnumKey, EnumValue, QueryValueEx):
+        setattr(module, fn.__name__, fn)
+    return module
+
+
+def make_usb_registry(devices=1000, seed=0):
+    """HKEY_LOCAL_MACHINE with USBSTOR, USB and MountedDevices entries for devices sticks."""
+    rng = random.Random(seed)
+    filetime = 133000000000000000
+    hklm = FakeKey("HKEY_LOCAL_MACHINE")
+    enum = hklm.add(r"SYSTEM\CurrentControlSet\Enum", modified=filetime)
+    mounted = hklm.add(r"SYSTEM\MountedDevices", modified=filetime)
+    for i in range(devices):
+        vendor = rng.choice(["SanDisk", "Kingston", "Generic", "Verbatim"])
+        device_class = f"Disk&Ven_{vendor}&Prod_Model{i % 50}&Rev_1.00"
+        serial = f"{rng.getrandbits(64):016X}"
+        enum.add(f"USBSTOR\\{device_class}\\{serial}&0",
+                 {"FriendlyName": f"{vendor} Model{i % 50} USB Device",
+                  "Mfg": "@disk.inf,%genmanufacturer%;(Standard disk drives)"},
+                 modified=filetime + i * 10000000)
+        enum.add(f"USB\\VID_{rng.getrandbits(16):04X}&PID_{rng.getrandbits(16):04X}\\{serial}",
+                 modified=filetime)
+        if i < 23:
+            mounted.values.append((
+                f"\\DosDevices\\{chr(ord('D') + i)}:",
+                f"_??_USBSTOR#{device_class}#{serial}&0#{{53f56307-b6bf-11d0-94f2-00a0c91efb8b}}"
+                .encode("utf-16-le"),
+                REG_BINARY))
+    return hklm
+
+
+def install(volumes=(), registry=None):
+    """Put fake wmi and winreg modules in sys.modules, replacing any real ones.
+
+    registry is a FakeKey for HKEY_LOCAL_MACHINE (default: an empty one).
+    """
+    wmi = types.ModuleType("wmi")
+    wmi.WMI = lambda *args, **kwargs: FakeWMI(list(volumes))
+    sys.modules["wmi"] = wmi
+    sys.modules["winreg"] = make_winreg(registry or FakeKey("HKEY_LOCAL_MACHINE"))